@@ -0,0 +1,324 @@
+"""
+Motor de diagnóstico de medidores Coriolis (salud del medidor y detección multifase).
+
+Trabaja sobre columnas NumPy (una por variable, NaN = sin dato) y calcula en una sola
+pasada por columna las métricas (último, promedio, mínimo, máximo), el desbalance
+A1/A2 y las clasificaciones de agua, vapor/burbujas, suciedad e interferencia.
+
+No depende de Django: recibe columnas y umbrales, de modo que sirve igual para el detalle
+de un batch que para evaluar lecturas recientes de cualquier sistema.
+
+Uso:
+    columnas = {campo: valores for campo in CAMPOS_DIAGNOSTICO}   # listas o arreglos
+    diagnostico = diagnosticar(columnas, densidad_prom, umbrales_diagnostico(config))
+"""
+import numpy as np
+
+# (campo, etiqueta, unidad) de las variables que se reportan en 'parametros'
+VARIABLES_DIAGNOSTICO = (
+    ('driver_curr', 'Corriente del driver', 'mA'),
+    ('dsp_rxmsg_amplitudeEstimateA1', 'Amplitud estimada A1', None),
+    ('dsp_rxmsg_amplitudeEstimateA2', 'Amplitud estimada A2', None),
+    ('dsp_rxmsg_driverAmplitude', 'Amplitud del driver', None),
+    ('dsp_rxmsg_noiseEstimatedN1', 'Ruido estimado N1', None),
+    ('dsp_rxmsg_noiseEstimatedN2', 'Ruido estimado N2', None),
+)
+
+# Columnas que necesita diagnosticar()
+CAMPOS_DIAGNOSTICO = [campo for campo, _etiqueta, _unidad in VARIABLES_DIAGNOSTICO] + ['driver_curr_alm']
+
+# Valores por defecto cuando la configuración del sistema no los define
+UMBRALES_DEFECTO = {
+    'glp_density_ref': 0.55,
+    'glp_density_tolerance_pct': 5.0,
+    'driver_amp_multiplier': 1.3,
+    'amp_imbalance_threshold_pct': 5.0
+}
+
+# Campo de ConfiguracionCoeficientes de cada umbral
+_CAMPOS_CONFIGURACION = {
+    'glp_density_ref': 'diagnostic_glp_density_ref',
+    'glp_density_tolerance_pct': 'diagnostic_glp_density_tolerance_pct',
+    'driver_amp_base': 'diagnostic_driver_amp_base',
+    'driver_amp_multiplier': 'diagnostic_driver_amp_multiplier',
+    'n1_threshold': 'diagnostic_n1_threshold',
+    'n2_threshold': 'diagnostic_n2_threshold',
+    'amp_imbalance_threshold_pct': 'diagnostic_amp_imbalance_threshold_pct',
+}
+
+# Densidad del agua (g/cc) para la regla de mezcla
+RHO_AGUA = 1.0
+
+
+def umbrales_diagnostico(config):
+    """
+    Umbrales configurados (None si no se definen) a partir de una ConfiguracionCoeficientes
+    o de cualquier objeto con los atributos diagnostic_*; config puede ser None.
+    """
+    return {
+        clave: getattr(config, campo, None) if config else None
+        for clave, campo in _CAMPOS_CONFIGURACION.items()
+    }
+
+
+def columna(valores):
+    """Secuencia (con None) o arreglo → arreglo float64 con NaN como dato faltante."""
+    return np.asarray(valores if valores is not None else [], dtype=np.float64)
+
+
+def metricas(valores):
+    """Último valor, promedio, mínimo y máximo de una columna, ignorando los faltantes."""
+    validos = valores[~np.isnan(valores)]
+    if validos.size == 0:
+        return {'ultimo': None, 'promedio': None, 'min': None, 'max': None}
+    return {
+        'ultimo': float(validos[-1]),
+        # Suma acumulada: mismo orden de sumas (y mismo redondeo) que sum() en Python
+        'promedio': float(np.cumsum(validos)[-1] / validos.size),
+        'min': float(validos.min()),
+        'max': float(validos.max())
+    }
+
+
+def desbalance_maximo_pct(a1, a2):
+    """Máximo de |A1-A2|/(A1+A2) en %, sobre los puntos con ambos valores y A1+A2 != 0."""
+    denominador = a1 + a2
+    validos = ~np.isnan(denominador) & (denominador != 0)
+    if not validos.any():
+        return None
+    return float((np.abs(a1[validos] - a2[validos]) / denominador[validos]).max() * 100)
+
+
+def porcentaje_agua(densidad_prom, glp_ref, glp_variacion):
+    """% de agua por regla de mezcla sobre el límite superior de la densidad GLP."""
+    if densidad_prom is None or glp_ref in [None, 0]:
+        return None
+    glp_superior = glp_ref * (1 + glp_variacion)
+    if densidad_prom > glp_superior and RHO_AGUA > glp_superior:
+        return min(100.0, max(0.0, ((densidad_prom - glp_superior) / (RHO_AGUA - glp_superior)) * 100))
+    return 0.0
+
+
+def _estado_detalle(alerta, datos_disponibles):
+    if alerta:
+        return 'ALERTA'
+    if not datos_disponibles:
+        return 'SIN_DATOS'
+    return 'OK'
+
+
+def _estado_grupo(elementos):
+    if any(elemento['estado'] == 'ALERTA' for elemento in elementos):
+        return 'ALERTA'
+    if any(elemento['estado'] == 'OK' for elemento in elementos):
+        return 'OK'
+    return 'SIN_DATOS'
+
+
+def diagnosticar(columnas, densidad_prom, umbrales=None):
+    """
+    Diagnóstico del medidor sobre un intervalo (p. ej. los puntos de un batch).
+
+    Args:
+        columnas: {campo: valores} con los CAMPOS_DIAGNOSTICO (listas con None o arreglos
+            NumPy con NaN, A1 y A2 alineadas); los campos ausentes se toman como sin datos
+        densidad_prom: densidad promedio del intervalo (g/cc) o None
+        umbrales: dict de umbrales_diagnostico() (None = todos sin configurar)
+
+    Returns:
+        dict con estado_general, mensajes, parametros, alarmas_detectadas, multifase
+        y salud_medidor
+    """
+    umbrales = umbrales or umbrales_diagnostico(None)
+    arreglos = {campo: columna(columnas.get(campo)) for campo in CAMPOS_DIAGNOSTICO}
+    por_variable = {campo: metricas(arreglos[campo]) for campo, _etiqueta, _unidad in VARIABLES_DIAGNOSTICO}
+
+    alarmas_driver = arreglos['driver_curr_alm']
+    alarma_driver = bool((alarmas_driver[~np.isnan(alarmas_driver)] != 0).any())
+
+    parametros_diagnostico = [
+        {
+            'id': campo,
+            'label': etiqueta,
+            'unidad': unidad,
+            'metricas': por_variable[campo],
+            'en_alarma': alarma_driver if campo == 'driver_curr' else False
+        }
+        for campo, etiqueta, unidad in VARIABLES_DIAGNOSTICO
+    ]
+
+    # Umbrales efectivos
+    glp_ref = umbrales['glp_density_ref'] if umbrales['glp_density_ref'] not in [None, 0] else UMBRALES_DEFECTO['glp_density_ref']
+    glp_tolerance_pct = umbrales['glp_density_tolerance_pct'] if umbrales['glp_density_tolerance_pct'] is not None else UMBRALES_DEFECTO['glp_density_tolerance_pct']
+    glp_variacion = max(glp_tolerance_pct, 0) / 100
+    driver_amp_multiplier = umbrales['driver_amp_multiplier'] if umbrales['driver_amp_multiplier'] not in [None, 0] else UMBRALES_DEFECTO['driver_amp_multiplier']
+    amp_imbalance_threshold = umbrales['amp_imbalance_threshold_pct'] if umbrales['amp_imbalance_threshold_pct'] is not None else UMBRALES_DEFECTO['amp_imbalance_threshold_pct']
+    n1_threshold = umbrales['n1_threshold']
+    n2_threshold = umbrales['n2_threshold']
+
+    driver_amp_metricas = por_variable['dsp_rxmsg_driverAmplitude']
+    driver_amp_max = driver_amp_metricas['max']
+    driver_amp_base = umbrales['driver_amp_base'] if umbrales['driver_amp_base'] not in [None, 0] else driver_amp_metricas['promedio']
+    driver_amp_threshold = driver_amp_base * driver_amp_multiplier if driver_amp_base else None
+    driver_amp_alto = driver_amp_threshold is not None and driver_amp_max is not None and driver_amp_max >= driver_amp_threshold
+
+    n1_max = por_variable['dsp_rxmsg_noiseEstimatedN1']['max']
+    n2_max = por_variable['dsp_rxmsg_noiseEstimatedN2']['max']
+    n1_alert = n1_threshold is not None and n1_max is not None and n1_max >= n1_threshold
+    n2_alert = n2_threshold is not None and n2_max is not None and n2_max >= n2_threshold
+    ruido_configurado = (n1_threshold is not None) or (n2_threshold is not None)
+    ruido_datos_disponibles = ruido_configurado and (n1_max is not None or n2_max is not None)
+    ruido_alto = n1_alert or n2_alert
+
+    desbalance_pct = desbalance_maximo_pct(
+        arreglos['dsp_rxmsg_amplitudeEstimateA1'], arreglos['dsp_rxmsg_amplitudeEstimateA2']
+    )
+    desbalance_alert = desbalance_pct is not None and amp_imbalance_threshold is not None and desbalance_pct >= amp_imbalance_threshold
+
+    agua = porcentaje_agua(densidad_prom, glp_ref, glp_variacion)
+
+    # Clasificación multifase
+    vapor_detectado = driver_amp_alto and ruido_alto
+    suciedad_detectada = driver_amp_alto and not ruido_alto and driver_amp_max is not None
+    interferencia_detectada = ruido_alto and not driver_amp_alto
+
+    valores_ruido = [v for v in [n1_max, n2_max] if v is not None]
+    ruido_maximo = max(valores_ruido) if valores_ruido else None
+
+    detalles_multifase = [
+        {
+            'id': 'agua',
+            'titulo': '% Agua estimado',
+            'estado': 'ALERTA' if agua is not None and agua > 1 else ('OK' if agua is not None else 'SIN_DATOS'),
+            'valor': agua,
+            'unidad': '%',
+            'mensaje': 'Se calcula con regla de mezcla usando la densidad GLP configurada.'
+        },
+        {
+            'id': 'vapor',
+            'titulo': 'Presencia de vapor/burbujas',
+            'estado': _estado_detalle(vapor_detectado, driver_amp_threshold is not None and ruido_datos_disponibles),
+            'valor': driver_amp_max,
+            'unidad': '',
+            'mensaje': 'Driver Amp y ruido elevados indican burbujeo/dos fases o cavitación.'
+        },
+        {
+            'id': 'suciedad',
+            'titulo': 'Suciedad o fluido viscoso',
+            'estado': _estado_detalle(suciedad_detectada, driver_amp_threshold is not None),
+            'valor': driver_amp_max,
+            'unidad': '',
+            'mensaje': 'Driver Amp alto con ruido normal suele asociarse a suciedad o mayor viscosidad.'
+        },
+        {
+            'id': 'interferencia',
+            'titulo': 'Interferencia mecánica/eléctrica',
+            'estado': _estado_detalle(interferencia_detectada, ruido_datos_disponibles),
+            'valor': ruido_maximo,
+            'unidad': None,
+            'mensaje': 'Ruido elevado con Driver Amp normal sugiere interferencias externas.'
+        },
+    ]
+    estado_multifase = _estado_grupo(detalles_multifase)
+
+    indicadores_salud = [
+        {
+            'id': 'driver_amp',
+            'label': 'Driver Amp (máx)',
+            'valor': driver_amp_max,
+            'umbral': driver_amp_threshold,
+            'estado': _estado_detalle(driver_amp_alto, driver_amp_threshold is not None and driver_amp_max is not None),
+            'unidad': '',
+            'descripcion': 'Se compara contra el valor base configurado.'
+        },
+        {
+            'id': 'desbalance',
+            'label': 'Desbalance A1/A2',
+            'valor': desbalance_pct,
+            'umbral': amp_imbalance_threshold,
+            'estado': _estado_detalle(desbalance_alert, desbalance_pct is not None and amp_imbalance_threshold is not None),
+            'unidad': '%',
+            'descripcion': 'Calculado como |A1-A2|/(A1+A2).'
+        },
+        {
+            'id': 'n1',
+            'label': 'Ruido N1',
+            'valor': n1_max,
+            'umbral': n1_threshold,
+            'estado': _estado_detalle(n1_alert, n1_threshold is not None and n1_max is not None),
+            'unidad': None,
+            'descripcion': 'Comparado contra el umbral configurado.'
+        },
+        {
+            'id': 'n2',
+            'label': 'Ruido N2',
+            'valor': n2_max,
+            'umbral': n2_threshold,
+            'estado': _estado_detalle(n2_alert, n2_threshold is not None and n2_max is not None),
+            'unidad': None,
+            'descripcion': 'Comparado contra el umbral configurado.'
+        },
+    ]
+    estado_salud = _estado_grupo(indicadores_salud)
+
+    mensajes_multifase = []
+    if agua is None:
+        mensajes_multifase.append('Sin densidad promedio para estimar porcentaje de agua.')
+    elif agua > 1:
+        mensajes_multifase.append(f'Densidad promedio superior a la referencia GLP (+{agua:.1f}%). Posible presencia de agua.')
+    if vapor_detectado:
+        mensajes_multifase.append('Driver Amp y ruido elevados: patrón consistente con vapor/burbujas o cavitación.')
+    if suciedad_detectada:
+        mensajes_multifase.append('Driver Amp elevado con ruido normal: revisar posibles sólidos o fluido más viscoso.')
+    if interferencia_detectada:
+        mensajes_multifase.append('Ruido elevado con Driver Amp normal: revisar posibles interferencias mecánicas/eléctricas.')
+
+    mensajes_salud = []
+    if desbalance_alert:
+        mensajes_salud.append(f'Desbalance entre tubos superior a {amp_imbalance_threshold:.1f}% (máx observado {desbalance_pct:.1f}%).')
+    if n1_alert or n2_alert:
+        mensajes_salud.append('Ruido N1/N2 excede el umbral configurado.')
+
+    if estado_multifase == 'ALERTA' or estado_salud == 'ALERTA':
+        estado_general = 'ALERTA'
+    elif estado_multifase == 'SIN_DATOS' and estado_salud == 'SIN_DATOS':
+        estado_general = 'SIN_DATOS'
+    else:
+        estado_general = 'OK'
+
+    mensajes_diagnostico = mensajes_multifase + mensajes_salud
+    if not mensajes_diagnostico and estado_general != 'SIN_DATOS':
+        mensajes_diagnostico = ['Sin anomalías detectadas en los parámetros configurados.']
+    elif not mensajes_diagnostico:
+        mensajes_diagnostico = ['No se encontraron lecturas suficientes para un diagnóstico.']
+
+    alarmas = [
+        ('agua', agua is not None and agua > 1),
+        ('vapor', vapor_detectado),
+        ('suciedad', suciedad_detectada),
+        ('interferencia', interferencia_detectada),
+        ('desbalance', desbalance_alert),
+        ('n1', n1_alert),
+        ('n2', n2_alert),
+        ('driver_curr', alarma_driver),
+    ]
+
+    return {
+        'estado_general': estado_general,
+        'mensajes': mensajes_diagnostico,
+        'parametros': parametros_diagnostico,
+        'alarmas_detectadas': [alarma for alarma, activa in alarmas if activa],
+        'multifase': {
+            'estado': estado_multifase,
+            'porcentaje_agua': agua,
+            'densidad_promedio': densidad_prom,
+            'densidad_glp_referencia': glp_ref,
+            'variacion_glp_pct': glp_tolerance_pct,
+            'detalles': detalles_multifase
+        },
+        'salud_medidor': {
+            'estado': estado_salud,
+            'indicadores': indicadores_salud,
+            'mensajes': mensajes_salud
+        }
+    }
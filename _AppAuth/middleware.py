@@ -15,6 +15,10 @@ class AuthMiddleware:
         if request.path.startswith(exempt_prefixes):
             return self.get_response(request)
 
+        # Ingesta Node-RED ya autenticada por NodeRedAuthMiddleware (sin sesión)
+        if getattr(request, "node_red", None) is not None:
+            return self.get_response(request)
+
         # Verificar si el usuario está autenticado pero no registrado
         if request.session.get('user_not_registered'):
             email = request.session.get('unregistered_user_email', 'Usuario autenticado')
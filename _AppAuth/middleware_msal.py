@@ -1,9 +1,10 @@
 # _AppAuth/middleware_msal.py
 
-import os, base64, json, logging
+import base64, json, logging
 from django.contrib.auth import get_user_model
 from django.utils.deprecation import MiddlewareMixin
 from django.conf import settings
+from _AppAuth.middleware_node_red import RUTA_NODE_RED
 
 log = logging.getLogger(__name__)
 
@@ -19,78 +20,17 @@ class MSALAuthMiddleware(MiddlewareMixin):
     """
     Middleware unificado para autenticación MSAL que maneja:
     1. Autenticación Azure AD via MSAL (desarrollo y producción)
-    2. Autenticación especial para Node-RED con Basic Auth
+    2. Omite las rutas de ingesta Node-RED (las autentica NodeRedAuthMiddleware)
     """
     
     def process_request(self, request):
-        # Para rutas de Node-RED, intentar Basic Auth primero
-        if '/monitoreo/api/node-red/' in request.path:
-            return self._handle_node_red_auth(request)
+        # Las rutas de Node-RED las autentica NodeRedAuthMiddleware (sin sesión ni usuario)
+        if RUTA_NODE_RED in request.path:
+            return
         
         # Para otras rutas, continuar con MSAL auth
         return self._handle_msal_auth(request)
     
-    def _handle_node_red_auth(self, request):
-        """Maneja autenticación específica para Node-RED usando Basic Auth con variables de entorno"""
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        
-        if not auth_header or not auth_header.startswith('Basic '):
-            log.warning("Acceso denegado a Node-RED: Sin header Basic Auth")
-            return
-            
-        try:
-            # Decodificar credenciales del header
-            encoded_credentials = auth_header.split(' ')[1]
-            decoded_credentials = base64.b64decode(encoded_credentials).decode('utf-8')
-            username, password = decoded_credentials.split(':', 1)
-            
-            # Obtener credenciales de variables de entorno
-            node_red_user = os.environ.get('NODE_RED_USER')
-            node_red_pass = os.environ.get('NODE_RED_PASS')
-            
-            if not node_red_user or not node_red_pass:
-                log.error("Variables de entorno NODE_RED_USER o NODE_RED_PASS no configuradas")
-                return
-            
-            # Verificar credenciales
-            if username == node_red_user and password == node_red_pass:
-                # Buscar un usuario admin en la base de datos para asignar
-                User = get_user_model()
-                try:
-                    # Buscar un usuario con rol admin_principal para Node-RED
-                    admin_user = User.objects.filter(
-                        user_role__role='admin_principal'
-                    ).first()
-                    
-                    if admin_user:
-                        request.user = admin_user
-                        log.info(f"Usuario Node-RED autenticado exitosamente como: {admin_user.email}")
-                        return
-                    else:
-                        # Si no hay admin_principal, buscar cualquier admin
-                        admin_user = User.objects.filter(
-                            user_role__role='admin'
-                        ).first()
-                        
-                        if admin_user:
-                            request.user = admin_user
-                            log.info(f"Usuario Node-RED autenticado como admin: {admin_user.email}")
-                            return
-                        else:
-                            log.error("No se encontró usuario administrador para Node-RED")
-                            return
-                            
-                except Exception as e:
-                    log.error(f"Error buscando usuario admin para Node-RED: {e}")
-                    return
-            else:
-                log.warning(f"Credenciales Node-RED inválidas para usuario: {username}")
-                return
-                
-        except Exception as e:
-            log.error(f"Error decodificando Basic Auth para Node-RED: {e}")
-            return
-    
     def _handle_msal_auth(self, request):
         """Maneja autenticación MSAL - Lee datos de la sesión que son guardados por views_aad_local.py"""
         # Los datos MSAL se guardan en la sesión durante el callback de MSAL
@@ -0,0 +1,171 @@
+# _AppAuth/middleware_node_red.py
+"""
+Autenticación de la ingesta Node-RED (/monitoreo/api/node-red/) sin sesión ni usuario.
+
+Los gateways no son usuarios de la plataforma: NodeRedAuthMiddleware verifica las
+credenciales antes de SessionMiddleware y marca el request con la identidad del
+gateway (request.node_red). MSALAuthMiddleware y AuthMiddleware dejan pasar esas rutas
+sin consultar usuarios ni leer/guardar la sesión, y las vistas (BasicNodeRedAuthMixin)
+reutilizan la identidad ya verificada.
+
+Esquemas aceptados en el header Authorization:
+
+- Basic NODE_RED_USER:NODE_RED_PASS: credencial de servicio, cualquier mac_gateway.
+- Basic <mac_gateway>:<clave>: clave propia del gateway (NODE_RED_CLAVES_GATEWAY, sin
+  ':'); solo puede enviar lecturas de su mac_gateway.
+- GISME-HMAC <mac_gateway>:<timestamp>:<firma>: el cuerpo viaja firmado y la clave no
+  se transmite. firma = HMAC-SHA256(clave, "<timestamp>\\n<MÉTODO>\\n<ruta>\\n" + cuerpo)
+  en hexadecimal; timestamp en segundos epoch, con tolerancia
+  NODE_RED_HMAC_TOLERANCIA_SEGUNDOS. Una firma ya usada se rechaza dentro de la
+  tolerancia: las firmas se registran en NODE_RED_FIRMAS_CACHE, que debe ser compartida
+  por todos los workers (y nodos) que reciben la ingesta; con un backend de add()
+  atómico (Redis, Memcached, base de datos) tampoco pasan réplicas simultáneas.
+
+Las identidades se arman una sola vez por configuración de credenciales.
+"""
+import time
+import hmac
+import string
+import base64
+import hashlib
+import logging
+from collections import namedtuple
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+
+log = logging.getLogger(__name__)
+
+RUTA_NODE_RED = '/monitoreo/api/node-red/'
+ESQUEMA_HMAC = 'GISME-HMAC'
+
+# usuario: credencial de servicio o mac_gateway; gateway: None si puede enviar cualquier mac
+IdentidadNodeRed = namedtuple('IdentidadNodeRed', ['usuario', 'gateway', 'metodo'])
+
+# (configuración de credenciales, {usuario: (clave, identidad Basic)})
+_credenciales = (None, {})
+
+
+def _obtener_credenciales():
+    """Credenciales vigentes indexadas por usuario (se rearman solo si cambia la configuración)."""
+    global _credenciales
+    servicio = (getattr(settings, 'NODE_RED_USER', None), getattr(settings, 'NODE_RED_PASS', None))
+    gateways = getattr(settings, 'NODE_RED_CLAVES_GATEWAY', None) or {}
+    configuracion = (servicio, tuple(sorted(gateways.items())))
+    if _credenciales[0] != configuracion:
+        credenciales = {
+            mac: (clave, IdentidadNodeRed(mac, mac, 'basic')) for mac, clave in gateways.items()
+        }
+        if all(servicio):
+            credenciales[servicio[0]] = (servicio[1], IdentidadNodeRed(servicio[0], None, 'basic'))
+        elif not gateways:
+            log.error("Variables de entorno NODE_RED_USER o NODE_RED_PASS no configuradas")
+        _credenciales = (configuracion, credenciales)
+    return _credenciales[1]
+
+
+def _verificar_basic(valor):
+    try:
+        decodificado = base64.b64decode(valor).decode('utf-8')
+        usuario, clave = decodificado.split(':', 1)
+    except Exception:
+        return None, 'Credenciales mal formateadas'
+    credenciales = _obtener_credenciales()
+    if usuario not in credenciales:
+        # La mac_gateway como usuario también lleva ':' (las claves de gateway no)
+        usuario, _, clave = decodificado.rpartition(':')
+    registrada = credenciales.get(usuario)
+    if registrada is None or not hmac.compare_digest(clave.encode('utf-8'), registrada[0].encode('utf-8')):
+        log.warning(f"Credenciales Node-RED inválidas para usuario: {usuario}")
+        return None, 'Credenciales inválidas'
+    return registrada[1], None
+
+
+def _verificar_hmac(request, valor):
+    try:
+        mac, timestamp, firma = valor.rsplit(':', 2)
+        antiguedad = abs(time.time() - int(timestamp))
+    except ValueError:
+        return None, 'Credenciales mal formateadas'
+    # SHA-256 en hexadecimal; compare_digest no acepta texto con caracteres no ASCII
+    if len(firma) != 64 or not all(caracter in string.hexdigits for caracter in firma):
+        return None, 'Credenciales mal formateadas'
+
+    clave = (getattr(settings, 'NODE_RED_CLAVES_GATEWAY', None) or {}).get(mac)
+    if clave is None:
+        log.warning(f"Firma Node-RED de un gateway sin clave registrada: {mac}")
+        return None, 'Credenciales inválidas'
+    tolerancia = getattr(settings, 'NODE_RED_HMAC_TOLERANCIA_SEGUNDOS', 300)
+    if antiguedad > tolerancia:
+        return None, 'Firma vencida'
+
+    mensaje = f"{timestamp}\n{request.method}\n{request.path}\n".encode('utf-8') + request.body
+    esperada = hmac.new(clave.encode('utf-8'), mensaje, hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(firma.lower(), esperada):
+        log.warning(f"Firma Node-RED inválida para el gateway: {mac}")
+        return None, 'Credenciales inválidas'
+
+    try:
+        nueva = caches[getattr(settings, 'NODE_RED_FIRMAS_CACHE', 'respuestas')].add(
+            f'gisme:ingesta:firma:{esperada}', True, 2 * tolerancia
+        )
+    except Exception as e:
+        # Sin registro de firmas no se puede descartar una réplica: se rechaza
+        log.error(f"Error registrando la firma Node-RED de {mac}: {str(e)}")
+        return None, 'No se pudo verificar la firma'
+    if not nueva:
+        log.warning(f"Firma Node-RED repetida para el gateway: {mac}")
+        return None, 'Firma ya utilizada'
+    return IdentidadNodeRed(mac, mac, 'hmac'), None
+
+
+def autenticar_node_red(request):
+    """
+    Verifica las credenciales de un request de ingesta (una sola vez por request).
+
+    Returns:
+        (IdentidadNodeRed, None) si son válidas o (None, mensaje de error)
+    """
+    request = getattr(request, '_request', request)  # Request de DRF → HttpRequest
+    if hasattr(request, 'node_red'):
+        return request.node_red, getattr(request, 'node_red_error', None)
+
+    auth_header = request.META.get('HTTP_AUTHORIZATION') or ''
+    esquema, _, valor = auth_header.partition(' ')
+    if esquema == 'Basic':
+        identidad, error = _verificar_basic(valor.strip())
+    elif esquema == ESQUEMA_HMAC:
+        identidad, error = _verificar_hmac(request, valor.strip())
+    else:
+        log.warning("Acceso denegado a Node-RED: sin header Authorization")
+        identidad, error = None, 'No autorizado'
+
+    request.node_red = identidad
+    request.node_red_error = error
+    return identidad, error
+
+
+def mac_autorizada(request, mac_gateway):
+    """True si la identidad del request puede enviar lecturas de mac_gateway."""
+    identidad, _error = autenticar_node_red(request)
+    return identidad is not None and (identidad.gateway is None or identidad.gateway == mac_gateway)
+
+
+class NodeRedAuthMiddleware:
+    """
+    Autentica las rutas de ingesta Node-RED antes de sesión, CSRF y usuarios; sin
+    credenciales válidas responde 401 sin pasar por el resto de la cadena.
+    Debe ir antes de SessionMiddleware en MIDDLEWARE.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if RUTA_NODE_RED not in request.path:
+            return self.get_response(request)
+
+        identidad, error = autenticar_node_red(request)
+        if identidad is None:
+            return JsonResponse({'error': error}, status=401)
+        return self.get_response(request)
@@ -1,3 +1,70 @@
-from django.test import TestCase
+import base64
+import hashlib
+import hmac
+import time
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from _AppAuth.middleware_node_red import autenticar_node_red, mac_autorizada
 
-# Create your tests here.
+MAC = 'AA:BB:CC:DD:EE:FF'
+RUTA = '/monitoreo/api/node-red/bulk/'
+
+
+def _basic(usuario, clave):
+    return 'Basic ' + base64.b64encode(f'{usuario}:{clave}'.encode()).decode()
+
+
+def _firmado(cuerpo, clave='k1', timestamp=None):
+    timestamp = str(int(time.time()) if timestamp is None else timestamp)
+    mensaje = f'{timestamp}\nPOST\n{RUTA}\n'.encode() + cuerpo
+    firma = hmac.new(clave.encode(), mensaje, hashlib.sha256).hexdigest()
+    return RequestFactory().post(
+        RUTA, cuerpo, content_type='application/json',
+        HTTP_AUTHORIZATION=f'GISME-HMAC {MAC}:{timestamp}:{firma}'
+    )
+
+
+@override_settings(
+    NODE_RED_USER='nodered', NODE_RED_PASS='secreto', NODE_RED_CLAVES_GATEWAY={MAC: 'k1'},
+    NODE_RED_FIRMAS_CACHE='default'
+)
+class AutenticacionNodeRedTests(SimpleTestCase):
+    """Credenciales de la ingesta Node-RED verificadas sin sesión ni usuarios."""
+
+    def setUp(self):
+        cache.clear()
+
+    def _autenticar(self, authorization=None):
+        extra = {'HTTP_AUTHORIZATION': authorization} if authorization else {}
+        return autenticar_node_red(RequestFactory().post(RUTA, **extra))
+
+    def test_basic(self):
+        identidad, error = self._autenticar(_basic('nodered', 'secreto'))
+        self.assertIsNone(error)
+        self.assertIsNone(identidad.gateway)
+
+        identidad, error = self._autenticar(_basic(MAC, 'k1'))
+        self.assertEqual(identidad.gateway, MAC)
+
+        self.assertEqual(self._autenticar(_basic('nodered', 'otra'))[1], 'Credenciales inválidas')
+        self.assertEqual(self._autenticar(_basic(MAC, 'secreto'))[1], 'Credenciales inválidas')
+        self.assertEqual(self._autenticar('Basic ###')[1], 'Credenciales mal formateadas')
+        self.assertEqual(self._autenticar()[1], 'No autorizado')
+
+    def test_hmac(self):
+        request = _firmado(b'{"mac_gateway": "x"}')
+        identidad, error = autenticar_node_red(request)
+        self.assertEqual((identidad.gateway, identidad.metodo, error), (MAC, 'hmac', None))
+        self.assertTrue(mac_autorizada(request, MAC))
+        self.assertFalse(mac_autorizada(request, '11:22:33:44:55:66'))
+
+        self.assertEqual(autenticar_node_red(_firmado(b'{"mac_gateway": "x"}'))[1], 'Firma ya utilizada')
+        self.assertEqual(autenticar_node_red(_firmado(b'{}', clave='otra'))[1], 'Credenciales inválidas')
+        vencida = _firmado(b'{}', timestamp=int(time.time()) - 3600)
+        self.assertEqual(autenticar_node_red(vencida)[1], 'Firma vencida')
+
+    def test_hmac_firma_mal_formada(self):
+        for firma in ('ñ' * 64, 'z' * 64, 'ab12'):
+            with self.subTest(firma=firma):
+                identidad, error = self._autenticar(f'GISME-HMAC {MAC}:{int(time.time())}:{firma}')
+                self.assertEqual((identidad, error), (None, 'Credenciales mal formateadas'))
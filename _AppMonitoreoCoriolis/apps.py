@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AppmonitoreocoriolisConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = '_AppMonitoreoCoriolis'
+
+    def ready(self):
+        # Registrar señales (invalidación de cachés)
+        from . import signals  # noqa: F401
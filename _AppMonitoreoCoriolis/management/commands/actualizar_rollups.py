@@ -0,0 +1,57 @@
+"""
+Actualiza los rollups (1 min / 15 min / 1 h) de NodeRedData.
+
+Pensado para ejecutarse periódicamente (cron / tarea programada), por ejemplo cada minuto:
+    python manage.py actualizar_rollups
+    python manage.py actualizar_rollups --sistema <uuid> --desde 2025-09-01
+    python manage.py actualizar_rollups --loop 60
+"""
+import time
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from _AppComplementos.models import Sistema
+from _AppMonitoreoCoriolis.views.utils import COLOMBIA_TZ
+from _AppMonitoreoCoriolis.views.utils_rollups import actualizar_rollups
+
+
+class Command(BaseCommand):
+    help = 'Actualiza de forma incremental los rollups (1 min / 15 min / 1 h) de los datos Node-RED'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sistema', help='UUID del sistema a procesar (por defecto todos)')
+        parser.add_argument(
+            '--desde',
+            help='Recalcular desde esta fecha (YYYY-MM-DD, hora de Colombia) en lugar de la marca de agua'
+        )
+        parser.add_argument(
+            '--loop',
+            type=int,
+            default=0,
+            help='Repetir indefinidamente cada N segundos (0 = una sola ejecución)'
+        )
+
+    def handle(self, *args, **options):
+        desde = None
+        if options['desde']:
+            try:
+                desde = COLOMBIA_TZ.localize(datetime.strptime(options['desde'], '%Y-%m-%d'))
+            except ValueError:
+                raise CommandError('Formato de fecha inválido. Use YYYY-MM-DD')
+
+        sistemas = Sistema.objects.all()
+        if options['sistema']:
+            sistemas = sistemas.filter(id=options['sistema'])
+            if not sistemas.exists():
+                raise CommandError(f"Sistema no encontrado: {options['sistema']}")
+
+        while True:
+            for sistema in sistemas:
+                procesados = actualizar_rollups(sistema, desde=desde)
+                self.stdout.write(f'{sistema.tag}: {procesados} registros agregados')
+            self.stdout.write(self.style.SUCCESS('Rollups actualizados.'))
+
+            if options['loop'] <= 0:
+                break
+            # --desde solo aplica a la primera pasada
+            desde = None
+            time.sleep(options['loop'])
@@ -0,0 +1,124 @@
+"""
+Carga histórica de lecturas Node-RED desde archivos CSV / NDJSON (opcionalmente .gz),
+para gateways que estuvieron fuera de línea o medidores nuevos con registro local
+(ver _AppMonitoreoCoriolis/views/utils_backfill.py).
+
+    python manage.py backfill_nodered datos/*.csv
+    python manage.py backfill_nodered log_medidor.ndjson.gz --mac AA:BB:CC:DD:EE:FF
+    python manage.py backfill_nodered archivos/ --procesos 4 --lote 50000
+
+Los archivos (o todos los de un directorio) se cargan en paralelo, uno por proceso. Si
+la carga se interrumpe, al repetir el comando cada archivo continúa desde su último
+lote confirmado (--reiniciar para cargarlo de nuevo; las lecturas ya guardadas no se
+duplican). Al final se recalculan los rollups de los sistemas afectados desde la lectura
+más antigua cargada (--sin-rollups para omitirlo).
+
+CSV: encabezado con los nombres de campo de NodeRedData (los mismos del JSON de la
+ingesta). NDJSON: un objeto JSON por línea. created_at_iot es obligatorio.
+"""
+import os
+from datetime import datetime, timezone as dt_timezone
+from django.core.management.base import BaseCommand, CommandError
+from _AppComplementos.models import Sistema
+from _AppMonitoreoCoriolis.views.utils import COLOMBIA_TZ
+from _AppMonitoreoCoriolis.views.utils_rollups import actualizar_rollups
+from _AppMonitoreoCoriolis.views.utils_backfill import FORMATOS, cargar_en_proceso, formato_de
+from _AppMonitoreoCoriolis.views.utils_procesos import mapear_en_procesos
+
+EXTENSIONES = ('.csv', '.ndjson', '.jsonl', '.json', '.csv.gz', '.ndjson.gz', '.jsonl.gz', '.json.gz')
+
+
+class Command(BaseCommand):
+    help = 'Carga archivos históricos CSV / NDJSON de lecturas Node-RED en NodeRedData'
+
+    def add_arguments(self, parser):
+        parser.add_argument('rutas', nargs='+', help='Archivos o directorios a cargar')
+        parser.add_argument('--formato', choices=FORMATOS, help='Formato de los archivos (por defecto según la extensión)')
+        parser.add_argument('--mac', help='mac_gateway de los registros que no la traen')
+        parser.add_argument('--lote', type=int, default=20000, help='Registros por transacción (por defecto 20000)')
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            default=0,
+            help=f'Archivos cargados en paralelo (por defecto uno por CPU, {os.cpu_count() or 1} en este equipo)'
+        )
+        parser.add_argument('--reiniciar', action='store_true', help='Ignorar los puntos de control guardados')
+        parser.add_argument('--sin-rollups', action='store_true', help='No recalcular los rollups al terminar')
+
+    def handle(self, *args, **options):
+        archivos = self._archivos(options['rutas'])
+        if not archivos:
+            raise CommandError('No se encontraron archivos CSV / NDJSON para cargar')
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor o igual a 1')
+        if not options['formato']:
+            for ruta in archivos:
+                try:
+                    formato_de(ruta)
+                except ValueError as e:
+                    raise CommandError(str(e))
+
+        opciones = {
+            'formato': options['formato'],
+            'mac': options['mac'],
+            'lote': options['lote'],
+            'reiniciar': options['reiniciar'],
+        }
+        procesos = min(options['procesos'] or os.cpu_count() or 1, len(archivos))
+        self.stdout.write(f'Cargando {len(archivos)} archivo(s) con {procesos} proceso(s)...')
+
+        tareas = [(ruta, opciones) for ruta in archivos]
+        if procesos > 1:
+            resultados = mapear_en_procesos(cargar_en_proceso, tareas, procesos)
+        else:
+            resultados = [cargar_en_proceso(tarea, reportar=self.stdout.write) for tarea in tareas]
+
+        rangos = {}
+        errores = 0
+        for resultado in resultados:
+            if 'error' in resultado:
+                errores += 1
+                self.stdout.write(self.style.ERROR(f"{resultado['ruta']}: {resultado['error']}"))
+                continue
+            if resultado.get('omitido'):
+                continue
+            self.stdout.write(
+                f"{resultado['ruta']}: {resultado['registros']} registros, "
+                f"{resultado['insertados']} nuevos, {resultado['rechazados']} rechazados"
+            )
+            for error in resultado['errores'] if resultado['rechazados'] else []:
+                self.stdout.write(f"    rechazo: {error}")
+            for sistema_id, (menor, _mayor) in resultado['rangos'].items():
+                rangos[sistema_id] = min(rangos.get(sistema_id, menor), menor)
+
+        if rangos and not options['sin_rollups']:
+            for sistema in Sistema.objects.filter(id__in=rangos):
+                desde = datetime.fromtimestamp(rangos[str(sistema.id)] / 1000, tz=dt_timezone.utc)
+                procesados = actualizar_rollups(sistema, desde=desde)
+                self.stdout.write(f'Rollups {sistema.tag}: {procesados} registros recalculados')
+
+        for sistema in Sistema.objects.filter(id__in=rangos):
+            desde = datetime.fromtimestamp(rangos[str(sistema.id)] / 1000, tz=dt_timezone.utc)
+            self.stdout.write(
+                f'Para detectar batches en lo cargado de {sistema.tag}: python manage.py detectar_batches '
+                f'--sistema {sistema.id} --desde {desde.astimezone(COLOMBIA_TZ):%Y-%m-%d}'
+            )
+
+        if errores:
+            raise CommandError(f'{errores} archivo(s) con error; repita el comando para retomarlos')
+        self.stdout.write(self.style.SUCCESS('Carga histórica completada'))
+
+    @staticmethod
+    def _archivos(rutas):
+        archivos = []
+        for ruta in rutas:
+            if os.path.isdir(ruta):
+                archivos.extend(
+                    os.path.join(ruta, nombre) for nombre in sorted(os.listdir(ruta))
+                    if nombre.endswith(EXTENSIONES)
+                )
+            elif os.path.isfile(ruta):
+                archivos.append(ruta)
+            else:
+                raise CommandError(f'No existe: {ruta}')
+        return archivos
@@ -0,0 +1,82 @@
+"""
+Micro-benchmark de la validación de lecturas Node-RED: esquema liviano
+(views/utils_validacion.py) frente a los serializers DRF de la ingesta.
+
+No escribe en la base de datos. NodeRedDataSerializer (receptor individual) consulta la
+existencia del systemId, por eso solo se mide si existe al menos un sistema.
+
+    python manage.py benchmark_validacion
+    python manage.py benchmark_validacion --registros 20000 --repeticiones 5
+"""
+import time
+import random
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from _AppComplementos.models import Sistema
+from _AppMonitoreoCoriolis.models import NodeRedData
+from _AppMonitoreoCoriolis.serializers import NodeRedDataSerializer, NodeRedDataBulkSerializer
+from _AppMonitoreoCoriolis.views.utils_validacion import ValidadorLecturas, CAMPOS_IGNORADOS
+
+
+def _payloads(cantidad, sistema_id):
+    """Lecturas sintéticas con todos los campos del modelo, como las envía el gateway."""
+    campos = [
+        campo.name for campo in NodeRedData._meta.concrete_fields
+        if campo.name not in CAMPOS_IGNORADOS and campo.name not in ('mac_gateway', 'created_at_iot')
+    ]
+    inicio = timezone.now() - timedelta(days=1)
+    payloads = []
+    for i in range(cantidad):
+        payload = {campo: round(random.uniform(0, 100), 4) for campo in campos}
+        payload['mac_gateway'] = 'AA:BB:CC:DD:EE:FF'
+        payload['created_at_iot'] = (inicio + timedelta(seconds=i)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        if sistema_id:
+            payload['systemId'] = sistema_id
+        payloads.append(payload)
+    return payloads
+
+
+class Command(BaseCommand):
+    help = 'Compara el tiempo de validación del esquema liviano con el de los serializers DRF'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--registros', type=int, default=5000, help='Lecturas por repetición')
+        parser.add_argument('--repeticiones', type=int, default=3, help='Se reporta la mejor repetición')
+
+    def handle(self, *args, **options):
+        sistema = Sistema.objects.first()
+        payloads = _payloads(options['registros'], str(sistema.id) if sistema else None)
+        validador = ValidadorLecturas()
+
+        def serializer(clase):
+            def validar(payload):
+                s = clase(data=payload)
+                s.is_valid()
+                return s.validated_data
+            return validar
+
+        casos = [('Esquema liviano', lambda payload: validador.validar(payload)[0])]
+        casos.append(('NodeRedDataBulkSerializer', serializer(NodeRedDataBulkSerializer)))
+        if sistema:
+            casos.append(('NodeRedDataSerializer (consulta FK)', serializer(NodeRedDataSerializer)))
+        else:
+            self.stdout.write(self.style.WARNING('Sin sistemas registrados: se omite NodeRedDataSerializer'))
+
+        self.stdout.write(f"{len(payloads)} lecturas, mejor de {options['repeticiones']} repeticiones")
+        referencia = None
+        for nombre, validar in casos:
+            mejor = min(self._medir(validar, payloads) for _ in range(options['repeticiones']))
+            referencia = referencia or mejor
+            por_registro_us = mejor / len(payloads) * 1e6
+            self.stdout.write(
+                f"  {nombre:<38} {mejor * 1000:9.1f} ms  {por_registro_us:8.1f} µs/lectura  "
+                f"x{mejor / referencia:.1f}"
+            )
+
+    @staticmethod
+    def _medir(validar, payloads):
+        inicio = time.perf_counter()
+        for payload in payloads:
+            validar(payload)
+        return time.perf_counter() - inicio
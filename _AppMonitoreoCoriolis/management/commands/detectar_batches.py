@@ -0,0 +1,56 @@
+"""
+Avanza el detector continuo de batches con los datos Node-RED nuevos.
+
+Pensado para ejecutarse como worker o tarea programada, por ejemplo:
+    python manage.py detectar_batches --loop 30
+    python manage.py detectar_batches --sistema <uuid> --desde 2025-09-01
+"""
+import time
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from _AppComplementos.models import Sistema
+from _AppMonitoreoCoriolis.views.utils import COLOMBIA_TZ
+from _AppMonitoreoCoriolis.views.utils_batches import avanzar_detector
+
+
+class Command(BaseCommand):
+    help = 'Detecta batches de forma incremental y continua a partir de los datos Node-RED'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sistema', help='UUID del sistema a procesar (por defecto todos)')
+        parser.add_argument(
+            '--desde',
+            help='Reiniciar la detección desde esta fecha (YYYY-MM-DD, hora de Colombia) descartando el estado guardado'
+        )
+        parser.add_argument(
+            '--loop',
+            type=int,
+            default=0,
+            help='Repetir indefinidamente cada N segundos (0 = una sola ejecución)'
+        )
+
+    def handle(self, *args, **options):
+        desde = None
+        if options['desde']:
+            try:
+                desde = COLOMBIA_TZ.localize(datetime.strptime(options['desde'], '%Y-%m-%d'))
+            except ValueError:
+                raise CommandError('Formato de fecha inválido. Use YYYY-MM-DD')
+
+        sistemas = Sistema.objects.all()
+        if options['sistema']:
+            sistemas = sistemas.filter(id=options['sistema'])
+            if not sistemas.exists():
+                raise CommandError(f"Sistema no encontrado: {options['sistema']}")
+
+        while True:
+            for sistema in sistemas:
+                procesados, nuevos = avanzar_detector(sistema, desde=desde)
+                self.stdout.write(f'{sistema.tag}: {procesados} registros, {nuevos} batches nuevos')
+            self.stdout.write(self.style.SUCCESS('Detección de batches actualizada.'))
+
+            if options['loop'] <= 0:
+                break
+            # --desde solo aplica a la primera pasada
+            desde = None
+            time.sleep(options['loop'])
@@ -0,0 +1,68 @@
+"""
+Escaneo de diagnóstico de la flota: evalúa las lecturas recientes de cada sistema con los
+umbrales diagnostic_* de su configuración y guarda el puntaje de salud
+(ver _AppMonitoreoCoriolis/views/utils_flota.py).
+
+Pensado para ejecutarse periódicamente (cron / tarea programada), por ejemplo cada hora:
+    python manage.py escanear_flota
+    python manage.py escanear_flota --horas 6 --procesos 8
+    python manage.py escanear_flota --sistema <uuid>
+    python manage.py escanear_flota --loop 3600
+"""
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from _AppComplementos.models import Sistema
+from _AppMonitoreoCoriolis.views.utils_flota import escanear_flota, procesos_por_defecto
+
+
+class Command(BaseCommand):
+    help = 'Diagnostica las lecturas recientes de todos los medidores y guarda su puntaje de salud'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sistema', action='append', help='UUID del sistema a evaluar (repetible; por defecto todos)')
+        parser.add_argument('--horas', type=float, default=None, help='Ventana a evaluar (por defecto FLOTA_DIAGNOSTICO_HORAS)')
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            default=None,
+            help=f'Procesos en paralelo (por defecto FLOTA_DIAGNOSTICO_PROCESOS, {procesos_por_defecto()} en este equipo)'
+        )
+        parser.add_argument(
+            '--loop',
+            type=int,
+            default=0,
+            help='Repetir indefinidamente cada N segundos (0 = una sola ejecución)'
+        )
+
+    def handle(self, *args, **options):
+        if options['sistema']:
+            try:
+                sistemas = {uuid.UUID(valor) for valor in options['sistema']}
+            except ValueError as e:
+                raise CommandError(f"UUID de sistema inválido: {str(e)}")
+            encontrados = set(Sistema.objects.filter(id__in=sistemas).values_list('id', flat=True))
+            if encontrados != sistemas:
+                faltantes = ', '.join(str(sistema_id) for sistema_id in sistemas - encontrados)
+                raise CommandError(f"Sistema no encontrado: {faltantes}")
+            options['sistema'] = [str(sistema_id) for sistema_id in sistemas]
+
+        while True:
+            inicio = time.monotonic()
+            evaluados, errores = escanear_flota(options['sistema'], options['horas'], options['procesos'])
+            tags = dict(Sistema.objects.values_list('id', 'tag'))
+
+            for resultado in sorted(evaluados, key=lambda r: (r['puntaje'] is None, r['puntaje'] or 0)):
+                diagnostico = resultado['diagnostico']
+                puntaje = 'sin datos' if resultado['puntaje'] is None else f"{resultado['puntaje']:.0f}"
+                alarmas = ', '.join(diagnostico['alarmas_detectadas']) or '-'
+                self.stdout.write(f"{tags.get(resultado['sistema_id'])}: {puntaje} ({diagnostico['estado_general']}) alarmas: {alarmas}")
+            for error in errores:
+                self.stderr.write(f"{tags.get(error['sistema_id'])}: {error['error']}")
+            self.stdout.write(self.style.SUCCESS(
+                f'Flota diagnosticada: {len(evaluados)} sistemas en {time.monotonic() - inicio:.1f} s.'
+            ))
+
+            if options['loop'] <= 0:
+                break
+            time.sleep(options['loop'])
@@ -0,0 +1,285 @@
+"""
+Particionado mensual por rango de created_at_iot para NodeRedData (solo PostgreSQL).
+
+Flujo típico:
+    python manage.py particiones_nodered estado
+    python manage.py particiones_nodered inicializar
+    python manage.py particiones_nodered crear --desde 2025-09 --meses 3
+    python manage.py particiones_nodered desadjuntar --mes 2024-01
+    python manage.py particiones_nodered adjuntar --tabla <tabla> --mes 2024-01
+
+`inicializar` convierte la tabla existente en tabla particionada: la tabla actual se
+renombra a <tabla>_historico y se adjunta como partición DEFAULT, de modo que los
+datos existentes siguen accesibles sin copiarlos. Las particiones mensuales nuevas
+reciben la ingesta a partir de su creación.
+
+`crear` para un mes que ya tiene filas en la partición DEFAULT (p. ej. el mes actual
+justo después de `inicializar`) mueve esas filas a la partición nueva: desadjunta la
+DEFAULT, crea el mes, copia y borra sus filas y vuelve a adjuntar la DEFAULT, todo en
+una transacción. Adjuntar la DEFAULT la recorre completa y bloquea la tabla mientras
+tanto: ejecutarlo en una ventana de baja ingesta y crear los meses futuros por
+adelantado (esos no mueven filas).
+
+Unicidad: PostgreSQL exige que los índices únicos de una tabla particionada incluyan
+la columna de partición, por eso la tabla padre lleva UNIQUE (id, created_at_iot). Un
+id repetido con el mismo created_at_iot (reintentos de la ingesta diferida, carga
+histórica) choca en esa restricción; las lecturas sin created_at_iot van a la
+DEFAULT, que conserva su PK sobre id.
+
+En SQLite (tests) el comando no hace nada: el índice compuesto (systemId, created_at_iot)
+de la migración 0016 es suficiente.
+"""
+from datetime import datetime, timezone as dt_timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from _AppMonitoreoCoriolis.models import NodeRedData
+
+
+def _parse_mes(valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m').replace(tzinfo=dt_timezone.utc)
+    except (TypeError, ValueError):
+        raise CommandError(f"Mes inválido '{valor}'. Use el formato YYYY-MM")
+
+
+def _mes_siguiente(fecha):
+    if fecha.month == 12:
+        return fecha.replace(year=fecha.year + 1, month=1)
+    return fecha.replace(month=fecha.month + 1)
+
+
+class Command(BaseCommand):
+    help = 'Administra las particiones mensuales (PostgreSQL) de la tabla de telemetría NodeRedData'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'accion',
+            choices=['estado', 'inicializar', 'crear', 'adjuntar', 'desadjuntar'],
+            help='Acción a ejecutar'
+        )
+        parser.add_argument('--desde', help='Primer mes a crear (YYYY-MM). Por defecto el mes actual')
+        parser.add_argument('--meses', type=int, default=1, help='Cantidad de meses a crear (por defecto 1)')
+        parser.add_argument('--mes', help='Mes de la partición a adjuntar/desadjuntar (YYYY-MM)')
+        parser.add_argument('--tabla', help='Tabla existente a adjuntar como partición')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Mostrar el SQL sin ejecutarlo'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING(
+                f'El particionado solo aplica a PostgreSQL (motor actual: {connection.vendor}). '
+                'Se usa únicamente el índice compuesto (systemId, created_at_iot).'
+            ))
+            return
+
+        self.tabla = NodeRedData._meta.db_table
+        self.dry_run = options['dry_run']
+        accion = options['accion']
+
+        if accion == 'estado':
+            self._estado()
+        elif accion == 'inicializar':
+            self._inicializar()
+        elif accion == 'crear':
+            desde = _parse_mes(options['desde']) if options['desde'] else \
+                datetime.now(dt_timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            if options['meses'] < 1:
+                raise CommandError('--meses debe ser mayor o igual a 1')
+            self._crear(desde, options['meses'])
+        elif accion == 'adjuntar':
+            if not options['tabla'] or not options['mes']:
+                raise CommandError('adjuntar requiere --tabla y --mes')
+            self._adjuntar(options['tabla'], _parse_mes(options['mes']))
+        elif accion == 'desadjuntar':
+            if not options['mes']:
+                raise CommandError('desadjuntar requiere --mes')
+            self._desadjuntar(_parse_mes(options['mes']))
+
+    # ------------------------------------------------------------------
+    # Utilidades
+    # ------------------------------------------------------------------
+    def _q(self, nombre):
+        return connection.ops.quote_name(nombre)
+
+    def _nombre_particion(self, mes):
+        return f'{self.tabla}_p{mes:%Y%m}'
+
+    def _ejecutar(self, sentencias):
+        for sql in sentencias:
+            self.stdout.write(sql)
+        if self.dry_run:
+            self.stdout.write(self.style.WARNING('Dry-run: no se ejecutó ninguna sentencia.'))
+            return
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for sql in sentencias:
+                    cursor.execute(sql)
+
+    def _esta_particionada(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT c.relkind FROM pg_class c "
+                "JOIN pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE c.relname = %s AND n.nspname = current_schema()",
+                [self.tabla]
+            )
+            fila = cursor.fetchone()
+        return bool(fila) and fila[0] == 'p'
+
+    def _particiones(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint "
+                "FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = %s ORDER BY c.relname",
+                [self.tabla]
+            )
+            return cursor.fetchall()
+
+    def _sql_unico(self, si_no_existe=False):
+        return (
+            f'CREATE UNIQUE INDEX {"IF NOT EXISTS " if si_no_existe else ""}'
+            f'{self._q(self.tabla + "_part_id_iot_uniq")} ON {self._q(self.tabla)} ("id", "created_at_iot")'
+        )
+
+    def _rango(self, mes):
+        inicio = mes.strftime('%Y-%m-%d 00:00:00+00')
+        fin = _mes_siguiente(mes).strftime('%Y-%m-%d 00:00:00+00')
+        return f"FOR VALUES FROM ('{inicio}') TO ('{fin}')"
+
+    # ------------------------------------------------------------------
+    # Acciones
+    # ------------------------------------------------------------------
+    def _estado(self):
+        if not self._esta_particionada():
+            self.stdout.write(self.style.WARNING(
+                f'{self.tabla} no está particionada. Ejecute "inicializar" para convertirla.'
+            ))
+            return
+        particiones = self._particiones()
+        self.stdout.write(f'{self.tabla}: {len(particiones)} particiones')
+        for nombre, limites, filas_estimadas in particiones:
+            self.stdout.write(f'  - {nombre}: {limites} (~{filas_estimadas} filas)')
+
+    def _inicializar(self):
+        if self._esta_particionada():
+            # Tablas convertidas antes de que el padre llevara la restricción única
+            self._ejecutar([self._sql_unico(si_no_existe=True)])
+            self.stdout.write(self.style.SUCCESS(f'{self.tabla} ya está particionada.'))
+            return
+
+        historico = f'{self.tabla}_historico'
+        campo_sistema = NodeRedData._meta.get_field('systemId')
+        tabla_sistema = campo_sistema.related_model._meta.db_table
+        columna_sistema = campo_sistema.column
+
+        # Los índices únicos de una tabla particionada deben incluir la columna de partición:
+        # UNIQUE (id, created_at_iot) en el padre se propaga a cada partición (no es PRIMARY
+        # KEY porque created_at_iot admite nulos). Es la restricción que usan
+        # bulk_create(ignore_conflicts=True) y ON CONFLICT DO NOTHING para descartar repetidos.
+        self._ejecutar([
+            f'ALTER TABLE {self._q(self.tabla)} RENAME TO {self._q(historico)}',
+            f'CREATE TABLE {self._q(self.tabla)} '
+            f'(LIKE {self._q(historico)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE ("created_at_iot")',
+            f'ALTER TABLE {self._q(self.tabla)} ADD CONSTRAINT {self._q(self.tabla + "_systemid_fk")} '
+            f'FOREIGN KEY ({self._q(columna_sistema)}) REFERENCES {self._q(tabla_sistema)} ("id") '
+            f'DEFERRABLE INITIALLY DEFERRED',
+            f'CREATE INDEX {self._q(self.tabla + "_part_sistema_iot_idx")} '
+            f'ON {self._q(self.tabla)} ({self._q(columna_sistema)}, "created_at_iot")',
+            self._sql_unico(),
+            f'ALTER TABLE {self._q(self.tabla)} ATTACH PARTITION {self._q(historico)} DEFAULT',
+        ])
+        if not self.dry_run:
+            self.stdout.write(self.style.SUCCESS(
+                f'{self.tabla} convertida a tabla particionada; datos existentes en {historico} (DEFAULT).'
+            ))
+
+    def _particion_default(self):
+        for nombre, limites, _ in self._particiones():
+            if limites == 'DEFAULT':
+                return nombre
+        return None
+
+    def _tiene_filas(self, tabla, mes):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT 1 FROM {self._q(tabla)} WHERE "created_at_iot" >= %s AND "created_at_iot" < %s LIMIT 1',
+                [mes, _mes_siguiente(mes)]
+            )
+            return cursor.fetchone() is not None
+
+    def _crear(self, desde, meses):
+        if not self._esta_particionada():
+            raise CommandError(f'{self.tabla} no está particionada. Ejecute "inicializar" primero.')
+
+        existentes = {nombre for nombre, _, _ in self._particiones()}
+        default = self._particion_default()
+        sentencias = []
+        movimientos = []
+        mes = desde
+        for _ in range(meses):
+            nombre = self._nombre_particion(mes)
+            if nombre in existentes:
+                self.stdout.write(f'Partición {nombre} ya existe, se omite.')
+                mes = _mes_siguiente(mes)
+                continue
+
+            sentencias.append(
+                f'CREATE TABLE {self._q(nombre)} PARTITION OF {self._q(self.tabla)} {self._rango(mes)}'
+            )
+            if default and self._tiene_filas(default, mes):
+                # PostgreSQL no crea una partición cuyo rango ya tiene filas en la DEFAULT
+                inicio = mes.strftime('%Y-%m-%d 00:00:00+00')
+                fin = _mes_siguiente(mes).strftime('%Y-%m-%d 00:00:00+00')
+                rango = f""""created_at_iot" >= '{inicio}' AND "created_at_iot" < '{fin}'"""
+                movimientos.append(nombre)
+                sentencias.append(
+                    f'INSERT INTO {self._q(nombre)} SELECT * FROM {self._q(default)} WHERE {rango}'
+                )
+                sentencias.append(f'DELETE FROM {self._q(default)} WHERE {rango}')
+            mes = _mes_siguiente(mes)
+
+        if not sentencias:
+            self.stdout.write(self.style.SUCCESS('No hay particiones nuevas por crear.'))
+            return
+        if movimientos:
+            self.stdout.write(self.style.WARNING(
+                f'{", ".join(movimientos)}: se moverán filas desde {default}; la tabla queda '
+                'bloqueada hasta que termine.'
+            ))
+            sentencias = (
+                [f'ALTER TABLE {self._q(self.tabla)} DETACH PARTITION {self._q(default)}']
+                + sentencias
+                + [f'ALTER TABLE {self._q(self.tabla)} ATTACH PARTITION {self._q(default)} DEFAULT']
+            )
+        self._ejecutar(sentencias)
+        if not self.dry_run:
+            creadas = sum(1 for sql in sentencias if sql.startswith('CREATE TABLE'))
+            self.stdout.write(self.style.SUCCESS(f'{creadas} particiones creadas.'))
+
+    def _adjuntar(self, tabla, mes):
+        if not self._esta_particionada():
+            raise CommandError(f'{self.tabla} no está particionada. Ejecute "inicializar" primero.')
+        self._ejecutar([
+            f'ALTER TABLE {self._q(self.tabla)} ATTACH PARTITION {self._q(tabla)} {self._rango(mes)}'
+        ])
+        if not self.dry_run:
+            self.stdout.write(self.style.SUCCESS(f'Tabla {tabla} adjuntada para {mes:%Y-%m}.'))
+
+    def _desadjuntar(self, mes):
+        nombre = self._nombre_particion(mes)
+        if nombre not in {n for n, _, _ in self._particiones()}:
+            raise CommandError(f'No existe la partición {nombre}')
+        self._ejecutar([
+            f'ALTER TABLE {self._q(self.tabla)} DETACH PARTITION {self._q(nombre)}'
+        ])
+        if not self.dry_run:
+            self.stdout.write(self.style.SUCCESS(
+                f'Partición {nombre} desadjuntada; la tabla se conserva para archivo o eliminación.'
+            ))
@@ -0,0 +1,56 @@
+# Generated by Django 5.2 on 2026-10-18 13:27
+
+from django.db import migrations, models
+
+
+INDEX = models.Index(fields=['systemId', 'created_at_iot'], name='nodered_sistema_iot_idx')
+
+
+def crear_indice(apps, schema_editor):
+    """
+    En PostgreSQL el índice se construye con CONCURRENTLY para no bloquear la
+    ingesta sobre una tabla de decenas de millones de filas. En otros motores
+    (SQLite en tests) se usa la creación estándar.
+    """
+    NodeRedData = apps.get_model('_AppMonitoreoCoriolis', 'NodeRedData')
+    if schema_editor.connection.vendor == 'postgresql':
+        tabla = schema_editor.quote_name(NodeRedData._meta.db_table)
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{INDEX.name}" '
+            f'ON {tabla} ("systemId_id", "created_at_iot")'
+        )
+    else:
+        schema_editor.add_index(NodeRedData, INDEX)
+
+
+def eliminar_indice(apps, schema_editor):
+    NodeRedData = apps.get_model('_AppMonitoreoCoriolis', 'NodeRedData')
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{INDEX.name}"')
+    else:
+        schema_editor.remove_index(NodeRedData, INDEX)
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY no puede ejecutarse dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('_AppComplementos', '0015_configuracioncoeficientes_diagnostic_fields'),
+        ('_AppMonitoreoCoriolis', '0015_rename_specific_gravity_60f_nodereddata_time_closed_batch_and_more'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='nodereddata',
+                    index=INDEX,
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(crear_indice, eliminar_indice),
+            ],
+        ),
+    ]
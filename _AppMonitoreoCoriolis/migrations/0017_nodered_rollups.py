@@ -0,0 +1,46 @@
+# Generated by Django 5.2 on 2026-10-18 13:31
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('_AppComplementos', '0015_configuracioncoeficientes_diagnostic_fields'),
+        ('_AppMonitoreoCoriolis', '0016_nodereddata_nodered_sistema_iot_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NodeRedRollupEstado',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('procesado_hasta', models.DateTimeField(blank=True, null=True, verbose_name='Datos agregados hasta')),
+                ('actualizado_en', models.DateTimeField(auto_now=True, verbose_name='Última actualización')),
+                ('systemId', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='nodered_rollup_estado', to='_AppComplementos.sistema')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='NodeRedRollup',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('resolucion', models.CharField(choices=[('1m', '1 minuto'), ('15m', '15 minutos'), ('1h', '1 hora')], max_length=4, verbose_name='Resolución')),
+                ('bucket', models.DateTimeField(verbose_name='Inicio de la ventana (UTC)')),
+                ('total_registros', models.IntegerField(default=0, verbose_name='Registros agregados')),
+                ('estadisticas', models.JSONField(default=dict, verbose_name='Estadísticas por canal')),
+                ('systemId', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nodered_rollups', to='_AppComplementos.sistema')),
+            ],
+            options={
+                'verbose_name': 'Rollup NodeRed',
+                'verbose_name_plural': 'Rollups NodeRed',
+                'constraints': [models.UniqueConstraint(fields=('systemId', 'resolucion', 'bucket'), name='nodered_rollup_unico')],
+            },
+        ),
+    ]
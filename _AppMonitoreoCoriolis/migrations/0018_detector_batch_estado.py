@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-18 13:38
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('_AppComplementos', '0015_configuracioncoeficientes_diagnostic_fields'),
+        ('_AppMonitoreoCoriolis', '0017_nodered_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectorBatchEstado',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('procesado_desde', models.DateTimeField(blank=True, null=True, verbose_name='Detección continua desde')),
+                ('procesado_hasta', models.DateTimeField(blank=True, null=True, verbose_name='Datos procesados hasta')),
+                ('estado', models.JSONField(blank=True, default=dict, verbose_name='Estado del detector')),
+                ('actualizado_en', models.DateTimeField(auto_now=True, verbose_name='Última actualización')),
+                ('systemId', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='detector_batch_estado', to='_AppComplementos.sistema')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 15:02
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('_AppMonitoreoCoriolis', '0018_detector_batch_estado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetalleBatchCalculado',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('version', models.CharField(max_length=40, verbose_name='Versión de entradas del cálculo')),
+                ('rho15', models.FloatField(blank=True, null=True, verbose_name='Densidad a 60°F (kg/m³)')),
+                ('contenido', models.JSONField(default=dict, verbose_name='Detalle calculado')),
+                ('calculado_en', models.DateTimeField(auto_now=True, verbose_name='Calculado en')),
+                ('batch', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='detalle_calculado', to='_AppMonitoreoCoriolis.batchdetectado')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-18 16:20
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('_AppComplementos', '0015_configuracioncoeficientes_diagnostic_fields'),
+        ('_AppMonitoreoCoriolis', '0019_detalle_batch_calculado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiagnosticoSistema',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('ventana_inicio', models.DateTimeField(verbose_name='Inicio de la ventana evaluada')),
+                ('ventana_fin', models.DateTimeField(verbose_name='Fin de la ventana evaluada')),
+                ('total_registros', models.IntegerField(default=0, verbose_name='Registros evaluados')),
+                ('estado_general', models.CharField(max_length=12, verbose_name='Estado general')),
+                ('puntaje', models.FloatField(blank=True, null=True, verbose_name='Puntaje de salud (0-100)')),
+                ('alarmas', models.JSONField(blank=True, default=list, verbose_name='Alarmas detectadas')),
+                ('diagnostico', models.JSONField(blank=True, default=dict, verbose_name='Diagnóstico')),
+                ('evaluado_en', models.DateTimeField(auto_now=True, verbose_name='Evaluado en')),
+                ('systemId', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='diagnostico_flota', to='_AppComplementos.sistema')),
+            ],
+            options={
+                'verbose_name': 'Diagnóstico de Sistema',
+                'verbose_name_plural': 'Diagnósticos de Sistemas',
+                'indexes': [models.Index(fields=['puntaje'], name='diagnostico_sistema_puntaje')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('_AppMonitoreoCoriolis', '0020_diagnostico_sistema'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='noderedrollupestado',
+            name='pendiente_desde',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Recalcular desde'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('_AppMonitoreoCoriolis', '0021_rollup_pendiente_desde'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectorbatchestado',
+            name='pendiente_desde',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Re-escanear desde'),
+        ),
+    ]
@@ -78,6 +78,13 @@ class NodeRedData(BaseModel):
     mp = models.FloatField(null=True, blank=True, verbose_name="M Presión", help_text="Coeficiente M para presión vigente al momento del registro")
     bp = models.FloatField(null=True, blank=True, verbose_name="B Presión", help_text="Coeficiente B para presión vigente al momento del registro")
 
+    class Meta:
+        indexes = [
+            # Todas las consultas de monitoreo filtran por sistema + rango de created_at_iot
+            # y ordenan por created_at_iot (en ambos sentidos)
+            models.Index(fields=['systemId', 'created_at_iot'], name='nodered_sistema_iot_idx'),
+        ]
+
     def __str__(self):
         return f"{self.systemId}"
 
@@ -119,5 +126,116 @@ class BatchDetectado(BaseModel):
         presion_str = f" - {self.pressure_out_prom:.1f} PSI" if self.pressure_out_prom else ""
         return f"Batch {self.systemId.tag} - {self.fecha_inicio.strftime('%d/%m/%Y %H:%M')} ({self.vol_total:.2f} gal - {self.mass_total:.2f} kg{presion_str})"
 
+
+
+class NodeRedRollup(BaseModel):
+    """
+    Agregados pre-calculados de NodeRedData por sistema y ventana de tiempo
+    (1 min / 15 min / 1 h). Ver views/utils_rollups.py.
+    """
+    RESOLUCION_CHOICES = [
+        ('1m', '1 minuto'),
+        ('15m', '15 minutos'),
+        ('1h', '1 hora'),
+    ]
+
+    systemId = models.ForeignKey(Sistema, on_delete=models.CASCADE, related_name='nodered_rollups')
+    resolucion = models.CharField(max_length=4, choices=RESOLUCION_CHOICES, verbose_name="Resolución")
+    bucket = models.DateTimeField(verbose_name="Inicio de la ventana (UTC)")
+    total_registros = models.IntegerField(default=0, verbose_name="Registros agregados")
+    # {canal: {"min", "max", "avg", "first", "last", "n"}}
+    # pressure_out y redundant_temperature se guardan ya corregidos (mx+b del momento)
+    estadisticas = models.JSONField(default=dict, verbose_name="Estadísticas por canal")
+
+    class Meta:
+        verbose_name = "Rollup NodeRed"
+        verbose_name_plural = "Rollups NodeRed"
+        constraints = [
+            models.UniqueConstraint(fields=['systemId', 'resolucion', 'bucket'], name='nodered_rollup_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.systemId} {self.resolucion} {self.bucket:%Y-%m-%d %H:%M}"
+
+
+class NodeRedRollupEstado(BaseModel):
+    """
+    Marca de agua del proceso de rollups: último created_at_iot incluido por sistema, y
+    desde dónde recalcular por lecturas tardías.
+    """
+    systemId = models.OneToOneField(Sistema, on_delete=models.CASCADE, related_name='nodered_rollup_estado')
+    procesado_hasta = models.DateTimeField(null=True, blank=True, verbose_name="Datos agregados hasta")
+    # Lectura tardía más antigua recibida por la ingesta antes de la marca de agua
+    pendiente_desde = models.DateTimeField(null=True, blank=True, verbose_name="Recalcular desde")
+    actualizado_en = models.DateTimeField(auto_now=True, verbose_name="Última actualización")
+
+    def __str__(self):
+        return f"{self.systemId} hasta {self.procesado_hasta}"
+
+
+class DetectorBatchEstado(BaseModel):
+    """
+    Estado persistente del detector incremental de batches de un sistema
+    (ver _AppMonitoreoCoriolis/views/utils_batches.py).
+
+    `estado` guarda la máquina de estados serializada: batch abierto, contador de
+    tiempo en cero, punto de referencia, perfil capturado y acumulados de promedios.
+    """
+    systemId = models.OneToOneField(Sistema, on_delete=models.CASCADE, related_name='detector_batch_estado')
+    procesado_desde = models.DateTimeField(null=True, blank=True, verbose_name="Detección continua desde")
+    procesado_hasta = models.DateTimeField(null=True, blank=True, verbose_name="Datos procesados hasta")
+    # Lectura más antigua confirmada por la ingesta sin superar la marca de agua
+    pendiente_desde = models.DateTimeField(null=True, blank=True, verbose_name="Re-escanear desde")
+    estado = models.JSONField(default=dict, blank=True, verbose_name="Estado del detector")
+    actualizado_en = models.DateTimeField(auto_now=True, verbose_name="Última actualización")
+
+    def __str__(self):
+        return f"Detector {self.systemId} hasta {self.procesado_hasta}"
+
+
+class DetalleBatchCalculado(BaseModel):
+    """
+    Detalle calculado de un batch (puntos para gráficas, diagnóstico, rho15 e
+    incertidumbre GUM), materializado en la primera consulta
+    (ver _AppMonitoreoCoriolis/views/utils_detalle_batch.py).
+
+    `version` firma los campos del batch y de la configuración usados en el cálculo.
+    """
+    batch = models.OneToOneField(BatchDetectado, on_delete=models.CASCADE, related_name='detalle_calculado')
+    version = models.CharField(max_length=40, verbose_name="Versión de entradas del cálculo")
+    rho15 = models.FloatField(null=True, blank=True, verbose_name="Densidad a 60°F (kg/m³)")
+    contenido = models.JSONField(default=dict, verbose_name="Detalle calculado")
+    calculado_en = models.DateTimeField(auto_now=True, verbose_name="Calculado en")
+
+    def __str__(self):
+        return f"Detalle {self.batch_id} ({self.calculado_en:%Y-%m-%d %H:%M})"
+
+
+class DiagnosticoSistema(BaseModel):
+    """
+    Último diagnóstico del escaneo de la flota para un sistema: puntaje de salud
+    (100 = sin alarmas, None = sin datos) y resultado completo del motor de diagnóstico
+    (ver _AppMonitoreoCoriolis/views/utils_flota.py).
+    """
+    systemId = models.OneToOneField(Sistema, on_delete=models.CASCADE, related_name='diagnostico_flota')
+    ventana_inicio = models.DateTimeField(verbose_name="Inicio de la ventana evaluada")
+    ventana_fin = models.DateTimeField(verbose_name="Fin de la ventana evaluada")
+    total_registros = models.IntegerField(default=0, verbose_name="Registros evaluados")
+    estado_general = models.CharField(max_length=12, verbose_name="Estado general")
+    puntaje = models.FloatField(null=True, blank=True, verbose_name="Puntaje de salud (0-100)")
+    alarmas = models.JSONField(default=list, blank=True, verbose_name="Alarmas detectadas")
+    diagnostico = models.JSONField(default=dict, blank=True, verbose_name="Diagnóstico")
+    evaluado_en = models.DateTimeField(auto_now=True, verbose_name="Evaluado en")
+
+    class Meta:
+        verbose_name = "Diagnóstico de Sistema"
+        verbose_name_plural = "Diagnósticos de Sistemas"
+        indexes = [
+            models.Index(fields=['puntaje'], name='diagnostico_sistema_puntaje'),
+        ]
+
+    def __str__(self):
+        return f"{self.systemId} {self.estado_general} ({self.puntaje})"
+
 # Create your models here.
 
@@ -6,3 +6,12 @@ class NodeRedDataSerializer(serializers.ModelSerializer):
         model = NodeRedData
         fields = '__all__'
 
+
+class NodeRedDataBulkSerializer(serializers.ModelSerializer):
+    """
+    Serializer para la ingesta masiva. Excluye systemId porque el sistema ya
+    viene resuelto por lote (evita una consulta de existencia de FK por registro).
+    """
+    class Meta:
+        model = NodeRedData
+        exclude = ['systemId']
@@ -0,0 +1,39 @@
+"""
+Señales del módulo Monitoreo Coriolis
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from _AppComplementos.models import Sistema, ConfiguracionCoeficientes
+from _AppMonitoreoCoriolis.models import BatchDetectado
+from _AppMonitoreoCoriolis.views.utils_cache import cache_configuracion
+from _AppMonitoreoCoriolis.views.utils_tiempo_real import invalidar_ultima_lectura
+from _AppMonitoreoCoriolis.views.utils_tendencias import buffers_tendencias
+from _AppMonitoreoCoriolis.views.utils_respuestas import invalidar_respuestas
+
+
+@receiver([post_save, post_delete], sender=Sistema)
+def invalidar_cache_sistema(sender, instance, **kwargs):
+    """Invalida la caché de configuración al crear, editar o eliminar un sistema."""
+    cache_configuracion.invalidar_sistema(instance)
+    invalidar_ultima_lectura(instance.pk)
+    buffers_tendencias.descartar(instance.pk)
+    invalidar_respuestas(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=ConfiguracionCoeficientes)
+def invalidar_cache_coeficientes(sender, instance, **kwargs):
+    """
+    Invalida la caché de coeficientes al guardar o eliminar una configuración, y la
+    última lectura, el buffer de tendencias y las respuestas cacheadas, que se
+    calcularon con los anteriores.
+    """
+    cache_configuracion.invalidar_coeficientes(instance.systemId_id)
+    invalidar_ultima_lectura(instance.systemId_id)
+    buffers_tendencias.descartar(instance.systemId_id)
+    invalidar_respuestas(instance.systemId_id)
+
+
+@receiver([post_save, post_delete], sender=BatchDetectado)
+def invalidar_respuestas_batch(sender, instance, **kwargs):
+    """Invalida las respuestas cacheadas del sistema al editar (p. ej. asignar ticket) o eliminar un batch."""
+    invalidar_respuestas(instance.systemId_id)
@@ -113,6 +113,7 @@ let chartTemperaturaCoriolis = null;
 let chartTemperatureDiagnostic = null;
 let chartTemperaturaRedundant = null;
 let tiempoRealInterval = null;
+let streamTiempoReal = null; // EventSource del feed de tiempo real
 
 // Variables para controlar el modo de los gráficos
 let modoTiempoReal = true; // true = últimos N días actualizándose, false = filtrado estático
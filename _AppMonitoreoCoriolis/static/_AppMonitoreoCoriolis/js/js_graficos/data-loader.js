@@ -13,7 +13,16 @@ async function actualizarDisplaysConDatosReales() {
     try {
         const response = await fetch(`/monitoreo/api/datos-tiempo-real/${sistemaId}/`);
         const data = await response.json();
-        
+        pintarDisplays(data);
+    } catch (error) {
+        // console.error('❌ Error en la petición de datos tiempo real:', error);
+        mostrarDatosNoDisponibles();
+    }
+}
+
+// Función para pintar en los displays una respuesta de tiempo real (polling o stream)
+function pintarDisplays(data) {
+    try {
         if (data.success) {
             // Actualizar displays con datos reales
             document.getElementById('display-sensor1').textContent = 
@@ -91,6 +100,44 @@ async function actualizarDisplaysConDatosReales() {
     }
 }
 
+// Función para iniciar la consulta periódica de displays (respaldo del stream)
+function iniciarPollingDisplays() {
+    if (tiempoRealInterval) clearInterval(tiempoRealInterval);
+    tiempoRealInterval = setInterval(() => {
+        actualizarDisplaysConDatosReales();
+    }, CONFIG.INTERVALOS.ACTUALIZACION_DISPLAYS);
+}
+
+// Función para recibir las lecturas por stream (SSE) en lugar de consultar periódicamente.
+// Mientras el stream entrega lecturas el polling queda detenido; si falla, se reanuda.
+function conectarStreamTiempoReal(sistemaId) {
+    if (!window.EventSource || typeof STREAM_TIEMPO_REAL === 'undefined' || !STREAM_TIEMPO_REAL) return;
+    desconectarStreamTiempoReal();
+
+    streamTiempoReal = new EventSource(`/monitoreo/api/stream-tiempo-real/${sistemaId}/`);
+
+    streamTiempoReal.addEventListener('lectura', (evento) => {
+        if (tiempoRealInterval) {
+            clearInterval(tiempoRealInterval);
+            tiempoRealInterval = null;
+        }
+        pintarDisplays(JSON.parse(evento.data));
+    });
+
+    streamTiempoReal.onerror = () => {
+        // EventSource reintenta solo; mientras tanto los displays se siguen actualizando por polling
+        if (!tiempoRealInterval) iniciarPollingDisplays();
+    };
+}
+
+// Función para cerrar el stream de tiempo real
+function desconectarStreamTiempoReal() {
+    if (streamTiempoReal) {
+        streamTiempoReal.close();
+        streamTiempoReal = null;
+    }
+}
+
 // Función fallback para mostrar mensaje cuando no hay datos
 function mostrarDatosNoDisponibles() {
     // Displays principales
@@ -117,14 +164,100 @@ function mostrarDatosNoDisponibles() {
     }
 }
 
+// ====================================================================
+// CARGA INCREMENTAL DE HISTÓRICOS EN MODO TIEMPO REAL
+// ====================================================================
+
+// Respuestas históricas ya recibidas por clave de gráfico: { url, etag, data }
+const historicosIncrementales = {};
+
+// Si una serie acumulada supera este tamaño se vuelve a pedir la ventana completa (decimada)
+const MAX_PUNTOS_INCREMENTAL = 4000;
+
+// Arreglos de puntos de una respuesta (clave null = data.datos)
+function seriesHistorico(data, claves) {
+    return claves.map(clave => clave === null ? data : data[clave]);
+}
+
+// Último timestamp (ms) que tiene el navegador
+function cursorHistorico(data, claves) {
+    let cursor = null;
+    seriesHistorico(data, claves).forEach(serie => {
+        const datos = serie && serie.datos ? serie.datos : [];
+        if (datos.length > 0 && (cursor === null || datos[datos.length - 1].timestamp > cursor)) {
+            cursor = datos[datos.length - 1].timestamp;
+        }
+    });
+    return cursor;
+}
+
+// Aplica un delta: descarta lo reemplazado y lo que salió de la ventana, y agrega lo nuevo
+function combinarHistorico(anterior, delta, claves) {
+    const desde = delta.delta.reemplazar_desde;
+    const inicio = delta.delta.ventana_inicio;
+    let excedido = false;
+    claves.forEach(clave => {
+        const previa = clave === null ? anterior : anterior[clave];
+        const nueva = clave === null ? delta : delta[clave];
+        const datos = previa.datos
+            .filter(punto => punto.timestamp >= inicio && punto.timestamp < desde)
+            .concat(nueva.datos);
+        nueva.datos = datos;
+        nueva.total_registros = datos.length;
+        excedido = excedido || datos.length > MAX_PUNTOS_INCREMENTAL;
+    });
+    // La información de decimación corresponde a la ventana completa recibida antes
+    delta.decimacion_info = anterior.decimacion_info;
+    return excedido ? null : delta;
+}
+
+// fetch de un endpoint histórico en modo tiempo real pidiendo solo lo nuevo (?since=)
+// y revalidando con ETag; retorna la respuesta completa ya combinada
+async function fetchHistoricoIncremental(clave, url, claves) {
+    const previo = historicosIncrementales[clave];
+    const usable = previo && previo.url === url;
+    let urlPeticion = url;
+    const headers = {};
+    if (usable) {
+        const cursor = cursorHistorico(previo.data, claves);
+        if (cursor !== null) {
+            urlPeticion += `&since=${cursor}`;
+        }
+        if (previo.etag) {
+            headers['If-None-Match'] = previo.etag;
+        }
+    }
+    
+    const response = await fetch(urlPeticion, { headers: headers });
+    if (response.status === 304 && usable) {
+        return previo.data;
+    }
+    
+    let data = await response.json();
+    if (!data.success) {
+        delete historicosIncrementales[clave];
+        return data;
+    }
+    if (data.delta && data.delta.activo && usable) {
+        const mismaResolucion = previo.data.delta && previo.data.delta.resolucion === data.delta.resolucion;
+        data = mismaResolucion ? combinarHistorico(previo.data, data, claves) : null;
+        if (data === null) {
+            // Cambió la resolución o hay demasiados puntos: pedir la ventana completa
+            delete historicosIncrementales[clave];
+            return fetchHistoricoIncremental(clave, url, claves);
+        }
+    }
+    historicosIncrementales[clave] = { url: url, etag: response.headers.get('ETag'), data: data };
+    return data;
+}
+
 // Función para cargar datos de los últimos 3 días (MODO TIEMPO REAL)
 async function cargarUltimos3DiasDinamico(sistemaId) {
     try {
         // En modo tiempo real, el backend calculará desde el último created_at_iot
         const horasAtras = CONFIG.PERIODOS.DIAS_POR_DEFECTO * 24; // Convertir días a horas
         const url = `/monitoreo/api/datos-flujo/${sistemaId}/?tiempo_real=true&horas_atras=${horasAtras}`;
-        const response = await fetch(url);
-        const data = await response.json();
+        const data = await fetchHistoricoIncremental('flujo', url, ['flujo_volumetrico', 'flujo_masico']);
         
         if (data.success) {
             // console.log('🔄 Cargando datos reales de últimos 3 días:', {
@@ -273,8 +406,7 @@ async function cargarUltimosDiasPresion(sistemaId) {
         // En modo tiempo real, el backend calculará desde el último created_at_iot
         const horasAtras = CONFIG.PERIODOS.DIAS_POR_DEFECTO * 24; // Convertir días a horas
         const url = `/monitoreo/api/datos-presion/${sistemaId}/?tiempo_real=true&horas_atras=${horasAtras}`;
-        const response = await fetch(url);
-        const data = await response.json();
+        const data = await fetchHistoricoIncremental('presion', url, [null]);
         
         if (data.success) {
             // Renderizar gráfico en modo tiempo real
@@ -389,8 +521,15 @@ async function cargarDatosHistoricosTemperatura(sistemaId, fechaInicio = null, f
             url = `/monitoreo/api/datos-temperatura/${sistemaId}/?tiempo_real=true&horas_atras=${horasAtras}`;
         }
         
-        const response = await fetch(url);
-        const data = await response.json();
+        let data;
+        if (fechaInicio && fechaFin) {
+            const response = await fetch(url);
+            data = await response.json();
+        } else {
+            data = await fetchHistoricoIncremental(
+                'temperatura', url, ['coriolis_temperature', 'diagnostic_temperature', 'redundant_temperature']
+            );
+        }
         
         if (data.success) {
             // Renderizar gráficos (con o sin animación según el modo)
@@ -476,6 +615,39 @@ function exportarDatosTemperatura() {
 // Variable global para el gráfico de tendencias
 let trendChart = null;
 
+// Datos de tendencias que ya tiene el navegador (para pedir solo los puntos nuevos)
+let tendenciasCache = null;
+
+// Último timestamp (ms) presente en los datasets
+function ultimoTimestampTendencias(datasets) {
+    let ultimo = null;
+    Object.values(datasets).forEach(dataset => {
+        const puntos = dataset.data || [];
+        if (puntos.length > 0 && (ultimo === null || puntos[puntos.length - 1].x > ultimo)) {
+            ultimo = puntos[puntos.length - 1].x;
+        }
+    });
+    return ultimo;
+}
+
+// Agrega los puntos nuevos a los que ya se tenían y descarta los que salieron de la ventana
+function combinarTendencias(anterior, nuevo) {
+    const inicioMs = nuevo.ventana_tiempo ? nuevo.ventana_tiempo.inicio_ms : null;
+    let totalRegistros = 0;
+    Object.keys(nuevo.datasets).forEach(key => {
+        const previos = anterior.datasets[key] ? anterior.datasets[key].data : [];
+        let combinados = previos.concat(nuevo.datasets[key].data);
+        if (inicioMs !== null) {
+            combinados = combinados.filter(punto => punto.x >= inicioMs);
+        }
+        nuevo.datasets[key].data = combinados;
+        nuevo.datasets[key].total_registros = combinados.length;
+        totalRegistros = Math.max(totalRegistros, combinados.length);
+    });
+    nuevo.total_registros = totalRegistros;
+    return nuevo;
+}
+
 // Función para cargar datos de tendencias (últimas 4 horas)
 async function cargarDatosTendencias() {
     const sistemaId = obtenerSistemaActual();
@@ -485,10 +657,22 @@ async function cargarDatosTendencias() {
     }
     
     try {
-        const response = await fetch(`/monitoreo/api/datos-tendencias/${sistemaId}/`);
-        const data = await response.json();
+        // Si ya hay datos de este sistema, pedir solo los puntos posteriores al último
+        let url = `/monitoreo/api/datos-tendencias/${sistemaId}/`;
+        const ultimo = (tendenciasCache && tendenciasCache.sistemaId === sistemaId) ?
+            ultimoTimestampTendencias(tendenciasCache.data.datasets) : null;
+        if (ultimo !== null) {
+            url += `?since=${ultimo}`;
+        }
+        
+        const response = await fetch(url);
+        let data = await response.json();
         
         if (data.success) {
+            if (data.incremental && ultimo !== null) {
+                data = combinarTendencias(tendenciasCache.data, data);
+            }
+            tendenciasCache = { sistemaId: sistemaId, data: data };
             renderGraficoTendencias(data);
             const info = data.ventana_tiempo ? 
                 `${data.total_registros} registros (${data.ventana_tiempo.inicio} - ${data.ventana_tiempo.fin})` : 
@@ -502,6 +686,7 @@ async function cargarDatosTendencias() {
             }
         } else {
             //console.error('❌ Error obteniendo datos de tendencias:', data.error);
+            tendenciasCache = null;
             mostrarErrorTendencias(data.error);
         }
     } catch (error) {
@@ -171,6 +171,7 @@ function mostrarVistaSelector() {
     //console.log('📋 Mostrando vista de selección de sistemas');
     
     // Limpiar intervalos activos
+    desconectarStreamTiempoReal();
     if (tiempoRealInterval) {
         clearInterval(tiempoRealInterval);
         tiempoRealInterval = null;
@@ -219,6 +220,7 @@ function showSelectorView() {
 
 // Limpiar intervals cuando se abandone la página
 window.addEventListener('beforeunload', function() {
+    desconectarStreamTiempoReal();
     if (tiempoRealInterval) {
         clearInterval(tiempoRealInterval);
         //console.log('🧹 Intervals limpiados al salir de la página');
@@ -256,11 +258,9 @@ document.addEventListener('DOMContentLoaded', function() {
             cargarDatosTendencias();
         }, 500); // Incrementado a 500ms para asegurar visibilidad
         
-        // Configurar actualización automática de displays
-        if (tiempoRealInterval) clearInterval(tiempoRealInterval);
-        tiempoRealInterval = setInterval(() => {
-            actualizarDisplaysConDatosReales();
-        }, CONFIG.INTERVALOS.ACTUALIZACION_DISPLAYS);
+        // Configurar actualización automática de displays: stream SSE con polling de respaldo
+        iniciarPollingDisplays();
+        conectarStreamTiempoReal(sistemaId);
         
         // Configurar actualización automática de tendencias usando CONFIG
         if (tendenciasInterval) clearInterval(tendenciasInterval);
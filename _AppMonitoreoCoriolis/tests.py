@@ -1,3 +1,905 @@
-from django.test import TestCase
+import os
+import glob
+import base64
+import json
+import random
+import tempfile
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from types import SimpleNamespace
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from _AppAdmin.models import UserRole
+from _AppComplementos.models import ConfiguracionCoeficientes, Sistema, Ubicacion
+from _AppMonitoreoCoriolis.models import (
+    BatchDetectado, DetectorBatchEstado, NodeRedData, NodeRedRollup, NodeRedRollupEstado
+)
+from _AppMonitoreoCoriolis.serializers import NodeRedDataBulkSerializer
+from UTIL_LIB.diagnostico_coriolis import diagnosticar, umbrales_diagnostico, metricas, columna
+from _AppMonitoreoCoriolis.views.commands.DetectarBatchesCommand.DetectarBatchesCommand import DetectarBatchesCommandView
+from _AppMonitoreoCoriolis.views.utils_batches import (
+    CAMPOS_DETECTOR, DetectorBatches, avanzar_detector, detectar_batches_vectorizado, detector_cubre_rango,
+    generar_hash_batch, guardar_batches
+)
+from _AppMonitoreoCoriolis.views.utils_ingesta_diferida import BufferIngesta, _Segmento, _a_linea, guardar_lecturas
+from _AppMonitoreoCoriolis.views.utils_validacion import ValidadorLecturas
+from _AppMonitoreoCoriolis.views.utils_ingesta_binaria import (
+    CONTENT_TYPE_LECTURAS, MapaDesconocido, construir_lecturas, decodificar_lecturas, empaquetar_lecturas, id_mapa,
+    obtener_mapa
+)
+from _AppMonitoreoCoriolis.views.utils_backfill import LectorArchivo, _construir
+from _AppMonitoreoCoriolis.views.utils_tendencias import BufferTendencias, VARIABLES_TENDENCIAS
+from _AppMonitoreoCoriolis.views.utils_cache import cache_configuracion
+from _AppMonitoreoCoriolis.views.utils_tiempo_real import obtener_ultima_lectura
+from _AppMonitoreoCoriolis.views.utils_rollups import actualizar_rollups
+from _AppMonitoreoCoriolis.views.utils_decimation import MODOS_DECIMACION, decimar_columnas
 
-# Create your tests here.
+FilaDetector = namedtuple('FilaDetector', CAMPOS_DETECTOR)
+
+
+def _filas_sinteticas(semilla, total=4000):
+    """
+    Serie de un medidor con batches de duración variable, pausas cortas y largas, cruces
+    de medianoche (Colombia), registros incompletos, perfiles faltantes y timestamps repetidos.
+    """
+    rnd = random.Random(semilla)
+    fecha = datetime(2025, 3, 1, 2, 0, tzinfo=timezone.utc)
+    masa = rnd.uniform(0, 1e5)
+    volumen = rnd.uniform(0, 1e7)
+    flujo = False
+    filas = []
+    for _ in range(total):
+        if rnd.random() < 0.07:
+            flujo = not flujo
+        mass_rate = rnd.uniform(0.5, 6) if flujo else rnd.choice([0.0, 0.0, -0.01])
+        masa += max(mass_rate, 0) * 60
+        volumen += max(mass_rate, 0) * 60 * 450
+        perfil = rnd.random() > 0.03
+        filas.append(FilaDetector(
+            created_at_iot=fecha,
+            mass_rate=None if rnd.random() < 0.01 else mass_rate,
+            total_mass=None if rnd.random() < 0.01 else masa,
+            total_volume=volumen,
+            vol_detect_batch=rnd.choice([5.0, 40.0, 300.0]) if perfil else None,
+            time_closed_batch=rnd.choice([0, 1.0, 2.5, 4]) if perfil else None,
+            coriolis_temperature=None if rnd.random() < 0.2 else rnd.uniform(15, 35),
+            density=None if rnd.random() < 0.05 else rnd.uniform(0.7, 0.9),
+            pressure_out=None if rnd.random() < 0.5 else rnd.uniform(1, 3),
+        ))
+        fecha += timedelta(seconds=rnd.choice([0, 20, 60, 60, 60, 90, 600]), microseconds=rnd.choice([0, 250]))
+    return filas
+
+
+class DetectorBatchesVectorizadoTests(SimpleTestCase):
+    """El kernel NumPy debe producir exactamente los mismos batches que el algoritmo fila a fila."""
+
+    def _comparar(self, filas):
+        esperado = DetectarBatchesCommandView()._detectar_batches_con_perfil_dinamico(filas, 0, 0, None)
+        obtenido = detectar_batches_vectorizado(filas)
+        self.assertEqual(obtenido, esperado)
+        return esperado
+
+    def test_resultados_identicos(self):
+        total_batches = 0
+        for semilla in range(12):
+            with self.subTest(semilla=semilla):
+                total_batches += len(self._comparar(_filas_sinteticas(semilla)))
+        self.assertGreater(total_batches, 100)
+
+    def test_rangos_parciales(self):
+        filas = _filas_sinteticas(99)
+        for inicio, fin in ((0, 1), (0, 50), (137, 1900), (2500, 4000)):
+            with self.subTest(inicio=inicio, fin=fin):
+                self._comparar(filas[inicio:fin])
+
+    def test_batch_abierto_al_final_tras_medianoche(self):
+        # Referencia sin flujo a las 23:59 (Colombia) y un único dato con flujo después de medianoche
+        fila = FilaDetector(datetime(2025, 1, 2, 4, 59, tzinfo=timezone.utc), 0.0, 100.0, 1000.0, 5.0, 2.0, 20.0, 0.8, None)
+        filas = [fila, fila._replace(created_at_iot=datetime(2025, 1, 2, 5, 1, tzinfo=timezone.utc),
+                                     mass_rate=2.0, total_mass=200.0, total_volume=9000.0)]
+        self.assertEqual(len(self._comparar(filas)), 1)
+
+    def test_sin_datos(self):
+        self.assertEqual(detectar_batches_vectorizado([]), [])
+        self._comparar([FilaDetector(datetime(2025, 1, 1, tzinfo=timezone.utc), None, 1.0, 1.0, 5.0, 1.0, None, None, None)])
+
+
+def _umbrales(**valores):
+    return umbrales_diagnostico(SimpleNamespace(**{f'diagnostic_{k}': v for k, v in valores.items()}))
+
+
+def _estados(diagnostico):
+    return (
+        diagnostico['estado_general'],
+        diagnostico['multifase']['estado'],
+        diagnostico['salud_medidor']['estado'],
+        diagnostico['alarmas_detectadas'],
+    )
+
+
+class DiagnosticoCoriolisTests(SimpleTestCase):
+    """Resultados del motor de diagnóstico, fijados con los del cálculo original del detalle de batch."""
+
+    def test_metricas(self):
+        self.assertEqual(
+            metricas(columna([None, 2.0, 5.0, None, -1.0, None])),
+            {'ultimo': -1.0, 'promedio': 2.0, 'min': -1.0, 'max': 5.0}
+        )
+        self.assertEqual(metricas(columna([None, None])), {'ultimo': None, 'promedio': None, 'min': None, 'max': None})
+        # Mismo redondeo que sum() / len()
+        self.assertEqual(metricas(columna([0.1] * 10))['promedio'], sum([0.1] * 10) / 10)
+
+    def test_sin_datos(self):
+        diagnostico = diagnosticar({}, None)
+        self.assertEqual(_estados(diagnostico), ('SIN_DATOS', 'SIN_DATOS', 'SIN_DATOS', []))
+        self.assertEqual(diagnostico['mensajes'], ['Sin densidad promedio para estimar porcentaje de agua.'])
+        self.assertEqual(diagnostico['multifase']['densidad_glp_referencia'], 0.55)
+        self.assertEqual(diagnostico['salud_medidor']['indicadores'][1]['umbral'], 5.0)
+
+    def test_sin_anomalias(self):
+        diagnostico = diagnosticar({
+            'dsp_rxmsg_driverAmplitude': [1.0, 1.0],
+            'dsp_rxmsg_amplitudeEstimateA1': [1.0, 1.0],
+            'dsp_rxmsg_amplitudeEstimateA2': [1.0, 1.02],
+            'driver_curr_alm': [0, None],
+        }, 0.55)
+        self.assertEqual(_estados(diagnostico), ('OK', 'OK', 'OK', []))
+        self.assertEqual(diagnostico['mensajes'], ['Sin anomalías detectadas en los parámetros configurados.'])
+        self.assertEqual(diagnostico['multifase']['porcentaje_agua'], 0.0)
+
+    def test_vapor(self):
+        # Driver Amp sobre 1.3 x promedio y ruido N1 sobre el umbral
+        diagnostico = diagnosticar({
+            'dsp_rxmsg_driverAmplitude': [1.0, 1.0, 1.0, 2.0],
+            'dsp_rxmsg_noiseEstimatedN1': [1.0, 6.0],
+        }, 0.5, _umbrales(n1_threshold=5.0))
+        self.assertEqual(_estados(diagnostico), ('ALERTA', 'ALERTA', 'ALERTA', ['vapor', 'n1']))
+        driver_amp = diagnostico['salud_medidor']['indicadores'][0]
+        self.assertEqual((driver_amp['valor'], driver_amp['umbral']), (2.0, 1.25 * 1.3))
+        self.assertEqual(diagnostico['mensajes'], [
+            'Driver Amp y ruido elevados: patrón consistente con vapor/burbujas o cavitación.',
+            'Ruido N1/N2 excede el umbral configurado.',
+        ])
+
+    def test_suciedad_e_interferencia(self):
+        amplitud = {'dsp_rxmsg_driverAmplitude': [3.0, None]}
+        suciedad = diagnosticar(
+            dict(amplitud, dsp_rxmsg_noiseEstimatedN2=[1.0]), 0.5,
+            _umbrales(driver_amp_base=2.0, n2_threshold=4.0)
+        )
+        self.assertEqual(_estados(suciedad), ('ALERTA', 'ALERTA', 'ALERTA', ['suciedad']))
+        interferencia = diagnosticar(
+            dict(amplitud, dsp_rxmsg_noiseEstimatedN2=[1.0, 4.0]), 0.5,
+            _umbrales(driver_amp_base=2.0, driver_amp_multiplier=2.0, n2_threshold=4.0)
+        )
+        self.assertEqual(_estados(interferencia), ('ALERTA', 'ALERTA', 'ALERTA', ['interferencia', 'n2']))
+        self.assertEqual(interferencia['multifase']['detalles'][3]['valor'], 4.0)
+
+    def test_agua_desbalance_y_alarma_driver(self):
+        diagnostico = diagnosticar({
+            'driver_curr': [10.0, 11.0, None],
+            'driver_curr_alm': [None, 0.0, 2.0],
+            'dsp_rxmsg_amplitudeEstimateA1': [1.0, 1.2, None, 0.5],
+            'dsp_rxmsg_amplitudeEstimateA2': [1.0, 0.8, 3.0, -0.5],
+        }, 0.7, _umbrales(glp_density_ref=0.55, glp_density_tolerance_pct=5.0))
+        self.assertEqual(
+            diagnostico['alarmas_detectadas'], ['agua', 'desbalance', 'driver_curr']
+        )
+        self.assertAlmostEqual(diagnostico['multifase']['porcentaje_agua'], (0.7 - 0.5775) / (1.0 - 0.5775) * 100)
+        self.assertAlmostEqual(diagnostico['salud_medidor']['indicadores'][1]['valor'], 20.0)
+        self.assertEqual(diagnostico['mensajes'], [
+            'Densidad promedio superior a la referencia GLP (+29.0%). Posible presencia de agua.',
+            'Desbalance entre tubos superior a 5.0% (máx observado 20.0%).',
+        ])
+        driver_curr = diagnostico['parametros'][0]
+        self.assertTrue(driver_curr['en_alarma'])
+        self.assertEqual(driver_curr['metricas'], {'ultimo': 11.0, 'promedio': 10.5, 'min': 10.0, 'max': 11.0})
+
+    def test_listas_y_arreglos(self):
+        columnas = {
+            'dsp_rxmsg_driverAmplitude': [1.0, None, 4.0],
+            'dsp_rxmsg_noiseEstimatedN1': [0.5, 9.0, None],
+        }
+        arreglos = {campo: np.array(valores, dtype=float) for campo, valores in columnas.items()}
+        umbrales = _umbrales(n1_threshold=1.0)
+        self.assertEqual(diagnosticar(columnas, 0.6, umbrales), diagnosticar(arreglos, 0.6, umbrales))
+
+
+class SegmentoIngestaTests(SimpleTestCase):
+    """Segmentos de derrame de la ingesta diferida (sin base de datos)."""
+
+    def test_ida_y_vuelta(self):
+        directorio = tempfile.mkdtemp()
+        lectura = NodeRedData(
+            systemId_id=uuid.uuid4(),
+            created_at_iot=datetime(2025, 1, 1, 12, 30, 15, 250000, tzinfo=timezone.utc),
+            mass_rate=1.25,
+            density=None,
+            mt=2.0,
+        )
+        segmento = _Segmento.nuevo(directorio)
+        # La última línea queda truncada, como tras una caída durante la escritura
+        segmento.escribir([_a_linea(lectura), '{"id": "trunc'], sincronizar=True)
+
+        leidas = segmento.leer()
+        self.assertEqual(len(leidas), 1)
+        self.assertEqual(leidas[0].id, lectura.id)
+        self.assertEqual(leidas[0].systemId_id, lectura.systemId_id)
+        self.assertEqual(leidas[0].created_at_iot, lectura.created_at_iot)
+        self.assertEqual((leidas[0].mass_rate, leidas[0].density, leidas[0].mt), (1.25, None, 2.0))
+
+        # Mientras el proceso conserva el lock ningún otro puede adoptarlo
+        self.assertIsNone(_Segmento.adoptar(segmento.ruta))
+        segmento.eliminar()
+        self.assertFalse(os.path.exists(segmento.ruta))
+
+
+class ValidadorLecturasTests(SimpleTestCase):
+    """El esquema liviano acepta, convierte y rechaza igual que el serializer de la ingesta."""
+
+    VALORES = [
+        None, 0, -3, 1.5, True, '2.5', ' 3 ', '', 'abc', '1e400', [], 'x' * 101, ' AA:BB ',
+        '2025-01-01T00:00:00Z', '2025-01-01T00:00:00', '2025-01-01 05:00:00-05:00', '2025-01-01',
+        '2025-13-01T00:00:00', datetime(2025, 1, 1, 12, 0), datetime(2025, 1, 1, tzinfo=timezone.utc),
+    ]
+    CAMPOS = ['mass_rate', 'density', 'created_at_iot', 'mac_gateway', 'mt', 'id', 'desconocido']
+
+    def test_equivalente_al_serializer(self):
+        validador = ValidadorLecturas(desconocidos='ignorar')
+        rng = random.Random(7)
+        for _ in range(2000):
+            payload = {
+                campo: rng.choice(self.VALORES)
+                for campo in rng.sample(self.CAMPOS, rng.randint(1, len(self.CAMPOS)))
+            }
+            serializer = NodeRedDataBulkSerializer(data=payload)
+            valido = serializer.is_valid()
+            valores, errores = validador.validar(payload)
+            if valido:
+                self.assertEqual(errores, {}, payload)
+                self.assertEqual(valores, dict(serializer.validated_data), payload)
+            else:
+                esperados = {campo: [str(m) for m in mensajes] for campo, mensajes in serializer.errors.items()}
+                self.assertEqual(errores, esperados, payload)
+
+    def test_campos_desconocidos(self):
+        payload = {'mass_rate': '1', 'desconocido': 1, 'systemId': 'x', 'created_at': None}
+        self.assertEqual(ValidadorLecturas(desconocidos='ignorar').validar(payload), ({'mass_rate': 1.0}, {}))
+        valores, errores = ValidadorLecturas(desconocidos='rechazar').validar(payload)
+        self.assertEqual(list(errores), ['desconocido'])
+        with self.assertRaises(ValueError):
+            ValidadorLecturas(desconocidos='otro')
+
+
+class IngestaBinariaTests(SimpleTestCase):
+    """Lote binario columnar de la ingesta: ida y vuelta y lotes mal formados."""
+
+    def test_ida_y_vuelta(self):
+        nan = float('nan')
+        cuerpo = empaquetar_lecturas(
+            'AA:BB', [1735689600000, 1735689601500, nan],
+            [('mass_rate', [1.5, nan, 3.0]), ('mt', [9.0, 9.0, 9.0]), ('desconocido', [1, 2, 3])],
+            bytes_valor=8
+        )
+        lote = decodificar_lecturas(cuerpo)
+        self.assertEqual(lote['campos'], ['mass_rate', 'mt', 'desconocido'])
+
+        lecturas = construir_lecturas(lote, None, {'mt': 2.0})
+        self.assertEqual(len(lecturas), 3)
+        self.assertEqual([lectura.mass_rate for lectura in lecturas], [1.5, None, 3.0])
+        self.assertEqual({lectura.mt for lectura in lecturas}, {2.0})
+        self.assertEqual(lecturas[1].created_at_iot, datetime(2025, 1, 1, 0, 0, 1, 500000, tzinfo=timezone.utc))
+        self.assertIsNone(lecturas[2].created_at_iot)
+        self.assertFalse(hasattr(lecturas[0], 'desconocido'))
+        with self.assertRaises(ValueError):
+            construir_lecturas(lote, None, {}, desconocidos='rechazar')
+
+    def test_lotes_invalidos(self):
+        cuerpo = empaquetar_lecturas('AA:BB', [1735689600000], [('mass_rate', [1.0])])
+        for invalido in (cuerpo[:10], cuerpo[:-1], b'XXXX' + cuerpo[4:]):
+            with self.assertRaises(ValueError):
+                decodificar_lecturas(invalido)
+        with self.assertRaises(ValueError):
+            decodificar_lecturas(cuerpo, max_registros=0)
+
+
+class LectorArchivoTests(SimpleTestCase):
+    """Lectura de archivos de la carga histórica retomando desde el byte confirmado."""
+
+    def _retomar(self, nombre, contenido, formato):
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, nombre)
+            with open(ruta, 'w', encoding='utf-8') as archivo:
+                archivo.write(contenido)
+            lector = LectorArchivo(ruta, formato)
+            registros = lector.registros()
+            primero = next(registros)
+            offset = lector.offset
+            lector.cerrar()
+
+            lector = LectorArchivo(ruta, formato, offset=offset)
+            resto = list(lector.registros())
+            lector.cerrar()
+            return primero, resto
+
+    def test_csv(self):
+        primero, resto = self._retomar(
+            'lecturas.csv', 'mass_rate,mac_gateway\n1.5,AA\n,BB\n', 'csv'
+        )
+        self.assertEqual(primero, ({'mass_rate': '1.5', 'mac_gateway': 'AA'}, None))
+        self.assertEqual(resto, [({'mass_rate': None, 'mac_gateway': 'BB'}, None)])
+
+    def test_ndjson(self):
+        primero, resto = self._retomar(
+            'lecturas.ndjson', '{"mass_rate": 1}\n\nno es json\n[1]\n{"mass_rate": 2}\n', 'ndjson'
+        )
+        self.assertEqual(primero, ({'mass_rate': 1}, None))
+        self.assertEqual([registro for registro, _error in resto], [None, None, {'mass_rate': 2}])
+        self.assertEqual(sum(1 for _registro, error in resto if error), 2)
+
+
+class BufferTendenciasTests(SimpleTestCase):
+    """Mezcla en el buffer de tendencias de filas confirmadas fuera de orden."""
+
+    @staticmethod
+    def _puntos(instantes):
+        return [(t, t // 1000, (float(t),) * len(VARIABLES_TENDENCIAS)) for t in instantes]
+
+    def test_fusionar_fila_atrasada(self):
+        buffer = BufferTendencias(capacidad=4)
+        buffer.reiniciar(self._puntos([1000, 3000]), 0, (1, 0, 1, 0, 0, 0))
+        # Otro worker confirmó 2000 después de que el buffer leyera 3000
+        buffer.fusionar(self._puntos([2000, 3000, 4000]))
+        self.assertEqual(buffer.ventana().t_us.tolist(), [1000, 2000, 3000, 4000])
+        self.assertEqual(buffer.ventana().valores[:, 0].tolist(), [1000.0, 2000.0, 3000.0, 4000.0])
+
+        # Al exceder la capacidad se descartan las más antiguas y deja de cubrirlas
+        buffer.fusionar(self._puntos([2500, 5000]))
+        self.assertEqual(buffer.ventana().t_us.tolist(), [2500, 3000, 4000, 5000])
+        self.assertFalse(buffer.cubre(2000))
+        self.assertTrue(buffer.cubre(2500))
+
+
+class DecimacionTests(SimpleTestCase):
+    """Los tres modos de decimación conservan picos, bordes de batch y extremos."""
+
+    TOTAL = 20000
+    PICO = 12345
+    # Pausa de flujo (mass_rate = 0) entre estas dos filas: fin e inicio de batch
+    PAUSA = (7000, 7600)
+
+    def _columnas(self):
+        rnd = np.random.default_rng(7)
+        indices = np.arange(self.TOTAL)
+        density = 998.0 + np.sin(indices / 300.0) + rnd.normal(0, 0.05, self.TOTAL)
+        density[self.PICO] += 40.0
+        mass_rate = 3.0 + rnd.normal(0, 0.1, self.TOTAL)
+        mass_rate[self.PAUSA[0]:self.PAUSA[1]] = 0.0
+        return {
+            'created_at_iot': 1_700_000_000_000 + indices.astype(np.int64) * 1000,
+            'density': density,
+            'mass_rate': mass_rate,
+        }
+
+    def test_conserva_picos_y_bordes(self):
+        columnas = self._columnas()
+        inicio, fin = self.PAUSA
+        esperados = {0, self.PICO, inicio - 1, inicio, fin - 1, fin, self.TOTAL - 1}
+        for modo in MODOS_DECIMACION:
+            with self.subTest(modo=modo):
+                decimadas, info = decimar_columnas(columnas, ['density'], max_puntos=500, modo=modo)
+                self.assertTrue(info['aplicada'])
+                self.assertLessEqual(info['total_decimado'], 1000)
+                conservados = set(((decimadas['created_at_iot'] - columnas['created_at_iot'][0]) // 1000).tolist())
+                self.assertLessEqual(esperados, conservados)
+                self.assertEqual(decimadas['density'].max(), columnas['density'][self.PICO])
+
+
+def _crear_sistema(tag, mac):
+    ubicacion, _creada = Ubicacion.objects.get_or_create(nombre='Planta', defaults={'latitud': 4.6, 'longitud': -74.1})
+    return Sistema.objects.create(tag=tag, sistema_id=mac, ubicacion=ubicacion)
+
+
+class IngestaDiferidaTests(TestCase):
+    """Vaciado de la cola de escritura diferida con lecturas que no se pueden guardar."""
+
+    def test_lecturas_invalidas_no_bloquean_la_cola(self):
+        directorio = tempfile.mkdtemp()
+        valido, eliminado = _crear_sistema('FT-1', 'AA:00'), _crear_sistema('FT-2', 'AA:01')
+        fecha = datetime(2025, 1, 1, 12, tzinfo=timezone.utc)
+        buenas = [NodeRedData(systemId=valido, created_at_iot=fecha + timedelta(minutes=i), mass_rate=1.0) for i in range(5)]
+        huerfana = NodeRedData(systemId=eliminado, created_at_iot=fecha, mass_rate=1.0)
+        invalida = NodeRedData(systemId=valido, created_at_iot=fecha, mass_rate=1.0)
+
+        buffer = BufferIngesta()
+        with override_settings(
+            INGESTA_DIFERIDA_DIRECTORIO=directorio, INGESTA_DIFERIDA_LOTE=10**6, INGESTA_DIFERIDA_INTERVALO_MS=10**9
+        ):
+            buffer.encolar(buenas[:2] + [huerfana, invalida] + buenas[2:])
+            # Sistema eliminado con sus lecturas en la cola (systemId sigue cargado en la lectura)
+            eliminado.delete()
+            # Valor que solo falla al insertar (obliga a dividir el lote)
+            invalida.mass_rate = 'no es número'
+            self.assertTrue(buffer.vaciar())
+            estado = buffer.estado()
+
+        self.assertEqual(set(NodeRedData.objects.values_list('id', flat=True)), {obj.id for obj in buenas})
+        self.assertEqual((estado['en_cola'], estado['guardados'], estado['descartados']), (0, 5, 2))
+        descartadas = [
+            json.loads(linea)
+            for ruta in glob.glob(os.path.join(directorio, 'descartadas-*.ndjson'))
+            for linea in open(ruta, encoding='utf-8')
+        ]
+        self.assertEqual({lectura['id'] for lectura in descartadas}, {str(huerfana.id), str(invalida.id)})
+        self.assertTrue(all(lectura['_error'] for lectura in descartadas))
+
+
+class DetectorBatchesPendientesTests(TestCase):
+    """Lecturas confirmadas detrás de la marca de agua del detector continuo."""
+
+    def test_reescanea_lecturas_atrasadas(self):
+        sistema = _crear_sistema('FT-1', 'AA:00')
+        ConfiguracionCoeficientes.objects.create(
+            systemId=sistema, mt=1, bt=0, mp=1, bp=0, lim_inf_caudal_masico=0, lim_sup_caudal_masico=100
+        )
+        # Sin timestamps repetidos (orden de lectura definido) y perfiles como los devuelve la base (float)
+        filas = [
+            fila._replace(time_closed_batch=float(fila.time_closed_batch)) if fila.time_closed_batch is not None else fila
+            for fila in {fila.created_at_iot: fila for fila in _filas_sinteticas(7, total=3500)}.values()
+        ]
+        lecturas = [NodeRedData(systemId=sistema, **fila._asdict()) for fila in filas]
+        detector = DetectorBatches()
+        esperados = {
+            generar_hash_batch(b['fecha_inicio'], b['fecha_fin'], sistema.id, b['vol_minimo_usado'], b['time_finished_usado'])
+            for b in map(detector.procesar, filas) if b is not None
+        }
+
+        # Otro worker confirma un tramo después de que el detector ya pasó por él
+        atrasadas = lecturas[1200:1500]
+        NodeRedData.objects.bulk_create(lecturas[:1200] + lecturas[1500:])
+        avanzar_detector(sistema)
+        inicio, fin = filas[0].created_at_iot, filas[-1].created_at_iot
+        self.assertTrue(detector_cubre_rango(sistema, inicio, fin))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            guardar_lecturas(atrasadas)
+        self.assertEqual(
+            DetectorBatchEstado.objects.get(systemId=sistema).pendiente_desde, filas[1200].created_at_iot
+        )
+        self.assertFalse(detector_cubre_rango(sistema, inicio, fin))
+        # Lo anterior a las lecturas pendientes sigue cubierto
+        self.assertTrue(detector_cubre_rango(sistema, inicio, filas[1000].created_at_iot))
+
+        procesados, _nuevos = avanzar_detector(sistema)
+        # Re-escanea desde el cierre de un batch anterior, no toda la serie
+        self.assertLess(procesados, len(filas) - 1000)
+        self.assertIsNone(DetectorBatchEstado.objects.get(systemId=sistema).pendiente_desde)
+        self.assertTrue(detector_cubre_rango(sistema, inicio, fin))
+        self.assertTrue(esperados <= set(BatchDetectado.objects.values_list('hash_identificacion', flat=True)))
+
+
+class GuardarBatchesTests(TestCase):
+    """Conteo de batches nuevos cuando otro proceso inserta el mismo batch a la vez."""
+
+    def setUp(self):
+        self.sistema = _crear_sistema('FT-1', 'AA:00')
+        inicio = datetime(2025, 1, 1, 12, tzinfo=timezone.utc)
+        self.batches_data = [
+            {
+                'fecha_inicio': inicio + timedelta(hours=i), 'fecha_fin': inicio + timedelta(hours=i, minutes=30),
+                'vol_total': 100.0, 'mass_total': 50.0, 'temperatura_coriolis_prom': 20.0, 'densidad_prom': 0.5,
+                'vol_minimo_usado': 10.0, 'time_finished_usado': 2.0, 'duracion_minutos': 30.0, 'total_registros': 30,
+            }
+            for i in range(3)
+        ]
+
+    def _hash(self, batch_data):
+        return generar_hash_batch(
+            batch_data['fecha_inicio'], batch_data['fecha_fin'], self.sistema.id,
+            batch_data['vol_minimo_usado'], batch_data['time_finished_usado']
+        )
+
+    def test_insercion_concurrente(self):
+        concurrente = self.batches_data[1]
+        bulk_create = BatchDetectado.objects.bulk_create
+
+        def insertar_antes(objetos, **kwargs):
+            # Otro worker guarda el segundo batch entre la consulta y el insert
+            BatchDetectado.objects.create(
+                systemId=self.sistema, fecha_inicio=concurrente['fecha_inicio'], fecha_fin=concurrente['fecha_fin'],
+                vol_total=1.0, temperatura_coriolis_prom=1.0, densidad_prom=1.0, hash_identificacion=self._hash(concurrente)
+            )
+            return bulk_create(objetos, **kwargs)
+
+        with mock.patch.object(BatchDetectado.objects, 'bulk_create', side_effect=insertar_antes):
+            resultado = guardar_batches(self.sistema, self.batches_data, 0, 100)
+
+        self.assertEqual((resultado.nuevos, resultado.existentes), (2, 1))
+        self.assertEqual(BatchDetectado.objects.count(), 3)
+        guardados = {batch.pk: batch.vol_total for batch in BatchDetectado.objects.all()}
+        self.assertEqual({batch.pk: batch.vol_total for batch in resultado.batches}, guardados)
+
+        repetido = guardar_batches(self.sistema, self.batches_data, 0, 100)
+        self.assertEqual((repetido.nuevos, repetido.existentes), (0, 3))
+
+
+class BackfillIdsTests(TestCase):
+    """Ids deterministas de las lecturas de la carga histórica."""
+
+    def setUp(self):
+        cache_configuracion.limpiar()
+        self.sistema = _crear_sistema('FT-1', 'AA:00')
+
+    def _ids(self, *instantes):
+        registros = [{'mac_gateway': 'AA:00', 'mass_rate': 1.0, 'created_at_iot': instante} for instante in instantes]
+        lecturas, _rangos, rechazados, _errores = _construir(registros, None, ValidadorLecturas(), datetime.now(timezone.utc))
+        self.assertEqual(rechazados, 0)
+        return [lectura['id'] for lectura in lecturas]
+
+    def test_mismo_milisegundo(self):
+        primera, segunda, repetida = self._ids(
+            '2025-01-01T12:00:00.123100Z', '2025-01-01T12:00:00.123400Z', '2025-01-01T12:00:00.123100Z'
+        )
+        self.assertNotEqual(primera, segunda)
+        # La misma lectura siempre produce el mismo id (choca en la PK si se repite)
+        self.assertEqual(primera, repetida)
+        self.assertEqual(self._ids('2025-01-01T07:00:00.123100-05:00'), [primera])
+
+
+def _basic(usuario, clave):
+    return 'Basic ' + base64.b64encode(f'{usuario}:{clave}'.encode()).decode()
+
+
+@override_settings(
+    NODE_RED_USER='nodered', NODE_RED_PASS='secreto', NODE_RED_CLAVES_GATEWAY={'AA:00': 'clave-aa00'},
+    INGESTA_DIFERIDA_ACTIVA=False
+)
+class IngestaNodeRedTests(TestCase):
+    """Receptores Node-RED: aceptación/rechazo por lectura y alcance de las credenciales."""
+
+    def setUp(self):
+        cache_configuracion.limpiar()
+        self.sistema = _crear_sistema('FT-1', 'AA:00')
+        self.otro = _crear_sistema('FT-2', 'AA:01')
+        ConfiguracionCoeficientes.objects.create(systemId=self.sistema, mt=2, bt=1, mp=1, bp=0)
+
+    def _post(self, ruta, cuerpo, authorization=_basic('nodered', 'secreto')):
+        return self.client.post(
+            ruta, json.dumps(cuerpo), content_type='application/json', HTTP_AUTHORIZATION=authorization
+        )
+
+    def test_bulk_acepta_y_rechaza_por_lectura(self):
+        registros = [
+            {'mac_gateway': 'AA:00', 'mass_rate': 1.5, 'created_at_iot': '2025-01-01T00:00:00Z'},
+            {'mac_gateway': 'FF:FF', 'mass_rate': 1.0},
+            {'mac_gateway': 'AA:00', 'mass_rate': 'abc'},
+            'no es objeto',
+            {'mac_gateway': ['AA:00'], 'mass_rate': 1.0},
+            {'mac_gateway': 'AA:01', 'mass_rate': 2.5, 'created_at_iot': '2025-01-01T00:01:00Z'},
+        ]
+        respuesta = self._post('/monitoreo/api/node-red/bulk/', registros)
+
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+        cuerpo = respuesta.json()
+        self.assertEqual((cuerpo['aceptados'], cuerpo['rechazados']), (2, 4))
+        self.assertEqual(
+            [(r['index'], r['success']) for r in cuerpo['resultados']],
+            [(0, True), (1, False), (2, False), (3, False), (4, False), (5, True)]
+        )
+        self.assertEqual(
+            set(NodeRedData.objects.values_list('id', flat=True)),
+            {uuid.UUID(str(r['id'])) for r in cuerpo['resultados'] if r['success']}
+        )
+        # Coeficientes vigentes estampados (el otro sistema no tiene configuración)
+        self.assertEqual(NodeRedData.objects.get(systemId=self.sistema).mt, 2)
+
+        respuesta = self._post('/monitoreo/api/node-red/bulk/', [{'mac_gateway': 'FF:FF'}])
+        self.assertEqual((respuesta.status_code, respuesta.json()['aceptados']), (400, 0))
+        self.assertEqual(NodeRedData.objects.count(), 2)
+
+    def test_credenciales_invalidas(self):
+        for authorization in (_basic('nodered', 'otra'), _basic('AA:00', 'secreto'), None):
+            with self.subTest(authorization=authorization):
+                extra = {'HTTP_AUTHORIZATION': authorization} if authorization else {}
+                respuesta = self.client.post(
+                    '/monitoreo/api/node-red/', json.dumps({'mac_gateway': 'AA:00', 'mass_rate': 1.0}),
+                    content_type='application/json', **extra
+                )
+                self.assertEqual(respuesta.status_code, 401)
+        self.assertFalse(NodeRedData.objects.exists())
+
+    def test_clave_de_gateway_solo_su_mac(self):
+        clave_gateway = _basic('AA:00', 'clave-aa00')
+        respuesta = self._post('/monitoreo/api/node-red/', {'mac_gateway': 'AA:00', 'mass_rate': 1.0}, clave_gateway)
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+
+        respuesta = self._post('/monitoreo/api/node-red/', {'mac_gateway': 'AA:01', 'mass_rate': 1.0}, clave_gateway)
+        self.assertEqual(respuesta.status_code, 403)
+
+        respuesta = self._post('/monitoreo/api/node-red/bulk/', [
+            {'mac_gateway': 'AA:00', 'mass_rate': 1.0},
+            {'mac_gateway': 'AA:01', 'mass_rate': 1.0},
+        ], clave_gateway)
+        self.assertEqual(
+            [(r['success'], r.get('error')) for r in respuesta.json()['resultados']],
+            [(True, None), (False, 'mac_gateway no autorizado para esta credencial.')]
+        )
+        self.assertEqual(NodeRedData.objects.filter(systemId=self.otro).count(), 0)
+        self.assertEqual(NodeRedData.objects.filter(systemId=self.sistema).count(), 2)
+
+    @override_settings(NODE_RED_MAPAS_CACHE='default')
+    def test_lote_binario_de_otra_mac_no_registra_mapa(self):
+        cache.clear()
+        clave_gateway = _basic('AA:00', 'clave-aa00')
+        mapa = id_mapa(['mass_rate'])
+
+        def enviar(mac_gateway):
+            return self.client.post(
+                '/monitoreo/api/node-red/bulk/',
+                empaquetar_lecturas(mac_gateway, [1735689600000], [('mass_rate', [1.0])]),
+                content_type=CONTENT_TYPE_LECTURAS, HTTP_AUTHORIZATION=clave_gateway
+            )
+
+        self.assertEqual(enviar('AA:01').status_code, 403)
+        with self.assertRaises(MapaDesconocido):
+            obtener_mapa('AA:01', mapa)
+        self.assertFalse(NodeRedData.objects.exists())
+
+        respuesta = enviar('AA:00')
+        self.assertEqual((respuesta.status_code, respuesta.json()['mapa']), (201, mapa))
+        self.assertEqual(obtener_mapa('AA:00', mapa), ['mass_rate'])
+
+
+@override_settings(ULTIMA_LECTURA_CACHE='default', ULTIMA_LECTURA_TTL_SEGUNDOS=300)
+class UltimaLecturaTests(TestCase):
+    """Invalidación de la última lectura cacheada por sistema."""
+
+    def setUp(self):
+        cache.clear()
+        cache_configuracion.limpiar()
+        self.sistema = _crear_sistema('FT-1', 'AA:00')
+        self.configuracion = ConfiguracionCoeficientes.objects.create(systemId=self.sistema, mt=1, bt=0, mp=1, bp=0)
+        self.fecha = datetime(2025, 1, 1, 12, tzinfo=timezone.utc)
+        NodeRedData.objects.create(systemId=self.sistema, created_at_iot=self.fecha, pressure_out=2.0)
+
+    def _lectura(self, minutos, presion):
+        with self.captureOnCommitCallbacks(execute=True):
+            guardar_lecturas([NodeRedData(
+                systemId=self.sistema, created_at_iot=self.fecha + timedelta(minutes=minutos), pressure_out=presion
+            )])
+
+    def test_invalidada_al_guardar_coeficientes(self):
+        self.assertEqual(obtener_ultima_lectura(self.sistema.id)['coeficientes'][2:4], (1, 0))
+        # Caché caliente: sin consultas
+        with self.assertNumQueries(0):
+            obtener_ultima_lectura(self.sistema.id)
+
+        self.configuracion.mp, self.configuracion.bp = 2.0, 1.0
+        with self.captureOnCommitCallbacks(execute=True):
+            self.configuracion.save()
+        self.assertEqual(obtener_ultima_lectura(self.sistema.id)['coeficientes'][2:4], (2.0, 1.0))
+
+    def test_reemplazada_por_lectura_nueva(self):
+        obtener_ultima_lectura(self.sistema.id)
+        self._lectura(2, 7.0)
+        with self.assertNumQueries(0):
+            ultima = obtener_ultima_lectura(self.sistema.id)
+        self.assertEqual((ultima['created_at_iot'], ultima['crudo']['pressure_out']), (self.fecha + timedelta(minutes=2), 7.0))
+
+        # Un reenvío atrasado no la reemplaza
+        self._lectura(1, 9.0)
+        self.assertEqual(obtener_ultima_lectura(self.sistema.id)['crudo']['pressure_out'], 7.0)
+
+
+class RollupsTests(TestCase):
+    """Recálculo de rollups con lecturas tardías y lecturas eliminadas."""
+
+    def setUp(self):
+        cache_configuracion.limpiar()
+        self.sistema = _crear_sistema('FT-1', 'AA:00')
+        self.inicio = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        # Un día y medio, una lectura por minuto
+        NodeRedData.objects.bulk_create([
+            NodeRedData(systemId=self.sistema, created_at_iot=self.inicio + timedelta(minutes=i), mass_rate=1.0)
+            for i in range(36 * 60)
+        ])
+        actualizar_rollups(self.sistema)
+
+    def _registros(self, resolucion, bucket):
+        return NodeRedRollup.objects.get(systemId=self.sistema, resolucion=resolucion, bucket=bucket).total_registros
+
+    def test_lectura_tardia(self):
+        self.assertEqual(self._registros('1h', self.inicio), 60)
+        with self.captureOnCommitCallbacks(execute=True):
+            guardar_lecturas([NodeRedData(
+                systemId=self.sistema, created_at_iot=self.inicio + timedelta(minutes=30, seconds=30), mass_rate=3.0
+            )])
+        estado = NodeRedRollupEstado.objects.get(systemId=self.sistema)
+        self.assertEqual(estado.pendiente_desde, self.inicio + timedelta(minutes=30, seconds=30))
+
+        actualizar_rollups(self.sistema)
+        self.assertEqual(self._registros('1h', self.inicio), 61)
+        self.assertEqual(self._registros('1m', self.inicio + timedelta(minutes=30)), 2)
+        self.assertIsNone(NodeRedRollupEstado.objects.get(systemId=self.sistema).pendiente_desde)
+
+    def test_ventanas_sin_datos(self):
+        segundo_dia = self.inicio + timedelta(days=1)
+        # Se eliminan el primer día completo y la última hora
+        NodeRedData.objects.filter(systemId=self.sistema, created_at_iot__lt=segundo_dia).delete()
+        NodeRedData.objects.filter(systemId=self.sistema, created_at_iot__gte=segundo_dia + timedelta(hours=11)).delete()
+
+        actualizar_rollups(self.sistema, desde=self.inicio)
+        rollups = NodeRedRollup.objects.filter(systemId=self.sistema, resolucion='1h')
+        self.assertFalse(rollups.filter(bucket__lt=segundo_dia).exists())
+        self.assertEqual(rollups.filter(bucket__gte=segundo_dia).count(), 11)
+
+
+CACHES_PRUEBA = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'gisme-pruebas'},
+    'respuestas': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'gisme-pruebas-respuestas'},
+}
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class VistasHistoricasTestCase(TestCase):
+    """Usuario autenticado y un sistema con 300 lecturas (una por minuto) para las vistas históricas."""
+
+    def setUp(self):
+        cache.clear()
+        caches['respuestas'].clear()
+        cache_configuracion.limpiar()
+        usuario = get_user_model().objects.create(username='operador', email='operador@gisme.co')
+        UserRole.objects.create(user=usuario, role='admin_principal')
+        self.client.force_login(usuario)
+        self.sistema = _crear_sistema('FT-1', 'AA:00')
+        ConfiguracionCoeficientes.objects.create(systemId=self.sistema, mt=1, bt=0, mp=1, bp=0)
+        self.inicio = datetime(2025, 1, 1, 12, tzinfo=timezone.utc)
+        self.fin = self.inicio + timedelta(minutes=299)
+        NodeRedData.objects.bulk_create([
+            NodeRedData(
+                systemId=self.sistema, created_at_iot=self.inicio + timedelta(minutes=i),
+                pressure_out=10.0 + i % 7, mass_rate=1.0, mp=1.0, bp=0.0
+            )
+            for i in range(300)
+        ])
+
+    def _presion(self, parametros, **encabezados):
+        return self.client.get(f'/monitoreo/api/datos-presion/{self.sistema.id}/?{parametros}', **encabezados)
+
+    def _lecturas(self, *instantes):
+        with self.captureOnCommitCallbacks(execute=True):
+            guardar_lecturas([
+                NodeRedData(systemId=self.sistema, created_at_iot=instante, pressure_out=50.0, mp=1.0, bp=0.0)
+                for instante in instantes
+            ])
+
+
+class ConsultaIncrementalTests(VistasHistoricasTestCase):
+    """Modo delta (?since=), ETag / 304 y reemplazar_desde de las vistas históricas."""
+
+    @staticmethod
+    def _fusionar(anterior, delta):
+        """Lo que hace el navegador: conserva lo anterior a reemplazar_desde y agrega el delta."""
+        info = delta['delta']
+        conservados = [
+            punto for punto in anterior['datos']
+            if info['ventana_inicio'] <= punto['timestamp'] < info['reemplazar_desde']
+        ]
+        return conservados + delta['datos']
+
+    def test_since_trae_solo_lo_posterior(self):
+        parametros = 'tiempo_real=true&horas_atras=2&resolucion=raw'
+        anterior = self._presion(parametros)
+        cursor = max(punto['timestamp'] for punto in anterior.json()['datos'])
+
+        # Sin lecturas nuevas el cliente ya está al día
+        self.assertEqual(
+            self._presion(f'{parametros}&since={cursor}', HTTP_IF_NONE_MATCH=anterior['ETag']).status_code, 304
+        )
+
+        self._lecturas(self.fin + timedelta(seconds=30), self.fin + timedelta(minutes=1))
+        respuesta = self._presion(f'{parametros}&since={cursor}', HTTP_IF_NONE_MATCH=anterior['ETag'])
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], anterior['ETag'])
+        delta = respuesta.json()
+        self.assertTrue(delta['delta']['activo'])
+        self.assertEqual(delta['delta']['reemplazar_desde'], cursor + 1)
+        self.assertEqual(len(delta['datos']), 2)
+        self.assertEqual(self._fusionar(anterior.json(), delta), self._presion(parametros).json()['datos'])
+
+    def test_since_fuera_de_la_ventana(self):
+        parametros = 'tiempo_real=true&horas_atras=2&resolucion=raw'
+        completa = self._presion(parametros).json()
+        respuesta = self._presion(f'{parametros}&since=0').json()
+        self.assertFalse(respuesta['delta']['activo'])
+        self.assertIsNone(respuesta['delta']['reemplazar_desde'])
+        self.assertEqual(respuesta['datos'], completa['datos'])
+        self.assertEqual(self._presion(f'{parametros}&since=ayer').status_code, 400)
+
+    def test_etag_rango_cerrado(self):
+        parametros = 'fecha_inicio=2025-01-01&fecha_fin=2025-01-01&resolucion=raw'
+        respuesta = self._presion(parametros)
+        self.assertEqual(respuesta['Cache-Control'], 'private, no-cache')
+        self.assertEqual(self._presion(parametros, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
+        self.assertEqual(self._presion(parametros, HTTP_IF_MODIFIED_SINCE=respuesta['Last-Modified']).status_code, 304)
+
+        # Lectura tardía dentro del rango: cambia la versión
+        self._lecturas(self.inicio + timedelta(minutes=10, seconds=30))
+        nueva = self._presion(parametros, HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(nueva.status_code, 200)
+        self.assertEqual(nueva.json()['total_registros'], 301)
+
+    def test_reemplazar_desde_con_rollups(self):
+        actualizar_rollups(self.sistema)
+        parametros = 'tiempo_real=true&horas_atras=24&resolucion=1m'
+        anterior = self._presion(parametros)
+        self.assertEqual(anterior.json()['delta']['resolucion'], '1m')
+        cursor = max(punto['timestamp'] for punto in anterior.json()['datos'])
+
+        # Una lectura completa el último minuto (ya enviado) y otra abre el siguiente
+        self._lecturas(self.fin + timedelta(seconds=30), self.fin + timedelta(minutes=1))
+        actualizar_rollups(self.sistema)
+        delta = self._presion(f'{parametros}&since={cursor}', HTTP_IF_NONE_MATCH=anterior['ETag']).json()
+        self.assertEqual(delta['delta']['reemplazar_desde'], cursor)
+        self.assertEqual([punto['timestamp'] for punto in delta['datos']], [cursor, cursor + 60000])
+        self.assertEqual(self._fusionar(anterior.json(), delta), self._presion(parametros).json()['datos'])
+
+
+class CacheRespuestasTests(VistasHistoricasTestCase):
+    """Invalidación de las respuestas cacheadas de ventanas cerradas."""
+
+    PARAMETROS = 'fecha_inicio=2025-01-01&fecha_fin=2025-01-01&resolucion=raw'
+
+    def _cacheada(self):
+        primera, segunda = self._presion(self.PARAMETROS), self._presion(self.PARAMETROS)
+        self.assertEqual((primera['X-Cache-Respuesta'], segunda['X-Cache-Respuesta']), ('MISS', 'HIT'))
+        self.assertEqual(primera.content, segunda.content)
+        return segunda
+
+    def test_hit_y_revalidacion(self):
+        respuesta = self._cacheada()
+        no_modificada = self._presion(self.PARAMETROS, HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual((no_modificada.status_code, no_modificada['X-Cache-Respuesta']), (304, 'HIT'))
+        # Tiempo real y modo delta nunca se cachean
+        self.assertFalse(self._presion('tiempo_real=true').has_header('X-Cache-Respuesta'))
+        self.assertFalse(self._presion(f'{self.PARAMETROS}&since=0').has_header('X-Cache-Respuesta'))
+
+    def test_invalidada_por_dato_tardio(self):
+        self._cacheada()
+        self._lecturas(self.inicio + timedelta(minutes=10, seconds=30))
+        respuesta = self._presion(self.PARAMETROS)
+        self.assertEqual(respuesta['X-Cache-Respuesta'], 'MISS')
+        self.assertIn(50.0, [punto['valor'] for punto in respuesta.json()['datos']])
+
+    def test_invalidada_al_guardar_sistema_coeficientes_y_batches(self):
+        def guardar_sistema():
+            self.sistema.tag = 'FT-2'
+            self.sistema.save()
+
+        def guardar_coeficientes():
+            configuracion = ConfiguracionCoeficientes.objects.get(systemId=self.sistema)
+            configuracion.bp = 1.0
+            configuracion.save()
+
+        def crear_batch():
+            return BatchDetectado.objects.create(
+                systemId=self.sistema, fecha_inicio=self.inicio, fecha_fin=self.inicio + timedelta(hours=1),
+                vol_total=1, mass_total=5, temperatura_coriolis_prom=20, densidad_prom=0.5,
+                hash_identificacion='batch-cache'
+            )
+
+        def asignar_ticket():
+            batch = BatchDetectado.objects.get(hash_identificacion='batch-cache')
+            batch.num_ticket = 7
+            batch.save()
+
+        self._cacheada()
+        for cambio in (guardar_sistema, guardar_coeficientes, crear_batch, asignar_ticket):
+            with self.subTest(cambio=cambio.__name__):
+                cambio()
+                self.assertEqual(self._presion(self.PARAMETROS)['X-Cache-Respuesta'], 'MISS')
+                self.assertEqual(self._presion(self.PARAMETROS)['X-Cache-Respuesta'], 'HIT')
@@ -1,6 +1,6 @@
 from django.urls import path
 from . import views
-from .views_node_red import NodeRedReceiverView
+from .views_node_red import NodeRedReceiverView, NodeRedBulkReceiverView, EstadoIngestaView
 from .views.queries.pdf_views import DescargarTicketBatchPDFView
 
 urlpatterns = [
@@ -15,6 +15,8 @@ urlpatterns = [
     path('api/datos-otras-variables/<uuid:sistema_id>/', views.DatosHistoricosOtrasVariablesView.as_view(), name='datos_otras_variables'),
     path('api/datos-tiempo-real/<uuid:sistema_id>/', views.DatosTiempoRealView.as_view(), name='datos_tiempo_real'),
     path('api/datos-tendencias/<uuid:sistema_id>/', views.DatosTendenciasView.as_view(), name='datos_tendencias'),
+    path('api/stream-tiempo-real/<uuid:sistema_id>/', views.StreamTiempoRealQueryView.as_view(), name='stream_tiempo_real'),
+    path('api/series/<uuid:sistema_id>/', views.SeriesQueryView.as_view(), name='series'),
     
     # API para detección de batches
     path('api/detectar-batches/<uuid:sistema_id>/', views.DetectarBatchesView.as_view(), name='detectar_batches'),
@@ -23,6 +25,7 @@ urlpatterns = [
     path('api/listar-todos-tickets/<uuid:sistema_id>/', views.ListarTodosTicketsView.as_view(), name='listar_todos_tickets'),
     path('api/asignar-ticket-batch/<uuid:batch_id>/', views.AsignarTicketBatchView.as_view(), name='asignar_ticket_batch'),
     path('api/detalle-batch/<uuid:batch_id>/', views.DetalleBatchView.as_view(), name='detalle_batch'),
+    path('api/diagnostico-flota/', views.DiagnosticoFlotaQueryView.as_view(), name='diagnostico_flota'),
     path('api/configuracion/actualizar/<uuid:sistema_id>/', views.ActualizarConfiguracionView.as_view(), name='actualizar_configuracion'),
     
     # PDF Downloads
@@ -32,4 +35,6 @@ urlpatterns = [
 urlpatterns += [
     # Endpoint para Node-RED
     path('api/node-red/', NodeRedReceiverView.as_view(), name='node_red_receiver'),
+    path('api/node-red/bulk/', NodeRedBulkReceiverView.as_view(), name='node_red_bulk_receiver'),
+    path('api/node-red/estado-ingesta/', EstadoIngestaView.as_view(), name='node_red_estado_ingesta'),
 ]
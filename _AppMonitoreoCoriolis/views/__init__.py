@@ -12,10 +12,13 @@ from .queries import (
     DatosHistoricosOtrasVariablesQueryView,
     DatosTiempoRealQueryView,
     DatosTendenciasQueryView,
+    StreamTiempoRealQueryView,
+    SeriesQueryView,
     DetalleBatchQueryView,
     ListarBatchesQueryView,
     ListarTicketsQueryView,
-    ListarTodosTicketsView
+    ListarTodosTicketsView,
+    DiagnosticoFlotaQueryView
 )
 
 # Command Views (modifican datos)
@@ -46,10 +49,13 @@ __all__ = [
     'DatosHistoricosOtrasVariablesQueryView',
     'DatosTiempoRealQueryView',
     'DatosTendenciasQueryView',
+    'StreamTiempoRealQueryView',
+    'SeriesQueryView',
     'DetalleBatchQueryView',
     'ListarBatchesQueryView',
     'ListarTicketsQueryView',
     'ListarTodosTicketsView',
+    'DiagnosticoFlotaQueryView',
     
     # Command Views (new names)
     'DetectarBatchesCommandView',
@@ -1,9 +1,8 @@
 import logging
-import hashlib
 import pytz
 from datetime import datetime
+from django.conf import settings
 from django.utils import timezone as django_timezone
-from django.db import IntegrityError
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
@@ -11,13 +10,24 @@ from _AppComplementos.models import Sistema, ConfiguracionCoeficientes
 from _AppMonitoreoCoriolis.models import NodeRedData, BatchDetectado
 from UTIL_LIB.conversiones import lb_s_a_kg_min, lb_a_kg, cm3_a_gal
 from _AppMonitoreoCoriolis.views.utils import COLOMBIA_TZ
+from _AppMonitoreoCoriolis.views.utils_batches import (
+    CAMPOS_DETECTOR,
+    generar_hash_batch,
+    detector_cubre_rango,
+    detectar_batches_vectorizado,
+    guardar_batches,
+)
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
 class DetectarBatchesCommandView(APIView):
     """
-    CBV para detectar batches en un rango de fechas específico
+    CBV para detectar batches en un rango de fechas específico.
+
+    Si el detector continuo (comando detectar_batches) ya procesó el rango, los batches
+    ya están en BatchDetectado y solo se leen; con `recalcular: true` o si el detector no
+    cubre el rango se re-escanean los datos como siempre.
     """
     permission_classes = [IsAuthenticated]
     
@@ -90,6 +100,10 @@ class DetectarBatchesCommandView(APIView):
             logger.info(f"Fecha fin con margen de detección: {fecha_fin_con_margen} (UTC) - Margen: {margen_deteccion.total_seconds()/3600} horas")
             logger.info(f"Input recibido - fecha_inicio_str: '{fecha_inicio_str}', fecha_fin_str: '{fecha_fin_str}'")
             
+            recalcular = str(request.data.get('recalcular', '')).lower() in ('1', 'true', 'si')
+            if not recalcular and detector_cubre_rango(sistema, fecha_inicio, fecha_fin_con_margen):
+                return self._respuesta_detector_continuo(sistema, fecha_inicio, fecha_fin, lim_inf, lim_sup)
+            
             # Obtener datos del rango de fechas CON MARGEN, ordenados por fecha IoT
             datos = NodeRedData.objects.filter(
                 systemId=sistema,
@@ -98,117 +112,33 @@ class DetectarBatchesCommandView(APIView):
                 created_at_iot__isnull=False  # Solo datos con timestamp IoT válido
             ).order_by('created_at_iot')
             
-            logger.info(f"📊 Datos consultados: {datos.count()} registros (incluye margen para detección de medianoche)")
+            # Una sola consulta con las columnas que usa la detección (y la masa bruta)
+            filas = list(datos.values_list(*CAMPOS_DETECTOR, named=True))
             
-            if not datos.exists():
+            logger.info(f"📊 Datos consultados: {len(filas)} registros (incluye margen para detección de medianoche)")
+            
+            if not filas:
                 return Response({
                     'success': False,
                     'error': 'No se encontraron datos en el rango de fechas especificado'
                 }, status=404)
             
             # Ejecutar algoritmo de detección de batches con perfil dinámico
-            batches_detectados = self._detectar_batches_con_perfil_dinamico(datos, lim_inf, lim_sup, sistema)
+            if getattr(settings, 'BATCH_DETECTOR_VECTORIZADO', True):
+                batches_detectados = detectar_batches_vectorizado(filas)
+            else:
+                batches_detectados = self._detectar_batches_con_perfil_dinamico(datos, lim_inf, lim_sup, sistema)
             
             # Calcular masa total bruta del rango (sin perfil, solo mass_rate > 0)
-            masa_total_bruta_kg = self._calcular_masa_total_bruta(datos, fecha_inicio, fecha_fin)
+            masa_total_bruta_kg = self._calcular_masa_total_bruta(filas, fecha_inicio, fecha_fin)
             
-            # Guardar batches en la base de datos con prevención de duplicados
-            batches_guardados = []
-            batches_existentes = 0
-            batches_nuevos = 0
+            # Guardar batches en bloque (una consulta de existentes + bulk_create) y obtener,
+            # en la misma consulta, todos los batches existentes en el rango (no solo los recién detectados)
+            resultado = guardar_batches(sistema, batches_detectados, lim_inf, lim_sup, fecha_inicio, fecha_fin)
+            batches_nuevos = resultado.nuevos
+            batches_existentes = resultado.existentes
             
-            for batch_data in batches_detectados:
-                # Generar hash para este batch usando el perfil dinámico que se usó
-                hash_batch = self._generar_hash_batch(
-                    batch_data['fecha_inicio'],
-                    batch_data['fecha_fin'], 
-                    sistema_id,
-                    batch_data['vol_minimo_usado'],
-                    batch_data['time_finished_usado']
-                )
-                
-                # VERIFICAR PRIMERO SI YA EXISTE antes de intentar crear
-                batch_existente = BatchDetectado.objects.filter(hash_identificacion=hash_batch).first()
-                
-                if batch_existente:
-                    # El batch ya existe, no crear duplicado
-                    #logger.info(f"⚠️ Batch ya existe con hash {hash_batch[:16]}... - OMITIENDO")
-                    #logger.info(f"   ID existente: {batch_existente.id}")
-                    #logger.info(f"   Rango: {batch_existente.fecha_inicio.astimezone(COLOMBIA_TZ).strftime('%d/%m/%Y %H:%M:%S')} - {batch_existente.fecha_fin.astimezone(COLOMBIA_TZ).strftime('%d/%m/%Y %H:%M:%S')}")
-                    batches_existentes += 1
-                    batch = batch_existente
-                else:
-                    # El batch NO existe, crear uno nuevo
-                    try:
-                        batch = BatchDetectado.objects.create(
-                            systemId=sistema,
-                            fecha_inicio=batch_data['fecha_inicio'],
-                            fecha_fin=batch_data['fecha_fin'],
-                            vol_total=batch_data['vol_total'],
-                            mass_total=batch_data['mass_total'],
-                            temperatura_coriolis_prom=batch_data['temperatura_coriolis_prom'],
-                            densidad_prom=batch_data['densidad_prom'],
-                            pressure_out_prom=batch_data.get('pressure_out_prom'),
-                            hash_identificacion=hash_batch,
-                            perfil_lim_inf_caudal=lim_inf,
-                            perfil_lim_sup_caudal=lim_sup,
-                            perfil_vol_minimo=batch_data['vol_minimo_usado'],
-                            duracion_minutos=batch_data['duracion_minutos'],
-                            total_registros=batch_data['total_registros'],
-                            time_finished_batch=batch_data['time_finished_usado']
-                        )
-                        batches_nuevos += 1
-                        #logger.info(f"✅ Batch nuevo creado con ID {batch.id}")
-                        #logger.info(f"   Hash: {hash_batch[:16]}...")
-                        #logger.info(f"   Rango: {batch.fecha_inicio.astimezone(COLOMBIA_TZ).strftime('%d/%m/%Y %H:%M:%S')} - {batch.fecha_fin.astimezone(COLOMBIA_TZ).strftime('%d/%m/%Y %H:%M:%S')}")
-                    except IntegrityError as e:
-                        # Por si acaso hay condición de carrera (otro proceso creó el batch justo ahora)
-                        #logger.warning(f"⚠️ IntegrityError al crear batch (condición de carrera detectada)")
-                        #logger.warning(f"   Error: {str(e)}")
-                        batch = BatchDetectado.objects.get(hash_identificacion=hash_batch)
-                        batches_existentes += 1
-                
-                # Agregar a la lista de respuesta (ya sea nuevo o existente)
-                batches_guardados.append({
-                    'id': batch.id,
-                    'fecha_inicio': batch.fecha_inicio.astimezone(COLOMBIA_TZ).strftime('%d/%m/%Y %H:%M:%S'),
-                    'fecha_fin': batch.fecha_fin.astimezone(COLOMBIA_TZ).strftime('%d/%m/%Y %H:%M:%S'),
-                    'vol_total': round(batch.vol_total, 2),
-                    'mass_total': round(batch.mass_total, 2),
-                    'temperatura_coriolis_prom': round(batch.temperatura_coriolis_prom, 2),
-                    'densidad_prom': round(batch.densidad_prom, 10),
-                    'pressure_out_prom': round(batch.pressure_out_prom, 2) if batch.pressure_out_prom else None,
-                    'duracion_minutos': round(batch.duracion_minutos, 2),
-                    'total_registros': batch.total_registros,
-                    'perfil_lim_inf': batch.perfil_lim_inf_caudal,
-                    'perfil_lim_sup': batch.perfil_lim_sup_caudal,
-                    'perfil_vol_min': batch.perfil_vol_minimo
-                })
-            
-            # Obtener TODOS los batches existentes en el rango de fechas (no solo los recién detectados)
-            todos_batches = BatchDetectado.objects.filter(
-                systemId=sistema,
-                fecha_inicio__gte=fecha_inicio,
-                fecha_fin__lte=fecha_fin
-            ).order_by('-fecha_inicio')
-            
-            batches_completos = []
-            for batch in todos_batches:
-                batches_completos.append({
-                    'id': batch.id,
-                    'fecha_inicio': batch.fecha_inicio.astimezone(COLOMBIA_TZ).strftime('%d/%m/%Y %H:%M:%S'),
-                    'fecha_fin': batch.fecha_fin.astimezone(COLOMBIA_TZ).strftime('%d/%m/%Y %H:%M:%S'),
-                    'vol_total': round(batch.vol_total, 2),
-                    'mass_total': round(batch.mass_total, 2),
-                    'temperatura_coriolis_prom': round(batch.temperatura_coriolis_prom, 2),
-                    'densidad_prom': round(batch.densidad_prom, 10),
-                    'pressure_out_prom': round(batch.pressure_out_prom, 2) if batch.pressure_out_prom else None,
-                    'duracion_minutos': round(batch.duracion_minutos, 2),
-                    'total_registros': batch.total_registros,
-                    'perfil_lim_inf': batch.perfil_lim_inf_caudal or 0,
-                    'perfil_lim_sup': batch.perfil_lim_sup_caudal or 0,
-                    'perfil_vol_min': batch.perfil_vol_minimo or 0
-                })
+            batches_completos = [self._serializar_batch(batch) for batch in resultado.batches]
             
             return Response({
                 'success': True,
@@ -225,7 +155,7 @@ class DetectarBatchesCommandView(APIView):
                 'rango_analizado': {
                     'fecha_inicio': fecha_inicio.astimezone(COLOMBIA_TZ).strftime('%d/%m/%Y %H:%M:%S'),
                     'fecha_fin': fecha_fin.astimezone(COLOMBIA_TZ).strftime('%d/%m/%Y %H:%M:%S'),
-                    'total_registros': datos.count()
+                    'total_registros': len(filas)
                 }
             })
             
@@ -246,9 +176,77 @@ class DetectarBatchesCommandView(APIView):
                 'error': f'Error interno del servidor: {str(e)}'
             }, status=500)
     
+    def _serializar_batch(self, batch):
+        return {
+            'id': batch.id,
+            'fecha_inicio': batch.fecha_inicio.astimezone(COLOMBIA_TZ).strftime('%d/%m/%Y %H:%M:%S'),
+            'fecha_fin': batch.fecha_fin.astimezone(COLOMBIA_TZ).strftime('%d/%m/%Y %H:%M:%S'),
+            'vol_total': round(batch.vol_total, 2),
+            'mass_total': round(batch.mass_total, 2),
+            'temperatura_coriolis_prom': round(batch.temperatura_coriolis_prom, 2),
+            'densidad_prom': round(batch.densidad_prom, 10),
+            'pressure_out_prom': round(batch.pressure_out_prom, 2) if batch.pressure_out_prom else None,
+            'duracion_minutos': round(batch.duracion_minutos, 2),
+            'total_registros': batch.total_registros,
+            'perfil_lim_inf': batch.perfil_lim_inf_caudal or 0,
+            'perfil_lim_sup': batch.perfil_lim_sup_caudal or 0,
+            'perfil_vol_min': batch.perfil_vol_minimo or 0
+        }
+    
+    def _respuesta_detector_continuo(self, sistema, fecha_inicio, fecha_fin, lim_inf, lim_sup):
+        """
+        Respuesta cuando el detector continuo ya cubre el rango: los batches se leen de
+        BatchDetectado y solo se recorren las columnas necesarias para la masa bruta.
+        """
+        datos = NodeRedData.objects.filter(
+            systemId=sistema,
+            created_at_iot__gte=fecha_inicio,
+            created_at_iot__lte=fecha_fin
+        ).order_by('created_at_iot')
+        
+        filas = list(datos.values_list('created_at_iot', 'mass_rate', 'total_mass', named=True))
+        if not filas:
+            return Response({
+                'success': False,
+                'error': 'No se encontraron datos en el rango de fechas especificado'
+            }, status=404)
+        
+        masa_total_bruta_kg = self._calcular_masa_total_bruta(filas, fecha_inicio, fecha_fin)
+        
+        todos_batches = BatchDetectado.objects.filter(
+            systemId=sistema,
+            fecha_inicio__gte=fecha_inicio,
+            fecha_fin__lte=fecha_fin
+        ).order_by('-fecha_inicio')
+        batches_completos = [self._serializar_batch(batch) for batch in todos_batches]
+        
+        logger.info(f"📊 Batches leídos del detector continuo: {len(batches_completos)} ({len(filas)} registros en el rango)")
+        
+        return Response({
+            'success': True,
+            'batches_detectados': len(batches_completos),
+            'batches_nuevos': 0,
+            'batches_existentes': len(batches_completos),
+            'batches': batches_completos,
+            'masa_total_bruta_kg': round(masa_total_bruta_kg, 2),
+            'configuracion_usada': {
+                'lim_inf_caudal_masico': lim_inf,
+                'lim_sup_caudal_masico': lim_sup,
+                'nota': 'vol_detect_batch y time_closed_batch se usan dinámicamente de cada registro NodeRedData'
+            },
+            'rango_analizado': {
+                'fecha_inicio': fecha_inicio.astimezone(COLOMBIA_TZ).strftime('%d/%m/%Y %H:%M:%S'),
+                'fecha_fin': fecha_fin.astimezone(COLOMBIA_TZ).strftime('%d/%m/%Y %H:%M:%S'),
+                'total_registros': len(filas)
+            },
+            'fuente': 'detector_continuo'
+        })
+    
     def _detectar_batches_con_perfil_dinamico(self, datos, lim_inf, lim_sup, sistema):
         """
-        Lógica de detección con PERFIL DINÁMICO del PRIMER DATO:
+        Lógica de detección con PERFIL DINÁMICO del PRIMER DATO (implementación de
+        referencia; por defecto se usa utils_batches.detectar_batches_vectorizado, que
+        produce los mismos resultados):
         - Cada batch captura vol_detect_batch y time_closed_batch del PRIMER dato que lo inicia
         - El perfil se mantiene constante hasta que el batch se cierra
         - Detecta cuando caudal cambia de 0 a > 0 (inicio de batch)
@@ -305,7 +303,7 @@ class DetectarBatchesCommandView(APIView):
                     
                     # Validar que el dato tiene perfil válido
                     if vol_detect is None or time_closed is None:
-                        logger.warning(f"⚠️ Dato sin perfil válido en {dato.created_at_local}: vol_detect={vol_detect}, time_closed={time_closed} - IGNORANDO")
+                        logger.warning(f"⚠️ Dato sin perfil válido en {dato.created_at_iot}: vol_detect={vol_detect}, time_closed={time_closed} - IGNORANDO")
                         continue
                     
                     # Capturar perfil para este batch
@@ -590,17 +588,9 @@ class DetectarBatchesCommandView(APIView):
         """
         Genera un hash único basado en las fechas, sistema ID, vol_minimo y time_finished_batch.
         Esto previene duplicados cuando se ejecuta la detección múltiples veces.
-        Incluye parámetros que realmente afectan la detección de batches.
+        Es el mismo hash que usa el detector continuo (utils_batches.generar_hash_batch).
         """
-        # Crear string único con parámetros del batch
-        fecha_inicio_str = fecha_inicio.strftime('%Y-%m-%d %H:%M:%S')
-        fecha_fin_str = fecha_fin.strftime('%Y-%m-%d %H:%M:%S')
-        
-        datos_hash = f"{sistema_id}_{fecha_inicio_str}_{fecha_fin_str}_{vol_minimo}_{time_finished_batch}"
-        
-        # Generar hash SHA-256
-        hash_obj = hashlib.sha256(datos_hash.encode('utf-8'))
-        return hash_obj.hexdigest()
+        return generar_hash_batch(fecha_inicio, fecha_fin, sistema_id, vol_minimo, time_finished_batch)
     
     def _calcular_masa_total_bruta(self, datos, fecha_inicio, fecha_fin):
         """
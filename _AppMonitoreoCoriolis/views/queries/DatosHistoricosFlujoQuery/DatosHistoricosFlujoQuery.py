@@ -2,8 +2,6 @@ from django.utils import timezone
 from datetime import timedelta, datetime
 import pytz
 import logging
-from django.db.models import Window, F, Q, IntegerField
-from django.db.models.functions import RowNumber, Mod
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
@@ -11,7 +9,12 @@ from _AppComplementos.models import Sistema
 from _AppMonitoreoCoriolis.models import NodeRedData
 from UTIL_LIB.conversiones import cm3_s_a_gal_min, lb_s_a_kg_min
 from _AppMonitoreoCoriolis.views.utils import COLOMBIA_TZ
-from _AppMonitoreoCoriolis.views.utils_decimation import calcular_estadisticas_decimacion
+from _AppMonitoreoCoriolis.views.utils_series import leer_series, lineal
+from _AppMonitoreoCoriolis.views.utils_rollups import obtener_rollups, info_rollup
+from _AppMonitoreoCoriolis.views.utils_formato import ArmadorSeries
+from _AppMonitoreoCoriolis.views.utils_tiempo_real import obtener_ultima_lectura
+from _AppMonitoreoCoriolis.views.utils_delta import ConsultaIncremental
+from _AppMonitoreoCoriolis.views.utils_respuestas import CacheRespuesta
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -41,11 +44,11 @@ class DatosHistoricosFlujoQueryView(APIView):
             
             # MODO TIEMPO REAL: Calcular desde el último dato disponible
             if tiempo_real:
-                ultimo_dato = NodeRedData.objects.filter(systemId=sistema).order_by('-created_at_iot').first()
+                ultima_lectura = obtener_ultima_lectura(sistema.id)
                 
-                if ultimo_dato and ultimo_dato.created_at_iot:
+                if ultima_lectura:
                     # Usar el created_at_iot del último dato como fecha_fin
-                    fecha_fin = ultimo_dato.created_at_iot
+                    fecha_fin = ultima_lectura['created_at_iot']
                     fecha_inicio = fecha_fin - timedelta(hours=horas_atras)
                     logger.info(f"Modo Tiempo Real - Último dato: {fecha_fin}, Inicio calculado: {fecha_inicio}")
                 else:
@@ -85,101 +88,80 @@ class DatosHistoricosFlujoQueryView(APIView):
                 
                 logger.info(f"Fechas convertidas a UTC - Inicio: {fecha_inicio}, Fin: {fecha_fin}")
             
-            # Consultar datos usando created_at_iot (timestamp del dispositivo IoT)
-            logger.info(f"Consultando datos para sistema: {sistema.tag}")
-            datos_query = NodeRedData.objects.filter(
-                systemId=sistema,
-                created_at_iot__gte=fecha_inicio,
-                created_at_iot__lte=fecha_fin,
-                created_at_iot__isnull=False
-            ).order_by('created_at_iot')
-            
-            total_registros = datos_query.count()
-            logger.info(f"Datos encontrados: {total_registros} registros")
+            # Ventanas cerradas: respuesta ya serializada (ver utils_respuestas.py)
+            cache_respuesta = CacheRespuesta(
+                request, 'flujo', sistema.id, fecha_fin, cacheable=not tiempo_real
+            )
+            respuesta = cache_respuesta.obtener()
+            if respuesta is not None:
+                return respuesta
+
+            # Validación condicional (ETag / Last-Modified) y modo delta con ?since=
+            # (ver utils_delta.py)
+            try:
+                consulta = ConsultaIncremental(
+                    request, 'flujo', sistema, fecha_inicio, fecha_fin,
+                    tiempo_real=tiempo_real and ultima_lectura is not None
+                )
+            except ValueError:
+                return Response({
+                    'success': False,
+                    'error': 'Parámetro since inválido (epoch en ms)'
+                }, status=400)
+            no_modificado = consulta.no_modificado
+            if no_modificado is not None:
+                return consulta.con_validadores(no_modificado)
             
-            # Aplicar decimación SQL si hay más de 2000 registros
-            max_puntos = 2000
-            decimacion_info = {'aplicada': False}
+            # Rangos amplios: servir desde los rollups pre-agregados (ver utils_rollups.py)
+            rollup = obtener_rollups(sistema, consulta.desde, fecha_fin, consulta.resolucion)
+            # Puntos o arreglos columnares (?formato=columnar, ver utils_formato.py)
+            armador = ArmadorSeries(request, '%d/%m %H:%M')
             
-            if total_registros > max_puntos:
-                factor = max(1, total_registros // max_puntos)
-                logger.info(f"🔍 Aplicando decimación SQL: factor {factor} (tomar 1 de cada {factor})")
-                
-                # Obtener IDs decimados
-                ids_decimados = datos_query.annotate(
-                    row_num=Window(
-                        expression=RowNumber(),
-                        order_by=F('created_at_iot').asc()
-                    ),
-                    row_mod=Mod(
-                        Window(
-                            expression=RowNumber(),
-                            order_by=F('created_at_iot').asc()
-                        ),
-                        factor,
-                        output_field=IntegerField()
-                    )
-                ).filter(
-                    Q(row_num=1) |
-                    Q(row_num=total_registros) |
-                    Q(row_mod=0)
-                ).values_list('id', flat=True)
-                
-                # Obtener objetos limpios
-                datos = list(NodeRedData.objects.filter(id__in=list(ids_decimados)).order_by('created_at_iot'))
-                stats = calcular_estadisticas_decimacion(total_registros, len(datos))
-                decimacion_info = {
-                    'aplicada': True,
-                    'total_original': total_registros,
-                    'total_decimado': len(datos),
-                    'factor_reduccion': stats['factor_reduccion'],
-                    'porcentaje_reduccion': stats['porcentaje_reduccion']
-                }
-                logger.info(f"✅ Decimación aplicada: {len(datos)} registros ({stats['porcentaje_reduccion']:.1f}% reducción)")
+            if rollup is not None:
+                armador.con_rollup(rollup['buckets'])
+                flujo_volumetrico = armador.serie_rollup('flow_rate', cm3_s_a_gal_min)
+                flujo_masico = armador.serie_rollup('mass_rate', lb_s_a_kg_min)
+                decimacion_info = info_rollup(rollup)
+                logger.info(f"📦 Rollup {rollup['resolucion']}: {len(rollup['buckets'])} ventanas ({rollup['total_original']} registros)")
             else:
-                datos = list(datos_query)
-                logger.info(f"ℹ️ Sin decimación: {total_registros} registros")
+                # Consultar datos usando created_at_iot (timestamp del dispositivo IoT)
+                logger.info(f"Consultando datos para sistema: {sistema.tag}")
+                datos_query = NodeRedData.objects.filter(
+                    systemId=sistema,
+                    created_at_iot__gte=consulta.desde,
+                    created_at_iot__lte=fecha_fin,
+                    created_at_iot__isnull=False
+                ).order_by('created_at_iot')
             
-            # Preparar datos para ambos flujos
-            flujo_volumetrico = []
-            flujo_masico = []
             
-            for dato in datos:
-                # Convertir UTC a hora de Colombia usando created_at_iot
-                fecha_colombia = dato.created_at_iot.astimezone(COLOMBIA_TZ)
-                timestamp = int(fecha_colombia.timestamp() * 1000)
-                fecha_str = fecha_colombia.strftime('%d/%m %H:%M')
-                
-                # Flujo volumétrico - convertir a gal/min
-                if dato.flow_rate is not None:
-                    valor_convertido = cm3_s_a_gal_min(float(dato.flow_rate))
-                    flujo_volumetrico.append({
-                        'fecha': fecha_str,
-                        'valor': valor_convertido,
-                        'timestamp': timestamp
-                    })
-                
-                # Flujo másico - convertir a kg/min
-                if dato.mass_rate is not None:
-                    valor_convertido = lb_s_a_kg_min(float(dato.mass_rate))
-                    flujo_masico.append({
-                        'fecha': fecha_str,
-                        'valor': valor_convertido,
-                        'timestamp': timestamp
-                    })
+                # Lectura columnar + decimación en una sola consulta: conserva forma, picos y
+                # bordes de batch (?decimacion=lttb|minmax|stride, ver utils_decimation.py)
+                columnas, decimacion_info = leer_series(
+                    datos_query,
+                    campos=['created_at_iot', 'flow_rate', 'mass_rate'],
+                    campos_senal=['flow_rate', 'mass_rate'],
+                    max_puntos=2000,
+                    modo=request.GET.get('decimacion', 'lttb')
+                )
+                armador.con_timestamps(columnas['created_at_iot'])
             
-            return Response({
+                # Flujo volumétrico (gal/min) y másico (kg/min)
+                flujo_volumetrico = armador.serie(lineal(cm3_s_a_gal_min)(columnas['flow_rate']))
+                flujo_masico = armador.serie(lineal(lb_s_a_kg_min)(columnas['mass_rate']))
+            
+            return cache_respuesta.guardar(consulta.con_validadores(Response({
                 'success': True,
                 'flujo_volumetrico': {
                     'datos': flujo_volumetrico,
                     'unidad': 'gal/min',
-                    'total_registros': len(flujo_volumetrico)
+                    'total_registros': armador.total(flujo_volumetrico)
                 },
                 'flujo_masico': {
                     'datos': flujo_masico,
                     'unidad': 'kg/min',
-                    'total_registros': len(flujo_masico)
+                    'total_registros': armador.total(flujo_masico)
                 },
+                **armador.eje(),
                 'decimacion_info': decimacion_info,
                 'sistema': {
                     'id': str(sistema.id),
@@ -187,8 +169,9 @@ class DatosHistoricosFlujoQueryView(APIView):
                     'sistema_id': sistema.sistema_id
                 },
                 'fecha_inicio': fecha_inicio.strftime('%Y-%m-%d'),
-                'fecha_fin': fecha_fin.strftime('%Y-%m-%d')
-            })
+                'fecha_fin': fecha_fin.strftime('%Y-%m-%d'),
+                'delta': consulta.info(rollup['resolucion'] if rollup is not None else 'raw')
+            })))
             
         except Sistema.DoesNotExist:
             logger.error(f"Sistema no encontrado: {sistema_id}")
@@ -2,8 +2,6 @@ from django.utils import timezone
 from datetime import timedelta, datetime
 import pytz
 import logging
-from django.db.models import Window, F, Q, IntegerField
-from django.db.models.functions import RowNumber, Mod
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
@@ -11,7 +9,12 @@ from _AppComplementos.models import Sistema
 from _AppMonitoreoCoriolis.models import NodeRedData
 from UTIL_LIB.conversiones import cm3_s_a_gal_min, lb_s_a_kg_min, celsius_a_fahrenheit
 from _AppMonitoreoCoriolis.views.utils import COLOMBIA_TZ, get_coeficientes_correccion
-from _AppMonitoreoCoriolis.views.utils_decimation import calcular_estadisticas_decimacion
+from _AppMonitoreoCoriolis.views.utils_series import leer_series, lineal, corregir
+from _AppMonitoreoCoriolis.views.utils_rollups import obtener_rollups, info_rollup
+from _AppMonitoreoCoriolis.views.utils_formato import ArmadorSeries
+from _AppMonitoreoCoriolis.views.utils_tiempo_real import obtener_ultima_lectura
+from _AppMonitoreoCoriolis.views.utils_delta import ConsultaIncremental
+from _AppMonitoreoCoriolis.views.utils_respuestas import CacheRespuesta
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -46,10 +49,10 @@ class DatosHistoricosOtrasVariablesQueryView(APIView):
             
             # MODO TIEMPO REAL: Calcular desde el último dato disponible
             if tiempo_real:
-                ultimo_dato = NodeRedData.objects.filter(systemId=sistema).order_by('-created_at_iot').first()
+                ultima_lectura = obtener_ultima_lectura(sistema.id)
                 
-                if ultimo_dato and ultimo_dato.created_at_iot:
-                    fecha_fin = ultimo_dato.created_at_iot
+                if ultima_lectura:
+                    fecha_fin = ultima_lectura['created_at_iot']
                     fecha_inicio = fecha_fin - timedelta(hours=horas_atras)
                     logger.info(f"Modo Tiempo Real - Último dato: {fecha_fin}, Inicio calculado: {fecha_inicio}")
                 else:
@@ -84,177 +87,122 @@ class DatosHistoricosOtrasVariablesQueryView(APIView):
                 
                 logger.info(f"Fechas convertidas a UTC - Inicio: {fecha_inicio}, Fin: {fecha_fin}")
             
-            # Consultar datos usando created_at_iot (timestamp del dispositivo IoT)
-            logger.info(f"Consultando datos para sistema: {sistema.tag}")
-            datos_query = NodeRedData.objects.filter(
-                systemId=sistema,
-                created_at_iot__gte=fecha_inicio,
-                created_at_iot__lte=fecha_fin,
-                created_at_iot__isnull=False
-            ).order_by('created_at_iot')
-            
-            total_registros = datos_query.count()
-            logger.info(f"Datos encontrados: {total_registros} registros")
+            # Ventanas cerradas: respuesta ya serializada (ver utils_respuestas.py)
+            cache_respuesta = CacheRespuesta(
+                request, 'otras_variables', sistema.id, fecha_fin, (mt, bt, mp, bp), cacheable=not tiempo_real
+            )
+            respuesta = cache_respuesta.obtener()
+            if respuesta is not None:
+                return respuesta
+
+            # Validación condicional (ETag / Last-Modified) y modo delta con ?since=
+            # (ver utils_delta.py)
+            try:
+                consulta = ConsultaIncremental(
+                    request, 'otras_variables', sistema, fecha_inicio, fecha_fin, (mt, bt, mp, bp),
+                    tiempo_real=tiempo_real and ultima_lectura is not None
+                )
+            except ValueError:
+                return Response({
+                    'success': False,
+                    'error': 'Parámetro since inválido (epoch en ms)'
+                }, status=400)
+            no_modificado = consulta.no_modificado
+            if no_modificado is not None:
+                return consulta.con_validadores(no_modificado)
             
-            # Aplicar decimación SQL si hay más de 2000 registros
-            max_puntos = 2000
-            decimacion_info = {'aplicada': False}
+            # Rangos amplios: servir desde los rollups pre-agregados (ver utils_rollups.py)
+            rollup = obtener_rollups(sistema, consulta.desde, fecha_fin, consulta.resolucion)
+            # Puntos o arreglos columnares (?formato=columnar, ver utils_formato.py)
+            armador = ArmadorSeries(request, '%d/%m %H:%M')
             
-            if total_registros > max_puntos:
-                factor = max(1, total_registros // max_puntos)
-                logger.info(f"🔍 Aplicando decimación SQL: factor {factor} (tomar 1 de cada {factor})")
-                
-                # Obtener IDs decimados
-                ids_decimados = datos_query.annotate(
-                    row_num=Window(
-                        expression=RowNumber(),
-                        order_by=F('created_at_iot').asc()
-                    ),
-                    row_mod=Mod(
-                        Window(
-                            expression=RowNumber(),
-                            order_by=F('created_at_iot').asc()
-                        ),
-                        factor,
-                        output_field=IntegerField()
-                    )
-                ).filter(
-                    Q(row_num=1) |
-                    Q(row_num=total_registros) |
-                    Q(row_mod=0)
-                ).values_list('id', flat=True)
-                
-                # Obtener objetos limpios
-                datos = list(NodeRedData.objects.filter(id__in=list(ids_decimados)).order_by('created_at_iot'))
-                stats = calcular_estadisticas_decimacion(total_registros, len(datos))
-                decimacion_info = {
-                    'aplicada': True,
-                    'total_original': total_registros,
-                    'total_decimado': len(datos),
-                    'factor_reduccion': stats['factor_reduccion'],
-                    'porcentaje_reduccion': stats['porcentaje_reduccion']
-                }
-                logger.info(f"✅ Decimación aplicada: {len(datos)} registros ({stats['porcentaje_reduccion']:.1f}% reducción)")
+            if rollup is not None:
+                armador.con_rollup(rollup['buckets'])
+                # pressure_out y redundant_temperature se agregan ya corregidos (mx+b del momento)
+                datos_presion = armador.serie_rollup('pressure_out')
+                datos_flujo_masico = armador.serie_rollup('mass_rate', lb_s_a_kg_min)
+                datos_temperatura_salida = armador.serie_rollup('redundant_temperature', celsius_a_fahrenheit)
+                datos_frecuencia = armador.serie_rollup('coriolis_frecuency')
+                datos_densidad = armador.serie_rollup('density')
+                datos_intensidad_gateway = armador.serie_rollup('signal_strength_rxCoriolis')
+                datos_temperatura_gateway = armador.serie_rollup('temperature_gateway')
+                decimacion_info = info_rollup(rollup)
+                logger.info(f"📦 Rollup {rollup['resolucion']}: {len(rollup['buckets'])} ventanas ({rollup['total_original']} registros)")
             else:
-                datos = list(datos_query)
-                logger.info(f"ℹ️ Sin decimación: {total_registros} registros")
+                # Consultar datos usando created_at_iot (timestamp del dispositivo IoT)
+                logger.info(f"Consultando datos para sistema: {sistema.tag}")
+                datos_query = NodeRedData.objects.filter(
+                    systemId=sistema,
+                    created_at_iot__gte=consulta.desde,
+                    created_at_iot__lte=fecha_fin,
+                    created_at_iot__isnull=False
+                ).order_by('created_at_iot')
             
-            # Preparar datos para cada variable
-            datos_presion = []
-            datos_flujo_masico = []
-            datos_temperatura_salida = []
-            datos_frecuencia = []
-            datos_densidad = []
-            datos_intensidad_gateway = []
-            datos_temperatura_gateway = []
             
-            for dato in datos:
-                # Convertir UTC a hora de Colombia usando created_at_iot
-                fecha_colombia = dato.created_at_iot.astimezone(COLOMBIA_TZ)
-                timestamp = int(fecha_colombia.timestamp() * 1000)
-                fecha_str = fecha_colombia.strftime('%d/%m %H:%M')
-                
-                # Presión (PSI) - con corrección
-                if dato.pressure_out is not None:
-                    mp_momento = dato.mp if dato.mp is not None else mp
-                    bp_momento = dato.bp if dato.bp is not None else bp
-                    presion_corregida = mp_momento * dato.pressure_out + bp_momento
-                    datos_presion.append({
-                        'fecha': fecha_str,
-                        'valor': presion_corregida,
-                        'timestamp': timestamp
-                    })
-                
-                # Flujo Másico (kg/min)
-                if dato.mass_rate is not None:
-                    valor_convertido = lb_s_a_kg_min(float(dato.mass_rate))
-                    datos_flujo_masico.append({
-                        'fecha': fecha_str,
-                        'valor': valor_convertido,
-                        'timestamp': timestamp
-                    })
-                
-                # Temperatura de Salida (°F) - con corrección
-                if dato.redundant_temperature is not None:
-                    mt_momento = dato.mt if dato.mt is not None else mt
-                    bt_momento = dato.bt if dato.bt is not None else bt
-                    temp_corregida = mt_momento * float(dato.redundant_temperature) + bt_momento
-                    valor_convertido = celsius_a_fahrenheit(temp_corregida)
-                    datos_temperatura_salida.append({
-                        'fecha': fecha_str,
-                        'valor': valor_convertido,
-                        'timestamp': timestamp
-                    })
-                
-                # Frecuencia (Hz)
-                if dato.coriolis_frecuency is not None:
-                    datos_frecuencia.append({
-                        'fecha': fecha_str,
-                        'valor': float(dato.coriolis_frecuency),
-                        'timestamp': timestamp
-                    })
-                
-                # Densidad (g/cc)
-                if dato.density is not None:
-                    datos_densidad.append({
-                        'fecha': fecha_str,
-                        'valor': float(dato.density),
-                        'timestamp': timestamp
-                    })
-                
-                # Intensidad Señal Gateway (dB)
-                if dato.signal_strength_rxCoriolis is not None:
-                    datos_intensidad_gateway.append({
-                        'fecha': fecha_str,
-                        'valor': float(dato.signal_strength_rxCoriolis),
-                        'timestamp': timestamp
-                    })
-                
-                # Temperatura Gateway (°C)
-                if dato.temperature_gateway is not None:
-                    datos_temperatura_gateway.append({
-                        'fecha': fecha_str,
-                        'valor': float(dato.temperature_gateway),
-                        'timestamp': timestamp
-                    })
+                # Lectura columnar + decimación en una sola consulta: conserva forma, picos y
+                # bordes de batch (?decimacion=lttb|minmax|stride, ver utils_decimation.py)
+                columnas, decimacion_info = leer_series(
+                    datos_query,
+                    campos=[
+                        'created_at_iot', 'pressure_out', 'mp', 'bp', 'mass_rate', 'redundant_temperature',
+                        'mt', 'bt', 'coriolis_frecuency', 'density', 'signal_strength_rxCoriolis', 'temperature_gateway',
+                    ],
+                    campos_senal=['pressure_out', 'mass_rate', 'redundant_temperature', 'coriolis_frecuency', 'density'],
+                    max_puntos=2000,
+                    modo=request.GET.get('decimacion', 'lttb')
+                )
+                armador.con_timestamps(columnas['created_at_iot'])
             
-            return Response({
+                # Presión (PSI) y Temperatura de Salida (°F) con corrección mx+b del momento
+                presion_corregida = corregir(columnas['pressure_out'], columnas['mp'], columnas['bp'], mp, bp)
+                temp_corregida = corregir(columnas['redundant_temperature'], columnas['mt'], columnas['bt'], mt, bt)
+            
+                datos_presion = armador.serie(presion_corregida)
+                datos_flujo_masico = armador.serie(lineal(lb_s_a_kg_min)(columnas['mass_rate']))
+                datos_temperatura_salida = armador.serie(lineal(celsius_a_fahrenheit)(temp_corregida))
+                datos_frecuencia = armador.serie(columnas['coriolis_frecuency'])
+                datos_densidad = armador.serie(columnas['density'])
+                datos_intensidad_gateway = armador.serie(columnas['signal_strength_rxCoriolis'])
+                datos_temperatura_gateway = armador.serie(columnas['temperature_gateway'])
+            
+            return cache_respuesta.guardar(consulta.con_validadores(Response({
                 'success': True,
                 'presion': {
                     'datos': datos_presion,
                     'unidad': 'PSI',
-                    'total_registros': len(datos_presion)
+                    'total_registros': armador.total(datos_presion)
                 },
                 'flujo_masico': {
                     'datos': datos_flujo_masico,
                     'unidad': 'kg/min',
-                    'total_registros': len(datos_flujo_masico)
+                    'total_registros': armador.total(datos_flujo_masico)
                 },
                 'temperatura_salida': {
                     'datos': datos_temperatura_salida,
                     'unidad': '°F',
-                    'total_registros': len(datos_temperatura_salida)
+                    'total_registros': armador.total(datos_temperatura_salida)
                 },
                 'frecuencia': {
                     'datos': datos_frecuencia,
                     'unidad': 'Hz',
-                    'total_registros': len(datos_frecuencia)
+                    'total_registros': armador.total(datos_frecuencia)
                 },
                 'densidad': {
                     'datos': datos_densidad,
                     'unidad': 'g/cc',
-                    'total_registros': len(datos_densidad)
+                    'total_registros': armador.total(datos_densidad)
                 },
                 'intensidad_gateway': {
                     'datos': datos_intensidad_gateway,
                     'unidad': 'dB',
-                    'total_registros': len(datos_intensidad_gateway)
+                    'total_registros': armador.total(datos_intensidad_gateway)
                 },
                 'temperatura_gateway': {
                     'datos': datos_temperatura_gateway,
                     'unidad': '°C',
-                    'total_registros': len(datos_temperatura_gateway)
+                    'total_registros': armador.total(datos_temperatura_gateway)
                 },
+                **armador.eje(),
                 'decimacion_info': decimacion_info,
                 'sistema': {
                     'id': str(sistema.id),
@@ -262,8 +210,9 @@ class DatosHistoricosOtrasVariablesQueryView(APIView):
                     'sistema_id': sistema.sistema_id
                 },
                 'fecha_inicio': fecha_inicio.strftime('%Y-%m-%d'),
-                'fecha_fin': fecha_fin.strftime('%Y-%m-%d')
-            })
+                'fecha_fin': fecha_fin.strftime('%Y-%m-%d'),
+                'delta': consulta.info(rollup['resolucion'] if rollup is not None else 'raw')
+            })))
             
         except Sistema.DoesNotExist:
             logger.error(f"Sistema no encontrado: {sistema_id}")
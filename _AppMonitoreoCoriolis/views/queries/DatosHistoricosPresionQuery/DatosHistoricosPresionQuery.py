@@ -2,15 +2,21 @@ from django.utils import timezone
 from datetime import timedelta, datetime
 import pytz
 import logging
-from django.db.models import Window, F, Q, IntegerField
-from django.db.models.functions import RowNumber, Mod
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from _AppComplementos.models import Sistema
 from _AppMonitoreoCoriolis.models import NodeRedData
 from _AppMonitoreoCoriolis.views.utils import COLOMBIA_TZ, get_coeficientes_correccion, convertir_presion_con_span
-from _AppMonitoreoCoriolis.views.utils_decimation import calcular_estadisticas_decimacion
+from _AppMonitoreoCoriolis.views.utils_series import leer_series, corregir
+from _AppMonitoreoCoriolis.views.utils_export import (
+    ColumnaCSV, columnas_fecha_hora, valor_corregido, seleccionar_columnas, respuesta_csv_streaming
+)
+from _AppMonitoreoCoriolis.views.utils_rollups import obtener_rollups, info_rollup
+from _AppMonitoreoCoriolis.views.utils_formato import ArmadorSeries
+from _AppMonitoreoCoriolis.views.utils_tiempo_real import obtener_ultima_lectura
+from _AppMonitoreoCoriolis.views.utils_delta import ConsultaIncremental
+from _AppMonitoreoCoriolis.views.utils_respuestas import CacheRespuesta
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -43,11 +49,11 @@ class DatosHistoricosPresionQueryView(APIView):
             
             # MODO TIEMPO REAL: Calcular desde el último dato disponible
             if tiempo_real:
-                ultimo_dato = NodeRedData.objects.filter(systemId=sistema).order_by('-created_at_iot').first()
+                ultima_lectura = obtener_ultima_lectura(sistema.id)
                 
-                if ultimo_dato and ultimo_dato.created_at_iot:
+                if ultima_lectura:
                     # Usar el created_at_iot del último dato como fecha_fin
-                    fecha_fin = ultimo_dato.created_at_iot
+                    fecha_fin = ultima_lectura['created_at_iot']
                     fecha_inicio = fecha_fin - timedelta(hours=horas_atras)
                     logger.info(f"Modo Tiempo Real - Último dato: {fecha_fin}, Inicio calculado: {fecha_inicio}")
                 else:
@@ -87,95 +93,81 @@ class DatosHistoricosPresionQueryView(APIView):
                 
                 logger.info(f"Fechas convertidas a UTC - Inicio: {fecha_inicio}, Fin: {fecha_fin}")
             
-            # Consultar datos
-            logger.info(f"Consultando datos de presión para sistema: {sistema.tag}")
-            datos_query = NodeRedData.objects.filter(
-                systemId=sistema,
-                created_at_iot__range=[fecha_inicio, fecha_fin],
-                created_at_iot__isnull=False
-            ).order_by('created_at_iot')
+            # Ventanas cerradas: respuesta ya serializada (ver utils_respuestas.py)
+            cache_respuesta = CacheRespuesta(
+                request, 'presion', sistema.id, fecha_fin, (mt, bt, mp, bp),
+                cacheable=not tiempo_real and request.GET.get('export') != 'csv'
+            )
+            respuesta = cache_respuesta.obtener()
+            if respuesta is not None:
+                return respuesta
+
+            # Validación condicional (ETag / Last-Modified) y modo delta con ?since=
+            # (ver utils_delta.py)
+            try:
+                consulta = ConsultaIncremental(
+                    request, 'presion', sistema, fecha_inicio, fecha_fin, (mt, bt, mp, bp),
+                    tiempo_real=tiempo_real and ultima_lectura is not None
+                )
+            except ValueError:
+                return Response({
+                    'success': False,
+                    'error': 'Parámetro since inválido (epoch en ms)'
+                }, status=400)
+            no_modificado = consulta.no_modificado
+            if no_modificado is not None:
+                return consulta.con_validadores(no_modificado)
             
-            total_registros = datos_query.count()
-            logger.info(f"Datos encontrados: {total_registros} registros")
+            # Rangos amplios: servir desde los rollups pre-agregados (ver utils_rollups.py).
+            # La exportación CSV siempre usa los datos crudos.
+            rollup = None
+            if request.GET.get('export') != 'csv':
+                rollup = obtener_rollups(sistema, consulta.desde, fecha_fin, consulta.resolucion)
+            # Puntos o arreglos columnares (?formato=columnar, ver utils_formato.py)
+            armador = ArmadorSeries(request, '%d/%m %H:%M')
             
-            # Verificar si se solicita exportación CSV
-            export_format = request.GET.get('export')
-            if export_format == 'csv':
-                return self._exportar_csv_presion(datos_query, sistema, fecha_inicio, fecha_fin)
+            if rollup is not None:
+                armador.con_rollup(rollup['buckets'])
+                # pressure_out se agrega ya corregido con los coeficientes del momento
+                datos_presion = armador.serie_rollup('pressure_out')
+                decimacion_info = info_rollup(rollup)
+                logger.info(f"📦 Rollup {rollup['resolucion']}: {len(rollup['buckets'])} ventanas ({rollup['total_original']} registros)")
+            else:
+                # Consultar datos
+                logger.info(f"Consultando datos de presión para sistema: {sistema.tag}")
+                datos_query = NodeRedData.objects.filter(
+                    systemId=sistema,
+                    created_at_iot__range=[consulta.desde, fecha_fin],
+                    created_at_iot__isnull=False
+                ).order_by('created_at_iot')
             
-            # Aplicar decimación SQL si hay más de 2000 registros
-            max_puntos = 2000
-            decimacion_info = {'aplicada': False}
             
-            if total_registros > max_puntos:
-                factor = max(1, total_registros // max_puntos)
-                logger.info(f"🔍 Aplicando decimación SQL: factor {factor} (tomar 1 de cada {factor})")
-                
-                # Obtener IDs decimados
-                ids_decimados = datos_query.annotate(
-                    row_num=Window(
-                        expression=RowNumber(),
-                        order_by=F('created_at_iot').asc()
-                    ),
-                    row_mod=Mod(
-                        Window(
-                            expression=RowNumber(),
-                            order_by=F('created_at_iot').asc()
-                        ),
-                        factor,
-                        output_field=IntegerField()
-                    )
-                ).filter(
-                    Q(row_num=1) |
-                    Q(row_num=total_registros) |
-                    Q(row_mod=0)
-                ).values_list('id', flat=True)
-                
-                # Obtener objetos limpios
-                datos = list(NodeRedData.objects.filter(id__in=list(ids_decimados)).order_by('created_at_iot'))
-                stats = calcular_estadisticas_decimacion(total_registros, len(datos))
-                decimacion_info = {
-                    'aplicada': True,
-                    'total_original': total_registros,
-                    'total_decimado': len(datos),
-                    'factor_reduccion': stats['factor_reduccion'],
-                    'porcentaje_reduccion': stats['porcentaje_reduccion']
-                }
-                logger.info(f"✅ Decimación aplicada: {len(datos)} registros ({stats['porcentaje_reduccion']:.1f}% reducción)")
-            else:
-                datos = list(datos_query)
-                logger.info(f"ℹ️ Sin decimación: {total_registros} registros")
+                # Verificar si se solicita exportación CSV
+                export_format = request.GET.get('export')
+                if export_format == 'csv':
+                    return self._exportar_csv_presion(datos_query, sistema, fecha_inicio, fecha_fin, request.GET.get('columnas'))
             
-            # Preparar datos de presión
-            datos_presion = []
+                # Lectura columnar + decimación en una sola consulta: conserva forma, picos y
+                # bordes de batch (?decimacion=lttb|minmax|stride, ver utils_decimation.py)
+                columnas, decimacion_info = leer_series(
+                    datos_query,
+                    campos=['created_at_iot', 'pressure_out', 'mp', 'bp'],
+                    campos_senal=['pressure_out'],
+                    max_puntos=2000,
+                    modo=request.GET.get('decimacion', 'lttb')
+                )
+                armador.con_timestamps(columnas['created_at_iot'])
             
-            for dato in datos:
-                # Convertir UTC a hora de Colombia usando timestamp IoT
-                fecha_colombia = dato.created_at_iot.astimezone(COLOMBIA_TZ)
-                timestamp = int(fecha_colombia.timestamp() * 1000)
-                fecha_str = fecha_colombia.strftime('%d/%m %H:%M')
-                
-                # Usar pressure_out con corrección del momento aplicada
-                if dato.pressure_out is not None:
-                    # 1. Convertir valor crudo con span
-                    valor_convertido = dato.pressure_out
-                    
-                    # 2. Aplicar corrección mx+b
-                    # Usar coeficientes del momento (mp, bp) si están disponibles, sino usar los actuales
-                    mp_momento = dato.mp if dato.mp is not None else mp
-                    bp_momento = dato.bp if dato.bp is not None else bp
-                    presion_corregida = mp_momento * valor_convertido + bp_momento
-                    datos_presion.append({
-                        'fecha': fecha_str,
-                        'valor': presion_corregida,
-                        'timestamp': timestamp
-                    })
+                # Presión con corrección mx+b del momento (o los coeficientes actuales)
+                presion_corregida = corregir(columnas['pressure_out'], columnas['mp'], columnas['bp'], mp, bp)
+                datos_presion = armador.serie(presion_corregida)
             
-            return Response({
+            return cache_respuesta.guardar(consulta.con_validadores(Response({
                 'success': True,
                 'datos': datos_presion,
                 'unidad': 'PSI',
-                'total_registros': len(datos_presion),
+                'total_registros': armador.total(datos_presion),
+                **armador.eje(),
                 'decimacion_info': decimacion_info,
                 'sistema': {
                     'id': str(sistema.id),
@@ -183,8 +175,9 @@ class DatosHistoricosPresionQueryView(APIView):
                     'sistema_id': sistema.sistema_id
                 },
                 'fecha_inicio': fecha_inicio.strftime('%Y-%m-%d'),
-                'fecha_fin': fecha_fin.strftime('%Y-%m-%d')
-            })
+                'fecha_fin': fecha_fin.strftime('%Y-%m-%d'),
+                'delta': consulta.info(rollup['resolucion'] if rollup is not None else 'raw')
+            })))
             
         except Sistema.DoesNotExist:
             logger.error(f"Sistema no encontrado: {sistema_id}")
@@ -201,32 +194,20 @@ class DatosHistoricosPresionQueryView(APIView):
                 'error': f'Error interno del servidor: {str(e)}'
             }, status=500)
     
-    def _exportar_csv_presion(self, datos, sistema, fecha_inicio, fecha_fin):
-        """Exportar datos de presión como CSV"""
-        from django.http import HttpResponse
-        import csv
-        
+    def _exportar_csv_presion(self, datos, sistema, fecha_inicio, fecha_fin, columnas=None):
+        """Exportar datos de presión como CSV (streaming, ?columnas=fecha,hora,presion,sistema)"""
         # Obtener coeficientes de corrección
         mt, bt, mp, bp, span_presion, zero_presion = get_coeficientes_correccion(sistema)
         
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="presion_{sistema.tag}_{fecha_inicio.strftime("%Y%m%d")}_{fecha_fin.strftime("%Y%m%d")}.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Fecha', 'Hora', 'Presión (PSI)', 'Sistema'])
-        
-        for dato in datos:
-            if dato.pressure_out is not None:
-                fecha_colombia = dato.created_at.astimezone(COLOMBIA_TZ)
-                # Usar coeficientes del momento si están disponibles, sino usar los actuales
-                mp_momento = dato.mp if dato.mp is not None else mp
-                bp_momento = dato.bp if dato.bp is not None else bp
-                presion_corregida = mp_momento * float(dato.pressure_out) + bp_momento
-                writer.writerow([
-                    fecha_colombia.strftime('%d/%m/%Y'),
-                    fecha_colombia.strftime('%H:%M:%S'),
-                    presion_corregida,
-                    sistema.tag
-                ])
+        disponibles = {
+            **columnas_fecha_hora(),
+            # Presión con la corrección del momento
+            'presion': ColumnaCSV('Presión (PSI)', ['pressure_out', 'mp', 'bp'], valor_corregido('pressure_out', 'mp', 'bp', mp, bp)),
+            'sistema': ColumnaCSV('Sistema', [], lambda fila: sistema.tag),
+        }
         
-        return response
\ No newline at end of file
+        return respuesta_csv_streaming(
+            datos.filter(pressure_out__isnull=False),
+            seleccionar_columnas(disponibles, columnas),
+            f'presion_{sistema.tag}_{fecha_inicio.strftime("%Y%m%d")}_{fecha_fin.strftime("%Y%m%d")}.csv'
+        )
@@ -2,8 +2,6 @@ from django.utils import timezone
 from datetime import timedelta, datetime
 import pytz
 import logging
-from django.db.models import Window, F, Q, IntegerField
-from django.db.models.functions import RowNumber, Mod
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
@@ -11,7 +9,15 @@ from _AppComplementos.models import Sistema
 from _AppMonitoreoCoriolis.models import NodeRedData
 from UTIL_LIB.conversiones import celsius_a_fahrenheit
 from _AppMonitoreoCoriolis.views.utils import COLOMBIA_TZ, get_coeficientes_correccion
-from _AppMonitoreoCoriolis.views.utils_decimation import calcular_estadisticas_decimacion
+from _AppMonitoreoCoriolis.views.utils_series import leer_series, lineal, corregir
+from _AppMonitoreoCoriolis.views.utils_export import (
+    ColumnaCSV, columnas_fecha_hora, valor_crudo, valor_corregido, seleccionar_columnas, respuesta_csv_streaming
+)
+from _AppMonitoreoCoriolis.views.utils_rollups import obtener_rollups, info_rollup
+from _AppMonitoreoCoriolis.views.utils_formato import ArmadorSeries
+from _AppMonitoreoCoriolis.views.utils_tiempo_real import obtener_ultima_lectura
+from _AppMonitoreoCoriolis.views.utils_delta import ConsultaIncremental
+from _AppMonitoreoCoriolis.views.utils_respuestas import CacheRespuesta
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -45,11 +51,11 @@ class DatosHistoricosTemperaturaQueryView(APIView):
             
             # MODO TIEMPO REAL: Calcular desde el último dato disponible
             if tiempo_real:
-                ultimo_dato = NodeRedData.objects.filter(systemId=sistema).order_by('-created_at_iot').first()
+                ultima_lectura = obtener_ultima_lectura(sistema.id)
                 
-                if ultimo_dato and ultimo_dato.created_at_iot:
+                if ultima_lectura:
                     # Usar el created_at_iot del último dato como fecha_fin
-                    fecha_fin = ultimo_dato.created_at_iot
+                    fecha_fin = ultima_lectura['created_at_iot']
                     fecha_inicio = fecha_fin - timedelta(hours=horas_atras)
                     logger.info(f"Modo Tiempo Real - Último dato: {fecha_fin}, Inicio calculado: {fecha_inicio}")
                 else:
@@ -89,123 +95,98 @@ class DatosHistoricosTemperaturaQueryView(APIView):
             
             logger.info(f"Fechas UTC para consulta - Inicio: {fecha_inicio}, Fin: {fecha_fin}")
             
-            # Consultar datos de temperatura del sistema
-            datos_query = NodeRedData.objects.filter(
-                systemId=sistema,
-                created_at_iot__gte=fecha_inicio,
-                created_at_iot__lte=fecha_fin,
-                created_at_iot__isnull=False
-            ).order_by('created_at_iot')
-            
-            total_registros = datos_query.count()
-            logger.info(f"Query generada: {datos_query.query}")
-            logger.info(f"Total de registros encontrados: {total_registros}")
-            
-            # Si es exportación CSV, retornar CSV (sin decimación)
-            if export == 'csv':
-                return self._exportar_csv_temperatura(datos_query, sistema, fecha_inicio, fecha_fin)
-            
-            # Aplicar decimación SQL si hay más de 2000 registros
-            max_puntos = 2000
-            decimacion_info = {'aplicada': False}
-            
-            if total_registros > max_puntos:
-                factor = max(1, total_registros // max_puntos)
-                logger.info(f"🔍 Aplicando decimación SQL: factor {factor} (tomar 1 de cada {factor})")
-                
-                # Obtener IDs decimados
-                ids_decimados = datos_query.annotate(
-                    row_num=Window(
-                        expression=RowNumber(),
-                        order_by=F('created_at_iot').asc()
-                    ),
-                    row_mod=Mod(
-                        Window(
-                            expression=RowNumber(),
-                            order_by=F('created_at_iot').asc()
-                        ),
-                        factor,
-                        output_field=IntegerField()
-                    )
-                ).filter(
-                    Q(row_num=1) |
-                    Q(row_num=total_registros) |
-                    Q(row_mod=0)
-                ).values_list('id', flat=True)
-                
-                # Obtener objetos limpios
-                datos_query = NodeRedData.objects.filter(id__in=list(ids_decimados)).order_by('created_at_iot')
-                stats = calcular_estadisticas_decimacion(total_registros, datos_query.count())
-                decimacion_info = {
-                    'aplicada': True,
-                    'total_original': total_registros,
-                    'total_decimado': datos_query.count(),
-                    'factor_reduccion': stats['factor_reduccion'],
-                    'porcentaje_reduccion': stats['porcentaje_reduccion']
-                }
-                logger.info(f"✅ Decimación aplicada: {datos_query.count()} registros ({stats['porcentaje_reduccion']:.1f}% reducción)")
+            # Ventanas cerradas: respuesta ya serializada (ver utils_respuestas.py)
+            cache_respuesta = CacheRespuesta(
+                request, 'temperatura', sistema.id, fecha_fin, (mt, bt, mp, bp),
+                cacheable=not tiempo_real and export != 'csv'
+            )
+            respuesta = cache_respuesta.obtener()
+            if respuesta is not None:
+                return respuesta
+
+            # Validación condicional (ETag / Last-Modified) y modo delta con ?since=
+            # (ver utils_delta.py)
+            try:
+                consulta = ConsultaIncremental(
+                    request, 'temperatura', sistema, fecha_inicio, fecha_fin, (mt, bt, mp, bp),
+                    tiempo_real=tiempo_real and ultima_lectura is not None
+                )
+            except ValueError:
+                return Response({
+                    'success': False,
+                    'error': 'Parámetro since inválido (epoch en ms)'
+                }, status=400)
+            no_modificado = consulta.no_modificado
+            if no_modificado is not None:
+                return consulta.con_validadores(no_modificado)
+            
+            # Rangos amplios: servir desde los rollups pre-agregados (ver utils_rollups.py).
+            # La exportación CSV siempre usa los datos crudos.
+            rollup = None
+            if request.GET.get('export') != 'csv':
+                rollup = obtener_rollups(sistema, consulta.desde, fecha_fin, consulta.resolucion)
+            # Puntos o arreglos columnares (?formato=columnar, ver utils_formato.py)
+            armador = ArmadorSeries(request, '%d/%m/%Y %H:%M:%S')
+            
+            if rollup is not None:
+                armador.con_rollup(rollup['buckets'])
+                datos_coriolis = armador.serie_rollup('coriolis_temperature', celsius_a_fahrenheit)
+                datos_diagnostic = armador.serie_rollup('diagnostic_temperature', celsius_a_fahrenheit)
+                # redundant_temperature se agrega ya corregida con los coeficientes del momento
+                datos_redundant = armador.serie_rollup('redundant_temperature', celsius_a_fahrenheit)
+                decimacion_info = info_rollup(rollup)
+                logger.info(f"📦 Rollup {rollup['resolucion']}: {len(rollup['buckets'])} ventanas ({rollup['total_original']} registros)")
             else:
-                logger.info(f"ℹ️ Sin decimación: {total_registros} registros")
-            
-            # Preparar datos para gráficos separados
-            datos_coriolis = []
-            datos_diagnostic = []
-            datos_redundant = []
-            
-            for dato in datos_query:
-                # Convertir timestamp a hora de Colombia para mostrar
-                fecha_colombia = dato.created_at_iot.astimezone(COLOMBIA_TZ)
-                fecha_str = fecha_colombia.strftime('%d/%m/%Y %H:%M:%S')
-                timestamp = fecha_colombia.isoformat()
-                
-                # Temperatura Coriolis - convertir a °F
-                if dato.coriolis_temperature is not None:
-                    valor_convertido = celsius_a_fahrenheit(float(dato.coriolis_temperature))
-                    datos_coriolis.append({
-                        'fecha': fecha_str,
-                        'valor': valor_convertido,
-                        'timestamp': timestamp
-                    })
-                
-                # Temperatura Diagnóstico - convertir a °F
-                if dato.diagnostic_temperature is not None:
-                    valor_convertido = celsius_a_fahrenheit(float(dato.diagnostic_temperature))
-                    datos_diagnostic.append({
-                        'fecha': fecha_str,
-                        'valor': valor_convertido,
-                        'timestamp': timestamp
-                    })
-                
-                # Temperatura Redundante (Temperatura de Salida) - APLICAR CORRECCIÓN DEL MOMENTO y convertir a °F
-                if dato.redundant_temperature is not None:
-                    # Usar coeficientes del momento (mt, bt) si están disponibles, sino usar los actuales
-                    mt_momento = dato.mt if dato.mt is not None else mt
-                    bt_momento = dato.bt if dato.bt is not None else bt
-                    temp_corregida = mt_momento * float(dato.redundant_temperature) + bt_momento
-                    valor_convertido = celsius_a_fahrenheit(temp_corregida)
-                    datos_redundant.append({
-                        'fecha': fecha_str,
-                        'valor': valor_convertido,
-                        'timestamp': timestamp
-                    })
-            
-            return Response({
+                # Consultar datos de temperatura del sistema
+                datos_query = NodeRedData.objects.filter(
+                    systemId=sistema,
+                    created_at_iot__gte=consulta.desde,
+                    created_at_iot__lte=fecha_fin,
+                    created_at_iot__isnull=False
+                ).order_by('created_at_iot')
+            
+                logger.info(f"Query generada: {datos_query.query}")
+            
+                # Si es exportación CSV, retornar CSV (sin decimación)
+                if export == 'csv':
+                    return self._exportar_csv_temperatura(datos_query, sistema, fecha_inicio, fecha_fin, request.GET.get('columnas'))
+            
+                # Lectura columnar + decimación en una sola consulta: conserva forma, picos y
+                # bordes de batch (?decimacion=lttb|minmax|stride, ver utils_decimation.py)
+                columnas, decimacion_info = leer_series(
+                    datos_query,
+                    campos=['created_at_iot', 'coriolis_temperature', 'diagnostic_temperature', 'redundant_temperature', 'mt', 'bt'],
+                    campos_senal=['coriolis_temperature', 'diagnostic_temperature', 'redundant_temperature'],
+                    max_puntos=2000,
+                    modo=request.GET.get('decimacion', 'lttb')
+                )
+                armador.con_timestamps(columnas['created_at_iot'])
+                a_fahrenheit = lineal(celsius_a_fahrenheit)
+            
+                datos_coriolis = armador.serie(a_fahrenheit(columnas['coriolis_temperature']))
+                datos_diagnostic = armador.serie(a_fahrenheit(columnas['diagnostic_temperature']))
+                # Temperatura Redundante (Temperatura de Salida) - corrección mx+b del momento y °F
+                temp_corregida = corregir(columnas['redundant_temperature'], columnas['mt'], columnas['bt'], mt, bt)
+                datos_redundant = armador.serie(a_fahrenheit(temp_corregida))
+            
+            return cache_respuesta.guardar(consulta.con_validadores(Response({
                 'success': True,
                 'coriolis_temperature': {
                     'datos': datos_coriolis,
-                    'total_registros': len(datos_coriolis),
+                    'total_registros': armador.total(datos_coriolis),
                     'unidad': '°F'
                 },
                 'diagnostic_temperature': {
                     'datos': datos_diagnostic,
-                    'total_registros': len(datos_diagnostic),
+                    'total_registros': armador.total(datos_diagnostic),
                     'unidad': '°F'
                 },
                 'redundant_temperature': {
                     'datos': datos_redundant,
-                    'total_registros': len(datos_redundant),
+                    'total_registros': armador.total(datos_redundant),
                     'unidad': '°F'
                 },
+                **armador.eje(),
                 'decimacion_info': decimacion_info,
                 'sistema': {
                     'id': str(sistema.id),
@@ -213,8 +194,9 @@ class DatosHistoricosTemperaturaQueryView(APIView):
                     'sistema_id': sistema.sistema_id
                 },
                 'fecha_inicio': fecha_inicio.strftime('%Y-%m-%d'),
-                'fecha_fin': fecha_fin.strftime('%Y-%m-%d')
-            })
+                'fecha_fin': fecha_fin.strftime('%Y-%m-%d'),
+                'delta': consulta.info(rollup['resolucion'] if rollup is not None else 'raw')
+            })))
             
         except Sistema.DoesNotExist:
             logger.error(f"Sistema no encontrado: {sistema_id}")
@@ -231,38 +213,26 @@ class DatosHistoricosTemperaturaQueryView(APIView):
                 'error': f'Error interno del servidor: {str(e)}'
             }, status=500)
     
-    def _exportar_csv_temperatura(self, datos, sistema, fecha_inicio, fecha_fin):
-        """Exportar datos de temperatura como CSV"""
-        from django.http import HttpResponse
-        import csv
-        
+    def _exportar_csv_temperatura(self, datos, sistema, fecha_inicio, fecha_fin, columnas=None):
+        """Exportar datos de temperatura como CSV (streaming, ?columnas=fecha,hora,coriolis,...)"""
         # Obtener coeficientes de corrección
         mt, bt, mp, bp, span_presion, zero_presion = get_coeficientes_correccion(sistema)
         
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="temperatura_{sistema.tag}_{fecha_inicio.strftime("%Y%m%d")}_{fecha_fin.strftime("%Y%m%d")}.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Fecha', 'Hora', 'Temp. Coriolis (°C)', 'Temp. Diagnóstico (°C)', 'Temp. Redundante (°C)', 'Sistema'])
-        
-        for dato in datos:
-            fecha_colombia = dato.created_at_iot.astimezone(COLOMBIA_TZ)
-            
-            # Aplicar corrección del momento a temperatura redundante (temperatura de salida)
-            temp_redundante_corregida = None
-            if dato.redundant_temperature is not None:
-                # Usar coeficientes del momento si están disponibles, sino usar los actuales
-                mt_momento = dato.mt if dato.mt is not None else mt
-                bt_momento = dato.bt if dato.bt is not None else bt
-                temp_redundante_corregida = mt_momento * float(dato.redundant_temperature) + bt_momento
-            
-            writer.writerow([
-                fecha_colombia.strftime('%d/%m/%Y'),
-                fecha_colombia.strftime('%H:%M:%S'),
-                float(dato.coriolis_temperature) if dato.coriolis_temperature is not None else '',
-                float(dato.diagnostic_temperature) if dato.diagnostic_temperature is not None else '',
-                temp_redundante_corregida if temp_redundante_corregida is not None else '',
-                sistema.tag
-            ])
+        disponibles = {
+            **columnas_fecha_hora(),
+            'coriolis': ColumnaCSV('Temp. Coriolis (°C)', ['coriolis_temperature'], valor_crudo('coriolis_temperature')),
+            'diagnostico': ColumnaCSV('Temp. Diagnóstico (°C)', ['diagnostic_temperature'], valor_crudo('diagnostic_temperature')),
+            # Temperatura redundante (de salida) con la corrección del momento
+            'redundante': ColumnaCSV(
+                'Temp. Redundante (°C)',
+                ['redundant_temperature', 'mt', 'bt'],
+                valor_corregido('redundant_temperature', 'mt', 'bt', mt, bt)
+            ),
+            'sistema': ColumnaCSV('Sistema', [], lambda fila: sistema.tag),
+        }
         
-        return response
\ No newline at end of file
+        return respuesta_csv_streaming(
+            datos,
+            seleccionar_columnas(disponibles, columnas),
+            f'temperatura_{sistema.tag}_{fecha_inicio.strftime("%Y%m%d")}_{fecha_fin.strftime("%Y%m%d")}.csv'
+        )
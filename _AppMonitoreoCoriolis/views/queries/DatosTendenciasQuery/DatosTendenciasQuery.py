@@ -3,10 +3,13 @@ from datetime import timedelta
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+import numpy as np
 from _AppComplementos.models import Sistema
-from _AppMonitoreoCoriolis.models import NodeRedData
-from UTIL_LIB.conversiones import celsius_a_fahrenheit, cm3_s_a_gal_min, lb_s_a_kg_min
-from _AppMonitoreoCoriolis.views.utils import COLOMBIA_TZ, get_coeficientes_correccion, convertir_presion_con_span
+from _AppMonitoreoCoriolis.views.utils import COLOMBIA_TZ
+from _AppMonitoreoCoriolis.views.utils_series import etiquetas_fecha
+from _AppMonitoreoCoriolis.views.utils_tiempo_real import obtener_ultima_lectura
+from _AppMonitoreoCoriolis.views.utils_tendencias import ventana_tendencias, VARIABLES_TENDENCIAS
+from _AppMonitoreoCoriolis.views.utils_formato import formato_pedido, a_lista
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -15,23 +18,22 @@ class DatosTendenciasQueryView(APIView):
     """
     CBV para obtener datos de tendencias de las últimas 4 horas para el gráfico
     Incluye: Flujo Másico, Flujo Volumétrico, Temperatura Coriolis, Temperatura de Salida y Presión
+    
+    Parámetro opcional `since` (epoch ms del último punto que tiene el cliente): retorna
+    solo los puntos posteriores; el cliente descarta los anteriores a ventana_tiempo.inicio_ms.
+    
+    Con `?formato=columnar` cada dataset trae 'data': {'valores': [...]} alineado con el
+    eje 'timestamps' de la respuesta (ver utils_formato.py).
     """
     permission_classes = [IsAuthenticated]
     
     def get(self, request, sistema_id):
         try:
-            sistema = Sistema.objects.get(id=sistema_id)
-            
-            # Obtener coeficientes de corrección
-            mt, bt, mp, bp, span_presion, zero_presion = get_coeficientes_correccion(sistema)
+            # Última lectura cacheada por la ingesta: punto de referencia, datos del
+            # sistema y coeficientes vigentes (lanza Sistema.DoesNotExist)
+            ultima_lectura = obtener_ultima_lectura(sistema_id)
             
-            # Obtener el último dato disponible para establecer el punto de referencia
-            ultimo_dato = NodeRedData.objects.filter(
-                systemId=sistema,
-                created_at_iot__isnull=False
-            ).order_by('-created_at_iot').first()
-            
-            if not ultimo_dato:
+            if not ultima_lectura:
                 return Response({
                     'success': True,
                     'datasets': {
@@ -47,95 +49,49 @@ class DatosTendenciasQueryView(APIView):
                 })
             
             # Calcular ventana de 30 minutos desde el último dato hacia atrás
-            fecha_fin = ultimo_dato.created_at_iot
+            fecha_fin = ultima_lectura['created_at_iot']
             fecha_inicio = fecha_fin - timedelta(minutes=30)
             
-            # Consultar datos en esa ventana de tiempo usando timestamp IoT
-            datos = NodeRedData.objects.filter(
-                systemId=sistema,
-                created_at_iot__range=[fecha_inicio, fecha_fin],
-                created_at_iot__isnull=False
-            ).order_by('created_at_iot')
+            # Modo incremental: solo los puntos posteriores al último que tiene el navegador
+            since = request.GET.get('since')
+            try:
+                despues_de_ms = int(since) if since else None
+            except ValueError:
+                return Response({
+                    'success': False,
+                    'error': 'Parámetro since inválido (epoch en ms)'
+                }, status=400)
+            
+            # Puntos de la ventana desde el buffer en memoria (ver utils_tendencias.py)
+            ventana = ventana_tendencias(
+                sistema_id, fecha_inicio, fecha_fin, ultima_lectura['coeficientes'], despues_de_ms
+            )
+            x_ms = ventana.x_ms.tolist()
+            columnar = formato_pedido(request) == 'columnar'
+            eje = {'formato': 'columnar', 'timestamps': x_ms} if columnar else {}
             
             # Preparar datos para cada variable
-            flujo_masico = []
-            flujo_volumetrico = []
-            temperatura_coriolis = []
-            temperatura_salida = []
-            presion = []
-            densidad = []
-            
-            for dato in datos:
-                # Convertir UTC a hora de Colombia usando timestamp IoT
-                fecha_colombia = dato.created_at_iot.astimezone(COLOMBIA_TZ)
-                timestamp = int(fecha_colombia.timestamp() * 1000)
-                fecha_str = fecha_colombia.strftime('%H:%M')
-                
-                # Flujo Másico - convertir a kg/min
-                if dato.mass_rate is not None:
-                    valor_convertido = lb_s_a_kg_min(float(dato.mass_rate))
-                    flujo_masico.append({
-                        'x': timestamp,
-                        'y': valor_convertido,
-                        'fecha': fecha_str
-                    })
-                
-                # Flujo Volumétrico - convertir a gal/min
-                if dato.flow_rate is not None:
-                    valor_convertido = cm3_s_a_gal_min(float(dato.flow_rate))
-                    flujo_volumetrico.append({
-                        'x': timestamp,
-                        'y': valor_convertido,
-                        'fecha': fecha_str
-                    })
-                
-                # Temperatura Coriolis - convertir a °F
-                if dato.coriolis_temperature is not None:
-                    valor_convertido = celsius_a_fahrenheit(float(dato.coriolis_temperature))
-                    temperatura_coriolis.append({
-                        'x': timestamp,
-                        'y': valor_convertido,
-                        'fecha': fecha_str
-                    })
-                
-                # Temperatura de Salida (redundant_temperature) - APLICAR CORRECCIÓN DEL MOMENTO y convertir a °F
-                if dato.redundant_temperature is not None:
-                    # Usar coeficientes del momento si están disponibles, sino usar los actuales
-                    mt_momento = dato.mt if dato.mt is not None else mt
-                    bt_momento = dato.bt if dato.bt is not None else bt
-                    temp_corregida = mt_momento * float(dato.redundant_temperature) + bt_momento
-                    valor_convertido = celsius_a_fahrenheit(temp_corregida)
-                    temperatura_salida.append({
-                        'x': timestamp,
-                        'y': valor_convertido,
-                        'fecha': fecha_str
-                    })
-                
-                # Presión - APLICAR CORRECCIÓN DEL MOMENTO y mantener en PSI
-                if dato.pressure_out is not None:
-                    # 1. Convertir valor crudo con span
-                    #valor_convertido = convertir_presion_con_span(dato.pressure_out, span_presion)
-
-                    # 2. Aplicar corrección mx+b del momento
-                    # Usar coeficientes del momento si están disponibles, sino usar los actuales
-                    mp_momento = dato.mp if dato.mp is not None else mp
-                    bp_momento = dato.bp if dato.bp is not None else bp
-                    #presion_corregida = mp_momento * valor_convertido + bp_momento
-                    presion_corregida = mp_momento * dato.pressure_out + bp_momento
-                    
-                    presion.append({
-                        'x': timestamp,
-                        'y': presion_corregida,
-                        'fecha': fecha_str
-                    })
-
-                # Densidad - mantener en g/cc
-                if dato.density is not None:
-                    densidad.append({
-                        'x': timestamp,
-                        'y': dato.density,
-                        'fecha': fecha_str
-                    })
+            series = {}
+            if columnar:
+                for indice, variable in enumerate(VARIABLES_TENDENCIAS):
+                    series[variable] = {'valores': a_lista(ventana.valores[:, indice])}
+            else:
+                # Puntos {x, y, fecha} omitiendo los que no tienen dato
+                etiquetas = etiquetas_fecha(ventana.x_ms, '%H:%M')
+                for indice, variable in enumerate(VARIABLES_TENDENCIAS):
+                    columna = ventana.valores[:, indice]
+                    validos = (~np.isnan(columna)).tolist()
+                    series[variable] = [
+                        {'x': x, 'y': y, 'fecha': fecha}
+                        for x, y, fecha, valido in zip(x_ms, columna.tolist(), etiquetas, validos)
+                        if valido
+                    ]
+            flujo_masico = series['flujo_masico']
+            flujo_volumetrico = series['flujo_volumetrico']
+            temperatura_coriolis = series['temperatura_coriolis']
+            temperatura_salida = series['temperatura_salida']
+            presion = series['presion']
+            densidad = series['densidad']
 
             return Response({
                 'success': True,
@@ -145,57 +101,57 @@ class DatosTendenciasQueryView(APIView):
                         'data': flujo_masico,
                         'unidad': 'kg/min',
                         'color': '#28a745',  # Verde
-                        'total_registros': len(flujo_masico)
+                        'total_registros': len(ventana) if columnar else len(flujo_masico)
                     },
                     'flujo_volumetrico': {
                         'label': 'Flujo Volumétrico',
                         'data': flujo_volumetrico,
                         'unidad': 'gal/min',
                         'color': '#007bff',  # Azul
-                        'total_registros': len(flujo_volumetrico)
+                        'total_registros': len(ventana) if columnar else len(flujo_volumetrico)
                     },
                     'temperatura_coriolis': {
                         'label': 'Temperatura Coriolis',
                         'data': temperatura_coriolis,
                         'unidad': '°F',
                         'color': '#f59416',  # Naranja
-                        'total_registros': len(temperatura_coriolis)
+                        'total_registros': len(ventana) if columnar else len(temperatura_coriolis)
                     },
                     'temperatura_salida': {
                         'label': 'Temperatura de Salida',
                         'data': temperatura_salida,
                         'unidad': '°F',
                         'color': '#6f42c1',  # Púrpura
-                        'total_registros': len(temperatura_salida)
+                        'total_registros': len(ventana) if columnar else len(temperatura_salida)
                     },
                     'presion': {
                         'label': 'Presión',
                         'data': presion,
                         'unidad': 'PSI',
                         'color': '#dc3545',  # Rojo
-                        'total_registros': len(presion)
+                        'total_registros': len(ventana) if columnar else len(presion)
                     },
                     'densidad': {
                         'label': 'Densidad',
                         'data': densidad,
                         'unidad': 'g/cc',
                         'color': "#cbdc35",  # Amarillo verdoso
-                        'total_registros': len(densidad)
+                        'total_registros': len(ventana) if columnar else len(densidad)
                     }
                 },
-                'sistema': {
-                    'id': str(sistema.id),
-                    'tag': sistema.tag,
-                    'sistema_id': sistema.sistema_id
-                },
+                **eje,
+                'sistema': ultima_lectura['sistema'],
                 'periodo': '30 minutos desde último dato',
                 'ventana_tiempo': {
                     'inicio': fecha_inicio.astimezone(COLOMBIA_TZ).strftime('%H:%M'),
                     'fin': fecha_fin.astimezone(COLOMBIA_TZ).strftime('%H:%M'),
-                    'ultimo_dato': ultimo_dato.created_at_iot.astimezone(COLOMBIA_TZ).strftime('%d/%m/%Y %H:%M:%S')
+                    'inicio_ms': int(fecha_inicio.timestamp() * 1000),
+                    'fin_ms': int(fecha_fin.timestamp() * 1000),
+                    'ultimo_dato': fecha_fin.astimezone(COLOMBIA_TZ).strftime('%d/%m/%Y %H:%M:%S')
                 },
                 'timestamp': fecha_fin.isoformat(),
-                'total_registros': datos.count()
+                'incremental': despues_de_ms is not None,
+                'total_registros': len(ventana)
             })
             
         except Sistema.DoesNotExist:
@@ -3,141 +3,29 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from _AppComplementos.models import Sistema
-from _AppMonitoreoCoriolis.models import NodeRedData
-from UTIL_LIB.conversiones import celsius_a_fahrenheit, cm3_s_a_gal_min, lb_s_a_kg_min, cm3_a_gal, lb_a_kg
-from _AppMonitoreoCoriolis.views.utils import COLOMBIA_TZ, get_coeficientes_correccion, convertir_presion_con_span
+from _AppMonitoreoCoriolis.views.utils_tiempo_real import obtener_ultima_lectura
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
 class DatosTiempoRealQueryView(APIView):
     """
-    CBV para obtener los últimos datos para mostrar en los displays en tiempo real
+    CBV para obtener los últimos datos para mostrar en los displays en tiempo real.
+    Responde desde la última lectura cacheada por la ingesta (ver utils_tiempo_real.py).
     """
     permission_classes = [IsAuthenticated]
     
     def get(self, request, sistema_id):
         try:
-            sistema = Sistema.objects.get(id=sistema_id)
+            ultima_lectura = obtener_ultima_lectura(sistema_id)
             
-            # Obtener coeficientes de corrección
-            mt, bt, mp, bp, span_presion, zero_presion = get_coeficientes_correccion(sistema)
-            
-            # Obtener el último registro con timestamp IoT válido
-            ultimo_dato = NodeRedData.objects.filter(
-                systemId=sistema,
-                created_at_iot__isnull=False
-            ).order_by('-created_at_iot').first()
-            
-            if not ultimo_dato:
+            if not ultima_lectura:
                 return Response({
                     'success': False,
                     'error': 'No hay datos disponibles para este sistema'
                 }, status=404)
             
-            # Convertir UTC a hora de Colombia usando timestamp IoT
-            fecha_colombia = ultimo_dato.created_at_iot.astimezone(COLOMBIA_TZ)
-            
-            # Aplicar corrección a Temperatura de Salida (redundant_temperature)
-            temp_salida = celsius_a_fahrenheit(ultimo_dato.redundant_temperature)
-            temp_salida_corr = mt * float(temp_salida) + bt if temp_salida is not None else None
-            temp_salida_corrCalc = int(temp_salida_corr * 1000) / 1000
-            
-            # Aplicar corrección a Presión (pressure_out)
-            presion = ultimo_dato.pressure_out
-            if presion is not None:
-                # 1. Convertir valor crudo con span
-                #valor_convertido = convertir_presion_con_span(presion, span_presion)
-                # 2. Aplicar corrección mx+b
-                #presion_corr = mp * valor_convertido + bp
-                presion_corr = mp * presion + bp
-                presion_corrCalc = int(presion_corr * 1000) / 1000
-            else:
-                presion_corr = None
-            
-            return Response({
-                'success': True,
-                'datos': {
-                    'flujo': {
-                        'valor': cm3_s_a_gal_min(ultimo_dato.flow_rate),
-                        'unidad': 'gal/min'
-                    },
-                    'flujoMasico': {
-                        'valor': lb_s_a_kg_min(ultimo_dato.mass_rate),
-                        'unidad': 'kg/min'
-                    },
-                    'temperaturaRedundante': {
-                        'valor': temp_salida_corrCalc if temp_salida_corrCalc is not None else None,
-                        'unidad': '°F'
-                    },
-                    'temperaturaDiagnostico': {
-                        'valor': celsius_a_fahrenheit(ultimo_dato.diagnostic_temperature),
-                        'unidad': '°F'
-                    },
-                    'temperatura': {
-                        'valor': celsius_a_fahrenheit(ultimo_dato.coriolis_temperature),
-                        'unidad': '°F'
-                    },
-                    'presion': {
-                        'valor': float(presion_corrCalc) if presion_corrCalc is not None else 0,
-                        'unidad': 'PSI'
-                    },
-                    'volTotal': {
-                        'valor': cm3_a_gal(ultimo_dato.total_volume),
-                        'unidad': 'gal'
-                    },
-                    'masTotal': {
-                        'valor': lb_a_kg(ultimo_dato.total_mass),
-                        'unidad': 'kg'
-                    },
-                    'densidad': {
-                        'valor': float(ultimo_dato.density) if ultimo_dato.density else 0,
-                        'unidad': 'g/cc'
-                    },
-                    'frecuencia': {
-                        'valor': float(ultimo_dato.coriolis_frecuency) if ultimo_dato.coriolis_frecuency else 0,
-                        'unidad': 'Hz'
-                    },
-                    'NoiseEstimadedN1': {
-                        'valor': float(ultimo_dato.dsp_rxmsg_noiseEstimatedN1) if ultimo_dato.dsp_rxmsg_noiseEstimatedN1 else 0,
-                        'unidad': '--'
-                    },
-                    'NoiseEstimadedN2': {
-                        'valor': float(ultimo_dato.dsp_rxmsg_noiseEstimatedN2) if ultimo_dato.dsp_rxmsg_noiseEstimatedN2 else 0,
-                        'unidad': '--'
-                    },
-                    'DriverAmplitude': {
-                        'valor': float(ultimo_dato.dsp_rxmsg_driverAmplitude) if ultimo_dato.dsp_rxmsg_driverAmplitude else 0,
-                        'unidad': '--'
-                    },
-                    'DriverCurr': {
-                        'valor': float(ultimo_dato.driver_curr) if ultimo_dato.driver_curr else 0,
-                        'unidad': 'mA'
-                    },
-                    'A1A2': {
-                        'valor': float(ultimo_dato.dsp_rxmsg_amplitudeEstimateA1 - ultimo_dato.dsp_rxmsg_amplitudeEstimateA2) if (ultimo_dato.dsp_rxmsg_amplitudeEstimateA1 - ultimo_dato.dsp_rxmsg_amplitudeEstimateA2) else 0,
-                        'unidad': '--'
-                    },
-                    'concSolido': {
-                        'valor': float(ultimo_dato.pconc) if ultimo_dato.pconc else 0,
-                        'unidad': '%'
-                    },
-                    'corteAgua': {
-                        'valor': float(ultimo_dato.percent_cutWater64b) if ultimo_dato.percent_cutWater64b else 0,
-                        'unidad': '%'
-                    },
-                    'signalGateway': {
-                        'valor': float(ultimo_dato.signal_strength_rxCoriolis) if ultimo_dato.signal_strength_rxCoriolis else 0,
-                        'unidad': 'dB'
-                    },
-                    'tempGateway': {
-                        'valor': float(ultimo_dato.temperature_gateway) if ultimo_dato.temperature_gateway else 0,
-                        'unidad': '°C'  # Esta se mantiene en °C según lo solicitado
-                    }
-                },
-                'timestamp': fecha_colombia.isoformat(),
-                'fecha_legible': fecha_colombia.strftime('%d/%m/%Y %H:%M:%S')
-            })
+            return Response(ultima_lectura['mensaje'])
             
         except Sistema.DoesNotExist:
             return Response({
@@ -148,4 +36,4 @@ class DatosTiempoRealQueryView(APIView):
             return Response({
                 'success': False,
                 'error': str(e)
-            }, status=500)
\ No newline at end of file
+            }, status=500)
@@ -0,0 +1,76 @@
+import logging
+from django.db.models import F
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from _AppMonitoreoCoriolis.models import DiagnosticoSistema
+from _AppMonitoreoCoriolis.views.utils import COLOMBIA_TZ
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+
+class DiagnosticoFlotaQueryView(APIView):
+    """
+    CBV para listar los medidores de la flota ordenados por puntaje de salud (peor primero).
+
+    Lee los resultados guardados por el escaneo de la flota
+    (`python manage.py escanear_flota`, ver utils_flota.py); no recalcula nada.
+
+    Parámetros:
+        solo_atencion: 'true' para listar solo los sistemas con estado distinto de OK
+        limite: cantidad máxima de sistemas
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            diagnosticos = DiagnosticoSistema.objects.select_related('systemId__ubicacion').order_by(
+                F('puntaje').asc(nulls_last=True), 'systemId__tag'
+            )
+            if request.GET.get('solo_atencion', 'false').lower() == 'true':
+                diagnosticos = diagnosticos.exclude(estado_general='OK')
+
+            limite = request.GET.get('limite')
+            if limite:
+                try:
+                    diagnosticos = diagnosticos[:max(int(limite), 1)]
+                except ValueError:
+                    return Response({
+                        'success': False,
+                        'error': 'El parámetro limite debe ser un entero'
+                    }, status=400)
+
+            sistemas = []
+            for posicion, diagnostico in enumerate(diagnosticos, start=1):
+                sistema = diagnostico.systemId
+                sistemas.append({
+                    'posicion': posicion,
+                    'sistema': {
+                        'id': str(sistema.id),
+                        'tag': sistema.tag,
+                        'sistema_id': sistema.sistema_id,
+                        'ubicacion': sistema.ubicacion.nombre if sistema.ubicacion else "Sin ubicación",
+                    },
+                    'puntaje': diagnostico.puntaje,
+                    'estado_general': diagnostico.estado_general,
+                    'alarmas': diagnostico.alarmas,
+                    'mensajes': diagnostico.diagnostico.get('mensajes', []),
+                    'total_registros': diagnostico.total_registros,
+                    'ventana_inicio': diagnostico.ventana_inicio.astimezone(COLOMBIA_TZ).strftime('%d/%m/%Y %H:%M'),
+                    'ventana_fin': diagnostico.ventana_fin.astimezone(COLOMBIA_TZ).strftime('%d/%m/%Y %H:%M'),
+                    'evaluado_en': diagnostico.evaluado_en.astimezone(COLOMBIA_TZ).strftime('%d/%m/%Y %H:%M:%S'),
+                })
+
+            return Response({
+                'success': True,
+                'total_sistemas': len(sistemas),
+                'sistemas': sistemas
+            })
+
+        except Exception as e:
+            logger.error(f"Error en DiagnosticoFlotaQueryView: {str(e)}", exc_info=True)
+            return Response({
+                'success': False,
+                'error': f'Error interno del servidor: {str(e)}'
+            }, status=500)
@@ -0,0 +1,3 @@
+from .DiagnosticoFlotaQuery import DiagnosticoFlotaQueryView
+
+__all__ = ['DiagnosticoFlotaQueryView']
@@ -10,6 +10,7 @@ from rest_framework.permissions import IsAuthenticated
 from _AppComplementos.models import Sistema
 from _AppMonitoreoCoriolis.models import BatchDetectado
 from _AppMonitoreoCoriolis.views.utils import COLOMBIA_TZ
+from _AppMonitoreoCoriolis.views.utils_respuestas import CacheRespuesta
 from UTIL_LIB.conversiones import celsius_a_fahrenheit
 
 # Configurar logging
@@ -63,6 +64,13 @@ class ListarBatchesQueryView(APIView):
             
             logger.info(f"Fechas convertidas a UTC - Inicio: {fecha_inicio}, Fin: {fecha_fin}")
             
+            # Rangos cerrados: respuesta ya serializada, se invalida al guardar batches
+            # del sistema (ver utils_respuestas.py)
+            cache_respuesta = CacheRespuesta(request, 'batches', sistema.id, fecha_fin)
+            respuesta = cache_respuesta.obtener()
+            if respuesta is not None:
+                return respuesta
+            
             # Buscar batches que tengan fecha_inicio dentro del rango de fechas
             # Cualquier batch que inicie dentro del día seleccionado
             batches_queryset = BatchDetectado.objects.filter(
@@ -124,7 +132,7 @@ class ListarBatchesQueryView(APIView):
             
             logger.info(f"Listando página {page_number} de {paginator.num_pages} - {len(batches_data)} batches de {paginator.count} totales para sistema {sistema_id}")
             
-            return Response({
+            return cache_respuesta.guardar(Response({
                 'success': True,
                 'batches': batches_data,
                 'pagination': {
@@ -147,7 +155,7 @@ class ListarBatchesQueryView(APIView):
                 },
                 'fecha_inicio': fecha_inicio.astimezone(COLOMBIA_TZ).strftime('%Y-%m-%d %H:%M:%S'),
                 'fecha_fin': fecha_fin.astimezone(COLOMBIA_TZ).strftime('%Y-%m-%d %H:%M:%S')
-            })
+            }))
             
         except Exception as e:
             logger.error(f"Error listando batches: {str(e)}")
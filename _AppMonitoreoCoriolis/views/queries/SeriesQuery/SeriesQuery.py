@@ -0,0 +1,226 @@
+from django.utils import timezone
+from datetime import timedelta, datetime
+import pytz
+import logging
+import numpy as np
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from _AppComplementos.models import Sistema
+from _AppMonitoreoCoriolis.models import NodeRedData
+from _AppMonitoreoCoriolis.views.utils import COLOMBIA_TZ, get_coeficientes_correccion
+from _AppMonitoreoCoriolis.views.utils_series import leer_series, columnas_rollup
+from _AppMonitoreoCoriolis.views.utils_rollups import obtener_rollups, info_rollup
+from _AppMonitoreoCoriolis.views.utils_tiempo_real import obtener_ultima_lectura
+from _AppMonitoreoCoriolis.views.utils_delta import ConsultaIncremental
+from _AppMonitoreoCoriolis.views.utils_respuestas import CacheRespuesta
+from _AppMonitoreoCoriolis.views.utils_canales import CANALES, seleccionar_canales, campos_de
+from _AppMonitoreoCoriolis.views.utils_formato import formato_pedido, a_lista, empaquetar_binario
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+MAX_PUNTOS_DEFECTO = 2000
+MAX_PUNTOS_LIMITE = 20000
+
+
+def _rango_fechas(request, ultima_lectura):
+    """
+    Ventana (UTC) con los mismos parámetros de las vistas históricas.
+
+    Raises:
+        ValueError: formato de fecha inválido
+    """
+    fecha_inicio = request.GET.get('fecha_inicio')
+    fecha_fin = request.GET.get('fecha_fin')
+    horas_atras = float(request.GET.get('horas_atras', '4'))
+
+    if request.GET.get('tiempo_real', 'false').lower() == 'true':
+        fecha_fin = ultima_lectura['created_at_iot'] if ultima_lectura else timezone.now()
+        return fecha_fin - timedelta(hours=horas_atras), fecha_fin
+    if not fecha_inicio or not fecha_fin:
+        fecha_fin = timezone.now()
+        return fecha_fin - timedelta(days=7), fecha_fin
+
+    try:
+        fecha_inicio_naive = datetime.strptime(fecha_inicio, '%Y-%m-%dT%H:%M:%S')
+        fecha_fin_naive = datetime.strptime(fecha_fin, '%Y-%m-%dT%H:%M:%S')
+    except ValueError:
+        # Formato solo fecha: cubrir los días completos
+        fecha_inicio_naive = datetime.strptime(fecha_inicio, '%Y-%m-%d')
+        fecha_fin_naive = datetime.strptime(fecha_fin, '%Y-%m-%d').replace(
+            hour=23, minute=59, second=59, microsecond=999999
+        )
+    # Las fechas del frontend están en hora de Colombia
+    return (
+        COLOMBIA_TZ.localize(fecha_inicio_naive).astimezone(pytz.UTC),
+        COLOMBIA_TZ.localize(fecha_fin_naive).astimezone(pytz.UTC),
+    )
+
+
+class SeriesQueryView(APIView):
+    """
+    CBV para obtener varias series de un sistema en una sola consulta.
+
+    `?canales=flujo_volumetrico,presion,...` (todos si se omite; ver utils_canales.CANALES).
+    El rango se lee una sola vez (filas crudas o rollups) y todas las series comparten el
+    mismo eje de tiempo, en formato columnar:
+        {'timestamps': [ms, ...], 'series': {canal: {'unidad', 'valores': [...]}}}
+    Con rollups cada serie trae además 'min' y 'max' de la ventana.
+
+    `?formato=binario` retorna los mismos arreglos como bloques float32 (o float64 con
+    `?precision=64`) y un encabezado JSON (ver utils_formato.empaquetar_binario).
+
+    Acepta los mismos parámetros de rango, decimación, resolución y delta (`since`,
+    ETag) que las vistas históricas.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, sistema_id):
+        try:
+            logger.info(f"SeriesQueryView - Sistema ID: {sistema_id}, params: {dict(request.GET)}")
+
+            sistema = Sistema.objects.get(id=sistema_id)
+
+            try:
+                canales = seleccionar_canales(request.GET.get('canales'))
+            except ValueError as e:
+                return Response({
+                    'success': False,
+                    'error': f'Canales desconocidos: {e}. Disponibles: {", ".join(CANALES)}'
+                }, status=400)
+
+            tiempo_real = request.GET.get('tiempo_real', 'false').lower() == 'true'
+            ultima_lectura = obtener_ultima_lectura(sistema.id) if tiempo_real else None
+            try:
+                fecha_inicio, fecha_fin = _rango_fechas(request, ultima_lectura)
+            except ValueError:
+                return Response({
+                    'success': False,
+                    'error': 'Formato de fecha inválido. Use YYYY-MM-DD o YYYY-MM-DDTHH:MM:SS'
+                }, status=400)
+
+            try:
+                max_puntos = int(request.GET.get('max_puntos', MAX_PUNTOS_DEFECTO))
+            except ValueError:
+                max_puntos = MAX_PUNTOS_DEFECTO
+            max_puntos = min(max(max_puntos, 10), MAX_PUNTOS_LIMITE)
+
+            mt, bt, mp, bp, span_presion, zero_presion = get_coeficientes_correccion(sistema)
+            coeficientes = (mt, bt, mp, bp)
+
+            # Ventanas cerradas: respuesta ya serializada (ver utils_respuestas.py)
+            cache_respuesta = CacheRespuesta(
+                request, 'series', sistema.id, fecha_fin, coeficientes, cacheable=not tiempo_real
+            )
+            respuesta = cache_respuesta.obtener()
+            if respuesta is not None:
+                return respuesta
+
+            # Validación condicional (ETag / Last-Modified) y modo delta con ?since=
+            # (ver utils_delta.py)
+            try:
+                consulta = ConsultaIncremental(
+                    request, 'series', sistema, fecha_inicio, fecha_fin, coeficientes,
+                    tiempo_real=ultima_lectura is not None
+                )
+            except ValueError:
+                return Response({
+                    'success': False,
+                    'error': 'Parámetro since inválido (epoch en ms)'
+                }, status=400)
+            no_modificado = consulta.no_modificado
+            if no_modificado is not None:
+                return consulta.con_validadores(no_modificado)
+
+            # Arreglos por canal: {canal: {'valores': arr[, 'min': arr, 'max': arr]}}
+            arreglos = {}
+            rollup = obtener_rollups(sistema, consulta.desde, fecha_fin, consulta.resolucion)
+
+            if rollup is not None:
+                buckets = rollup['buckets']
+                timestamps = np.array(
+                    [int(bucket.timestamp() * 1000) for bucket, _total, _est in buckets], dtype=np.int64
+                )
+                for clave in canales:
+                    canal = CANALES[clave]
+                    promedio, minimo, maximo = columnas_rollup(buckets, canal.campo_rollup, canal.convertir_rollup)
+                    arreglos[clave] = {'valores': promedio, 'min': minimo, 'max': maximo}
+                decimacion_info = info_rollup(rollup)
+                logger.info(f"📦 Rollup {rollup['resolucion']}: {len(buckets)} ventanas ({rollup['total_original']} registros)")
+            else:
+                datos_query = NodeRedData.objects.filter(
+                    systemId=sistema,
+                    created_at_iot__gte=consulta.desde,
+                    created_at_iot__lte=fecha_fin,
+                    created_at_iot__isnull=False
+                ).order_by('created_at_iot')
+
+                # Una sola lectura con la unión de columnas; la decimación elige los
+                # mismos índices para todas las series
+                columnas, decimacion_info = leer_series(
+                    datos_query,
+                    campos=campos_de(canales),
+                    campos_senal=list(dict.fromkeys(CANALES[clave].senal for clave in canales)),
+                    max_puntos=max_puntos,
+                    modo=request.GET.get('decimacion', 'lttb')
+                )
+                timestamps = columnas['created_at_iot']
+                for clave in canales:
+                    valores = CANALES[clave].convertir(columnas, coeficientes)
+                    arreglos[clave] = {'valores': np.asarray(valores, dtype=np.float64)}
+
+            encabezado = {
+                'success': True,
+                'sistema': {
+                    'id': str(sistema.id),
+                    'tag': sistema.tag,
+                    'sistema_id': sistema.sistema_id
+                },
+                'total_registros': len(timestamps),
+                'decimacion_info': decimacion_info,
+                'fecha_inicio': fecha_inicio.strftime('%Y-%m-%d'),
+                'fecha_fin': fecha_fin.strftime('%Y-%m-%d'),
+                'delta': consulta.info(rollup['resolucion'] if rollup is not None else 'raw')
+            }
+            unidades = {
+                clave: {'etiqueta': CANALES[clave].etiqueta, 'unidad': CANALES[clave].unidad}
+                for clave in canales
+            }
+
+            if formato_pedido(request, ('columnar', 'binario')) == 'binario':
+                encabezado['series'] = unidades
+                columnas_binario = [
+                    (f'{clave}.{nombre}', valores)
+                    for clave in canales
+                    for nombre, valores in arreglos[clave].items()
+                ]
+                bytes_valor = 8 if request.GET.get('precision') == '64' else 4
+                return cache_respuesta.guardar(consulta.con_validadores(
+                    empaquetar_binario(timestamps, columnas_binario, encabezado, bytes_valor)
+                ))
+
+            return cache_respuesta.guardar(consulta.con_validadores(Response({
+                **encabezado,
+                'timestamps': timestamps.tolist(),
+                'series': {
+                    clave: {
+                        **unidades[clave],
+                        **{nombre: a_lista(valores) for nombre, valores in arreglos[clave].items()}
+                    }
+                    for clave in canales
+                },
+            })))
+
+        except Sistema.DoesNotExist:
+            logger.error(f"Sistema no encontrado: {sistema_id}")
+            return Response({
+                'success': False,
+                'error': 'Sistema no encontrado'
+            }, status=404)
+        except Exception as e:
+            logger.error(f"Error en SeriesQueryView: {str(e)}", exc_info=True)
+            return Response({
+                'success': False,
+                'error': f'Error interno del servidor: {str(e)}'
+            }, status=500)
@@ -0,0 +1,3 @@
+from .SeriesQuery import SeriesQueryView
+
+__all__ = ['SeriesQueryView']
@@ -0,0 +1,84 @@
+import json
+import asyncio
+import logging
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from _AppComplementos.models import Sistema
+from _AppMonitoreoCoriolis.views.utils_broker import obtener_broker
+from django.http import HttpResponse
+from _AppMonitoreoCoriolis.views.utils_tiempo_real import obtener_ultima_lectura, stream_tiempo_real_disponible
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+
+def _evento(nombre, datos):
+    return f"event: {nombre}\ndata: {json.dumps(datos, default=str)}\n\n"
+
+
+def _lectura_actual(sistema_id):
+    """Mensaje con la última lectura del sistema (o None), para el primer evento del stream."""
+    ultima_lectura = obtener_ultima_lectura(sistema_id)
+    return ultima_lectura['mensaje'] if ultima_lectura else None
+
+
+class StreamTiempoRealQueryView(View):
+    """
+    Stream SSE (text/event-stream) con las lecturas en tiempo real de un sistema.
+
+    Envía la lectura actual al conectar y luego cada lectura que publica la ingesta
+    (evento `lectura`, mismo cuerpo que DatosTiempoRealQueryView). Requiere servir la
+    aplicación por ASGI (config/asgi.py): servida por WSGI responde 204 de inmediato,
+    con lo que EventSource deja de reconectar y el navegador sigue con el polling. La
+    conexión se cierra tras TIEMPO_REAL_STREAM_MAX_SEGUNDOS; EventSource reconecta solo
+    y así la sesión se vuelve a validar periódicamente.
+    """
+
+    async def get(self, request, sistema_id):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return JsonResponse({'success': False, 'error': 'No autenticado'}, status=401)
+
+        if not stream_tiempo_real_disponible(request):
+            return HttpResponse(status=204)
+
+        try:
+            inicial = await sync_to_async(_lectura_actual)(sistema_id)
+        except Sistema.DoesNotExist:
+            return JsonResponse({'success': False, 'error': 'Sistema no encontrado'}, status=404)
+
+        response = StreamingHttpResponse(
+            self._eventos(sistema_id, inicial),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Evita que proxies (nginx) acumulen el stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def _eventos(self, sistema_id, inicial):
+        broker = obtener_broker()
+        entrada = broker.suscribir(sistema_id)
+        _, cola = entrada
+        latido = getattr(settings, 'TIEMPO_REAL_LATIDO_SEGUNDOS', 15)
+        duracion_maxima = getattr(settings, 'TIEMPO_REAL_STREAM_MAX_SEGUNDOS', 300)
+        loop = asyncio.get_running_loop()
+        fin = loop.time() + duracion_maxima
+
+        try:
+            yield "retry: 3000\n\n"
+            if inicial is not None:
+                yield _evento('lectura', inicial)
+
+            while loop.time() < fin:
+                try:
+                    mensaje = await asyncio.wait_for(cola.get(), timeout=min(latido, max(fin - loop.time(), 0.1)))
+                except asyncio.TimeoutError:
+                    # Comentario SSE: mantiene viva la conexión a través de proxies
+                    yield ": latido\n\n"
+                    continue
+                yield _evento('lectura', mensaje)
+        finally:
+            broker.cancelar_suscripcion(sistema_id, entrada)
@@ -0,0 +1,3 @@
+from .StreamTiempoRealQuery import StreamTiempoRealQueryView
+
+__all__ = ['StreamTiempoRealQueryView']
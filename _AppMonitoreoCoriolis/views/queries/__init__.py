@@ -5,10 +5,13 @@ from .DatosHistoricosTemperaturaQuery import DatosHistoricosTemperaturaQueryView
 from .DatosHistoricosOtrasVariablesQuery import DatosHistoricosOtrasVariablesQueryView
 from .DatosTiempoRealQuery import DatosTiempoRealQueryView
 from .DatosTendenciasQuery import DatosTendenciasQueryView
+from .StreamTiempoRealQuery import StreamTiempoRealQueryView
+from .SeriesQuery import SeriesQueryView
 from .DetalleBatchQuery import DetalleBatchQueryView
 from .ListarBatchesQuery import ListarBatchesQueryView
 from .ListarTicketsQuery import ListarTicketsQueryView
 from .ListarTodosTickets import ListarTodosTicketsView
+from .DiagnosticoFlotaQuery import DiagnosticoFlotaQueryView
 
 __all__ = [
     'DatosHistoricosFlujoQueryView',
@@ -17,8 +20,11 @@ __all__ = [
     'DatosHistoricosOtrasVariablesQueryView',
     'DatosTiempoRealQueryView',
     'DatosTendenciasQueryView',
+    'StreamTiempoRealQueryView',
+    'SeriesQueryView',
     'DetalleBatchQueryView',
     'ListarBatchesQueryView',
     'ListarTicketsQueryView',
-    'ListarTodosTicketsView'
+    'ListarTodosTicketsView',
+    'DiagnosticoFlotaQueryView'
 ]
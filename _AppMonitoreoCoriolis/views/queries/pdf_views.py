@@ -22,6 +22,8 @@ import datetime
 from _AppMonitoreoCoriolis.models import BatchDetectado
 from _AppComplementos.models import Sistema
 from _AppMonitoreoCoriolis.views.utils import COLOMBIA_TZ
+from _AppMonitoreoCoriolis.views.utils_cache import cache_configuracion
+from _AppMonitoreoCoriolis.views.utils_detalle_batch import obtener_detalle_batch
 from UTIL_LIB.densidad60Modelo import rho15_from_rhoobs_api1124
 from UTIL_LIB.conversiones import fahrenheit_a_celsius, g_cm3_a_kg_m3, kg_m3_a_g_cm3, celsius_a_fahrenheit, m3_a_gal
 
@@ -82,7 +84,7 @@ class DescargarTicketBatchPDFView(LoginRequiredMixin, View):
         """
         try:
             # Obtener datos del batch
-            batch = get_object_or_404(BatchDetectado, id=batch_id)
+            batch = get_object_or_404(BatchDetectado.objects.select_related('systemId__ubicacion'), id=batch_id)
             
             # Crear respuesta HTTP para PDF
             response = HttpResponse(content_type='application/pdf')
@@ -131,9 +133,13 @@ class DescargarTicketBatchPDFView(LoginRequiredMixin, View):
         producto = "GLP"  # Valor quemado como solicitaste
         
         # Datos reales del batch
-        rho_obs = g_cm3_a_kg_m3(batch.densidad_prom)  # kg/m3
-        T_obs_C = batch.temperatura_coriolis_prom # °C
-        rho15, gamma60 = rho15_from_rhoobs_api1124(rho_obs, T_obs_C)
+        # rho15 del detalle materializado del batch (ver utils_detalle_batch.py)
+        detalle = obtener_detalle_batch(batch, cache_configuracion.obtener_coeficientes(batch.systemId_id))
+        rho15 = detalle.rho15 if detalle is not None else None
+        if rho15 is None:
+            rho_obs = g_cm3_a_kg_m3(batch.densidad_prom)  # kg/m3
+            T_obs_C = batch.temperatura_coriolis_prom # °C
+            rho15, gamma60 = rho15_from_rhoobs_api1124(rho_obs, T_obs_C)
         rho15_g_cm3 = kg_m3_a_g_cm3(rho15)
 
         densidad_std = f"{rho15_g_cm3:.4f} g/cm³" if rho15_g_cm3 is not None else "N/A"
@@ -4,6 +4,7 @@ from django.views.generic import TemplateView
 from _AppComplementos.models import Sistema
 from _AppAuth.utils import get_monitoring_context
 from _AppMonitoreoCoriolis.models import BatchDetectado
+from _AppMonitoreoCoriolis.views.utils_tiempo_real import stream_tiempo_real_disponible
 from django.db.models import Sum
 from datetime import datetime, timedelta
 import pytz
@@ -23,6 +24,7 @@ class MonitoreoCoriolisBaseView(LoginRequiredMixin, TemplateView):
         context.update(monitoring_context)
         
         context['active_section'] = 'monitoreo_coriolis'
+        context['stream_tiempo_real'] = stream_tiempo_real_disponible(self.request)
         return context
 
 class MonitoreoCoriolisSistemaView(LoginRequiredMixin, TemplateView):
@@ -48,7 +50,8 @@ class MonitoreoCoriolisSistemaView(LoginRequiredMixin, TemplateView):
             'sistema': sistema,
             'active_section': 'monitoreo_coriolis',
             'masa_dia_anterior': masa_dia_anterior,
-            'fecha_dia_anterior': fecha_dia_anterior
+            'fecha_dia_anterior': fecha_dia_anterior,
+            'stream_tiempo_real': stream_tiempo_real_disponible(self.request)
         })
         return context
     
@@ -3,7 +3,7 @@ Utilidades compartidas para las vistas de monitoreo de Coriolis
 """
 import pytz
 import logging
-from _AppComplementos.models import ConfiguracionCoeficientes
+from _AppMonitoreoCoriolis.views.utils_cache import cache_configuracion
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -15,13 +15,13 @@ def get_coeficientes_correccion(sistema):
     """
     Obtiene los coeficientes de corrección para un sistema.
     Retorna valores por defecto (m=1, b=0) si no existen configuraciones.
+    Usa la caché compartida de configuración (ver utils_cache.py).
     """
-    try:
-        coef = ConfiguracionCoeficientes.objects.get(systemId=sistema)
-        return coef.mt, coef.bt, coef.mp, coef.bp, coef.span_presion, coef.zero_presion
-    except ConfiguracionCoeficientes.DoesNotExist:
+    coef = cache_configuracion.obtener_coeficientes(sistema.pk)
+    if coef is None:
         # Valores por defecto: m=1, b=0 (no corrige), span=1, zero=0
         return 1.0, 0.0, 1.0, 0.0, 1.0, 0.0
+    return coef.mt, coef.bt, coef.mp, coef.bp, coef.span_presion, coef.zero_presion
 
 def convertir_presion_con_span(valor_crudo, span_presion):
     """
@@ -0,0 +1,458 @@
+"""
+Carga histórica (backfill) de lecturas Node-RED desde archivos CSV / NDJSON
+(comando backfill_nodered).
+
+- Los archivos se leen por lotes de registros. Cada registro se valida con el esquema
+  liviano de la ingesta (utils_validacion) y se resuelve su sistema por mac_gateway. Si
+  el archivo es de un solo medidor, la MAC puede venir por opción.
+- Coeficientes: cada lectura lleva los mt/bt/mp/bp/vol_detect_batch/time_closed_batch
+  vigentes en su created_at_iot (ver coeficientes_vigentes).
+- Escritura: COPY a una tabla temporal + INSERT ... SELECT en PostgreSQL; en otros
+  motores, executemany de un INSERT ... SELECT por lectura.
+- Sin duplicados: se omiten las lecturas cuyo (sistema, created_at_iot) ya existe, sea
+  de la ingesta en vivo (el archivo se superpone con lo que el gateway alcanzó a enviar)
+  o de una carga anterior. Además el id se deriva de (sistema, created_at_iot), así que
+  las repetidas dentro de un mismo lote chocan en la PK.
+- Punto de control por archivo en BACKFILL_DIRECTORIO (registros y byte leídos, rango
+  cargado por sistema), guardado después de cada lote confirmado.
+- Al terminar cada lote se invalidan las respuestas cacheadas y los detalles de batch de
+  los sistemas afectados, como con los datos tardíos de la ingesta.
+"""
+import io
+import os
+import csv
+import gzip
+import json
+import time
+import uuid
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+import numpy as np
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, models, transaction
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+from _AppMonitoreoCoriolis.models import NodeRedData
+from _AppMonitoreoCoriolis.views_node_red import valores_coeficientes
+from _AppMonitoreoCoriolis.views.utils_cache import cache_configuracion
+from _AppMonitoreoCoriolis.views.utils_validacion import ValidadorLecturas
+from _AppMonitoreoCoriolis.views.utils_respuestas import invalidar_respuestas
+from _AppMonitoreoCoriolis.views.utils_detalle_batch import invalidar_detalles_batch
+
+logger = logging.getLogger(__name__)
+
+FORMATOS = ('csv', 'ndjson')
+
+# Espacio de nombres de los ids deterministas (uuid5) de las lecturas cargadas
+NAMESPACE_BACKFILL = uuid.UUID('6f1c1d1e-8a43-5b8e-9d64-2f0b7c4e9a10')
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_MICROSEGUNDO = timedelta(microseconds=1)
+
+# Coeficientes que se estampan en cada lectura (mismos de la ingesta)
+CAMPOS_COEFICIENTES = list(valores_coeficientes(None))
+
+_CAMPOS = NodeRedData._meta.concrete_fields
+
+# Una lectura por sistema e instante
+_CLAVE = ('systemId', 'created_at_iot')
+_INDICES_CLAVE = tuple(
+    [campo.name for campo in _CAMPOS].index(nombre) for nombre in _CLAVE
+)
+
+
+def formato_de(ruta):
+    """Formato por la extensión (.csv, .ndjson, .jsonl, opcionalmente .gz)."""
+    nombre = ruta[:-3] if ruta.endswith('.gz') else ruta
+    if nombre.endswith('.csv'):
+        return 'csv'
+    if nombre.endswith(('.ndjson', '.jsonl', '.json')):
+        return 'ndjson'
+    raise ValueError(f"No se reconoce el formato de {ruta} (use --formato)")
+
+
+# ----------------------------------------------------------------------
+# Puntos de control
+# ----------------------------------------------------------------------
+def _directorio():
+    return str(getattr(settings, 'BACKFILL_DIRECTORIO', 'backfill'))
+
+
+def _ruta_control(ruta):
+    clave = hashlib.sha1(os.path.abspath(ruta).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(_directorio(), f'{clave}.json')
+
+
+def _firma(ruta):
+    estado = os.stat(ruta)
+    return {'tamano': estado.st_size, 'modificado': estado.st_mtime}
+
+
+def leer_control(ruta):
+    """Punto de control del archivo, o None si no existe o el archivo cambió desde entonces."""
+    try:
+        with open(_ruta_control(ruta), encoding='utf-8') as f:
+            control = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if control.get('firma') != _firma(ruta):
+        logger.warning(f"Backfill: {ruta} cambió desde el último punto de control; se carga completo")
+        return None
+    return control
+
+
+def guardar_control(ruta, control):
+    os.makedirs(_directorio(), exist_ok=True)
+    destino = _ruta_control(ruta)
+    temporal = f'{destino}.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(control, f)
+    os.replace(temporal, destino)
+
+
+# ----------------------------------------------------------------------
+# Lectura de archivos
+# ----------------------------------------------------------------------
+class LectorArchivo:
+    """
+    Itera los registros (dict) de un archivo llevando el byte leído, para retomar la
+    lectura desde un punto de control sin recorrer lo ya cargado.
+    """
+
+    def __init__(self, ruta, formato, offset=0):
+        self.ruta = ruta
+        self.formato = formato
+        self.offset = offset
+        self.comprimido = ruta.endswith('.gz')
+        self.tamano = None if self.comprimido else os.path.getsize(ruta)
+        self._archivo = gzip.open(ruta, 'rb') if self.comprimido else open(ruta, 'rb')
+        self.encabezado = None
+        if formato == 'csv':
+            primera = self._archivo.readline()
+            self.encabezado = next(csv.reader([primera.decode('utf-8-sig')]))
+            self.offset = max(self.offset, len(primera))
+        self._archivo.seek(self.offset)
+
+    def _lineas(self):
+        for linea in self._archivo:
+            self.offset += len(linea)
+            yield linea.decode('utf-8')
+
+    def registros(self):
+        """Genera (registro, error) por cada registro del archivo."""
+        if self.formato == 'csv':
+            for fila in csv.reader(self._lineas()):
+                if not fila:
+                    continue
+                # En CSV no hay nulos: las celdas vacías son datos ausentes
+                yield {campo: (valor if valor != '' else None) for campo, valor in zip(self.encabezado, fila)}, None
+            return
+        for linea in self._lineas():
+            if not linea.strip():
+                continue
+            try:
+                registro = json.loads(linea)
+            except ValueError:
+                yield None, 'Línea JSON inválida.'
+                continue
+            yield (registro, None) if isinstance(registro, dict) else (None, 'El registro debe ser un objeto JSON.')
+
+    def progreso(self):
+        """Fracción leída del archivo (None si está comprimido)."""
+        return self.offset / self.tamano if self.tamano else None
+
+    def cerrar(self):
+        self._archivo.close()
+
+
+# ----------------------------------------------------------------------
+# Coeficientes vigentes
+# ----------------------------------------------------------------------
+def coeficientes_vigentes(sistema_id, timestamps_ms, coef_actual):
+    """
+    Coeficientes vigentes en cada instante, según los estampados en las lecturas ya
+    guardadas del sistema (la configuración se edita en el lugar y no guarda historial).
+
+    Para cada timestamp se usan los de la última lectura guardada en o antes de él; antes
+    de la primera lectura, los de la primera. Si el sistema no tiene lecturas con
+    coeficientes se usan los de la configuración actual.
+
+    Args:
+        sistema_id: UUID del sistema
+        timestamps_ms: arreglo int64 de epoch ms
+        coef_actual: ConfiguracionCoeficientes vigente (o None)
+
+    Returns:
+        {campo: lista de valores alineada con timestamps_ms}
+    """
+    desde = datetime.fromtimestamp(int(timestamps_ms.min()) / 1000, tz=dt_timezone.utc)
+    hasta = datetime.fromtimestamp(int(timestamps_ms.max()) / 1000, tz=dt_timezone.utc)
+    datos = NodeRedData.objects.filter(
+        systemId_id=sistema_id, created_at_iot__isnull=False, mt__isnull=False
+    )
+    campos = ['created_at_iot'] + CAMPOS_COEFICIENTES
+
+    filas = []
+    anterior = datos.filter(created_at_iot__lte=desde).order_by('-created_at_iot').values_list(*campos).first()
+    if anterior is not None:
+        filas.append(anterior)
+    # Solo los cambios dentro del rango (normalmente vacío: el backfill llena huecos)
+    for fila in datos.filter(created_at_iot__gt=desde, created_at_iot__lte=hasta).order_by('created_at_iot').values_list(*campos).iterator(chunk_size=5000):
+        if not filas or fila[1:] != filas[-1][1:]:
+            filas.append(fila)
+    if not filas:
+        siguiente = datos.filter(created_at_iot__gt=hasta).order_by('created_at_iot').values_list(*campos).first()
+        if siguiente is None:
+            actuales = valores_coeficientes(coef_actual)
+            return {campo: [actuales[campo]] * len(timestamps_ms) for campo in CAMPOS_COEFICIENTES}
+        filas.append(siguiente)
+
+    cambios = np.array([int(fila[0].timestamp() * 1000) for fila in filas], dtype=np.int64)
+    indices = np.clip(np.searchsorted(cambios, timestamps_ms, side='right') - 1, 0, None).tolist()
+    return {
+        campo: [filas[i][posicion] for i in indices]
+        for posicion, campo in enumerate(CAMPOS_COEFICIENTES, start=1)
+    }
+
+
+# ----------------------------------------------------------------------
+# Escritura
+# ----------------------------------------------------------------------
+def _filas_db(lecturas):
+    """Tuplas con los valores de base de datos de cada lectura (dict por attname)."""
+    conexion = connections[DEFAULT_DB_ALIAS]
+    # Los FloatField ya vienen como float / None del validador: solo se preparan los demás
+    preparar = [
+        (campo.attname, None if isinstance(campo, models.FloatField) else campo)
+        for campo in _CAMPOS
+    ]
+    return [
+        tuple(
+            lectura.get(nombre) if campo is None else campo.get_db_prep_save(lectura.get(nombre), conexion)
+            for nombre, campo in preparar
+        )
+        for lectura in lecturas
+    ]
+
+
+def _columnas_clave():
+    """Columnas (sistema, created_at_iot) que identifican una lectura, ya citadas."""
+    return tuple(connection.ops.quote_name(NodeRedData._meta.get_field(nombre).column) for nombre in _CLAVE)
+
+
+def _copy_postgres(cursor, tabla, columnas, lecturas):
+    temporal = connection.ops.quote_name(f'backfill_{uuid.uuid4().hex[:12]}')
+    cursor.execute(f'CREATE TEMP TABLE {temporal} (LIKE {tabla} INCLUDING DEFAULTS) ON COMMIT DROP')
+
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    for fila in _filas_db(lecturas):
+        escritor.writerow(['\\N' if valor is None else valor for valor in fila])
+    buffer.seek(0)
+    sql_copy = f"COPY {temporal} ({columnas}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    crudo = cursor.cursor
+    if hasattr(crudo, 'copy_expert'):
+        crudo.copy_expert(sql_copy, buffer)  # psycopg2
+    else:
+        with crudo.copy(sql_copy) as copia:  # psycopg 3
+            copia.write(buffer.getvalue())
+
+    sistema, fecha = _columnas_clave()
+    cursor.execute(
+        f'INSERT INTO {tabla} ({columnas}) SELECT {columnas} FROM {temporal} AS nueva '
+        f'WHERE NOT EXISTS (SELECT 1 FROM {tabla} AS existente '
+        f'WHERE existente.{sistema} = nueva.{sistema} AND existente.{fecha} = nueva.{fecha}) '
+        f'ON CONFLICT DO NOTHING'
+    )
+    return cursor.rowcount
+
+
+def _insertar_generico(cursor, tabla, columnas, lecturas):
+    ops = connection.ops
+    marcadores = ', '.join(['%s'] * len(_CAMPOS))
+    sufijo = ops.on_conflict_suffix_sql(_CAMPOS, OnConflict.IGNORE, None, None)
+    sistema, fecha = _columnas_clave()
+    sql = (
+        f'{ops.insert_statement(on_conflict=OnConflict.IGNORE)} {tabla} ({columnas}) SELECT {marcadores} '
+        f'WHERE NOT EXISTS (SELECT 1 FROM {tabla} WHERE {sistema} = %s AND {fecha} = %s) {sufijo}'
+    )
+    i_sistema, i_fecha = _INDICES_CLAVE
+    cursor.executemany(sql, [fila + (fila[i_sistema], fila[i_fecha]) for fila in _filas_db(lecturas)])
+    return cursor.rowcount
+
+
+def escribir_lecturas(lecturas):
+    """
+    Inserta las lecturas (dict de valores por attname de NodeRedData) omitiendo las que
+    ya existen (mismo sistema y created_at_iot, o mismo id).
+
+    Returns:
+        Cantidad de lecturas nuevas
+    """
+    tabla = connection.ops.quote_name(NodeRedData._meta.db_table)
+    columnas = ', '.join(connection.ops.quote_name(campo.column) for campo in _CAMPOS)
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            return _copy_postgres(cursor, tabla, columnas, lecturas)
+        return _insertar_generico(cursor, tabla, columnas, lecturas)
+
+
+# ----------------------------------------------------------------------
+# Carga de un archivo
+# ----------------------------------------------------------------------
+def _construir(registros, mac_defecto, validador, creado):
+    """
+    Valida un lote de registros y arma las lecturas con sus coeficientes vigentes.
+
+    Returns:
+        (lecturas, rangos, rechazados, errores de muestra): cada lectura es un dict de
+        valores por attname de NodeRedData, listo para escribir_lecturas(); rangos es
+        {sistema_id: (min_ms, max_ms)}
+    """
+    rechazados = 0
+    errores = []
+
+    def rechazar(error):
+        nonlocal rechazados
+        rechazados += 1
+        if len(errores) < 5:
+            errores.append(error)
+
+    macs = {r.get('mac_gateway') or mac_defecto for r in registros if r is not None}
+    sistemas = cache_configuracion.obtener_sistemas_por_mac(macs)
+
+    por_sistema = {}
+    for registro in registros:
+        if registro is None:
+            rechazar('Registro inválido.')
+            continue
+        mac = registro.get('mac_gateway') or mac_defecto
+        sistema = sistemas.get(mac)
+        if sistema is None:
+            rechazar(f'mac_gateway no registrado: {mac}')
+            continue
+        valores, errores_campo = validador.validar(registro)
+        if not errores_campo and valores.get('created_at_iot') is None:
+            errores_campo = {'created_at_iot': ['Requerido para la carga histórica.']}
+        if errores_campo:
+            rechazar(errores_campo)
+            continue
+        valores['mac_gateway'] = mac
+        por_sistema.setdefault(sistema, []).append(valores)
+
+    coeficientes = cache_configuracion.obtener_coeficientes_de([sistema.id for sistema in por_sistema])
+    resultado = []
+    rangos = {}
+    for sistema, lecturas in por_sistema.items():
+        timestamps = np.array(
+            [int(valores['created_at_iot'].timestamp() * 1000) for valores in lecturas], dtype=np.int64
+        )
+        vigentes = coeficientes_vigentes(sistema.id, timestamps, coeficientes.get(sistema.id))
+        rangos[str(sistema.id)] = (int(timestamps.min()), int(timestamps.max()))
+        prefijo = f'{sistema.id}:'
+        for indice, valores in enumerate(lecturas):
+            for campo in CAMPOS_COEFICIENTES:
+                valores[campo] = vigentes[campo][indice]
+            # Id determinista: la misma lectura (sistema, created_at_iot) siempre produce el
+            # mismo id. Con la precisión completa (µs): la tabla particionada solo es única
+            # en (id, created_at_iot) y dos lecturas del mismo ms no deben compartir id
+            microsegundos = (valores['created_at_iot'] - _EPOCH) // _MICROSEGUNDO
+            valores['id'] = uuid.uuid5(NAMESPACE_BACKFILL, f'{prefijo}{microsegundos}')
+            valores['systemId_id'] = sistema.id
+            valores['created_at'] = creado
+            resultado.append(valores)
+    return resultado, rangos, rechazados, errores
+
+
+def cargar_archivo(ruta, formato=None, mac=None, lote=20000, reiniciar=False, reportar=None):
+    """
+    Carga un archivo retomando desde su punto de control.
+
+    Args:
+        ruta: archivo CSV / NDJSON (opcionalmente .gz)
+        formato: 'csv' o 'ndjson' (por defecto según la extensión)
+        mac: mac_gateway de los registros que no la traen
+        lote: registros por transacción
+        reiniciar: ignorar el punto de control
+        reportar: función(texto) para el progreso
+
+    Returns:
+        dict con ruta, registros, insertados, rechazados, errores (muestra) y rangos
+        {sistema_id: [min_ms, max_ms]} de todo lo cargado del archivo
+    """
+    formato = formato or formato_de(ruta)
+    validador = ValidadorLecturas()
+    control = None if reiniciar else leer_control(ruta)
+    if control and control.get('completo'):
+        if reportar:
+            reportar(f"{ruta}: ya cargado ({control['insertados']} lecturas nuevas); use --reiniciar para recargar")
+        return dict(control, ruta=ruta, omitido=True)
+    control = control or {
+        'ruta': os.path.abspath(ruta), 'firma': _firma(ruta), 'offset': 0, 'registros': 0,
+        'insertados': 0, 'rechazados': 0, 'errores': [], 'rangos': {}, 'completo': False,
+    }
+
+    lector = LectorArchivo(ruta, formato, control['offset'])
+    inicio = time.monotonic()
+    registros_sesion = 0
+
+    def procesar(registros):
+        nonlocal registros_sesion
+        lecturas, rangos, rechazados, errores = _construir(registros, mac, validador, timezone.now())
+        insertados = escribir_lecturas(lecturas) if lecturas else 0
+
+        for clave, (menor, mayor) in rangos.items():
+            anterior = control['rangos'].get(clave, [menor, mayor])
+            control['rangos'][clave] = [min(anterior[0], menor), max(anterior[1], mayor)]
+            invalidar_respuestas(clave)
+            invalidar_detalles_batch(
+                clave,
+                datetime.fromtimestamp(menor / 1000, tz=dt_timezone.utc),
+                datetime.fromtimestamp(mayor / 1000, tz=dt_timezone.utc)
+            )
+
+        control['offset'] = lector.offset
+        control['registros'] += len(registros)
+        control['insertados'] += insertados
+        control['rechazados'] += rechazados
+        control['errores'] = (control['errores'] + errores)[:5]
+        guardar_control(ruta, control)
+
+        registros_sesion += len(registros)
+        if reportar:
+            fraccion = lector.progreso()
+            velocidad = registros_sesion / max(time.monotonic() - inicio, 1e-6)
+            reportar(
+                f"{ruta}: {control['registros']} registros"
+                f"{f' ({fraccion * 100:.0f}%)' if fraccion is not None else ''}, "
+                f"{control['insertados']} nuevos, {control['rechazados']} rechazados, {velocidad:.0f} reg/s"
+            )
+
+    try:
+        pendientes = []
+        for registro, error in lector.registros():
+            pendientes.append(registro if error is None else None)
+            if len(pendientes) >= lote:
+                procesar(pendientes)
+                pendientes = []
+        if pendientes:
+            procesar(pendientes)
+    finally:
+        lector.cerrar()
+
+    control['completo'] = True
+    guardar_control(ruta, control)
+    return dict(control, ruta=ruta)
+
+
+def cargar_en_proceso(argumentos, reportar=None):
+    """
+    Trabajo de un proceso del pool (ver utils_procesos): nunca propaga errores para no
+    cortar los demás archivos. Sin `reportar`, el progreso va al log.
+    """
+    ruta, opciones = argumentos
+    try:
+        return cargar_archivo(ruta, reportar=reportar or logger.info, **opciones)
+    except Exception as e:
+        logger.error(f"Backfill: error cargando {ruta}: {str(e)}", exc_info=True)
+        return {'ruta': ruta, 'error': str(e)}
@@ -0,0 +1,678 @@
+"""
+Detección incremental de batches.
+
+Misma lógica de perfil dinámico que DetectarBatchesCommandView._detectar_batches_con_perfil_dinamico,
+pero como máquina de estados que avanza registro a registro y cuyo estado (batch abierto,
+contador de tiempo en cero, punto de referencia, perfil capturado y acumulados de los
+promedios) se persiste por sistema en DetectorBatchEstado. Así los batches se cierran a
+medida que llegan los datos (comando `detectar_batches` o gancho de ingesta) y la consulta
+bajo demanda se reduce a leer BatchDetectado.
+
+Las lecturas que se confirman con created_at_iot no posterior a la marca de agua
+(workers de ingesta que confirman fuera de orden, escritura diferida, gateways
+atrasados) dejan en DetectorBatchEstado.pendiente_desde la más antigua
+(registrar_lecturas_tardias_detector); la siguiente pasada re-escanea desde el cierre
+de un batch anterior (ver _punto_de_reinicio) y, mientras tanto, detector_cubre_rango() no da el rango por
+cubierto.
+
+detectar_batches_vectorizado() es el kernel NumPy equivalente para la detección bajo
+demanda sobre un rango completo.
+"""
+import hashlib
+import logging
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from _AppMonitoreoCoriolis.models import NodeRedData, BatchDetectado, DetectorBatchEstado
+from _AppMonitoreoCoriolis.views.utils import COLOMBIA_TZ
+from _AppMonitoreoCoriolis.views.utils_cache import cache_configuracion
+from _AppMonitoreoCoriolis.views.utils_respuestas import invalidar_respuestas
+from UTIL_LIB.conversiones import lb_s_a_kg_min, lb_a_kg, cm3_a_gal
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_UN_US = timedelta(microseconds=1)
+_US_POR_DIA = 86_400_000_000
+
+ResultadoGuardado = namedtuple('ResultadoGuardado', ['nuevos', 'existentes', 'batches'])
+
+# Columnas de NodeRedData que necesita el detector, en el orden en que se leen
+CAMPOS_DETECTOR = (
+    'created_at_iot',
+    'mass_rate',
+    'total_mass',
+    'total_volume',
+    'vol_detect_batch',
+    'time_closed_batch',
+    'coriolis_temperature',
+    'density',
+    'pressure_out',
+)
+
+
+def generar_hash_batch(fecha_inicio, fecha_fin, sistema_id, vol_minimo, time_finished_batch):
+    """
+    Hash único del batch (sistema, rango y perfil usado). Es la clave con la que se
+    evitan duplicados en BatchDetectado, tanto bajo demanda como en modo continuo.
+    """
+    fecha_inicio_str = fecha_inicio.strftime('%Y-%m-%d %H:%M:%S')
+    fecha_fin_str = fecha_fin.strftime('%Y-%m-%d %H:%M:%S')
+    datos_hash = f"{sistema_id}_{fecha_inicio_str}_{fecha_fin_str}_{vol_minimo}_{time_finished_batch}"
+    return hashlib.sha256(datos_hash.encode('utf-8')).hexdigest()
+
+
+def _fecha_colombia(fecha):
+    return fecha.astimezone(COLOMBIA_TZ).date()
+
+
+def _acumulado_vacio():
+    # [suma, cantidad] por variable; la suma parte de 0 igual que sum() sobre la lista
+    return {'n': 0, 'temp': [0, 0], 'dens': [0, 0], 'pres': [0, 0]}
+
+
+def _acumular(acumulado, temperatura, densidad, presion):
+    acumulado['n'] += 1
+    for clave, valor in (('temp', temperatura), ('dens', densidad), ('pres', presion)):
+        if valor is not None:
+            acumulado[clave][0] += valor
+            acumulado[clave][1] += 1
+
+
+def _punto_a_json(punto):
+    return None if punto is None else [punto[0].isoformat(), punto[1], punto[2]]
+
+
+def _punto_de_json(valor):
+    return None if valor is None else (datetime.fromisoformat(valor[0]), valor[1], valor[2])
+
+
+class DetectorBatches:
+    """
+    Máquina de estados del detector de batches con perfil dinámico.
+
+    procesar(fila) recibe una tupla con CAMPOS_DETECTOR (en orden cronológico) y retorna
+    el batch cerrado por esa fila (dict con las mismas claves que produce la detección
+    bajo demanda) o None. Los puntos de referencia se guardan como (fecha, total_mass,
+    total_volume) y los promedios como sumas parciales, de modo que el estado es pequeño
+    y serializable sin importar la duración del batch.
+    """
+
+    def __init__(self, estado=None):
+        estado = estado or {}
+        self.en_batch = estado.get('en_batch', False)
+        self.primer_dato = _punto_de_json(estado.get('primer_dato'))
+        self.punto_anterior = _punto_de_json(estado.get('punto_anterior'))
+        self.ultimo_dato_con_flujo = _punto_de_json(estado.get('ultimo_dato_con_flujo'))
+        # Último dato del batch con la misma fecha (Colombia) que primer_dato
+        self.ultimo_dato_dia_inicio = _punto_de_json(estado.get('ultimo_dato_dia_inicio'))
+        tiempo_cero = estado.get('tiempo_cero_inicio')
+        self.tiempo_cero_inicio = datetime.fromisoformat(tiempo_cero) if tiempo_cero else None
+        self.vol_minimo_batch = estado.get('vol_minimo_batch')
+        self.time_finished_batch_actual = estado.get('time_finished_batch_actual')
+        # Acumulados de todos los datos del batch y solo de los del día de inicio (cierre por medianoche)
+        self.acumulado = estado.get('acumulado') or _acumulado_vacio()
+        self.acumulado_dia_inicio = estado.get('acumulado_dia_inicio') or _acumulado_vacio()
+
+    def a_json(self):
+        return {
+            'en_batch': self.en_batch,
+            'primer_dato': _punto_a_json(self.primer_dato),
+            'punto_anterior': _punto_a_json(self.punto_anterior),
+            'ultimo_dato_con_flujo': _punto_a_json(self.ultimo_dato_con_flujo),
+            'ultimo_dato_dia_inicio': _punto_a_json(self.ultimo_dato_dia_inicio),
+            'tiempo_cero_inicio': self.tiempo_cero_inicio.isoformat() if self.tiempo_cero_inicio else None,
+            'vol_minimo_batch': self.vol_minimo_batch,
+            'time_finished_batch_actual': self.time_finished_batch_actual,
+            'acumulado': self.acumulado,
+            'acumulado_dia_inicio': self.acumulado_dia_inicio,
+        }
+
+    def _reiniciar(self):
+        self.en_batch = False
+        self.primer_dato = None
+        self.ultimo_dato_con_flujo = None
+        self.ultimo_dato_dia_inicio = None
+        self.tiempo_cero_inicio = None
+        self.vol_minimo_batch = None
+        self.time_finished_batch_actual = None
+        self.acumulado = _acumulado_vacio()
+        self.acumulado_dia_inicio = _acumulado_vacio()
+
+    def _agregar_al_batch(self, punto, temperatura, densidad, presion):
+        _acumular(self.acumulado, temperatura, densidad, presion)
+        if _fecha_colombia(punto[0]) == _fecha_colombia(self.primer_dato[0]):
+            _acumular(self.acumulado_dia_inicio, temperatura, densidad, presion)
+            self.ultimo_dato_dia_inicio = punto
+        self.ultimo_dato_con_flujo = punto
+
+    def _cerrar(self, ultimo_dato, fecha_fin, acumulado):
+        """Batch entre primer_dato y ultimo_dato, o None si no alcanza el volumen mínimo."""
+        diferencia_masa_kg = lb_a_kg(ultimo_dato[1] - self.primer_dato[1])
+        if diferencia_masa_kg < self.vol_minimo_batch:
+            logger.debug(
+                f"Batch descartado en {self.primer_dato[0]}: {diferencia_masa_kg:.2f} kg < {self.vol_minimo_batch} kg"
+            )
+            return None
+
+        suma_temp, n_temp = acumulado['temp']
+        suma_dens, n_dens = acumulado['dens']
+        suma_pres, n_pres = acumulado['pres']
+        return {
+            'fecha_inicio': self.primer_dato[0],
+            'fecha_fin': fecha_fin,
+            'vol_total': cm3_a_gal(ultimo_dato[2] - self.primer_dato[2]),
+            'mass_total': diferencia_masa_kg,
+            'temperatura_coriolis_prom': suma_temp / n_temp if n_temp else 0,
+            'densidad_prom': suma_dens / n_dens if n_dens else 0,
+            'pressure_out_prom': suma_pres / n_pres if n_pres else None,
+            'duracion_minutos': (fecha_fin - self.primer_dato[0]).total_seconds() / 60,
+            'total_registros': acumulado['n'],
+            'vol_minimo_usado': self.vol_minimo_batch,
+            'time_finished_usado': self.time_finished_batch_actual
+        }
+
+    def procesar(self, fila):
+        (fecha, mass_rate, total_mass, total_volume, vol_detect, time_closed,
+         temperatura, densidad, presion) = fila
+
+        if mass_rate is None or total_mass is None or total_volume is None:
+            return None
+
+        punto = (fecha, total_mass, total_volume)
+
+        if lb_s_a_kg_min(mass_rate) > 0:
+            if not self.en_batch:
+                # Capturar el perfil del primer dato; sin perfil el dato se ignora
+                if vol_detect is None or time_closed is None:
+                    logger.warning(f"⚠️ Dato sin perfil válido en {fecha} - IGNORANDO")
+                    return None
+                self.vol_minimo_batch = vol_detect
+                self.time_finished_batch_actual = time_closed
+                self.en_batch = True
+                self.tiempo_cero_inicio = None
+                # Referencia: último punto con flujo = 0, o el propio dato
+                self.primer_dato = self.punto_anterior if self.punto_anterior is not None else punto
+                self._agregar_al_batch(punto, temperatura, densidad, presion)
+                return None
+
+            if _fecha_colombia(fecha) != _fecha_colombia(self.primer_dato[0]):
+                # Cruce de medianoche: cerrar lo del día de inicio y esperar un nuevo flanco
+                batch = None
+                if self.ultimo_dato_dia_inicio is not None:
+                    batch = self._cerrar(
+                        self.ultimo_dato_dia_inicio, self.ultimo_dato_dia_inicio[0], self.acumulado_dia_inicio
+                    )
+                self._reiniciar()
+                return batch
+
+            self._agregar_al_batch(punto, temperatura, densidad, presion)
+            self.tiempo_cero_inicio = None
+            return None
+
+        batch = None
+        if self.en_batch:
+            if self.tiempo_cero_inicio is None:
+                self.tiempo_cero_inicio = fecha
+            elif (fecha - self.tiempo_cero_inicio).total_seconds() / 60 >= self.time_finished_batch_actual:
+                batch = self._cerrar(self.ultimo_dato_con_flujo, self.tiempo_cero_inicio, self.acumulado)
+                self._reiniciar()
+        else:
+            self.tiempo_cero_inicio = None
+
+        # Todo punto sin flujo es candidato a referencia del próximo batch
+        self.punto_anterior = punto
+        return batch
+
+
+def detectar_batches_vectorizado(filas):
+    """
+    Kernel NumPy de la detección bajo demanda: produce exactamente los mismos batches que
+    DetectarBatchesCommandView._detectar_batches_con_perfil_dinamico sobre las mismas filas.
+
+    En lugar de recorrer fila a fila, salta de evento en evento con búsquedas binarias
+    sobre arreglos precalculados:
+    - inicio: siguiente fila con flujo y perfil válido; la referencia es el último punto
+      sin flujo anterior (o la propia fila).
+    - cierre por tiempo: primera fila de una racha sin flujo cuyo tiempo desde el inicio
+      de la racha alcanza time_closed_batch (se precalcula una vez por perfil).
+    - cierre por medianoche: primera fila con flujo de un día (Colombia) distinto al de
+      la referencia.
+    Los promedios se calculan con sum() sobre las mismas listas que el algoritmo original
+    para conservar el mismo redondeo.
+
+    Args:
+        filas: secuencia de tuplas con CAMPOS_DETECTOR ordenadas por created_at_iot
+
+    Returns:
+        Lista de dicts de batch (mismas claves que la detección bajo demanda).
+    """
+    total = len(filas)
+    if total == 0:
+        return []
+
+    columnas = list(zip(*filas))
+    # Se ignoran las filas sin mass_rate, total_mass o total_volume
+    presentes = np.ones(total, dtype=bool)
+    for valores in columnas[1:4]:
+        presentes &= np.fromiter((v is not None for v in valores), dtype=bool, count=total)
+    posiciones = np.flatnonzero(presentes).tolist()
+    n = len(posiciones)
+    if n == 0:
+        return []
+
+    def columna(k):
+        # None -> NaN
+        return np.array([columnas[k][p] for p in posiciones], dtype=np.float64)
+
+    fechas = [columnas[0][p] for p in posiciones]
+    vol_detect = [columnas[4][p] for p in posiciones]
+    time_closed = [columnas[5][p] for p in posiciones]
+    total_mass = [columnas[2][p] for p in posiciones]
+    total_volume = [columnas[3][p] for p in posiciones]
+    temperaturas = columna(6)
+    densidades = columna(7)
+    presiones = columna(8)
+
+    indices = np.arange(n)
+    t_us = np.fromiter(((f - _EPOCH) // _UN_US for f in fechas), dtype=np.int64, count=n)
+    # Misma operación que lb_s_a_kg_min(mass_rate) > 0
+    flujo = columna(1) * 0.453592 * 60 > 0
+    cero = ~flujo
+    perfil_valido = np.fromiter(
+        (v is not None and w is not None for v, w in zip(vol_detect, time_closed)), dtype=bool, count=n
+    )
+
+    # Colombia no tiene horario de verano: día local = (t + desplazamiento) // 1 día
+    desplazamiento_us = int(COLOMBIA_TZ.utcoffset(fechas[0].replace(tzinfo=None)).total_seconds()) * 1_000_000
+    dia = (t_us + desplazamiento_us) // _US_POR_DIA
+
+    # Último punto sin flujo estrictamente anterior a cada fila (-1 si no hay)
+    ultimo_cero = np.maximum.accumulate(np.where(cero, indices, -1))
+    cero_anterior = np.concatenate(([-1], ultimo_cero[:-1]))
+
+    # Inicio de la racha sin flujo de cada fila y minutos transcurridos desde él
+    inicio_racha = np.maximum.accumulate(
+        np.where(cero & ~np.concatenate(([False], cero[:-1])), indices, 0)
+    )
+    minutos_en_cero = ((t_us - t_us[inicio_racha]) / 1e6) / 60
+    # El primer punto de la racha solo arranca el contador; el cierre se evalúa desde el segundo
+    evaluables = cero & (indices != inicio_racha)
+    cierres_por_perfil = {}
+
+    filas_flujo = np.flatnonzero(flujo)
+    inicios = np.flatnonzero(flujo & perfil_valido)
+
+    def flujo_entre(desde, hasta):
+        return filas_flujo[np.searchsorted(filas_flujo, desde):np.searchsorted(filas_flujo, hasta)]
+
+    def cerrar(primero, ultimo, fecha_fin, filas_batch, vol_minimo, time_finished):
+        diferencia_masa_kg = lb_a_kg(total_mass[ultimo] - total_mass[primero])
+        if diferencia_masa_kg < vol_minimo:
+            return None
+
+        def promedio(valores, vacio):
+            valores = valores[filas_batch]
+            valores = valores[~np.isnan(valores)].tolist()
+            return sum(valores) / len(valores) if valores else vacio
+
+        return {
+            'fecha_inicio': fechas[primero],
+            'fecha_fin': fecha_fin,
+            'vol_total': cm3_a_gal(total_volume[ultimo] - total_volume[primero]),
+            'mass_total': diferencia_masa_kg,
+            'temperatura_coriolis_prom': promedio(temperaturas, 0),
+            'densidad_prom': promedio(densidades, 0),
+            'pressure_out_prom': promedio(presiones, None),
+            'duracion_minutos': (fecha_fin - fechas[primero]).total_seconds() / 60,
+            'total_registros': len(filas_batch),
+            'vol_minimo_usado': vol_minimo,
+            'time_finished_usado': time_finished
+        }
+
+    batches = []
+    actual = 0
+    while True:
+        siguiente = np.searchsorted(inicios, actual)
+        if siguiente == len(inicios):
+            break
+        j = int(inicios[siguiente])
+        primero = int(cero_anterior[j]) if cero_anterior[j] >= 0 else j
+        vol_minimo = vol_detect[j]
+        time_finished = time_closed[j]
+        dia_inicio = dia[primero]
+
+        # Primera fila con flujo de otro día, posterior al inicio
+        desde = max(j + 1, int(np.searchsorted(dia, dia_inicio, side='right')))
+        k = np.searchsorted(filas_flujo, desde)
+        fila_medianoche = int(filas_flujo[k]) if k < len(filas_flujo) else n
+
+        # Primera fila que cumple el tiempo de cierre, posterior al inicio
+        if time_finished not in cierres_por_perfil:
+            cierres_por_perfil[time_finished] = np.flatnonzero(evaluables & (minutos_en_cero >= time_finished))
+        cierres = cierres_por_perfil[time_finished]
+        k = np.searchsorted(cierres, j + 1)
+        fila_cierre = int(cierres[k]) if k < len(cierres) else n
+
+        if fila_cierre < fila_medianoche:
+            # Cierre por tiempo en cero: fin = inicio de la racha sin flujo
+            inicio_cero = int(inicio_racha[fila_cierre])
+            filas_batch = flujo_entre(j, inicio_cero)
+            batch = cerrar(primero, int(filas_batch[-1]), fechas[inicio_cero], filas_batch, vol_minimo, time_finished)
+            actual = fila_cierre + 1
+        elif fila_medianoche < n:
+            # Cruce de medianoche: se reporta lo del día de la referencia
+            filas_batch = flujo_entre(j, fila_medianoche)
+            filas_batch = filas_batch[dia[filas_batch] == dia_inicio]
+            batch = None
+            if len(filas_batch):
+                ultimo = int(filas_batch[-1])
+                batch = cerrar(primero, ultimo, fechas[ultimo], filas_batch, vol_minimo, time_finished)
+            actual = fila_medianoche + 1
+        else:
+            # Batch abierto al final del rango: el original solo lo cierra si su último
+            # dato es de otro día que la referencia (el último dato siempre tiene flujo)
+            filas_batch = flujo_entre(j, n)
+            ultimo = int(filas_batch[-1])
+            if dia[ultimo] != dia_inicio:
+                batch = cerrar(primero, ultimo, fechas[ultimo], filas_batch, vol_minimo, time_finished)
+                if batch is not None:
+                    batches.append(batch)
+            break
+
+        if batch is not None:
+            batches.append(batch)
+
+    return batches
+
+
+def guardar_batches(sistema, batches_data, lim_inf, lim_sup, fecha_inicio=None, fecha_fin=None):
+    """
+    Persiste en bloque los batches detectados: calcula todos los hashes, busca los
+    existentes en una sola consulta e inserta los nuevos con bulk_create(ignore_conflicts),
+    de modo que una inserción concurrente del mismo batch no falla.
+
+    Los insertados se releen por hash, así que los batches retornados tienen siempre el
+    id guardado y una inserción perdida frente a otro proceso cuenta como existente.
+
+    Si se indica el rango, la misma consulta trae también los batches ya guardados del
+    sistema dentro de él (p. ej. detectados con otro perfil), para armar la respuesta sin
+    volver a consultar.
+
+    Returns:
+        ResultadoGuardado(nuevos, existentes, batches): cantidad de batches nuevos y ya
+        existentes entre los detectados, y los BatchDetectado del rango (o de los
+        detectados, sin rango) ordenados por fecha_inicio descendente.
+    """
+    por_hash = {}
+    for batch_data in batches_data:
+        hash_batch = generar_hash_batch(
+            batch_data['fecha_inicio'],
+            batch_data['fecha_fin'],
+            sistema.id,
+            batch_data['vol_minimo_usado'],
+            batch_data['time_finished_usado']
+        )
+        por_hash[hash_batch] = BatchDetectado(
+            systemId=sistema,
+            fecha_inicio=batch_data['fecha_inicio'],
+            fecha_fin=batch_data['fecha_fin'],
+            vol_total=batch_data['vol_total'],
+            mass_total=batch_data['mass_total'],
+            temperatura_coriolis_prom=batch_data['temperatura_coriolis_prom'],
+            densidad_prom=batch_data['densidad_prom'],
+            pressure_out_prom=batch_data.get('pressure_out_prom'),
+            hash_identificacion=hash_batch,
+            perfil_lim_inf_caudal=lim_inf,
+            perfil_lim_sup_caudal=lim_sup,
+            perfil_vol_minimo=batch_data['vol_minimo_usado'],
+            duracion_minutos=batch_data['duracion_minutos'],
+            total_registros=batch_data['total_registros'],
+            time_finished_batch=batch_data['time_finished_usado']
+        )
+
+    en_rango = fecha_inicio is not None and fecha_fin is not None
+    consulta = Q(hash_identificacion__in=list(por_hash))
+    if en_rango:
+        consulta |= Q(systemId=sistema, fecha_inicio__gte=fecha_inicio, fecha_fin__lte=fecha_fin)
+    encontrados = list(BatchDetectado.objects.filter(consulta)) if por_hash or en_rango else []
+
+    hashes_existentes = {batch.hash_identificacion for batch in encontrados}
+    candidatos = [batch for hash_batch, batch in por_hash.items() if hash_batch not in hashes_existentes]
+    nuevos = []
+    if candidatos:
+        BatchDetectado.objects.bulk_create(candidatos, batch_size=500, ignore_conflicts=True)
+        # Con ignore_conflicts se omiten en silencio los que otro proceso insertó entre la
+        # consulta y el insert: se releen por hash y solo son nuevos los que conservan el
+        # id generado aquí; los demás cuentan como existentes (con el id guardado)
+        ids_propios = {batch.pk for batch in candidatos}
+        for batch in BatchDetectado.objects.filter(hash_identificacion__in=[b.hash_identificacion for b in candidatos]):
+            (nuevos if batch.pk in ids_propios else encontrados).append(batch)
+        if nuevos:
+            # bulk_create no emite post_save: invalidar aquí las respuestas cacheadas
+            transaction.on_commit(lambda: invalidar_respuestas(sistema.id))
+
+    batches = encontrados + nuevos
+    if en_rango:
+        batches = [
+            batch for batch in batches
+            if batch.systemId_id == sistema.id and fecha_inicio <= batch.fecha_inicio and batch.fecha_fin <= fecha_fin
+        ]
+    batches.sort(key=lambda batch: batch.fecha_inicio, reverse=True)
+
+    return ResultadoGuardado(len(nuevos), len(por_hash) - len(nuevos), batches)
+
+
+def _filas_siguientes(sistema, estado, desde, lote):
+    """
+    Siguiente lote de filas sin procesar y si el lote quedó lleno. En un lote lleno se
+    recortan las filas del último instante, para no partir entre lotes registros con el
+    mismo created_at_iot.
+    """
+    datos = NodeRedData.objects.filter(systemId=sistema, created_at_iot__isnull=False)
+    if estado.procesado_hasta is not None:
+        datos = datos.filter(created_at_iot__gt=estado.procesado_hasta)
+    elif desde is not None:
+        datos = datos.filter(created_at_iot__gte=desde)
+
+    filas = list(datos.order_by('created_at_iot').values_list(*CAMPOS_DETECTOR)[:lote])
+    lleno = len(filas) == lote
+    if lleno:
+        ultimo = filas[-1][0]
+        recortadas = [fila for fila in filas if fila[0] < ultimo]
+        if recortadas:
+            filas = recortadas
+    return filas, lleno
+
+
+def _punto_de_reinicio(sistema, estado):
+    """
+    Instante desde el cual re-escanear, con el detector vacío, para incluir las lecturas
+    pendientes y obtener lo mismo que un recorrido continuo.
+
+    Tras el cierre normal de un batch (fecha_fin + time_finished_batch minutos sin flujo)
+    el detector queda sin batch abierto y con la fila de cierre como referencia, igual que
+    si arrancara vacío en esa fila. Se usa el último batch guardado cerrado así antes de
+    pendiente_desde; sin ninguno, se re-escanea desde procesado_desde.
+    """
+    pendiente = estado.pendiente_desde
+    if estado.procesado_desde is None or pendiente <= estado.procesado_desde:
+        return estado.procesado_desde or pendiente
+
+    candidatos = BatchDetectado.objects.filter(
+        systemId=sistema, fecha_fin__gte=estado.procesado_desde, fecha_fin__lt=pendiente
+    ).order_by('-fecha_fin').values_list('fecha_fin', 'time_finished_batch')[:5]
+    datos = NodeRedData.objects.filter(systemId=sistema)
+    for fecha_fin, time_finished in candidatos:
+        # En un cierre por medianoche fecha_fin es una lectura con flujo: no sirve de referencia
+        if not datos.filter(created_at_iot=fecha_fin, mass_rate__lte=0).exists():
+            continue
+        cierre = datos.filter(
+            created_at_iot__gte=fecha_fin + timedelta(minutes=time_finished or 0)
+        ).order_by('created_at_iot').values_list('created_at_iot', flat=True).first()
+        if cierre is not None and cierre < pendiente:
+            return cierre
+    return estado.procesado_desde
+
+
+def avanzar_detector(sistema, desde=None):
+    """
+    Avanza el detector incremental de un sistema con los datos nuevos.
+
+    Args:
+        sistema: instancia de Sistema
+        desde: fecha (aware) desde la cual reiniciar la detección descartando el estado
+            guardado. Por defecto se continúa desde la marca de agua (o desde el primer
+            dato si el sistema nunca se ha procesado). Si hay lecturas pendientes detrás
+            de la marca de agua se re-escanea desde un punto anterior a ellas.
+
+    Returns:
+        (registros procesados, batches nuevos). (0, 0) si otro proceso está avanzando
+        el mismo sistema.
+    """
+    config = cache_configuracion.obtener_coeficientes(sistema.id)
+    if config is None:
+        logger.warning(f"Detector de batches: {sistema.tag} no tiene configuración de límites")
+        return 0, 0
+
+    lote = getattr(settings, 'BATCH_DETECTOR_LOTE', 20000)
+    estado_obj, _ = DetectorBatchEstado.objects.get_or_create(systemId=sistema)
+    total_procesados = 0
+    total_nuevos = 0
+    procesado_hasta = estado_obj.procesado_hasta
+
+    while True:
+        with transaction.atomic():
+            # skip_locked: si otro worker ya avanza este sistema, él procesará estas filas
+            estado = DetectorBatchEstado.objects.select_for_update(skip_locked=True).filter(pk=estado_obj.pk).first()
+            if estado is None:
+                return total_procesados, total_nuevos
+
+            reanudar = desde
+            if reanudar is None and estado.pendiente_desde is not None:
+                reanudar = _punto_de_reinicio(sistema, estado)
+                logger.info(
+                    f"Detector de batches {sistema.tag}: lecturas desde {estado.pendiente_desde}, "
+                    f"re-escaneando desde {reanudar}"
+                )
+            if reanudar is not None:
+                estado.estado = {}
+                if desde is not None or estado.procesado_desde is None:
+                    estado.procesado_desde = reanudar
+                else:
+                    # Lo anterior a reanudar ya está procesado
+                    estado.procesado_desde = min(estado.procesado_desde, reanudar)
+                estado.procesado_hasta = None
+                estado.pendiente_desde = None
+
+            filas, lleno = _filas_siguientes(sistema, estado, reanudar, lote)
+            if not filas:
+                if reanudar is not None:
+                    estado.save(update_fields=[
+                        'estado', 'procesado_desde', 'procesado_hasta', 'pendiente_desde', 'actualizado_en'
+                    ])
+                break
+
+            detector = DetectorBatches(estado.estado)
+            cerrados = [batch for batch in map(detector.procesar, filas) if batch is not None]
+            if cerrados:
+                resultado = guardar_batches(
+                    sistema, cerrados, config.lim_inf_caudal_masico, config.lim_sup_caudal_masico
+                )
+                total_nuevos += resultado.nuevos
+
+            if estado.procesado_desde is None:
+                estado.procesado_desde = filas[0][0]
+            estado.procesado_hasta = filas[-1][0]
+            estado.estado = detector.a_json()
+            estado.save(update_fields=[
+                'estado', 'procesado_desde', 'procesado_hasta', 'pendiente_desde', 'actualizado_en'
+            ])
+            total_procesados += len(filas)
+            procesado_hasta = estado.procesado_hasta
+            desde = None
+
+        if not lleno:
+            break
+
+    if total_procesados:
+        logger.info(
+            f"Detector de batches {sistema.tag}: {total_procesados} registros, "
+            f"{total_nuevos} batches nuevos, hasta {procesado_hasta}"
+        )
+    return total_procesados, total_nuevos
+
+
+def detector_cubre_rango(sistema, fecha_inicio, fecha_fin):
+    """
+    True si el detector continuo ya procesó todo [fecha_inicio, fecha_fin], es decir,
+    los batches del rango ya están en BatchDetectado y no hace falta re-escanear. Con
+    lecturas pendientes dentro del rango (aún no re-escaneadas) no lo cubre.
+    """
+    estado = DetectorBatchEstado.objects.filter(systemId=sistema).values_list(
+        'procesado_desde', 'procesado_hasta', 'pendiente_desde'
+    ).first()
+    if estado is None or estado[0] is None or estado[1] is None:
+        return False
+    procesado_desde, procesado_hasta, pendiente_desde = estado
+    if pendiente_desde is not None and pendiente_desde <= fecha_fin:
+        return False
+    return procesado_desde <= fecha_inicio and procesado_hasta >= fecha_fin
+
+
+def registrar_lecturas_tardias_detector(lecturas):
+    """
+    Gancho de ingesta: marca para re-escaneo los detectores cuya marca de agua ya cubre
+    alguna de las lecturas recibidas. Se ejecuta al confirmarse la transacción de la
+    ingesta, antes de avanzar el detector (avanzar_detector_en_ingesta).
+    """
+    minimos = {}
+    for lectura in lecturas:
+        fecha = lectura.created_at_iot
+        if fecha is None:
+            continue
+        sistema_id = lectura.systemId_id
+        if sistema_id not in minimos or fecha < minimos[sistema_id]:
+            minimos[sistema_id] = fecha
+    if minimos:
+        transaction.on_commit(lambda: marcar_detector_pendiente(minimos))
+
+
+def marcar_detector_pendiente(minimos):
+    """
+    Args:
+        minimos: {sistema_id: created_at_iot más antiguo recibido}
+    """
+    for sistema_id, fecha in minimos.items():
+        try:
+            # _filas_siguientes lee created_at_iot > procesado_hasta: el mismo instante también queda atrás
+            DetectorBatchEstado.objects.filter(
+                systemId_id=sistema_id,
+                procesado_hasta__gte=fecha
+            ).filter(
+                Q(pendiente_desde__isnull=True) | Q(pendiente_desde__gt=fecha)
+            ).update(pendiente_desde=fecha)
+        except Exception as e:
+            logger.error(f"Error marcando el detector de batches del sistema {sistema_id}: {str(e)}")
+
+
+def avanzar_detector_en_ingesta(sistemas):
+    """
+    Gancho de ingesta: si BATCH_DETECTOR_EN_INGESTA está activo, avanza el detector de
+    los sistemas que recibieron datos una vez confirmada la transacción. Un error aquí
+    nunca afecta la ingesta: el comando detectar_batches retoma desde la marca de agua.
+    """
+    if not getattr(settings, 'BATCH_DETECTOR_EN_INGESTA', False):
+        return
+
+    def avanzar():
+        for sistema in sistemas:
+            try:
+                avanzar_detector(sistema)
+            except Exception as e:
+                logger.error(f"Error avanzando el detector de batches de {sistema.tag}: {str(e)}", exc_info=True)
+
+    transaction.on_commit(avanzar)
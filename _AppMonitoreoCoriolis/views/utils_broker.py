@@ -0,0 +1,163 @@
+"""
+Broker de publicación/suscripción para el feed de tiempo real.
+
+La ingesta publica cada lectura nueva (ya convertida a unidades de display) y el stream
+SSE (StreamTiempoRealQueryView) la reparte a todos los navegadores suscritos a ese
+sistema, de modo que la carga sobre la base de datos no crece con los dashboards abiertos.
+
+Backends (setting TIEMPO_REAL_BROKER, ruta importable de la clase):
+- BrokerMemoria: en proceso. Sirve cuando la ingesta y el servidor ASGI comparten proceso
+  (despliegue de un solo nodo).
+- BrokerPostgres: LISTEN/NOTIFY de PostgreSQL. Cada proceso ASGI escucha un canal y
+  reenvía a sus suscriptores locales, así la ingesta puede correr en otro proceso o nodo.
+
+Para otro backend basta una subclase de BrokerMemoria que redefina publicar() y entregue
+los mensajes remotos con publicar_local().
+"""
+import json
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class BrokerMemoria:
+    """
+    Reparte mensajes a colas asyncio por sistema. publicar() es thread-safe y puede
+    llamarse desde vistas síncronas; cada suscriptor recibe el mensaje en su event loop.
+    Si un suscriptor es lento se descarta su mensaje más antiguo: los displays solo
+    necesitan la última lectura.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._suscriptores = defaultdict(set)
+
+    @property
+    def tamano_cola(self):
+        return getattr(settings, 'TIEMPO_REAL_COLA_MAXIMA', 10)
+
+    def publicar(self, sistema_id, mensaje):
+        self.publicar_local(sistema_id, mensaje)
+
+    def publicar_local(self, sistema_id, mensaje):
+        with self._lock:
+            suscriptores = list(self._suscriptores.get(str(sistema_id), ()))
+        for loop, cola in suscriptores:
+            try:
+                loop.call_soon_threadsafe(_encolar, cola, mensaje)
+            except RuntimeError:
+                # El event loop del suscriptor ya se cerró
+                pass
+
+    def total_suscriptores(self, sistema_id=None):
+        with self._lock:
+            if sistema_id is not None:
+                return len(self._suscriptores.get(str(sistema_id), ()))
+            return sum(len(s) for s in self._suscriptores.values())
+
+    def suscribir(self, sistema_id):
+        """Registra una cola en el event loop actual; la entrada retornada se pasa a cancelar_suscripcion()."""
+        entrada = (asyncio.get_running_loop(), asyncio.Queue(maxsize=self.tamano_cola))
+        with self._lock:
+            self._suscriptores[str(sistema_id)].add(entrada)
+        return entrada
+
+    def cancelar_suscripcion(self, sistema_id, entrada):
+        with self._lock:
+            suscriptores = self._suscriptores.get(str(sistema_id))
+            if suscriptores is not None:
+                suscriptores.discard(entrada)
+                if not suscriptores:
+                    del self._suscriptores[str(sistema_id)]
+
+
+def _encolar(cola, mensaje):
+    if cola.full():
+        cola.get_nowait()
+    cola.put_nowait(mensaje)
+
+
+class BrokerPostgres(BrokerMemoria):
+    """
+    Backend multi-nodo con LISTEN/NOTIFY. Publicar es un `SELECT pg_notify(...)` en la
+    conexión de la vista; un hilo por proceso escucha el canal con una conexión propia
+    (solo se inicia con el primer suscriptor). Los NOTIFY dentro de una transacción se
+    entregan al confirmarse, igual que la lectura que anuncian.
+    """
+
+    canal = 'gisme_tiempo_real'
+
+    def __init__(self):
+        super().__init__()
+        self._escuchando = False
+
+    def publicar(self, sistema_id, mensaje):
+        carga = json.dumps({'sistema': str(sistema_id), 'mensaje': mensaje}, default=str)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.canal, carga])
+
+    def suscribir(self, sistema_id):
+        self._iniciar_escucha()
+        return super().suscribir(sistema_id)
+
+    def _iniciar_escucha(self):
+        with self._lock:
+            if self._escuchando:
+                return
+            self._escuchando = True
+        threading.Thread(target=self._escuchar, name='broker-tiempo-real', daemon=True).start()
+
+    def _escuchar(self):
+        import select
+        import time
+        import psycopg2
+
+        db = settings.DATABASES['default']
+        while True:
+            conexion = None
+            try:
+                conexion = psycopg2.connect(
+                    dbname=db['NAME'], user=db.get('USER'), password=db.get('PASSWORD'),
+                    host=db.get('HOST') or None, port=db.get('PORT') or None,
+                    **db.get('OPTIONS', {})
+                )
+                conexion.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conexion.cursor() as cursor:
+                    cursor.execute(f'LISTEN {self.canal};')
+                logger.info(f"Broker de tiempo real escuchando el canal {self.canal}")
+                while True:
+                    if select.select([conexion], [], [], 30) == ([], [], []):
+                        continue
+                    conexion.poll()
+                    while conexion.notifies:
+                        notificacion = conexion.notifies.pop(0)
+                        carga = json.loads(notificacion.payload)
+                        self.publicar_local(carga['sistema'], carga['mensaje'])
+            except Exception as e:
+                logger.error(f"Error en la escucha del broker de tiempo real: {str(e)}", exc_info=True)
+                if conexion is not None:
+                    conexion.close()
+                time.sleep(5)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def obtener_broker():
+    """Instancia compartida del backend configurado en TIEMPO_REAL_BROKER."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                ruta = getattr(
+                    settings, 'TIEMPO_REAL_BROKER', '_AppMonitoreoCoriolis.views.utils_broker.BrokerMemoria'
+                )
+                _broker = import_string(ruta)()
+    return _broker
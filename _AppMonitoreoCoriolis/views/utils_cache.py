@@ -0,0 +1,161 @@
+"""
+Caché en proceso de Sistema y ConfiguracionCoeficientes para la ruta de ingesta
+y las vistas de consulta.
+
+- Indexada por MAC del gateway (Sistema.sistema_id) y por UUID del sistema.
+- Cada entrada expira tras un TTL (CONFIG_CACHE_TTL_SEGUNDOS) para acotar la
+  desactualización entre workers.
+- Se invalida inmediatamente en el proceso local mediante señales post_save /
+  post_delete (ver _AppMonitoreoCoriolis/signals.py).
+- También se guardan los resultados negativos (MAC no registrada, sistema sin
+  configuración) para que el camino caliente no emita consultas en estado estable.
+"""
+import time
+import logging
+import threading
+from django.conf import settings
+from _AppComplementos.models import Sistema, ConfiguracionCoeficientes
+
+logger = logging.getLogger(__name__)
+
+# Marcador para resultados negativos cacheados
+_NO_EXISTE = object()
+
+
+class CacheConfiguracionSistemas:
+    """
+    Caché TTL thread-safe de sistemas (por MAC) y coeficientes (por UUID de sistema).
+    Los objetos retornados son compartidos: tratarlos como solo lectura.
+    """
+
+    def __init__(self, ttl_segundos=None):
+        self._ttl = ttl_segundos
+        self._lock = threading.Lock()
+        self._sistemas_por_mac = {}
+        self._coeficientes_por_sistema = {}
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, 'CONFIG_CACHE_TTL_SEGUNDOS', 60)
+
+    def _leer(self, tabla, clave):
+        with self._lock:
+            entrada = tabla.get(clave)
+        if entrada is None:
+            return None
+        _, expira = entrada
+        if expira < time.monotonic():
+            return None
+        return entrada
+
+    def _guardar(self, tabla, clave, valor):
+        with self._lock:
+            tabla[clave] = (valor, time.monotonic() + self.ttl)
+
+    # ------------------------------------------------------------------
+    # Sistemas por MAC
+    # ------------------------------------------------------------------
+    def obtener_sistema_por_mac(self, mac_gateway):
+        """Retorna el Sistema registrado con sistema_id == mac_gateway o None."""
+        if not mac_gateway:
+            return None
+        entrada = self._leer(self._sistemas_por_mac, mac_gateway)
+        if entrada is not None:
+            valor = entrada[0]
+            return None if valor is _NO_EXISTE else valor
+
+        sistema = Sistema.objects.filter(sistema_id=mac_gateway).first()
+        self._guardar(self._sistemas_por_mac, mac_gateway, sistema if sistema is not None else _NO_EXISTE)
+        return sistema
+
+    def obtener_sistemas_por_mac(self, macs):
+        """
+        Resuelve varias MAC a la vez. Solo consulta la base de datos (una vez) por las
+        MAC que no estén en caché. Retorna {mac: Sistema} con las MAC registradas.
+        """
+        resultado = {}
+        faltantes = set()
+        for mac in macs:
+            if not mac:
+                continue
+            entrada = self._leer(self._sistemas_por_mac, mac)
+            if entrada is None:
+                faltantes.add(mac)
+            elif entrada[0] is not _NO_EXISTE:
+                resultado[mac] = entrada[0]
+
+        if faltantes:
+            encontrados = {s.sistema_id: s for s in Sistema.objects.filter(sistema_id__in=faltantes)}
+            for mac in faltantes:
+                sistema = encontrados.get(mac)
+                self._guardar(self._sistemas_por_mac, mac, sistema if sistema is not None else _NO_EXISTE)
+                if sistema is not None:
+                    resultado[mac] = sistema
+        return resultado
+
+    # ------------------------------------------------------------------
+    # Coeficientes por sistema
+    # ------------------------------------------------------------------
+    def obtener_coeficientes(self, sistema_id):
+        """Retorna la ConfiguracionCoeficientes del sistema (UUID) o None si no existe."""
+        entrada = self._leer(self._coeficientes_por_sistema, sistema_id)
+        if entrada is not None:
+            valor = entrada[0]
+            return None if valor is _NO_EXISTE else valor
+
+        coef = ConfiguracionCoeficientes.objects.filter(systemId_id=sistema_id).first()
+        self._guardar(self._coeficientes_por_sistema, sistema_id, coef if coef is not None else _NO_EXISTE)
+        return coef
+
+    def obtener_coeficientes_de(self, sistema_ids):
+        """
+        Resuelve los coeficientes de varios sistemas con una sola consulta para los
+        que no estén en caché. Retorna {sistema_id: ConfiguracionCoeficientes | None}.
+        """
+        resultado = {}
+        faltantes = set()
+        for sistema_id in sistema_ids:
+            entrada = self._leer(self._coeficientes_por_sistema, sistema_id)
+            if entrada is None:
+                faltantes.add(sistema_id)
+            else:
+                resultado[sistema_id] = None if entrada[0] is _NO_EXISTE else entrada[0]
+
+        if faltantes:
+            encontrados = {
+                c.systemId_id: c
+                for c in ConfiguracionCoeficientes.objects.filter(systemId_id__in=faltantes)
+            }
+            for sistema_id in faltantes:
+                coef = encontrados.get(sistema_id)
+                self._guardar(self._coeficientes_por_sistema, sistema_id, coef if coef is not None else _NO_EXISTE)
+                resultado[sistema_id] = coef
+        return resultado
+
+    # ------------------------------------------------------------------
+    # Invalidación
+    # ------------------------------------------------------------------
+    def invalidar_sistema(self, sistema):
+        """Elimina las entradas de un sistema (incluida cualquier MAC anterior)."""
+        with self._lock:
+            for mac in [m for m, (v, _) in self._sistemas_por_mac.items()
+                        if v is not _NO_EXISTE and v.pk == sistema.pk]:
+                self._sistemas_por_mac.pop(mac, None)
+            if sistema.sistema_id:
+                self._sistemas_por_mac.pop(sistema.sistema_id, None)
+            self._coeficientes_por_sistema.pop(sistema.pk, None)
+
+    def invalidar_coeficientes(self, sistema_id):
+        with self._lock:
+            self._coeficientes_por_sistema.pop(sistema_id, None)
+
+    def limpiar(self):
+        with self._lock:
+            self._sistemas_por_mac.clear()
+            self._coeficientes_por_sistema.clear()
+
+
+# Instancia compartida por proceso
+cache_configuracion = CacheConfiguracionSistemas()
@@ -0,0 +1,127 @@
+"""
+Canales de medición disponibles para la API unificada de series (SeriesQueryView).
+
+Cada canal declara las columnas de NodeRedData que necesita, su unidad y cómo se
+convierte, tanto desde las columnas crudas (arreglos NumPy de utils_series.leer_columnas)
+como desde los rollups (estadísticas avg/min/max ya agregadas, ver utils_rollups.py).
+Las conversiones son las mismas de las vistas históricas individuales.
+"""
+from collections import namedtuple
+from UTIL_LIB.conversiones import celsius_a_fahrenheit, cm3_s_a_gal_min, lb_s_a_kg_min
+from _AppMonitoreoCoriolis.views.utils_series import lineal, corregir
+
+# etiqueta / unidad: para el cliente
+# campos: columnas crudas que necesita (además de created_at_iot)
+# senal: columna que cuenta para la decimación (conservar forma y picos)
+# convertir: función (columnas, coeficientes) -> arreglo con los valores del canal
+# campo_rollup: canal en las estadísticas de los rollups
+# convertir_rollup: conversión de unidades de avg/min/max del rollup (None = sin conversión)
+Canal = namedtuple(
+    'Canal', ['etiqueta', 'unidad', 'campos', 'senal', 'convertir', 'campo_rollup', 'convertir_rollup']
+)
+
+
+def _directo(campo, conversion=None):
+    if conversion is None:
+        return lambda columnas, coeficientes: columnas[campo]
+    vectorizada = lineal(conversion)
+    return lambda columnas, coeficientes: vectorizada(columnas[campo])
+
+
+def _presion(columnas, coeficientes):
+    mt, bt, mp, bp = coeficientes[:4]
+    return corregir(columnas['pressure_out'], columnas['mp'], columnas['bp'], mp, bp)
+
+
+def _temperatura_salida(columnas, coeficientes):
+    mt, bt, mp, bp = coeficientes[:4]
+    corregida = corregir(columnas['redundant_temperature'], columnas['mt'], columnas['bt'], mt, bt)
+    return lineal(celsius_a_fahrenheit)(corregida)
+
+
+CANALES = {
+    'flujo_volumetrico': Canal(
+        'Flujo Volumétrico', 'gal/min', ['flow_rate'], 'flow_rate',
+        _directo('flow_rate', cm3_s_a_gal_min), 'flow_rate', cm3_s_a_gal_min
+    ),
+    'flujo_masico': Canal(
+        'Flujo Másico', 'kg/min', ['mass_rate'], 'mass_rate',
+        _directo('mass_rate', lb_s_a_kg_min), 'mass_rate', lb_s_a_kg_min
+    ),
+    # pressure_out y redundant_temperature: corrección mx+b del momento (en los rollups ya viene aplicada)
+    'presion': Canal(
+        'Presión', 'PSI', ['pressure_out', 'mp', 'bp'], 'pressure_out',
+        _presion, 'pressure_out', None
+    ),
+    'temperatura_coriolis': Canal(
+        'Temperatura Coriolis', '°F', ['coriolis_temperature'], 'coriolis_temperature',
+        _directo('coriolis_temperature', celsius_a_fahrenheit), 'coriolis_temperature', celsius_a_fahrenheit
+    ),
+    'temperatura_diagnostico': Canal(
+        'Temperatura Diagnóstico', '°F', ['diagnostic_temperature'], 'diagnostic_temperature',
+        _directo('diagnostic_temperature', celsius_a_fahrenheit), 'diagnostic_temperature', celsius_a_fahrenheit
+    ),
+    'temperatura_salida': Canal(
+        'Temperatura de Salida', '°F', ['redundant_temperature', 'mt', 'bt'], 'redundant_temperature',
+        _temperatura_salida, 'redundant_temperature', celsius_a_fahrenheit
+    ),
+    'densidad': Canal(
+        'Densidad', 'g/cc', ['density'], 'density',
+        _directo('density'), 'density', None
+    ),
+    'frecuencia': Canal(
+        'Frecuencia', 'Hz', ['coriolis_frecuency'], 'coriolis_frecuency',
+        _directo('coriolis_frecuency'), 'coriolis_frecuency', None
+    ),
+    'corriente_driver': Canal(
+        'Corriente Driver', 'mA', ['driver_curr'], 'driver_curr',
+        _directo('driver_curr'), 'driver_curr', None
+    ),
+    'ruido_n1': Canal(
+        'Noise Estimated N1', '--', ['dsp_rxmsg_noiseEstimatedN1'], 'dsp_rxmsg_noiseEstimatedN1',
+        _directo('dsp_rxmsg_noiseEstimatedN1'), 'dsp_rxmsg_noiseEstimatedN1', None
+    ),
+    'ruido_n2': Canal(
+        'Noise Estimated N2', '--', ['dsp_rxmsg_noiseEstimatedN2'], 'dsp_rxmsg_noiseEstimatedN2',
+        _directo('dsp_rxmsg_noiseEstimatedN2'), 'dsp_rxmsg_noiseEstimatedN2', None
+    ),
+    'intensidad_gateway': Canal(
+        'Intensidad Señal Gateway', 'dB', ['signal_strength_rxCoriolis'], 'signal_strength_rxCoriolis',
+        _directo('signal_strength_rxCoriolis'), 'signal_strength_rxCoriolis', None
+    ),
+    'temperatura_gateway': Canal(
+        'Temperatura Gateway', '°C', ['temperature_gateway'], 'temperature_gateway',
+        _directo('temperature_gateway'), 'temperature_gateway', None
+    ),
+}
+
+
+def seleccionar_canales(parametro):
+    """
+    Canales pedidos con `?canales=a,b,c` (todos si no se indica).
+
+    Raises:
+        ValueError: con las claves desconocidas
+    """
+    if not parametro:
+        return list(CANALES)
+    claves = []
+    for clave in parametro.split(','):
+        clave = clave.strip()
+        if clave and clave not in claves:
+            claves.append(clave)
+    desconocidos = [clave for clave in claves if clave not in CANALES]
+    if desconocidos or not claves:
+        raise ValueError(', '.join(desconocidos))
+    return claves
+
+
+def campos_de(canales):
+    """Columnas crudas (sin repetir) que necesitan los canales, con created_at_iot primero."""
+    campos = ['created_at_iot']
+    for clave in canales:
+        for campo in CANALES[clave].campos:
+            if campo not in campos:
+                campos.append(campo)
+    return campos
+
@@ -1,11 +1,286 @@
 """
 Utilidades para decimación inteligente de datos de series temporales.
 Reduce la cantidad de puntos sin perder la forma de la curva.
+
+Modos disponibles (parámetro `decimacion` de las vistas):
+- 'lttb':   Largest-Triangle-Three-Buckets, conserva la forma visual de la curva (por defecto)
+- 'minmax': mínimo y máximo de cada ventana, conserva la envolvente completa
+- 'stride': 1 de cada N puntos (comportamiento anterior)
+
+En todos los modos se conservan siempre el primer y último punto, los picos
+(saltos atípicos respecto al ruido de la señal) y los bordes de batch
+(transiciones de flujo cero / flujo activo). Para rangos largos la agregación por
+ventanas de tiempo en SQL la proveen los rollups (ver utils_rollups.py).
 """
 import logging
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+MODOS_DECIMACION = ('lttb', 'minmax', 'stride')
+
+# Umbral (en desviaciones robustas del salto entre muestras) para considerar un pico
+UMBRAL_PICO_MAD = 6.0
+
+def stride_indices(n, n_salida):
+    """Índices uniformemente espaciados (incluye primero y último)."""
+    if n <= n_salida:
+        return np.arange(n)
+    return np.unique(np.linspace(0, n - 1, n_salida).astype(np.int64))
+
+
+def lttb_indices(x, y, n_salida):
+    """
+    Largest-Triangle-Three-Buckets sobre arreglos NumPy.
+
+    Args:
+        x: tiempos (float, crecientes)
+        y: valores (float, sin NaN)
+        n_salida: cantidad de puntos a conservar (>= 3)
+
+    Returns:
+        Arreglo de índices seleccionados (ordenados)
+    """
+    n = len(x)
+    if n_salida >= n or n_salida < 3:
+        return np.arange(n)
+
+    # Bordes de las n_salida - 2 ventanas internas (el primer y último punto van fijos)
+    bordes = np.linspace(1, n - 1, n_salida - 1).astype(np.int64)
+    seleccion = np.empty(n_salida, dtype=np.int64)
+    seleccion[0] = 0
+    seleccion[-1] = n - 1
+    a = 0
+
+    for i in range(n_salida - 2):
+        inicio, fin = bordes[i], bordes[i + 1]
+        # Promedio de la ventana siguiente (o el último punto)
+        sig_inicio, sig_fin = fin, (bordes[i + 2] if i + 2 < len(bordes) else n)
+        if sig_fin <= sig_inicio:
+            sig_inicio, sig_fin = n - 1, n
+        x_prom = x[sig_inicio:sig_fin].mean()
+        y_prom = y[sig_inicio:sig_fin].mean()
+
+        xs = x[inicio:fin]
+        ys = y[inicio:fin]
+        if len(xs) == 0:
+            seleccion[i + 1] = a
+            continue
+        areas = np.abs((x[a] - x_prom) * (ys - y[a]) - (x[a] - xs) * (y_prom - y[a]))
+        a = inicio + int(np.argmax(areas))
+        seleccion[i + 1] = a
+
+    return np.unique(seleccion)
+
+
+def minmax_indices(y, n_ventanas):
+    """
+    Índice del mínimo y del máximo de cada una de n_ventanas ventanas consecutivas.
+    """
+    n = len(y)
+    if n <= 2 * n_ventanas:
+        return np.arange(n)
+    bordes = np.linspace(0, n, n_ventanas + 1).astype(np.int64)
+    seleccion = []
+    for inicio, fin in zip(bordes[:-1], bordes[1:]):
+        if fin <= inicio:
+            continue
+        ventana = y[inicio:fin]
+        seleccion.append(inicio + int(np.argmin(ventana)))
+        seleccion.append(inicio + int(np.argmax(ventana)))
+    return np.unique(np.asarray(seleccion, dtype=np.int64))
+
+
+def indices_picos(y, umbral=UMBRAL_PICO_MAD, max_picos=None):
+    """
+    Índices de picos: muestras cuyo salto respecto a la anterior supera `umbral`
+    veces la desviación robusta (MAD) de los saltos. Incluye ambos lados del salto.
+    Si hay más de max_picos se conservan los saltos más grandes.
+    """
+    if len(y) < 3:
+        return np.arange(len(y))
+    saltos = np.diff(y)
+    mediana = np.median(saltos)
+    mad = np.median(np.abs(saltos - mediana)) * 1.4826
+    if mad == 0:
+        # Señal escalonada: cualquier salto distinto de la mediana es relevante
+        candidatos = np.flatnonzero(saltos != mediana)
+    else:
+        candidatos = np.flatnonzero(np.abs(saltos - mediana) > umbral * mad)
+    if max_picos is not None and len(candidatos) > max_picos // 2:
+        orden = np.argsort(-np.abs(saltos[candidatos] - mediana))
+        candidatos = candidatos[orden[:max(1, max_picos // 2)]]
+    return np.unique(np.concatenate([candidatos, candidatos + 1]))
+
+
+def indices_bordes(activo, max_bordes=None):
+    """
+    Índices a ambos lados de cada transición de un arreglo booleano
+    (p. ej. flujo activo / flujo cero = inicio o fin de batch).
+    """
+    if len(activo) < 2:
+        return np.arange(len(activo))
+    cambios = np.flatnonzero(activo[1:] != activo[:-1])
+    if max_bordes is not None and len(cambios) > max_bordes // 2:
+        cambios = cambios[stride_indices(len(cambios), max(1, max_bordes // 2))]
+    return np.unique(np.concatenate([cambios, cambios + 1]))
+
+
+def seleccionar_indices(x, series, max_puntos=2000, modo='lttb', activo=None, obligatorios=None):
+    """
+    Selecciona las filas a conservar para un conjunto de series que comparten eje x.
+
+    Args:
+        x: tiempos (float, crecientes)
+        series: lista de arreglos float (NaN = sin dato) alineados con x
+        max_puntos: presupuesto aproximado de puntos de salida
+        modo: 'lttb', 'minmax' o 'stride'
+        activo: arreglo booleano opcional; sus transiciones se conservan (bordes de batch)
+        obligatorios: índices adicionales que deben conservarse
+
+    Returns:
+        Arreglo ordenado de índices únicos
+    """
+    n = len(x)
+    if n <= max_puntos:
+        return np.arange(n)
+
+    # Índices forzados: extremos, bordes de batch, picos y obligatorios (hasta la mitad del presupuesto)
+    cupo_forzados = max_puntos // 2
+    forzados = [np.array([0, n - 1], dtype=np.int64)]
+    if activo is not None:
+        forzados.append(indices_bordes(activo, max_bordes=cupo_forzados // 2))
+    if obligatorios is not None and len(obligatorios):
+        forzados.append(np.asarray(obligatorios, dtype=np.int64))
+    for y in series:
+        validos = np.flatnonzero(~np.isnan(y))
+        if len(validos) > 2:
+            picos = indices_picos(y[validos], max_picos=max(2, cupo_forzados // (2 * len(series))))
+            forzados.append(validos[picos])
+    forzados = np.unique(np.concatenate(forzados))
+
+    presupuesto = max(max_puntos - len(forzados), max_puntos // 2)
+    if modo == 'stride':
+        seleccion = [stride_indices(n, presupuesto)]
+    else:
+        seleccion = []
+        por_serie = max(3, presupuesto // max(1, len(series)))
+        for y in series:
+            validos = np.flatnonzero(~np.isnan(y))
+            if len(validos) == 0:
+                continue
+            if modo == 'minmax':
+                elegidos = minmax_indices(y[validos], max(1, por_serie // 2))
+            else:
+                elegidos = lttb_indices(x[validos], y[validos], por_serie)
+            seleccion.append(validos[elegidos])
+        if not seleccion:
+            seleccion = [stride_indices(n, presupuesto)]
+
+    return np.unique(np.concatenate(seleccion + [forzados]))
+
+
+def decimar_filas(queryset, campos, campos_senal, max_puntos=2000, modo='lttb',
+                  campo_actividad='mass_rate', instantes_obligatorios=None):
+    """
+    Lee las columnas `campos` del queryset en UNA sola consulta (values_list con
+    tuplas nombradas: `fila.created_at_iot`, `fila.mass_rate`, ...) y, si hay más de
+    max_puntos filas, las decima en memoria con NumPy.
+
+    Args:
+        queryset: QuerySet de NodeRedData ordenado por created_at_iot
+        campos: columnas a leer (debe incluir 'created_at_iot')
+        campos_senal: columnas cuya forma se debe conservar
+        modo: 'lttb', 'minmax' o 'stride' (valores desconocidos usan 'lttb')
+        campo_actividad: columna cuyo paso por cero define los bordes de batch (None para omitir)
+        instantes_obligatorios: datetimes que deben conservarse (se elige la fila más cercana)
+
+    Returns:
+        (filas, decimacion_info)
+    """
+    if modo not in MODOS_DECIMACION:
+        modo = 'lttb'
+    campos = list(campos)
+    if campo_actividad and campo_actividad not in campos:
+        campos.append(campo_actividad)
+
+    filas = list(queryset.values_list(*campos, named=True))
+    total = len(filas)
+    if max_puntos is None or total <= max_puntos:
+        logger.info(f"ℹ️ Sin decimación: {total} registros")
+        return filas, {'aplicada': False}
+
+    x = np.fromiter((f.created_at_iot.timestamp() for f in filas), dtype=np.float64, count=total)
+    series = [
+        np.fromiter(
+            (np.nan if v is None else v for v in (getattr(f, campo) for f in filas)),
+            dtype=np.float64, count=total
+        )
+        for campo in campos_senal
+    ]
+
+    activo = None
+    if campo_actividad:
+        activo = np.fromiter(
+            ((getattr(f, campo_actividad) or 0) > 0 for f in filas), dtype=bool, count=total
+        )
+
+    obligatorios = _indices_instantes(x, instantes_obligatorios)
+    indices = seleccionar_indices(x, series, max_puntos, modo, activo, obligatorios)
+    filas = [filas[i] for i in indices]
+    return filas, _info_decimacion(total, len(filas), modo)
+
+
+def decimar_columnas(columnas, campos_senal, max_puntos=2000, modo='lttb',
+                     campo_actividad='mass_rate', instantes_obligatorios=None):
+    """
+    Igual que decimar_filas pero sobre columnas ya leídas (ver utils_series.leer_columnas):
+    {'created_at_iot': int64 epoch ms, campo: float64 con NaN, ...}.
+
+    Returns:
+        (columnas_decimadas, decimacion_info)
+    """
+    if modo not in MODOS_DECIMACION:
+        modo = 'lttb'
+    total = len(columnas['created_at_iot'])
+    if max_puntos is None or total <= max_puntos:
+        logger.info(f"ℹ️ Sin decimación: {total} registros")
+        return columnas, {'aplicada': False}
+
+    x = columnas['created_at_iot'] / 1000.0
+    series = [columnas[campo] for campo in campos_senal]
+    activo = None
+    if campo_actividad and campo_actividad in columnas:
+        activo = np.nan_to_num(columnas[campo_actividad]) > 0
+
+    obligatorios = _indices_instantes(x, instantes_obligatorios)
+    indices = seleccionar_indices(x, series, max_puntos, modo, activo, obligatorios)
+    decimadas = {campo: valores[indices] for campo, valores in columnas.items()}
+    return decimadas, _info_decimacion(total, len(indices), modo)
+
+
+def _indices_instantes(x, instantes):
+    """Filas a ambos lados de cada instante (segundos epoch en x) que debe conservarse."""
+    if not instantes:
+        return None
+    total = len(x)
+    objetivos = np.array([instante.timestamp() for instante in instantes])
+    posiciones = np.clip(np.searchsorted(x, objetivos), 0, total - 1)
+    return np.unique(np.concatenate([posiciones, np.clip(posiciones - 1, 0, total - 1)]))
+
+
+def _info_decimacion(total, total_decimado, modo):
+    stats = calcular_estadisticas_decimacion(total, total_decimado)
+    logger.info(f"✅ Decimación {modo}: {total} → {total_decimado} registros ({stats['porcentaje_reduccion']:.1f}% reducción)")
+    return {
+        'aplicada': True,
+        'modo': modo,
+        'total_original': total,
+        'total_decimado': total_decimado,
+        'factor_reduccion': stats['factor_reduccion'],
+        'porcentaje_reduccion': stats['porcentaje_reduccion']
+    }
+
 
 def decimar_datos_inteligente(datos, max_puntos=2000):
     """
@@ -16,6 +291,8 @@ def decimar_datos_inteligente(datos, max_puntos=2000):
     - Si hay más, toma 1 de cada N puntos de forma uniforme
     - Siempre incluye el primer y último punto
     
+    Para conservar picos y bordes de batch use decimar_filas / seleccionar_indices.
+    
     Args:
         datos: QuerySet o lista de objetos de datos
         max_puntos: Cantidad máxima de puntos a devolver (default: 2000)
@@ -30,27 +307,7 @@ def decimar_datos_inteligente(datos, max_puntos=2000):
         logger.info(f"📊 Datos: {total_puntos} puntos (no requiere decimación)")
         return datos_list
     
-    # Calcular factor de decimación
-    factor = total_puntos / max_puntos
-    logger.info(f"📊 Decimación: {total_puntos} → ~{max_puntos} puntos (factor: {factor:.2f}x)")
-    
-    datos_decimados = []
-    
-    # Siempre incluir el primer punto
-    datos_decimados.append(datos_list[0])
-    
-    # Tomar puntos uniformemente distribuidos
-    indice_float = factor
-    while indice_float < total_puntos - 1:
-        indice = int(indice_float)
-        if indice < total_puntos:
-            datos_decimados.append(datos_list[indice])
-        indice_float += factor
-    
-    # Siempre incluir el último punto
-    if datos_list[-1] not in datos_decimados:
-        datos_decimados.append(datos_list[-1])
-    
+    datos_decimados = [datos_list[i] for i in stride_indices(total_puntos, max_puntos)]
     logger.info(f"✅ Decimación completada: {len(datos_decimados)} puntos finales")
     return datos_decimados
 
@@ -0,0 +1,121 @@
+"""
+Modo incremental (delta) y validación condicional de las vistas históricas.
+
+Protocolo con el navegador:
+- Cada respuesta lleva ETag (y Last-Modified = último created_at_iot del rango) con
+  Cache-Control `private, no-cache`. Si el cliente reenvía If-None-Match /
+  If-Modified-Since y nada cambió, la vista responde 304 sin leer las series.
+- `?since=<epoch ms>` = último timestamp que ya tiene el cliente. Si el cursor cae
+  dentro de la ventana, la vista lee solo lo posterior: filas crudas con timestamp
+  mayor al cursor o, si la ventana se sirve desde rollups, los buckets desde el que
+  contiene el cursor (que pudo estar incompleto). La respuesta trae 'delta':
+  el cliente descarta sus puntos con timestamp >= reemplazar_desde y los anteriores a
+  ventana_inicio, y agrega los recibidos.
+
+La resolución (datos crudos o rollup) se fija con la ventana completa, de modo que los
+deltas coinciden con lo que ya tiene el cliente; si cambia (p. ej. rollups atrasados),
+'resolucion' lo indica y el cliente pide la ventana completa.
+"""
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from _AppMonitoreoCoriolis.models import NodeRedData
+from _AppMonitoreoCoriolis.views.utils_rollups import RESOLUCIONES, seleccionar_resolucion
+
+logger = logging.getLogger(__name__)
+
+
+def _epoch_ms(fecha):
+    return int(fecha.timestamp() * 1000)
+
+
+class ConsultaIncremental:
+    """
+    Cursor, resolución y validadores de una petición a una vista histórica.
+
+    Args:
+        request: request de DRF
+        vista: nombre corto de la vista (forma parte del ETag)
+        sistema: Sistema consultado
+        fecha_inicio, fecha_fin: ventana (UTC) ya resuelta por la vista
+        coeficientes: tupla de get_coeficientes_correccion si la vista los usa (forma parte del ETag)
+        tiempo_real: la ventana termina en la última lectura; el ETag se deriva de ella
+            sin consultar el rango
+
+    Raises:
+        ValueError: `since` no es un entero (epoch en ms)
+    """
+
+    def __init__(self, request, vista, sistema, fecha_inicio, fecha_fin, coeficientes=(), tiempo_real=False):
+        self.request = request
+        self.fecha_inicio = fecha_inicio
+        self.fecha_fin = fecha_fin
+
+        since = request.GET.get('since')
+        self.since_ms = int(since) if since else None
+
+        resolucion = request.GET.get('resolucion', 'auto')
+        if resolucion != 'raw' and resolucion not in RESOLUCIONES:
+            resolucion = seleccionar_resolucion(fecha_inicio, fecha_fin) or 'raw'
+        self.resolucion = resolucion
+
+        if tiempo_real:
+            # fecha_fin es la última lectura del sistema
+            self.ultimo, total = fecha_fin, None
+        else:
+            version = NodeRedData.objects.filter(
+                systemId=sistema,
+                created_at_iot__range=[fecha_inicio, fecha_fin]
+            ).aggregate(ultimo=Max('created_at_iot'), total=Count('id'))
+            self.ultimo, total = version['ultimo'], version['total']
+
+        parametros = sorted((k, v) for k, v in request.GET.items() if k != 'since')
+        firma = repr((
+            vista, str(sistema.pk), parametros, fecha_inicio.isoformat(), fecha_fin.isoformat(),
+            self.ultimo.isoformat() if self.ultimo else None, total, tuple(coeficientes)
+        ))
+        self.etag = 'W/"%s"' % hashlib.sha1(firma.encode()).hexdigest()
+
+        self.delta = (
+            self.since_ms is not None
+            and _epoch_ms(fecha_inicio) <= self.since_ms <= _epoch_ms(fecha_fin)
+        )
+
+    @property
+    def no_modificado(self):
+        """HttpResponseNotModified si el cliente ya tiene esta versión; si no, None."""
+        last_modified = int(self.ultimo.timestamp()) if self.ultimo else None
+        return get_conditional_response(self.request, etag=self.etag, last_modified=last_modified)
+
+    @property
+    def desde(self):
+        """Inicio de la lectura: la ventana completa o lo posterior al cursor."""
+        if not self.delta:
+            return self.fecha_inicio
+        cursor = datetime(1970, 1, 1, tzinfo=dt_timezone.utc) + timedelta(milliseconds=self.since_ms)
+        if self.resolucion == 'raw':
+            # Solo filas cuyo timestamp en ms sea mayor al cursor
+            return cursor + timedelta(milliseconds=1)
+        return cursor
+
+    def info(self, resolucion_usada):
+        """Bloque 'delta' de la respuesta."""
+        desde = self.desde
+        return {
+            'activo': self.delta,
+            'reemplazar_desde': _epoch_ms(desde) if self.delta else None,
+            'ventana_inicio': _epoch_ms(self.fecha_inicio),
+            'ventana_fin': _epoch_ms(self.fecha_fin),
+            'resolucion': resolucion_usada,
+        }
+
+    def con_validadores(self, response):
+        response['ETag'] = self.etag
+        if self.ultimo:
+            response['Last-Modified'] = http_date(self.ultimo.timestamp())
+        # El navegador puede guardar la respuesta pero debe revalidarla siempre
+        response['Cache-Control'] = 'private, no-cache'
+        return response
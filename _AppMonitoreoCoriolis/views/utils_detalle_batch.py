@@ -0,0 +1,346 @@
+"""
+Detalle calculado de un batch: puntos para las gráficas, diagnóstico del medidor,
+densidad a 60°F (rho15) e incertidumbre GUM.
+
+Un batch cerrado no cambia, así que el resultado se materializa en DetalleBatchCalculado
+la primera vez que se consulta y las siguientes aperturas del detalle (o la impresión
+del ticket) cuestan una lectura por índice.
+
+- Solo se materializa la consulta por defecto (decimación LTTB a MAX_PUNTOS_DETALLE) de
+  batches cuya ventana extendida (±3 min) ya está cerrada: termina antes de
+  ahora - RESPUESTAS_CACHE_MARGEN_MINUTOS. Cualquier lectura nueva dentro de esa ventana
+  es entonces un dato tardío.
+- `version` firma los campos del batch y de la configuración que entran en el cálculo
+  (límites, diagnóstico, incertidumbre) más VERSION_CALCULO; si cambian, el detalle se
+  recalcula en la siguiente consulta.
+- Los datos tardíos borran los detalles de los batches afectados
+  (invalidar_detalles_batch, desde utils_respuestas.registrar_datos_tardios).
+"""
+import json
+import hashlib
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from _AppMonitoreoCoriolis.models import NodeRedData, DetalleBatchCalculado
+from UTIL_LIB.conversiones import celsius_a_fahrenheit, lb_s_a_kg_min, lb_a_kg, g_cm3_a_kg_m3
+from _AppMonitoreoCoriolis.views.utils import COLOMBIA_TZ
+from _AppMonitoreoCoriolis.views.utils_decimation import calcular_estadisticas_decimacion, decimar_filas
+from UTIL_LIB.GUM_coriolis_simp import GUM
+from UTIL_LIB.diagnostico_coriolis import CAMPOS_DIAGNOSTICO, diagnosticar, umbrales_diagnostico
+from UTIL_LIB.densidad60Modelo import rho15_from_rhoobs_api1124
+
+logger = logging.getLogger(__name__)
+
+# Subir al cambiar el cálculo: los detalles guardados con otra versión se recalculan
+VERSION_CALCULO = 1
+
+MAX_PUNTOS_DETALLE = 2000
+
+# Contexto antes y después del batch en las gráficas
+CONTEXTO = timedelta(minutes=3)
+
+# Campos del batch y de ConfiguracionCoeficientes que entran en el cálculo
+CAMPOS_BATCH = (
+    'fecha_inicio', 'fecha_fin', 'mass_total', 'densidad_prom',
+    'temperatura_coriolis_prom', 'pressure_out_prom',
+)
+CAMPOS_CONFIGURACION = (
+    'lim_inf_caudal_masico', 'lim_sup_caudal_masico',
+    'diagnostic_glp_density_ref', 'diagnostic_glp_density_tolerance_pct',
+    'diagnostic_driver_amp_base', 'diagnostic_driver_amp_multiplier',
+    'diagnostic_n1_threshold', 'diagnostic_n2_threshold', 'diagnostic_amp_imbalance_threshold_pct',
+    'mf', 'vis', 'deltavis', 'dn', 'ucal_dens', 'kcal_dens', 'tipdens', 'desv_dens',
+    'ucal_met', 'kcal_met', 'esis_met', 'ucarta_met', 'zero_stab',
+)
+
+
+def version_detalle(batch, config):
+    """Firma de las entradas del cálculo (config puede ser None)."""
+    firma = repr((
+        VERSION_CALCULO,
+        [getattr(batch, campo) for campo in CAMPOS_BATCH],
+        [getattr(config, campo, None) for campo in CAMPOS_CONFIGURACION] if config else None,
+    ))
+    return hashlib.sha1(firma.encode()).hexdigest()
+
+
+def batch_cerrado(batch):
+    """La ventana extendida del batch ya no puede recibir lecturas que no sean tardías."""
+    margen = timedelta(minutes=getattr(settings, 'RESPUESTAS_CACHE_MARGEN_MINUTOS', 15))
+    return batch.fecha_fin + CONTEXTO <= timezone.now() - margen
+
+
+def calcular_detalle_batch(batch, config, max_puntos=MAX_PUNTOS_DETALLE, modo='lttb'):
+    """
+    Lee las lecturas del batch (±3 min) y calcula el detalle.
+
+    Args:
+        batch: BatchDetectado
+        config: ConfiguracionCoeficientes del sistema o None
+        max_puntos: puntos para las gráficas (None = sin decimación)
+        modo: modo de decimación (ver utils_decimation.py)
+
+    Returns:
+        (contenido, rho15): contenido con las claves del detalle para la respuesta, o
+        None si no hay lecturas en la ventana del batch
+    """
+    lim_inf = getattr(config, 'lim_inf_caudal_masico', None) or 0  # En kg/min
+    lim_sup = getattr(config, 'lim_sup_caudal_masico', None) or 9999  # En kg/min
+
+    # Extender el rango de datos 3 minutos antes y después para mejor contexto visual
+    inicio_extendido = batch.fecha_inicio - CONTEXTO
+    fin_extendido = batch.fecha_fin + CONTEXTO
+
+    # Obtener todos los datos del intervalo extendido del batch
+    datos_query = NodeRedData.objects.filter(
+        systemId_id=batch.systemId_id,
+        created_at_iot__gte=inicio_extendido,
+        created_at_iot__lte=fin_extendido,
+        created_at_iot__isnull=False  # Solo datos con timestamp IoT válido
+    ).order_by('created_at_iot')
+
+    # Una sola consulta de las columnas necesarias. La decimación conserva picos y
+    # los instantes de inicio/fin del batch (ver utils_decimation.py)
+    datos, decimacion_info = decimar_filas(
+        datos_query,
+        campos=[
+            'created_at_iot',
+            'mass_rate',
+            'total_mass',
+            'coriolis_temperature',
+            'density',
+            'pressure_out',
+            'driver_curr',
+            'driver_curr_alm',
+            'dsp_rxmsg_amplitudeEstimateA1',
+            'dsp_rxmsg_amplitudeEstimateA2',
+            'dsp_rxmsg_driverAmplitude',
+            'dsp_rxmsg_noiseEstimatedN1',
+            'dsp_rxmsg_noiseEstimatedN2',
+            'coriolis_frecuency',
+        ],
+        campos_senal=['mass_rate', 'density', 'coriolis_temperature', 'pressure_out', 'driver_curr'],
+        max_puntos=max_puntos,
+        modo=modo,
+        instantes_obligatorios=[batch.fecha_inicio, batch.fecha_fin]
+    )
+
+    if not datos:
+        return None
+
+    # Calcular estadísticas de decimación
+    total_registros_db = decimacion_info.get('total_original', len(datos))
+    stats_decimacion = calcular_estadisticas_decimacion(total_registros_db, len(datos))
+    logger.info(f"   Registros para gráfica: {len(datos)} de {total_registros_db} "
+               f"({stats_decimacion['porcentaje_reduccion']:.1f}% reducción)")
+
+    # Preparar datos para el gráfico y acumular Qm (dentro del batch)
+    datos_grafico = []
+    suma_qm_in = 0.0
+    conteo_qm_in = 0
+
+    logger.info(f"   🔄 Procesando {len(datos)} datos para gráficas...")
+
+    for dato in datos:
+        # Convertir UTC a hora de Colombia usando timestamp IoT
+        fecha_colombia = dato.created_at_iot.astimezone(COLOMBIA_TZ)
+
+        # Determinar si el punto está dentro del batch real o en el contexto extendido
+        dentro_batch = batch.fecha_inicio <= dato.created_at_iot <= batch.fecha_fin
+
+        # Convertir mass_rate de lb/sec a kg/min para consistencia
+        mass_rate_kg_min = lb_s_a_kg_min(dato.mass_rate) if dato.mass_rate is not None else None
+
+        # Convertir total_mass de lb a kg
+        total_mass_kg = lb_a_kg(dato.total_mass) if dato.total_mass is not None else None
+
+        # Convertir temperatura de °C a °F
+        temperatura_f = celsius_a_fahrenheit(dato.coriolis_temperature) if dato.coriolis_temperature is not None else None
+
+        registro = {
+            'timestamp': int(fecha_colombia.timestamp() * 1000),  # Para Chart.js
+            'fecha_hora': fecha_colombia.strftime('%d/%m %H:%M:%S'),
+            'mass_rate_lb_s': dato.mass_rate,  # Original en lb/s
+            'mass_rate_kg_min': mass_rate_kg_min,  # Convertido a kg/min
+            'total_mass_lb': dato.total_mass,  # Original en lb
+            'total_mass_kg': total_mass_kg,  # Convertido a kg
+            'coriolis_temperature_c': dato.coriolis_temperature,  # Original en °C
+            'coriolis_temperature_f': temperatura_f,  # Convertido a °F
+            'density': dato.density,
+            'pressure_out': dato.pressure_out,  # Presión de salida en psi
+            'driver_curr': dato.driver_curr,
+            'driver_curr_alm': dato.driver_curr_alm,
+            'dsp_rxmsg_amplitudeEstimateA1': dato.dsp_rxmsg_amplitudeEstimateA1,
+            'dsp_rxmsg_amplitudeEstimateA2': dato.dsp_rxmsg_amplitudeEstimateA2,
+            'dsp_rxmsg_driverAmplitude': dato.dsp_rxmsg_driverAmplitude,
+            'dsp_rxmsg_noiseEstimatedN1': dato.dsp_rxmsg_noiseEstimatedN1,
+            'dsp_rxmsg_noiseEstimatedN2': dato.dsp_rxmsg_noiseEstimatedN2,
+            'coriolis_frequency': dato.coriolis_frecuency,  # Frecuencia del medidor Coriolis
+            'dentro_batch': dentro_batch  # Indica si está dentro del batch real
+        }
+        datos_grafico.append(registro)
+
+        # Acumular Qm solo para puntos dentro del batch
+        if dentro_batch and mass_rate_kg_min is not None:
+            suma_qm_in += mass_rate_kg_min
+            conteo_qm_in += 1
+
+    logger.info(f"   ✅ Datos procesados para gráficas: {len(datos_grafico)} registros")
+
+    # Qm promedio durante el batch
+    Qm_prom = (suma_qm_in / conteo_qm_in) if conteo_qm_in > 0 else None
+
+    # Diagnóstico del medidor (solo datos dentro del batch)
+    datos_batch = [punto for punto in datos_grafico if punto['dentro_batch']]
+    diagnostico_batch = diagnosticar(
+        {campo: [punto[campo] for punto in datos_batch] for campo in CAMPOS_DIAGNOSTICO},
+        batch.densidad_prom,
+        umbrales_diagnostico(config)
+    )
+
+    # Calcular densidad a 60°F (rho15) para usar en GUM
+    rho15 = None
+    try:
+        if batch.densidad_prom is not None and batch.temperatura_coriolis_prom is not None:
+            rho_obs = g_cm3_a_kg_m3(batch.densidad_prom)  # g/cc -> kg/m³
+            T_obs_C = batch.temperatura_coriolis_prom
+            rho15, _gamma60 = rho15_from_rhoobs_api1124(rho_obs, T_obs_C)
+    except Exception as e:
+        logger.warning(f"No fue posible calcular rho15 para batch {batch.id}: {e}")
+
+    # Preparar entradas para motor GUM (usando nombres exactos)
+    incertidumbre_result = None
+    try:
+        # Valores medidos/promedios del batch
+        Tl = celsius_a_fahrenheit(batch.temperatura_coriolis_prom) if batch.temperatura_coriolis_prom is not None else None
+        Pl = batch.pressure_out_prom
+        Masa = batch.mass_total  # ya en kg según modelo
+
+        # Variables de configuración (Incertidumbre) desde ConfiguracionCoeficientes
+        # Pueden ser None si no están configuradas; el motor GUM validará y podría lanzar error
+        gum_input = {
+            'dl': rho15,  # usar densidad a 60°F (kg/m³) calculada en backend
+            'MF': getattr(config, 'mf', None),
+            'vis': getattr(config, 'vis', None),
+            'deltavis': getattr(config, 'deltavis', None),
+            'DN': getattr(config, 'dn', None),
+            'ucalDens': getattr(config, 'ucal_dens', None),
+            'kcalDens': getattr(config, 'kcal_dens', None),
+            'tipdens': getattr(config, 'tipdens', None),
+            'desvdens': getattr(config, 'desv_dens', None),
+            'ucalMet': getattr(config, 'ucal_met', None),
+            'kcalMet': getattr(config, 'kcal_met', None),
+            'esisMet': getattr(config, 'esis_met', None),
+            'ucartaMet': getattr(config, 'ucarta_met', None),
+            'zeroStab': getattr(config, 'zero_stab', None),
+            # Backend-provided (temperatura en °F, presión psi, masa kg, Qm promedio kg/min)
+            'Tl': Tl,
+            'Pl': Pl,
+            'Masa': Masa,
+            'Qm': Qm_prom,
+            # Constantes/fijos
+            'tipoMet': 'COR',
+            'product': 'GLP'
+        }
+
+        # Fallbacks / saneamiento de entradas
+        # MF por defecto 1 si no configurado
+        if gum_input['MF'] is None or gum_input['MF'] == 0:
+            gum_input['MF'] = 1
+        # DN por defecto 1 si no configurado
+        if gum_input['DN'] is None or gum_input['DN'] == 0:
+            gum_input['DN'] = 1
+        # Convertir Qm (kg/min) a kg/h si existe
+        if gum_input['Qm'] is not None:
+            gum_input['Qm'] = gum_input['Qm'] * 60.0
+        # Reemplazar None numéricos por 0 para evitar TypeError dentro de operaciones
+        for clave in ['vis','deltavis','ucalDens','kcalDens','desvdens','ucalMet','kcalMet','esisMet','ucartaMet','zeroStab','Tl','Pl']:
+            if gum_input[clave] is None:
+                gum_input[clave] = 0
+
+        # Verificación mínima antes de cálculo
+        if gum_input['Masa'] and gum_input['Masa'] > 0 and gum_input['dl'] and gum_input['dl'] > 0:
+            incertidumbre_result = GUM(gum_input)
+        else:
+            logger.info(f"Incertidumbre omitida: Masa ({gum_input['Masa']}), dl ({gum_input['dl']}) insuficientes para batch {batch.id}")
+    except Exception as e:
+        logger.warning(f"No fue posible calcular incertidumbre GUM para batch {batch.id}: {e}")
+
+    contenido = {
+        'qm_promedio_kg_min': Qm_prom,
+        'datos_grafico': datos_grafico,
+        'total_datos': len(datos_grafico),
+        # Información de decimación
+        'decimacion_info': {
+            'aplicada': stats_decimacion['decimacion_aplicada'],
+            'registros_originales': stats_decimacion['total_original'],
+            'registros_graficados': stats_decimacion['total_decimado'],
+            'factor_reduccion': stats_decimacion['factor_reduccion'],
+            'porcentaje_reduccion': stats_decimacion['porcentaje_reduccion']
+        },
+        # Límites para las líneas horizontales en el gráfico
+        'lim_inf_caudal_masico': lim_inf,
+        'lim_sup_caudal_masico': lim_sup,
+        # Resultados de Incertidumbre (si se pudo calcular)
+        'incertidumbre': incertidumbre_result,
+        # Diagnóstico del medidor
+        'diagnostico': diagnostico_batch
+    }
+    return contenido, rho15
+
+
+def obtener_detalle_batch(batch, config, max_puntos=MAX_PUNTOS_DETALLE, modo='lttb'):
+    """
+    Detalle del batch: el materializado si está vigente o uno recién calculado (que se
+    guarda si la consulta es la materializable).
+
+    Returns:
+        DetalleBatchCalculado (sin guardar si no aplica materializar) o None si no hay
+        lecturas en la ventana del batch
+    """
+    version = version_detalle(batch, config)
+    materializable = (
+        max_puntos == MAX_PUNTOS_DETALLE
+        and modo == 'lttb'
+        and getattr(settings, 'DETALLE_BATCH_MATERIALIZAR', True)
+        and batch_cerrado(batch)
+    )
+    if materializable:
+        detalle = DetalleBatchCalculado.objects.filter(batch=batch, version=version).first()
+        if detalle is not None:
+            return detalle
+
+    calculado = calcular_detalle_batch(batch, config, max_puntos, modo)
+    if calculado is None:
+        return None
+    contenido, rho15 = calculado
+    detalle = DetalleBatchCalculado(batch=batch, version=version, contenido=contenido, rho15=rho15)
+
+    if materializable:
+        try:
+            # Mismo JSON que la respuesta (tipos de NumPy incluidos)
+            contenido = json.loads(JSONRenderer().render(contenido))
+            detalle, _creado = DetalleBatchCalculado.objects.update_or_create(
+                batch=batch,
+                defaults={'version': version, 'contenido': contenido, 'rho15': rho15}
+            )
+            logger.info(f"💾 Detalle del batch {batch.id} materializado")
+        except Exception as e:
+            logger.error(f"Error guardando el detalle calculado del batch {batch.id}: {str(e)}")
+    return detalle
+
+
+def invalidar_detalles_batch(sistema_id, desde, hasta):
+    """Borra los detalles de los batches cuya ventana extendida toca [desde, hasta]."""
+    try:
+        borrados, _ = DetalleBatchCalculado.objects.filter(
+            batch__systemId_id=sistema_id,
+            batch__fecha_inicio__lte=hasta + CONTEXTO,
+            batch__fecha_fin__gte=desde - CONTEXTO,
+        ).delete()
+        if borrados:
+            logger.info(f"Detalles de batch invalidados por datos tardíos: {borrados} (sistema {sistema_id})")
+    except Exception as e:
+        logger.error(f"Error invalidando detalles de batch del sistema {sistema_id}: {str(e)}")
@@ -0,0 +1,102 @@
+"""
+Exportación CSV en streaming para las vistas históricas.
+
+Las filas se leen con un cursor del servidor (values_list(...).iterator(chunk_size))
+y se escriben a medida que el navegador las consume, de modo que la memoria del
+worker no depende del rango exportado y los primeros bytes salen de inmediato.
+
+Cada vista define sus columnas disponibles como {clave: ColumnaCSV}; el cliente puede
+elegir cuáles exportar y en qué orden con `?columnas=fecha,hora,presion`.
+"""
+import csv
+import logging
+from collections import namedtuple
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from _AppMonitoreoCoriolis.views.utils import COLOMBIA_TZ
+
+logger = logging.getLogger(__name__)
+
+# encabezado: título de la columna
+# campos: columnas de NodeRedData que necesita
+# valor: función (fila: dict campo -> valor) -> valor de la celda
+ColumnaCSV = namedtuple('ColumnaCSV', ['encabezado', 'campos', 'valor'])
+
+
+class _Eco:
+    """Pseudo-buffer: csv.writer escribe y la línea se entrega tal cual al generador."""
+
+    def write(self, valor):
+        return valor
+
+
+def columnas_fecha_hora():
+    """Columnas estándar de fecha y hora (Colombia) a partir de created_at_iot."""
+    return {
+        'fecha': ColumnaCSV(
+            'Fecha', ['created_at_iot'],
+            lambda fila: fila['created_at_iot'].astimezone(COLOMBIA_TZ).strftime('%d/%m/%Y')
+        ),
+        'hora': ColumnaCSV(
+            'Hora', ['created_at_iot'],
+            lambda fila: fila['created_at_iot'].astimezone(COLOMBIA_TZ).strftime('%H:%M:%S')
+        ),
+    }
+
+
+def valor_corregido(campo, campo_m, campo_b, m_actual, b_actual):
+    """Celda m·x + b con los coeficientes del momento (o los vigentes); vacía si no hay dato."""
+    def valor(fila):
+        if fila[campo] is None:
+            return ''
+        m = fila[campo_m] if fila[campo_m] is not None else m_actual
+        b = fila[campo_b] if fila[campo_b] is not None else b_actual
+        return m * float(fila[campo]) + b
+    return valor
+
+
+def valor_crudo(campo):
+    return lambda fila: float(fila[campo]) if fila[campo] is not None else ''
+
+
+def seleccionar_columnas(disponibles, parametro):
+    """
+    Columnas a exportar según `?columnas=a,b,c` (claves desconocidas se ignoran).
+    Sin parámetro, o si ninguna clave es válida, se exportan todas.
+    """
+    if parametro:
+        claves = [c.strip() for c in parametro.split(',') if c.strip() in disponibles]
+        if claves:
+            return [disponibles[c] for c in claves]
+    return list(disponibles.values())
+
+
+def respuesta_csv_streaming(queryset, columnas, nombre_archivo):
+    """
+    StreamingHttpResponse con el CSV de `queryset` (ya filtrado y ordenado).
+
+    Args:
+        queryset: QuerySet de NodeRedData
+        columnas: lista de ColumnaCSV (ver seleccionar_columnas)
+        nombre_archivo: nombre del archivo descargado
+    """
+    campos = []
+    for columna in columnas:
+        for campo in columna.campos:
+            if campo not in campos:
+                campos.append(campo)
+    chunk_size = getattr(settings, 'CSV_EXPORT_CHUNK_SIZE', 2000)
+
+    def generar():
+        writer = csv.writer(_Eco())
+        yield writer.writerow([columna.encabezado for columna in columnas])
+        total = 0
+        for valores in queryset.values_list(*campos).iterator(chunk_size=chunk_size):
+            fila = dict(zip(campos, valores))
+            yield writer.writerow([columna.valor(fila) for columna in columnas])
+            total += 1
+        logger.info(f"📤 Exportación CSV {nombre_archivo}: {total} filas")
+
+    response = StreamingHttpResponse(generar(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    return response
@@ -0,0 +1,148 @@
+"""
+Escaneo de diagnóstico de la flota de medidores.
+
+Evalúa las lecturas recientes de cada sistema con el motor de diagnóstico
+(UTIL_LIB/diagnostico_coriolis.py) y los umbrales diagnostic_* de su
+ConfiguracionCoeficientes, y guarda el resultado en DiagnosticoSistema con un puntaje
+de salud. La lista de "medidores que requieren atención" se sirve desde esa tabla sin
+recalcular nada (DiagnosticoFlotaQueryView).
+
+- Cada sistema se evalúa en un proceso del pool (FLOTA_DIAGNOSTICO_PROCESOS): lectura
+  columnar de la ventana, diagnóstico NumPy y retorno del resultado ya serializable.
+  El proceso principal solo guarda los resultados.
+- Se evalúan las filas con flujo (mass_rate > 0), que son las condiciones de medición;
+  si el medidor estuvo detenido toda la ventana se usan todas y no se estima % de agua.
+- Puntaje: 100 menos la penalización de cada alarma (PENALIZACIONES); None si no hubo
+  lecturas suficientes.
+"""
+import os
+import logging
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from _AppComplementos.models import Sistema
+from _AppMonitoreoCoriolis.models import NodeRedData, DiagnosticoSistema
+from _AppMonitoreoCoriolis.views.utils_cache import cache_configuracion
+from _AppMonitoreoCoriolis.views.utils_procesos import mapear_en_procesos
+from _AppMonitoreoCoriolis.views.utils_series import leer_columnas
+from UTIL_LIB.diagnostico_coriolis import CAMPOS_DIAGNOSTICO, diagnosticar, umbrales_diagnostico
+
+logger = logging.getLogger(__name__)
+
+# Penalización del puntaje de salud por alarma detectada
+PENALIZACIONES = {
+    'agua': 30,
+    'vapor': 25,
+    'driver_curr': 25,
+    'suciedad': 20,
+    'desbalance': 20,
+    'interferencia': 15,
+    'n1': 10,
+    'n2': 10,
+}
+
+
+def puntaje_salud(diagnostico):
+    """Puntaje 0-100 del diagnóstico (None si no hubo datos para diagnosticar)."""
+    if diagnostico['estado_general'] == 'SIN_DATOS':
+        return None
+    penalizacion = sum(PENALIZACIONES.get(alarma, 10) for alarma in diagnostico['alarmas_detectadas'])
+    return float(max(0, 100 - penalizacion))
+
+
+def evaluar_sistema(sistema_id, desde, hasta, umbrales):
+    """
+    Diagnóstico de las lecturas de un sistema en [desde, hasta].
+
+    Returns:
+        dict con sistema_id, total_registros, diagnostico y puntaje
+    """
+    columnas = leer_columnas(
+        NodeRedData.objects.filter(
+            systemId_id=sistema_id,
+            created_at_iot__gte=desde,
+            created_at_iot__lte=hasta
+        ).order_by('created_at_iot'),
+        CAMPOS_DIAGNOSTICO + ['mass_rate', 'density']
+    )
+
+    operando = columnas['mass_rate'] > 0
+    if operando.any():
+        columnas = {campo: valores[operando] for campo, valores in columnas.items()}
+        densidades = columnas['density'][~np.isnan(columnas['density'])]
+        densidad_prom = float(densidades.mean()) if densidades.size else None
+    else:
+        densidad_prom = None
+
+    diagnostico = diagnosticar(columnas, densidad_prom, umbrales)
+    return {
+        'sistema_id': sistema_id,
+        'total_registros': int(columnas['mass_rate'].size),
+        'diagnostico': diagnostico,
+        'puntaje': puntaje_salud(diagnostico),
+    }
+
+
+def _evaluar(tarea):
+    """Trabajo de un proceso del pool: nunca propaga errores para no cortar el escaneo."""
+    sistema_id, desde, hasta, umbrales = tarea
+    try:
+        return evaluar_sistema(sistema_id, desde, hasta, umbrales)
+    except Exception as e:
+        logger.error(f"Error diagnosticando el sistema {sistema_id}: {str(e)}", exc_info=True)
+        return {'sistema_id': sistema_id, 'error': str(e)}
+
+
+def procesos_por_defecto():
+    procesos = getattr(settings, 'FLOTA_DIAGNOSTICO_PROCESOS', 0)
+    return procesos if procesos > 0 else (os.cpu_count() or 1)
+
+
+def escanear_flota(sistema_ids=None, horas=None, procesos=None):
+    """
+    Diagnostica los sistemas (todos por defecto) sobre las últimas `horas` y guarda
+    su DiagnosticoSistema.
+
+    Returns:
+        (evaluados, errores): lista de resultados guardados y de sistemas que fallaron
+    """
+    horas = horas or getattr(settings, 'FLOTA_DIAGNOSTICO_HORAS', 24)
+    procesos = procesos or procesos_por_defecto()
+    hasta = timezone.now()
+    desde = hasta - timedelta(hours=horas)
+
+    sistemas = Sistema.objects.all()
+    if sistema_ids:
+        sistemas = sistemas.filter(id__in=sistema_ids)
+    ids = list(sistemas.values_list('id', flat=True))
+    configuraciones = cache_configuracion.obtener_coeficientes_de(ids)
+    tareas = [
+        (sistema_id, desde, hasta, umbrales_diagnostico(configuraciones.get(sistema_id)))
+        for sistema_id in ids
+    ]
+
+    resultados = mapear_en_procesos(_evaluar, tareas, procesos)
+
+    evaluados, errores = [], []
+    for resultado in resultados:
+        if 'error' in resultado:
+            errores.append(resultado)
+            continue
+        diagnostico = resultado['diagnostico']
+        DiagnosticoSistema.objects.update_or_create(
+            systemId_id=resultado['sistema_id'],
+            defaults={
+                'ventana_inicio': desde,
+                'ventana_fin': hasta,
+                'total_registros': resultado['total_registros'],
+                'estado_general': diagnostico['estado_general'],
+                'puntaje': resultado['puntaje'],
+                'alarmas': diagnostico['alarmas_detectadas'],
+                'diagnostico': diagnostico,
+            }
+        )
+        evaluados.append(resultado)
+
+    logger.info(f"🩺 Escaneo de flota: {len(evaluados)} sistemas evaluados, {len(errores)} con error")
+    return evaluados, errores
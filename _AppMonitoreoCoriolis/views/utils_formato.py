@@ -0,0 +1,126 @@
+"""
+Formato de las series en las respuestas para gráficos.
+
+Parámetro `?formato=`:
+- 'puntos' (por defecto en las vistas históricas y de tendencias): cada serie es una
+  lista de puntos {'fecha', 'valor', 'timestamp'} (o {'x', 'y', 'fecha'} en tendencias).
+- 'columnar': la respuesta lleva un solo eje 'timestamps' (epoch ms) y cada serie es un
+  arreglo paralelo {'valores': [...]} (null = sin dato), con 'min' / 'max' cuando viene
+  de rollups. Sin fechas formateadas: el navegador las arma solo para lo que muestra.
+- 'binario' (solo /api/series/): bloques float32/float64, ver empaquetar_binario().
+"""
+import json
+import struct
+import numpy as np
+from django.http import HttpResponse
+from _AppMonitoreoCoriolis.views.utils_series import etiquetas_fecha, serie, columnas_rollup
+from _AppMonitoreoCoriolis.views.utils_rollups import serie_rollup
+
+MAGIA_BINARIO = b'GSMS'
+VERSION_BINARIO = 1
+CONTENT_TYPE_BINARIO = 'application/vnd.gisme.series'
+
+# magia, versión, bytes por valor, reservado, puntos, longitud del encabezado JSON
+_CABECERA = struct.Struct('<4sBBHII')
+
+
+def formato_pedido(request, permitidos=('puntos', 'columnar')):
+    """Formato de `?formato=`; cualquier otro valor usa el primero de `permitidos`."""
+    formato = request.GET.get('formato', permitidos[0])
+    return formato if formato in permitidos else permitidos[0]
+
+
+def a_lista(valores):
+    """Arreglo NumPy → lista JSON (NaN → null)."""
+    return [None if v != v else v for v in valores.tolist()]
+
+
+class ArmadorSeries:
+    """
+    Arma las series de una vista histórica en el formato pedido. Se inicializa con el
+    eje de la lectura (con_timestamps() o con_rollup()) y luego se pide cada serie:
+
+        armador = ArmadorSeries(request, '%d/%m %H:%M')
+        armador.con_timestamps(columnas['created_at_iot'])
+        datos = armador.serie(valores)
+        ... 'total_registros': armador.total(datos), **armador.eje()
+    """
+
+    def __init__(self, request, formato_fecha='%d/%m %H:%M'):
+        self.columnar = formato_pedido(request) == 'columnar'
+        self.formato_fecha = formato_fecha
+        self._timestamps = np.empty(0, dtype=np.int64)
+        self._etiquetas = []
+        self._buckets = None
+
+    def con_timestamps(self, timestamps_ms):
+        """Eje de una lectura cruda (arreglo de epoch ms)."""
+        self._timestamps = timestamps_ms
+        if not self.columnar:
+            # Las etiquetas se calculan una sola vez para todas las series
+            self._etiquetas = etiquetas_fecha(timestamps_ms, self.formato_fecha)
+
+    def con_rollup(self, buckets):
+        """Eje de una lectura desde rollups (un punto por bucket)."""
+        self._buckets = buckets
+        self._timestamps = np.array(
+            [int(bucket.timestamp() * 1000) for bucket, _total, _est in buckets], dtype=np.int64
+        )
+
+    def serie(self, valores):
+        """Serie cruda (arreglo alineado con el eje)."""
+        if self.columnar:
+            return {'valores': a_lista(valores)}
+        return serie(self._timestamps, self._etiquetas, valores)
+
+    def serie_rollup(self, canal, convertir=None):
+        """Serie de un canal de los rollups: promedio de la ventana más 'min' / 'max'."""
+        if not self.columnar:
+            return serie_rollup(self._buckets, canal, convertir, self.formato_fecha)
+        promedio, minimo, maximo = columnas_rollup(self._buckets, canal, convertir)
+        return {'valores': a_lista(promedio), 'min': a_lista(minimo), 'max': a_lista(maximo)}
+
+    def total(self, datos):
+        return len(self._timestamps) if self.columnar else len(datos)
+
+    def eje(self):
+        """Claves que se agregan a la respuesta (el eje compartido en formato columnar)."""
+        if not self.columnar:
+            return {}
+        return {'formato': 'columnar', 'timestamps': self._timestamps.tolist()}
+
+
+def empaquetar_binario(timestamps_ms, columnas, encabezado, bytes_valor=4):
+    """
+    Respuesta binaria little-endian:
+
+        0   4s   magia 'GSMS'
+        4   u8   versión (1)
+        5   u8   bytes por valor (4 = float32, 8 = float64)
+        6   u16  reservado
+        8   u32  n = número de puntos
+        12  u32  L = longitud del encabezado JSON (UTF-8, relleno con espacios a múltiplo de 8)
+        16  L    encabezado JSON: `encabezado` + 'columnas' (orden de los bloques)
+        ... float64[n]  timestamps (epoch ms, exactos en float64)
+        ... por cada columna: float32/float64[n]  (NaN = sin dato)
+
+    Los bloques quedan alineados para leerse con Float64Array / Float32Array sin copiar.
+
+    Args:
+        timestamps_ms: arreglo de epoch ms
+        columnas: lista de (nombre, arreglo) en el orden en que se escriben
+        encabezado: dict con los metadatos de la respuesta
+        bytes_valor: 4 o 8
+    """
+    tipo = '<f4' if bytes_valor == 4 else '<f8'
+    meta = dict(encabezado, columnas=[nombre for nombre, _valores in columnas])
+    meta_json = json.dumps(meta, default=str).encode('utf-8')
+    meta_json += b' ' * (-len(meta_json) % 8)
+
+    partes = [
+        _CABECERA.pack(MAGIA_BINARIO, VERSION_BINARIO, bytes_valor, 0, len(timestamps_ms), len(meta_json)),
+        meta_json,
+        np.asarray(timestamps_ms, dtype='<f8').tobytes(),
+    ]
+    partes.extend(np.asarray(valores, dtype=tipo).tobytes() for _nombre, valores in columnas)
+    return HttpResponse(b''.join(partes), content_type=CONTENT_TYPE_BINARIO)
@@ -0,0 +1,260 @@
+"""
+Formato binario compacto para la ingesta Node-RED (api/node-red/bulk/).
+
+En JSON cada lectura repite ~60 nombres de campo y cada valor se serializa como texto.
+Los gateways de alta frecuencia pueden enviar en su lugar un lote columnar con
+Content-Type application/vnd.gisme.lecturas (JSON sigue siendo el formato por defecto):
+
+    0   4s   magia 'GSMI'
+    4   u8   versión (1)
+    5   u8   bytes por valor (4 = float32, 8 = float64)
+    6   u16  reservado
+    8   u32  n = número de lecturas
+    12  u32  L = longitud del encabezado JSON (UTF-8, relleno con espacios a múltiplo de 8)
+    16  L    encabezado JSON: {"mac_gateway": "...", "campos": [...]} o {"mac_gateway", "mapa"}
+    ... float64[n]  created_at_iot (epoch ms; NaN = sin fecha)
+    ... por cada campo: float32/float64[n]  (NaN = sin dato)
+
+Es el mismo esquema de la respuesta binaria de /api/series/ (utils_formato.empaquetar_binario).
+
+Mapa de campos por gateway: la primera vez el gateway envía la lista `campos` (campos
+FloatField de NodeRedData, en el orden de los bloques) y la respuesta incluye el
+identificador `mapa`. Mientras no cambie su lista, los siguientes lotes pueden enviar
+solo {"mapa": "..."}. Si el servidor no lo conoce (p. ej. expiró de la caché) responde 409
+y el gateway vuelve a enviar `campos`.
+"""
+import json
+import struct
+import hashlib
+import logging
+from datetime import timezone as dt_timezone
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.db import models
+from _AppMonitoreoCoriolis.models import NodeRedData
+from _AppMonitoreoCoriolis.views.utils_validacion import CAMPOS_IGNORADOS
+
+logger = logging.getLogger(__name__)
+
+MAGIA_LECTURAS = b'GSMI'
+VERSION_LECTURAS = 1
+CONTENT_TYPE_LECTURAS = 'application/vnd.gisme.lecturas'
+
+# magia, versión, bytes por valor, reservado, lecturas, longitud del encabezado JSON
+_CABECERA = struct.Struct('<4sBBHII')
+
+# 9999-12-31T23:59:59.999Z
+_MAX_TIMESTAMP_MS = 253402300799999
+
+# Campos numéricos que puede traer un bloque
+CAMPOS_BINARIOS = frozenset(
+    campo.name for campo in NodeRedData._meta.concrete_fields
+    if isinstance(campo, models.FloatField) and campo.name not in CAMPOS_IGNORADOS
+)
+
+
+class MapaDesconocido(Exception):
+    """El lote trae un `mapa` que el servidor no tiene registrado para el gateway."""
+
+    def __init__(self, mapa):
+        super().__init__(mapa)
+        self.mapa = mapa
+
+
+class MacNoAutorizada(Exception):
+    """La credencial del request no puede enviar lecturas (ni registrar mapas) de la mac_gateway del lote."""
+
+    def __init__(self, mac_gateway):
+        super().__init__(mac_gateway)
+        self.mac_gateway = mac_gateway
+
+
+def _cache():
+    return caches[getattr(settings, 'NODE_RED_MAPAS_CACHE', 'respuestas')]
+
+
+def _clave_mapa(mac_gateway, mapa):
+    return f'gisme:ingesta:mapa:{mac_gateway}:{mapa}'
+
+
+def id_mapa(campos):
+    return hashlib.sha1(','.join(campos).encode('utf-8')).hexdigest()[:16]
+
+
+def registrar_mapa(mac_gateway, campos):
+    """Guarda el mapa de campos del gateway y retorna su identificador."""
+    mapa = id_mapa(campos)
+    try:
+        _cache().set(_clave_mapa(mac_gateway, mapa), list(campos), None)
+    except Exception as e:
+        # Sin caché el gateway seguirá enviando `campos` (recibirá 409 al usar el mapa)
+        logger.error(f"Error registrando el mapa de campos de {mac_gateway}: {str(e)}")
+    return mapa
+
+
+def obtener_mapa(mac_gateway, mapa):
+    try:
+        campos = _cache().get(_clave_mapa(mac_gateway, mapa))
+    except Exception as e:
+        logger.error(f"Error leyendo el mapa de campos de {mac_gateway}: {str(e)}")
+        campos = None
+    if campos is None:
+        raise MapaDesconocido(mapa)
+    return campos
+
+
+def empaquetar_lecturas(mac_gateway, timestamps_ms, columnas, bytes_valor=4, mapa=None):
+    """
+    Arma un lote binario (referencia del formato para los gateways y las pruebas).
+
+    Args:
+        mac_gateway: MAC del gateway
+        timestamps_ms: epoch ms de cada lectura
+        columnas: lista de (campo, valores) en el orden de los bloques
+        bytes_valor: 4 o 8
+        mapa: si se indica, el encabezado lleva el mapa en lugar de la lista de campos
+    """
+    tipo = '<f4' if bytes_valor == 4 else '<f8'
+    meta = {'mac_gateway': mac_gateway}
+    if mapa:
+        meta['mapa'] = mapa
+    else:
+        meta['campos'] = [campo for campo, _valores in columnas]
+    meta_json = json.dumps(meta).encode('utf-8')
+    meta_json += b' ' * (-len(meta_json) % 8)
+
+    partes = [
+        _CABECERA.pack(MAGIA_LECTURAS, VERSION_LECTURAS, bytes_valor, 0, len(timestamps_ms), len(meta_json)),
+        meta_json,
+        np.asarray(timestamps_ms, dtype='<f8').tobytes(),
+    ]
+    partes.extend(np.asarray(valores, dtype=tipo).tobytes() for _campo, valores in columnas)
+    return b''.join(partes)
+
+
+def decodificar_lecturas(cuerpo, max_registros=None, autorizada=None):
+    """
+    Decodifica un lote binario en columnas NumPy (vistas sobre el cuerpo, sin copiar).
+
+    Args:
+        cuerpo: bytes del lote
+        max_registros: máximo de lecturas aceptadas
+        autorizada: función(mac_gateway) -> bool; se verifica antes de registrar o leer
+            el mapa de campos, para que una credencial no pueda reemplazar el de otro gateway
+
+    Returns:
+        dict con mac_gateway, campos, mapa (si el lote trae `campos` se registra),
+        timestamps (float64, epoch ms) y columnas {campo: arreglo float}
+
+    Raises:
+        ValueError: lote mal formado o con campos que no son numéricos de NodeRedData
+        MacNoAutorizada: `autorizada` rechazó la mac_gateway del lote
+        MapaDesconocido: el lote usa un mapa que el servidor no conoce
+    """
+    if len(cuerpo) < _CABECERA.size:
+        raise ValueError("Lote binario incompleto.")
+    magia, version, bytes_valor, _reservado, n, largo_meta = _CABECERA.unpack_from(cuerpo)
+    if magia != MAGIA_LECTURAS or version != VERSION_LECTURAS:
+        raise ValueError("Lote binario con magia o versión desconocida.")
+    if bytes_valor not in (4, 8):
+        raise ValueError("Bytes por valor inválidos (use 4 u 8).")
+    if max_registros is not None and n > max_registros:
+        raise ValueError(f"El lote excede el máximo permitido de {max_registros} registros.")
+
+    inicio = _CABECERA.size
+    try:
+        meta = json.loads(cuerpo[inicio:inicio + largo_meta])
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Encabezado JSON del lote inválido.")
+    if not isinstance(meta, dict) or not meta.get('mac_gateway'):
+        raise ValueError("El encabezado del lote debe incluir mac_gateway.")
+
+    mac_gateway = str(meta['mac_gateway'])
+    if autorizada is not None and not autorizada(mac_gateway):
+        raise MacNoAutorizada(mac_gateway)
+    if isinstance(meta.get('campos'), list):
+        campos = [str(campo) for campo in meta['campos']]
+        mapa = registrar_mapa(mac_gateway, campos)
+    elif meta.get('mapa'):
+        mapa = str(meta['mapa'])
+        campos = obtener_mapa(mac_gateway, mapa)
+    else:
+        raise ValueError("El encabezado del lote debe incluir 'campos' o 'mapa'.")
+
+    if len(set(campos)) != len(campos):
+        raise ValueError("Campos repetidos en el lote.")
+
+    offset = inicio + largo_meta
+    esperado = offset + n * 8 + n * bytes_valor * len(campos)
+    if len(cuerpo) != esperado:
+        raise ValueError(f"Tamaño del lote inválido: {len(cuerpo)} bytes, se esperaban {esperado}.")
+
+    timestamps = np.frombuffer(cuerpo, dtype='<f8', count=n, offset=offset)
+    offset += n * 8
+    tipo = '<f4' if bytes_valor == 4 else '<f8'
+    columnas = {}
+    for campo in campos:
+        columnas[campo] = np.frombuffer(cuerpo, dtype=tipo, count=n, offset=offset)
+        offset += n * bytes_valor
+
+    return {
+        'mac_gateway': mac_gateway,
+        'campos': campos,
+        'mapa': mapa,
+        'timestamps': timestamps,
+        'columnas': columnas,
+    }
+
+
+def _a_lista(valores):
+    """Arreglo → lista de Python (NaN → None)."""
+    return [None if v != v else v for v in valores.astype(np.float64).tolist()]
+
+
+def construir_lecturas(lote, sistema, valores_fijos, desconocidos='ignorar'):
+    """
+    Lecturas NodeRedData (sin guardar) de un lote decodificado.
+
+    Args:
+        lote: resultado de decodificar_lecturas()
+        sistema: Sistema del gateway
+        valores_fijos: valores que se estampan en todas las lecturas (coeficientes vigentes)
+        desconocidos: 'ignorar' descarta los campos que no son numéricos de NodeRedData;
+            'rechazar' levanta ValueError
+
+    Raises:
+        ValueError: campos desconocidos con la política 'rechazar'
+    """
+    desconocidos_lote = [campo for campo in lote['campos'] if campo not in CAMPOS_BINARIOS]
+    if desconocidos_lote and desconocidos == 'rechazar':
+        raise ValueError(f"Campos desconocidos en el lote: {', '.join(desconocidos_lote)}")
+
+    columnas = {
+        campo: _a_lista(valores)
+        for campo, valores in lote['columnas'].items()
+        if campo in CAMPOS_BINARIOS and campo not in valores_fijos
+    }
+
+    timestamps = lote['timestamps']
+    validos = ~np.isnan(timestamps)
+    if ((timestamps[validos] < 0) | (timestamps[validos] > _MAX_TIMESTAMP_MS)).any():
+        raise ValueError("created_at_iot fuera de rango en el lote.")
+    fechas = [None] * len(timestamps)
+    for indice, fecha in zip(
+        np.flatnonzero(validos).tolist(),
+        timestamps[validos].astype('datetime64[ms]').tolist()
+    ):
+        fechas[indice] = fecha.replace(tzinfo=dt_timezone.utc)
+
+    nombres = list(columnas)
+    return [
+        NodeRedData(
+            systemId=sistema,
+            mac_gateway=lote['mac_gateway'],
+            created_at_iot=fecha,
+            **dict(zip(nombres, fila)),
+            **valores_fijos
+        )
+        for fecha, *fila in zip(fechas, *columnas.values())
+    ]
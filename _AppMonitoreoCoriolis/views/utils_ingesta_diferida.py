@@ -0,0 +1,477 @@
+"""
+Escritura diferida (write-behind) de la ingesta Node-RED.
+
+Con INGESTA_DIFERIDA_ACTIVA los receptores validan las lecturas y las encolan en el
+buffer del proceso en lugar de insertarlas dentro del request; un hilo de fondo las
+guarda en lotes (bulk_create + ganchos de ingesta, ver guardar_lecturas) cada
+INGESTA_DIFERIDA_LOTE registros o cada INGESTA_DIFERIDA_INTERVALO_MS, lo que ocurra
+primero.
+
+Durabilidad:
+- Cada lectura encolada se escribe además como una línea JSON en el segmento de
+  derrame del proceso (INGESTA_DIFERIDA_DIRECTORIO). Al guardar un lote se abre un
+  segmento nuevo y los anteriores se borran solo después del commit.
+- El proceso mantiene un lock (flock) sobre sus segmentos. Al arrancar, el buffer adopta
+  los segmentos sin lock (de procesos que terminaron sin vaciar) y los guarda. Los ids
+  (UUID) se asignan al encolar y el guardado ignora conflictos, así que reprocesar un
+  segmento ya guardado no duplica lecturas.
+
+Confirmación al gateway (INGESTA_DIFERIDA_CONFIRMACION):
+- 'encolado': tras escribir en el segmento (sobrevive a la caída del proceso) → 202
+- 'disco': además fsync del segmento (sobrevive a la caída del equipo) → 202
+- 'persistido': espera el commit del lote hasta INGESTA_DIFERIDA_ESPERA_MS → 201
+  (202 si vence la espera; la lectura sigue encolada)
+
+Límite de la cola (INGESTA_DIFERIDA_MAX_COLA):
+- Mientras la base de datos no responde la cola del proceso (y sus segmentos) crece.
+  Si al encolar se superaría el límite, encolar lanza ColaLlena sin escribir nada y los
+  receptores responden 503 con Retry-After: el gateway conserva y reintenta sus
+  lecturas. estado() lo reporta como 'saturada'.
+
+Lecturas que no se pueden guardar:
+- Antes de insertar se vuelve a verificar el sistema de cada lectura encolada (pudo
+  eliminarse mientras esperaba). Si el lote igual falla por una lectura (integridad o
+  datos) se divide y se reintenta por mitades hasta aislarla; las que fallan solas se
+  apartan en un segmento de descarte (descartadas-*.ndjson, con el error en '_error') y
+  no bloquean la cola. Los errores de conexión reintentan el lote completo.
+
+Métricas del proceso (profundidad de la cola, latencia de vaciado, errores) en
+buffer_ingesta.estado(), expuestas en /monitoreo/api/node-red/estado-ingesta/.
+"""
+import os
+import glob
+import json
+import time
+import uuid
+import atexit
+import logging
+import threading
+from collections import Counter
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DataError, IntegrityError, close_old_connections, transaction
+from _AppComplementos.models import Sistema
+from _AppMonitoreoCoriolis.models import NodeRedData
+from _AppMonitoreoCoriolis.views.utils_batches import avanzar_detector_en_ingesta, registrar_lecturas_tardias_detector
+from _AppMonitoreoCoriolis.views.utils_tiempo_real import publicar_lecturas
+from _AppMonitoreoCoriolis.views.utils_respuestas import registrar_datos_tardios
+from _AppMonitoreoCoriolis.views.utils_rollups import registrar_lecturas_tardias
+
+try:
+    import fcntl
+except ImportError:  # Sin locks POSIX no se adoptan segmentos de otros procesos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CONFIRMACIONES = ('encolado', 'disco', 'persistido')
+
+# Errores atribuibles a las lecturas del lote (no a la conexión): se aíslan dividiendo el lote
+ERRORES_LECTURA = (IntegrityError, DataError, ValidationError, ValueError, TypeError)
+
+
+class ColaLlena(Exception):
+    """La cola del proceso alcanzó INGESTA_DIFERIDA_MAX_COLA: las lecturas no se encolaron."""
+
+
+_CAMPOS = {campo.attname: campo for campo in NodeRedData._meta.concrete_fields}
+
+
+def ingesta_diferida_activa():
+    return getattr(settings, 'INGESTA_DIFERIDA_ACTIVA', False)
+
+
+def _directorio():
+    return str(getattr(settings, 'INGESTA_DIFERIDA_DIRECTORIO', 'ingesta'))
+
+
+def guardar_lecturas(objetos, ignorar_conflictos=False, verificar_sistemas=False):
+    """
+    Inserta las lecturas en una transacción y dispara los ganchos de ingesta (detector de
+    batches, tiempo real, datos tardíos y rollups pendientes) al confirmarse.
+
+    Con verificar_sistemas (lecturas que esperaron en la cola) se consulta de nuevo el
+    sistema de todas las lecturas, no solo de las que no lo traen cargado.
+
+    Returns:
+        Lecturas descartadas por pertenecer a sistemas eliminados
+    """
+    # Las lecturas recuperadas de un segmento solo traen systemId_id: una consulta para
+    # todos sus sistemas en lugar de una por lectura en los ganchos
+    por_verificar = objetos if verificar_sistemas else [
+        obj for obj in objetos if not NodeRedData.systemId.is_cached(obj)
+    ]
+    huerfanas = []
+    if por_verificar:
+        sistemas = Sistema.objects.in_bulk({obj.systemId_id for obj in por_verificar})
+        for obj in por_verificar:
+            if obj.systemId_id in sistemas:
+                obj.systemId = sistemas[obj.systemId_id]
+            else:
+                huerfanas.append(obj)
+        if huerfanas:
+            logger.warning(f"Ingesta diferida: {len(huerfanas)} lecturas de sistemas eliminados descartadas")
+            ids = {obj.id for obj in huerfanas}
+            objetos = [obj for obj in objetos if obj.id not in ids]
+
+    with transaction.atomic():
+        NodeRedData.objects.bulk_create(objetos, batch_size=500, ignore_conflicts=ignorar_conflictos)
+        # La marca de re-escaneo se registra antes para que el avance del detector la consuma
+        registrar_lecturas_tardias_detector(objetos)
+        avanzar_detector_en_ingesta({obj.systemId for obj in objetos})
+        publicar_lecturas(objetos)
+        registrar_datos_tardios(objetos)
+        registrar_lecturas_tardias(objetos)
+    return huerfanas
+
+
+def _a_linea(obj):
+    return json.dumps({campo: getattr(obj, campo) for campo in _CAMPOS}, cls=DjangoJSONEncoder) + '\n'
+
+
+def _de_linea(linea):
+    # to_python devuelve UUID, datetime, etc. a partir de lo que produjo DjangoJSONEncoder
+    return NodeRedData(**{
+        nombre: _CAMPOS[nombre].to_python(valor)
+        for nombre, valor in json.loads(linea).items() if nombre in _CAMPOS
+    })
+
+
+class _Segmento:
+    """Archivo de derrame (una lectura JSON por línea) con lock exclusivo del proceso."""
+
+    def __init__(self, ruta, archivo):
+        self.ruta = ruta
+        self.archivo = archivo
+
+    @classmethod
+    def nuevo(cls, directorio):
+        ruta = os.path.join(directorio, f'ingesta-{os.getpid()}-{uuid.uuid4().hex}.ndjson')
+        archivo = open(ruta, 'a+', encoding='utf-8')
+        if fcntl is not None:
+            fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return cls(ruta, archivo)
+
+    @classmethod
+    def adoptar(cls, ruta):
+        """Toma el segmento si ningún proceso vivo tiene su lock; si no, None."""
+        try:
+            archivo = open(ruta, 'r+', encoding='utf-8')
+        except FileNotFoundError:
+            return None
+        try:
+            fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            archivo.close()
+            return None
+        if not os.path.exists(ruta):
+            # Otro proceso lo guardó y borró mientras se tomaba el lock
+            archivo.close()
+            return None
+        return cls(ruta, archivo)
+
+    def escribir(self, lineas, sincronizar=False):
+        self.archivo.write(''.join(lineas))
+        self.archivo.flush()
+        if sincronizar:
+            os.fsync(self.archivo.fileno())
+
+    def leer(self):
+        self.archivo.seek(0)
+        objetos = []
+        for numero, linea in enumerate(self.archivo, start=1):
+            if not linea.strip():
+                continue
+            try:
+                objetos.append(_de_linea(linea))
+            except (ValueError, TypeError, ValidationError) as e:
+                # Línea truncada por una caída durante la escritura
+                logger.warning(f"Línea inválida {numero} en {self.ruta}: {str(e)}")
+        return objetos
+
+    def eliminar(self):
+        try:
+            os.remove(self.ruta)
+        except FileNotFoundError:
+            pass
+        self.archivo.close()
+
+
+class BufferIngesta:
+    """
+    Cola en memoria de lecturas pendientes de guardar, con segmentos de derrame en disco
+    y un hilo que la vacía por lotes. Una instancia por proceso (buffer_ingesta).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hay_trabajo = threading.Condition(self._lock)
+        self._pid = None
+        self._hilo = None
+        self.directorio = None
+
+    # ------------------------------------------------------------------
+    # Configuración
+    # ------------------------------------------------------------------
+    @property
+    def lote(self):
+        return getattr(settings, 'INGESTA_DIFERIDA_LOTE', 500)
+
+    @property
+    def intervalo(self):
+        return getattr(settings, 'INGESTA_DIFERIDA_INTERVALO_MS', 500) / 1000
+
+    @property
+    def confirmacion(self):
+        confirmacion = getattr(settings, 'INGESTA_DIFERIDA_CONFIRMACION', 'encolado')
+        return confirmacion if confirmacion in CONFIRMACIONES else 'encolado'
+
+    @property
+    def max_cola(self):
+        return getattr(settings, 'INGESTA_DIFERIDA_MAX_COLA', 50000)
+
+    # ------------------------------------------------------------------
+    # Estado del proceso
+    # ------------------------------------------------------------------
+    def _preparar(self):
+        """Inicializa el buffer en este proceso (también después de un fork). Requiere el lock."""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self.directorio = _directorio()
+        # (objeto, evento de confirmación o None, instante de encolado)
+        self._cola = []
+        self._segmentos = []
+        self._vaciando = False
+        self._en_vuelo = 0
+        self._detener = False
+        self._metricas = {
+            'encolados': 0,
+            # True desde que se rechaza por cola llena hasta el siguiente guardado exitoso
+            'saturada': False,
+            'rechazados': 0,
+            'ultimo_rechazo': None,
+            'guardados': 0,
+            'descartados': 0,
+            'vaciados': 0,
+            'errores': 0,
+            'ultimo_error': None,
+            'ultimo_vaciado': None,
+            'latencia_ultimo_ms': None,
+            'latencia_max_ms': 0.0,
+            'latencia_total_ms': 0.0,
+        }
+        os.makedirs(self.directorio, exist_ok=True)
+        self._adoptar_huerfanos()
+        self._actual = _Segmento.nuevo(self.directorio)
+        self._hilo = None
+
+    def _iniciar_hilo(self):
+        """Arranca el hilo de vaciado de este proceso. Requiere el lock."""
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._ciclo, name='ingesta-diferida', daemon=True)
+            self._hilo.start()
+            atexit.register(self.detener)
+
+    def _adoptar_huerfanos(self):
+        if fcntl is None:
+            return
+        for ruta in sorted(glob.glob(os.path.join(self.directorio, 'ingesta-*.ndjson'))):
+            segmento = _Segmento.adoptar(ruta)
+            if segmento is None:
+                continue
+            objetos = segmento.leer()
+            if not objetos:
+                segmento.eliminar()
+                continue
+            ahora = time.monotonic()
+            self._cola.extend((obj, None, ahora) for obj in objetos)
+            self._segmentos.append(segmento)
+            logger.warning(f"Ingesta diferida: {len(objetos)} lecturas recuperadas de {ruta}")
+
+    # ------------------------------------------------------------------
+    # Encolado (desde los receptores)
+    # ------------------------------------------------------------------
+    def encolar(self, objetos):
+        """
+        Encola lecturas ya validadas (con id asignado) según la confirmación configurada.
+
+        Returns:
+            True si las lecturas quedaron guardadas en la base de datos ('persistido'),
+            False si solo quedaron encoladas
+
+        Raises:
+            ColaLlena: si encolarlas superaría INGESTA_DIFERIDA_MAX_COLA (no se encola ninguna)
+        """
+        confirmacion = self.confirmacion
+        evento = threading.Event() if confirmacion == 'persistido' else None
+        lineas = [_a_linea(obj) for obj in objetos]
+        with self._lock:
+            self._preparar()
+            self._iniciar_hilo()
+            # El lote que se está guardando vuelve a la cola si el guardado falla
+            if self._en_vuelo + len(self._cola) + len(objetos) > self.max_cola:
+                self._metricas['saturada'] = True
+                self._metricas['rechazados'] += len(objetos)
+                self._metricas['ultimo_rechazo'] = time.time()
+                raise ColaLlena(
+                    f"Cola de ingesta llena ({self._en_vuelo + len(self._cola)} de {self.max_cola} lecturas)"
+                )
+            self._actual.escribir(lineas, sincronizar=confirmacion == 'disco')
+            ahora = time.monotonic()
+            self._cola.extend((obj, evento, ahora) for obj in objetos)
+            self._metricas['encolados'] += len(objetos)
+            # En modo 'persistido' el request espera el commit: no aguardar el intervalo
+            if evento is not None or len(self._cola) >= self.lote:
+                self._hay_trabajo.notify()
+
+        if evento is None:
+            return False
+        return evento.wait(getattr(settings, 'INGESTA_DIFERIDA_ESPERA_MS', 2000) / 1000)
+
+    # ------------------------------------------------------------------
+    # Vaciado (hilo de fondo)
+    # ------------------------------------------------------------------
+    def _ciclo(self):
+        espera = self.intervalo
+        while True:
+            with self._lock:
+                if not self._detener and len(self._cola) < self.lote:
+                    self._hay_trabajo.wait(espera)
+                if self._detener:
+                    return
+            ok = self.vaciar()
+            # Reintentos con espera creciente mientras la base de datos falle
+            espera = self.intervalo if ok else min(espera * 2, 30)
+            close_old_connections()
+
+    def vaciar(self):
+        """Guarda todo lo encolado en este proceso. Retorna False si el guardado falló."""
+        with self._lock:
+            self._preparar()
+            if self._vaciando or not self._cola:
+                return True
+            self._vaciando = True
+            pendientes, self._cola = self._cola, []
+            self._en_vuelo = len(pendientes)
+            segmentos = self._segmentos + [self._actual]
+            self._segmentos = []
+            self._actual = _Segmento.nuevo(self.directorio)
+
+        inicio = time.monotonic()
+        try:
+            descartadas = self._guardar_por_partes([obj for obj, _evento, _encolado in pendientes])
+            if descartadas:
+                self._descartar(descartadas)
+        except Exception as e:
+            logger.error(f"Ingesta diferida: error guardando {len(pendientes)} lecturas: {str(e)}", exc_info=True)
+            with self._lock:
+                # Se conservan en memoria y en sus segmentos para el siguiente intento
+                self._cola = pendientes + self._cola
+                self._segmentos = segmentos + self._segmentos
+                self._metricas['errores'] += 1
+                self._metricas['ultimo_error'] = str(e)
+                self._vaciando = False
+                self._en_vuelo = 0
+            return False
+
+        for segmento in segmentos:
+            segmento.eliminar()
+        # Un request 'persistido' con alguna lectura descartada no se confirma (vence la espera)
+        ids_descartados = {obj.id for obj, _error in descartadas}
+        fallidos = {evento for obj, evento, _encolado in pendientes if obj.id in ids_descartados}
+        for evento in {evento for _obj, evento, _encolado in pendientes if evento is not None} - fallidos:
+            evento.set()
+
+        latencia_ms = (time.monotonic() - inicio) * 1000
+        with self._lock:
+            metricas = self._metricas
+            metricas['guardados'] += len(pendientes) - len(descartadas)
+            metricas['descartados'] += len(descartadas)
+            metricas['vaciados'] += 1
+            metricas['ultimo_vaciado'] = time.time()
+            metricas['latencia_ultimo_ms'] = latencia_ms
+            metricas['latencia_max_ms'] = max(metricas['latencia_max_ms'], latencia_ms)
+            metricas['latencia_total_ms'] += latencia_ms
+            metricas['saturada'] = False
+            self._vaciando = False
+            self._en_vuelo = 0
+        logger.debug(f"Ingesta diferida: {len(pendientes)} lecturas guardadas en {latencia_ms:.1f} ms")
+        return True
+
+    def _guardar_por_partes(self, objetos):
+        """
+        Guarda las lecturas; si el lote falla por alguna lectura lo divide por mitades hasta
+        aislar las que no se pueden guardar. Los errores de conexión se propagan.
+
+        Returns:
+            [(lectura, error)] de las lecturas que no se pudieron guardar
+        """
+        try:
+            huerfanas = guardar_lecturas(objetos, ignorar_conflictos=True, verificar_sistemas=True)
+        except ERRORES_LECTURA as e:
+            if len(objetos) == 1:
+                return [(objetos[0], e)]
+            mitad = len(objetos) // 2
+            return self._guardar_por_partes(objetos[:mitad]) + self._guardar_por_partes(objetos[mitad:])
+        return [(obj, 'Sistema eliminado') for obj in huerfanas]
+
+    def _descartar(self, descartadas):
+        """Aparta en un segmento de descarte (fuera de la cola) las lecturas que no se pudieron guardar."""
+        ruta = os.path.join(self.directorio, f'descartadas-{os.getpid()}-{uuid.uuid4().hex}.ndjson')
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            for obj, error in descartadas:
+                archivo.write(json.dumps(
+                    {**{campo: getattr(obj, campo) for campo in _CAMPOS}, '_error': str(error)},
+                    cls=DjangoJSONEncoder
+                ) + '\n')
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        por_causa = Counter((obj.systemId_id, str(error)) for obj, error in descartadas)
+        for (sistema_id, error), cantidad in por_causa.items():
+            logger.error(f"Ingesta diferida: {cantidad} lecturas del sistema {sistema_id} descartadas en {ruta}: {error}")
+
+    def detener(self):
+        """Vacía lo pendiente al terminar el proceso (lo que falle queda en los segmentos)."""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self._detener = True
+            self._hay_trabajo.notify()
+        if self.vaciar():
+            with self._lock:
+                if not self._cola:
+                    self._actual.eliminar()
+
+    # ------------------------------------------------------------------
+    # Métricas
+    # ------------------------------------------------------------------
+    def estado(self):
+        with self._lock:
+            activo = self._pid == os.getpid()
+            metricas = dict(self._metricas) if activo else {}
+            en_cola = self._en_vuelo + len(self._cola) if activo else 0
+            mas_antigua = self._cola[0][2] if activo and self._cola else None
+            segmentos = len(self._segmentos) + 1 if activo else 0
+
+        latencia_total = metricas.pop('latencia_total_ms', 0.0)
+        archivos = glob.glob(os.path.join(self.directorio or _directorio(), 'ingesta-*.ndjson'))
+        return {
+            'activa': ingesta_diferida_activa(),
+            'confirmacion': self.confirmacion,
+            'pid': os.getpid(),
+            'en_cola': en_cola,
+            'max_cola': self.max_cola,
+            'espera_mas_antigua_ms': (time.monotonic() - mas_antigua) * 1000 if mas_antigua else None,
+            'segmentos_proceso': segmentos,
+            'latencia_promedio_ms': latencia_total / metricas['vaciados'] if metricas.get('vaciados') else None,
+            **metricas,
+            # Todos los procesos del nodo
+            'segmentos_directorio': len(archivos),
+            'bytes_directorio': sum(os.path.getsize(ruta) for ruta in archivos if os.path.exists(ruta)),
+        }
+
+
+# Instancia compartida por proceso
+buffer_ingesta = BufferIngesta()
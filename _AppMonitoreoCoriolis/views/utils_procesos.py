@@ -0,0 +1,30 @@
+"""
+Pool de procesos para los trabajos por lotes (escaneo de la flota, carga histórica).
+
+Cada proceso configura Django por su cuenta y abre sus propias conexiones; el proceso
+principal cierra las suyas antes de crear el pool para no compartirlas.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from django.db import connections
+
+
+def _inicializar_proceso():
+    # Con 'spawn' / 'forkserver' el proceso no hereda Django configurado
+    import django
+    django.setup()
+
+
+def mapear_en_procesos(funcion, tareas, procesos):
+    """
+    Aplica `funcion` (de nivel de módulo) a cada tarea en un pool de hasta `procesos`
+    procesos; en el mismo proceso si es uno solo o hay una sola tarea.
+
+    Returns:
+        Lista de resultados en el orden de las tareas
+    """
+    if procesos > 1 and len(tareas) > 1:
+        # Los procesos abren sus propias conexiones: no compartir las del padre
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=min(procesos, len(tareas)), initializer=_inicializar_proceso) as pool:
+            return list(pool.map(funcion, tareas))
+    return [funcion(tarea) for tarea in tareas]
@@ -0,0 +1,186 @@
+"""
+Caché de respuestas de las vistas de consulta para ventanas cerradas.
+
+Una consulta sobre un rango pasado (p. ej. ayer en hora de Colombia) produce siempre la
+misma respuesta mientras no lleguen datos tardíos ni cambien los coeficientes, así que se
+guarda ya serializada en el alias RESPUESTAS_CACHE de CACHES (por defecto en archivos,
+compartido por los workers del nodo sin servicios externos).
+
+- Clave: vista, sistema, generación del sistema, parámetros de la petición (canales,
+  rango, decimación, resolución, formato, paginación, ...) y partes extra de la vista
+  (coeficientes vigentes).
+- Generación: token aleatorio por sistema. invalidar_respuestas() lo reemplaza y todas las
+  respuestas guardadas del sistema quedan inalcanzables (expiran por TTL). Se invalida:
+  - al llegar lecturas anteriores a ahora - RESPUESTAS_CACHE_MARGEN_MINUTOS
+    (registrar_datos_tardios, desde la ingesta),
+  - al cambiar el sistema, sus coeficientes o sus batches (signals.py, guardar_batches).
+- Los datos tardíos también borran el detalle materializado de los batches que tocan
+  (utils_detalle_batch.invalidar_detalles_batch).
+- Solo se cachean ventanas que terminan antes de ahora - margen, sin `since` (modo delta)
+  y con estado 200.
+"""
+import uuid
+import hashlib
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from _AppMonitoreoCoriolis.views.utils_detalle_batch import invalidar_detalles_batch
+
+logger = logging.getLogger(__name__)
+
+# Encabezados que se guardan junto con el contenido
+ENCABEZADOS_GUARDADOS = ('ETag', 'Last-Modified', 'Cache-Control')
+
+
+def _cache():
+    return caches[getattr(settings, 'RESPUESTAS_CACHE', 'respuestas')]
+
+
+def _clave_generacion(sistema_id):
+    return f'gisme:respuestas:generacion:{sistema_id}'
+
+
+def _margen():
+    return timedelta(minutes=getattr(settings, 'RESPUESTAS_CACHE_MARGEN_MINUTOS', 15))
+
+
+def _generacion(cache, sistema_id):
+    """Token vigente del sistema; si no existe (o la caché lo descartó) se crea uno nuevo."""
+    clave = _clave_generacion(sistema_id)
+    generacion = cache.get(clave)
+    if generacion is None:
+        cache.add(clave, uuid.uuid4().hex, None)
+        generacion = cache.get(clave)
+    return generacion
+
+
+def invalidar_respuestas(sistema_id):
+    """Descarta todas las respuestas guardadas del sistema."""
+    try:
+        _cache().set(_clave_generacion(sistema_id), uuid.uuid4().hex, None)
+    except Exception as e:
+        logger.error(f"Error invalidando la caché de respuestas del sistema {sistema_id}: {str(e)}")
+
+
+def registrar_datos_tardios(lecturas):
+    """
+    Invalida las respuestas (y los detalles de batch materializados) de los sistemas que
+    recibieron lecturas dentro de ventanas que ya pudieron cachearse. Se ejecuta al confirmarse la transacción de la ingesta.
+    """
+    limite = timezone.now() - _margen()
+    # Rango de lecturas tardías por sistema
+    rangos = {}
+    for lectura in lecturas:
+        fecha = lectura.created_at_iot
+        if fecha is None or fecha >= limite:
+            continue
+        desde, hasta = rangos.get(lectura.systemId_id, (fecha, fecha))
+        rangos[lectura.systemId_id] = (min(desde, fecha), max(hasta, fecha))
+
+    def invalidar(sistema_id, desde, hasta):
+        invalidar_respuestas(sistema_id)
+        invalidar_detalles_batch(sistema_id, desde, hasta)
+
+    for sistema_id, (desde, hasta) in rangos.items():
+        transaction.on_commit(lambda sistema_id=sistema_id, desde=desde, hasta=hasta: invalidar(sistema_id, desde, hasta))
+
+
+class CacheRespuesta:
+    """
+    Respuesta cacheada de una petición a una vista de consulta.
+
+        cache_respuesta = CacheRespuesta(request, 'flujo', sistema.id, fecha_fin, partes=coeficientes)
+        respuesta = cache_respuesta.obtener()
+        if respuesta is not None:
+            return respuesta
+        ...
+        return cache_respuesta.guardar(response)
+
+    Args:
+        request: request de DRF
+        vista: nombre corto de la vista
+        sistema_id: sistema cuya generación versiona la respuesta
+        fecha_fin: fin de la ventana consultada (UTC); solo se cachea si ya está cerrada
+        partes: valores adicionales de la clave (p. ej. coeficientes vigentes)
+        cacheable: la vista puede descartar el caché para esta petición (p. ej. tiempo real)
+    """
+
+    def __init__(self, request, vista, sistema_id, fecha_fin, partes=(), cacheable=True):
+        self.request = request
+        self.activa = (
+            cacheable
+            and getattr(settings, 'RESPUESTAS_CACHE_ACTIVA', True)
+            and 'since' not in request.GET
+            and fecha_fin is not None
+            and fecha_fin <= timezone.now() - _margen()
+        )
+        self.clave = None
+        if not self.activa:
+            return
+
+        try:
+            cache = _cache()
+            parametros = sorted(request.GET.items())
+            if request.method == 'POST':
+                parametros += sorted((k, str(v)) for k, v in request.data.items())
+            firma = repr((
+                vista, str(sistema_id), _generacion(cache, sistema_id), parametros, tuple(partes)
+            ))
+            self.clave = f'gisme:respuesta:{vista}:{hashlib.sha1(firma.encode()).hexdigest()}'
+        except Exception as e:
+            logger.error(f"Error preparando la caché de respuestas: {str(e)}")
+            self.activa = False
+
+    def obtener(self):
+        """Respuesta guardada (o 304 si el cliente ya la tiene) o None."""
+        if not self.activa:
+            return None
+        try:
+            guardada = _cache().get(self.clave)
+        except Exception as e:
+            logger.error(f"Error leyendo la caché de respuestas: {str(e)}")
+            return None
+        if guardada is None:
+            return None
+
+        contenido, content_type, encabezados = guardada
+        response = None
+        if 'ETag' in encabezados or 'Last-Modified' in encabezados:
+            response = get_conditional_response(
+                self.request,
+                etag=encabezados.get('ETag'),
+                last_modified=parse_http_date_safe(encabezados.get('Last-Modified'))
+            )
+        if response is None:
+            response = HttpResponse(contenido, content_type=content_type)
+        for nombre, valor in encabezados.items():
+            response[nombre] = valor
+        response['X-Cache-Respuesta'] = 'HIT'
+        return response
+
+    def guardar(self, response):
+        """Guarda la respuesta si corresponde y la retorna sin cambios."""
+        if not self.activa or response.status_code != 200:
+            return response
+        try:
+            if isinstance(response, Response):
+                # La respuesta aún no está renderizada: se guarda como JSON
+                contenido, content_type = JSONRenderer().render(response.data), 'application/json'
+            else:
+                contenido, content_type = response.content, response['Content-Type']
+            encabezados = {
+                nombre: response[nombre] for nombre in ENCABEZADOS_GUARDADOS if response.has_header(nombre)
+            }
+            _cache().set(self.clave, (contenido, content_type, encabezados))
+            response['X-Cache-Respuesta'] = 'MISS'
+        except Exception as e:
+            logger.error(f"Error guardando la caché de respuestas: {str(e)}")
+        return response
@@ -0,0 +1,397 @@
+"""
+Rollups (agregados pre-calculados) de NodeRedData a 1 min / 15 min / 1 h.
+
+- actualizar_rollups(): proceso incremental por sistema. Recalcula desde el inicio
+  de la última hora procesada (la ventana más gruesa) para que las ventanas
+  parciales queden completas, y guarda la marca de agua en NodeRedRollupEstado.
+  Se ejecuta con `python manage.py actualizar_rollups` (cron / tarea programada).
+- registrar_lecturas_tardias(): gancho de la ingesta. Las lecturas anteriores a la
+  marca de agua (gateways que se reconectan y vacían su buffer) dejan en
+  NodeRedRollupEstado.pendiente_desde la más antigua, y la siguiente ejecución
+  recalcula desde ahí.
+- obtener_rollups(): usado por las vistas históricas. Elige la resolución más
+  gruesa que todavía entrega ROLLUP_MIN_PUNTOS puntos para el rango y completa
+  la cola aún no procesada agregando en vivo las filas crudas.
+
+pressure_out y redundant_temperature se agregan ya corregidos (mx+b con los
+coeficientes del momento). Las conversiones de unidades (lb/s → kg/min, °C → °F, ...)
+son lineales crecientes y se aplican al leer.
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from _AppMonitoreoCoriolis.models import NodeRedData, NodeRedRollup, NodeRedRollupEstado
+from _AppMonitoreoCoriolis.views.utils import COLOMBIA_TZ, get_coeficientes_correccion
+
+logger = logging.getLogger(__name__)
+
+# De la más fina a la más gruesa
+RESOLUCIONES = {
+    '1m': timedelta(minutes=1),
+    '15m': timedelta(minutes=15),
+    '1h': timedelta(hours=1),
+}
+
+CANALES_ROLLUP = [
+    'flow_rate',
+    'mass_rate',
+    'density',
+    'coriolis_temperature',
+    'diagnostic_temperature',
+    'redundant_temperature',
+    'pressure_out',
+    'coriolis_frecuency',
+    'driver_curr',
+    'dsp_rxmsg_noiseEstimatedN1',
+    'dsp_rxmsg_noiseEstimatedN2',
+    'signal_strength_rxCoriolis',
+    'temperature_gateway',
+]
+
+# Orden de columnas leídas con values_list
+CAMPOS_LECTURA = ['created_at_iot'] + CANALES_ROLLUP + ['mt', 'bt', 'mp', 'bp']
+
+# Tamaño de la ventana de lectura del proceso incremental (múltiplo de 1 h)
+VENTANA_PROCESO = timedelta(days=1)
+
+
+def inicio_bucket(fecha, paso):
+    """Inicio (UTC) de la ventana de tamaño `paso` que contiene `fecha`."""
+    segundos = int(paso.total_seconds())
+    epoch = int(fecha.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % segundos, tz=dt_timezone.utc)
+
+
+def calcular_buckets(filas, resoluciones, coeficientes_actuales):
+    """
+    Agrega filas (tuplas en el orden de CAMPOS_LECTURA, ordenadas por created_at_iot)
+    en ventanas de cada resolución en una sola pasada.
+
+    Returns:
+        {resolucion: {bucket: [total_registros, {canal: [min, max, suma, n, first, last]}]}}
+    """
+    mt_actual, bt_actual, mp_actual, bp_actual = coeficientes_actuales
+    idx_redundant = CAMPOS_LECTURA.index('redundant_temperature')
+    idx_pressure = CAMPOS_LECTURA.index('pressure_out')
+    idx_mt = CAMPOS_LECTURA.index('mt')
+
+    pasos = {res: int(RESOLUCIONES[res].total_seconds()) for res in resoluciones}
+    resultado = {res: {} for res in resoluciones}
+
+    for fila in filas:
+        fecha = fila[0]
+        if fecha is None:
+            continue
+        valores = list(fila[1:idx_mt])
+        mt, bt, mp, bp = fila[idx_mt:]
+
+        # Corrección del momento (o la vigente si el registro no la tiene)
+        if valores[idx_redundant - 1] is not None:
+            valores[idx_redundant - 1] = (
+                (mt if mt is not None else mt_actual) * valores[idx_redundant - 1]
+                + (bt if bt is not None else bt_actual)
+            )
+        if valores[idx_pressure - 1] is not None:
+            valores[idx_pressure - 1] = (
+                (mp if mp is not None else mp_actual) * valores[idx_pressure - 1]
+                + (bp if bp is not None else bp_actual)
+            )
+
+        epoch = int(fecha.timestamp())
+        for res, segundos in pasos.items():
+            clave = epoch - epoch % segundos
+            acumulado = resultado[res].get(clave)
+            if acumulado is None:
+                acumulado = resultado[res][clave] = [0, {}]
+            acumulado[0] += 1
+            canales = acumulado[1]
+            for canal, valor in zip(CANALES_ROLLUP, valores):
+                if valor is None:
+                    continue
+                est = canales.get(canal)
+                if est is None:
+                    canales[canal] = [valor, valor, valor, 1, valor, valor]
+                else:
+                    if valor < est[0]:
+                        est[0] = valor
+                    if valor > est[1]:
+                        est[1] = valor
+                    est[2] += valor
+                    est[3] += 1
+                    est[5] = valor
+
+    return {
+        res: {
+            datetime.fromtimestamp(clave, tz=dt_timezone.utc): acumulado
+            for clave, acumulado in buckets.items()
+        }
+        for res, buckets in resultado.items()
+    }
+
+
+def _estadisticas_json(canales):
+    return {
+        canal: {
+            'min': est[0],
+            'max': est[1],
+            'avg': est[2] / est[3],
+            'first': est[4],
+            'last': est[5],
+            'n': est[3],
+        }
+        for canal, est in canales.items()
+    }
+
+
+def _coeficientes_actuales(sistema):
+    mt, bt, mp, bp, _span, _zero = get_coeficientes_correccion(sistema)
+    return mt, bt, mp, bp
+
+
+def actualizar_rollups(sistema, desde=None):
+    """
+    Actualiza los rollups de un sistema de forma incremental.
+
+    Args:
+        sistema: instancia de Sistema
+        desde: fecha (aware) desde la cual recalcular. Por defecto, el inicio de la
+            hora de la marca de agua (o el primer dato si nunca se ha procesado). Si hay
+            lecturas tardías pendientes se recalcula desde la más antigua.
+
+    Returns:
+        Cantidad de registros crudos procesados.
+    """
+    estado, _ = NodeRedRollupEstado.objects.get_or_create(systemId=sistema)
+    datos = NodeRedData.objects.filter(systemId=sistema, created_at_iot__isnull=False)
+
+    # Se toma (y limpia) la marca de lecturas tardías antes de leer: las que lleguen
+    # durante el recálculo la vuelven a dejar. Si el proceso se interrumpe, la marca de
+    # agua queda en la última ventana recalculada y se retoma desde ahí.
+    pendiente = estado.pendiente_desde
+    if pendiente is not None:
+        NodeRedRollupEstado.objects.filter(pk=estado.pk, pendiente_desde=pendiente).update(pendiente_desde=None)
+
+    if desde is None:
+        if estado.procesado_hasta is not None:
+            desde = estado.procesado_hasta
+        else:
+            primero = datos.order_by('created_at_iot').values_list('created_at_iot', flat=True).first()
+            if primero is None:
+                return 0
+            desde = primero
+    if pendiente is not None:
+        desde = min(desde, pendiente)
+
+    # Hasta la última lectura o la última ya agregada (si se eliminaron las finales)
+    ultimo = max(filter(None, (
+        datos.order_by('-created_at_iot').values_list('created_at_iot', flat=True).first(),
+        estado.procesado_hasta
+    )), default=None)
+    if ultimo is None:
+        return 0
+
+    # Alinear a la resolución más gruesa: todas las ventanas afectadas se recalculan completas
+    ventana_inicio = inicio_bucket(desde, RESOLUCIONES['1h'])
+    coeficientes = _coeficientes_actuales(sistema)
+    total_procesados = 0
+
+    while ventana_inicio <= ultimo:
+        ventana_fin = ventana_inicio + VENTANA_PROCESO
+        filas = list(
+            datos.filter(created_at_iot__gte=ventana_inicio, created_at_iot__lt=ventana_fin)
+            .order_by('created_at_iot')
+            .values_list(*CAMPOS_LECTURA)
+        )
+
+        buckets = calcular_buckets(filas, RESOLUCIONES.keys(), coeficientes) if filas else {}
+        with transaction.atomic():
+            # También en ventanas que se quedaron sin datos: no deben quedar rollups de filas eliminadas
+            NodeRedRollup.objects.filter(
+                systemId=sistema,
+                bucket__gte=ventana_inicio,
+                bucket__lt=ventana_fin
+            ).delete()
+            if filas:
+                NodeRedRollup.objects.bulk_create([
+                    NodeRedRollup(
+                        systemId=sistema,
+                        resolucion=res,
+                        bucket=bucket,
+                        total_registros=acumulado[0],
+                        estadisticas=_estadisticas_json(acumulado[1])
+                    )
+                    for res, por_bucket in buckets.items()
+                    for bucket, acumulado in por_bucket.items()
+                ], batch_size=1000)
+                estado.procesado_hasta = filas[-1][0]
+                estado.save(update_fields=['procesado_hasta', 'actualizado_en'])
+        total_procesados += len(filas)
+
+        ventana_inicio = ventana_fin
+
+    logger.info(f"Rollups {sistema.tag}: {total_procesados} registros procesados, hasta {estado.procesado_hasta}")
+    return total_procesados
+
+
+def registrar_lecturas_tardias(lecturas):
+    """
+    Marca para recálculo los rollups de los sistemas que recibieron lecturas anteriores a
+    su marca de agua. Se ejecuta al confirmarse la transacción de la ingesta.
+
+    actualizar_rollups() recalcula siempre la hora de la marca de agua, así que solo se
+    consultan lecturas de horas anteriores a la actual (una actualización por sistema).
+    """
+    limite = inicio_bucket(timezone.now(), RESOLUCIONES['1h'])
+    minimos = {}
+    for lectura in lecturas:
+        fecha = lectura.created_at_iot
+        if fecha is None or fecha >= limite:
+            continue
+        sistema_id = lectura.systemId_id
+        if sistema_id not in minimos or fecha < minimos[sistema_id]:
+            minimos[sistema_id] = fecha
+    if minimos:
+        transaction.on_commit(lambda: marcar_rollups_pendientes(minimos))
+
+
+def marcar_rollups_pendientes(minimos):
+    """
+    Args:
+        minimos: {sistema_id: created_at_iot más antiguo recibido}
+    """
+    for sistema_id, fecha in minimos.items():
+        try:
+            NodeRedRollupEstado.objects.filter(
+                systemId_id=sistema_id,
+                procesado_hasta__gt=fecha
+            ).filter(
+                Q(pendiente_desde__isnull=True) | Q(pendiente_desde__gt=fecha)
+            ).update(pendiente_desde=fecha)
+        except Exception as e:
+            logger.error(f"Error marcando rollups pendientes del sistema {sistema_id}: {str(e)}")
+
+
+def seleccionar_resolucion(fecha_inicio, fecha_fin):
+    """
+    Resolución más gruesa que todavía produce ROLLUP_MIN_PUNTOS puntos para el rango.
+    Retorna None si el rango es tan corto que conviene leer los datos crudos.
+    """
+    min_puntos = getattr(settings, 'ROLLUP_MIN_PUNTOS', 500)
+    duracion = fecha_fin - fecha_inicio
+    for res in reversed(list(RESOLUCIONES)):
+        if duracion / RESOLUCIONES[res] >= min_puntos:
+            return res
+    return None
+
+
+def obtener_rollups(sistema, fecha_inicio, fecha_fin, resolucion='auto'):
+    """
+    Buckets agregados del rango para las vistas históricas.
+
+    Args:
+        resolucion: 'auto' (por defecto), 'raw' o una clave de RESOLUCIONES.
+
+    Returns:
+        None si se deben usar los datos crudos, o un dict con:
+        'resolucion', 'buckets' (lista de (bucket, total_registros, estadisticas))
+        y 'total_original' (registros crudos representados).
+    """
+    if resolucion == 'raw':
+        return None
+    if resolucion not in RESOLUCIONES:
+        resolucion = seleccionar_resolucion(fecha_inicio, fecha_fin)
+        if resolucion is None:
+            return None
+
+    estado = NodeRedRollupEstado.objects.filter(systemId=sistema).only('procesado_hasta').first()
+    if estado is None or estado.procesado_hasta is None:
+        return None
+
+    paso = RESOLUCIONES[resolucion]
+    desde = inicio_bucket(fecha_inicio, paso)
+    # La ventana de la marca de agua puede estar incompleta: se recalcula en vivo
+    corte = inicio_bucket(estado.procesado_hasta, paso)
+
+    if fecha_fin >= corte:
+        max_cola = timedelta(minutes=getattr(settings, 'ROLLUP_MAX_COLA_MINUTOS', 180))
+        if fecha_fin - corte > max_cola:
+            logger.warning(
+                f"Rollups de {sistema.tag} atrasados (procesado hasta {estado.procesado_hasta}); usando datos crudos"
+            )
+            return None
+
+    buckets = [
+        (r.bucket, r.total_registros, r.estadisticas)
+        for r in NodeRedRollup.objects.filter(
+            systemId=sistema,
+            resolucion=resolucion,
+            bucket__gte=desde,
+            bucket__lt=corte,
+            bucket__lte=fecha_fin
+        ).order_by('bucket')
+    ]
+
+    if fecha_fin >= corte:
+        filas = (
+            NodeRedData.objects.filter(
+                systemId=sistema,
+                created_at_iot__gte=max(corte, desde),
+                created_at_iot__lte=fecha_fin
+            )
+            .order_by('created_at_iot')
+            .values_list(*CAMPOS_LECTURA)
+        )
+        cola = calcular_buckets(filas, [resolucion], _coeficientes_actuales(sistema))[resolucion]
+        buckets.extend(
+            (bucket, acumulado[0], _estadisticas_json(acumulado[1]))
+            for bucket, acumulado in cola.items()
+        )
+
+    return {
+        'resolucion': resolucion,
+        'buckets': buckets,
+        'total_original': sum(b[1] for b in buckets),
+    }
+
+
+def serie_rollup(buckets, canal, convertir=None, formato_fecha='%d/%m %H:%M'):
+    """
+    Convierte los buckets de un canal al formato de punto de las vistas históricas
+    ({'fecha', 'valor', 'timestamp'}), agregando 'min' y 'max' de la ventana.
+    'valor' es el promedio de la ventana.
+    """
+    serie = []
+    for bucket, _total, estadisticas in buckets:
+        est = estadisticas.get(canal)
+        if not est:
+            continue
+        fecha_colombia = bucket.astimezone(COLOMBIA_TZ)
+        if convertir is not None:
+            valor, minimo, maximo = convertir(est['avg']), convertir(est['min']), convertir(est['max'])
+        else:
+            valor, minimo, maximo = est['avg'], est['min'], est['max']
+        serie.append({
+            'fecha': fecha_colombia.strftime(formato_fecha),
+            'valor': valor,
+            'min': minimo,
+            'max': maximo,
+            'timestamp': int(fecha_colombia.timestamp() * 1000)
+        })
+    return serie
+
+
+def info_rollup(rollup):
+    """decimacion_info equivalente para una respuesta servida desde rollups."""
+    total_original = rollup['total_original']
+    total_decimado = len(rollup['buckets'])
+    return {
+        'aplicada': True,
+        'rollup': rollup['resolucion'],
+        'total_original': total_original,
+        'total_decimado': total_decimado,
+        'factor_reduccion': round(total_original / total_decimado, 2) if total_decimado else 1.0,
+        'porcentaje_reduccion': round((total_original - total_decimado) / total_original * 100, 1) if total_original else 0.0
+    }
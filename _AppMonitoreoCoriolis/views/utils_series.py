@@ -0,0 +1,150 @@
+"""
+Lectura columnar de series de NodeRedData para las vistas históricas.
+
+En lugar de instanciar modelos completos (60+ columnas) y formatear punto a punto:
+- leer_columnas(): una sola consulta values_list con solo las columnas pedidas,
+  convertidas a arreglos NumPy (timestamps en epoch ms, None → NaN).
+- lineal(): versión vectorizada de una conversión lineal de UTIL_LIB.conversiones.
+- corregir(): corrección mx+b con los coeficientes del momento (o los vigentes).
+- etiquetas_fecha() / serie(): arman los puntos {'fecha', 'valor', 'timestamp'}.
+- columnas_rollup(): los buckets de un canal de los rollups como arreglos.
+"""
+import logging
+from datetime import datetime, timezone as dt_timezone
+import numpy as np
+from _AppMonitoreoCoriolis.views.utils import COLOMBIA_TZ
+from _AppMonitoreoCoriolis.views.utils_decimation import decimar_columnas
+
+logger = logging.getLogger(__name__)
+
+# Posición de cada directiva de strftime en 'YYYY-MM-DDTHH:MM:SS'
+_POSICIONES_ISO = {
+    'Y': (0, 4),
+    'm': (5, 7),
+    'd': (8, 10),
+    'H': (11, 13),
+    'M': (14, 16),
+    'S': (17, 19),
+}
+
+
+def leer_columnas(queryset, campos):
+    """
+    Lee `campos` del queryset en una sola consulta y los retorna como columnas.
+
+    Returns:
+        {'created_at_iot': int64 epoch ms, campo: float64 (NaN = sin dato), ...}
+    """
+    campos = list(campos)
+    filas = list(queryset.values_list(*campos))
+    total = len(filas)
+    columnas_crudas = list(zip(*filas)) if filas else [()] * len(campos)
+
+    columnas = {}
+    for campo, valores in zip(campos, columnas_crudas):
+        if campo == 'created_at_iot':
+            columnas[campo] = np.fromiter(
+                (int(fecha.timestamp() * 1000) for fecha in valores), dtype=np.int64, count=total
+            )
+        else:
+            # NumPy convierte None en NaN con dtype float
+            columnas[campo] = np.array(valores, dtype=np.float64)
+    return columnas
+
+
+def leer_series(queryset, campos, campos_senal, max_puntos=2000, modo='lttb'):
+    """leer_columnas + decimación en memoria (ver utils_decimation.decimar_columnas)."""
+    campos = list(campos)
+    if 'mass_rate' not in campos:
+        # Campo de actividad para conservar los bordes de batch
+        campos.append('mass_rate')
+    return decimar_columnas(leer_columnas(queryset, campos), campos_senal, max_puntos, modo)
+
+
+def lineal(conversion):
+    """
+    Vectoriza una conversión lineal de UTIL_LIB.conversiones (f(x) = a·x + b).
+    Los coeficientes se obtienen de la propia función, que sigue siendo la única
+    fuente de los factores de conversión.
+    """
+    b = float(conversion(0.0))
+    a = float(conversion(1.0)) - b
+
+    def convertir(valores):
+        return valores * a + b
+    return convertir
+
+
+def corregir(valores, m_momento, b_momento, m_actual, b_actual):
+    """
+    m·x + b por fila, usando los coeficientes del momento y, si el registro no los
+    tiene (NaN), los vigentes del sistema.
+    """
+    m = np.where(np.isnan(m_momento), m_actual, m_momento)
+    b = np.where(np.isnan(b_momento), b_actual, b_momento)
+    return m * valores + b
+
+
+def _compilar_formato(formato):
+    partes = []
+    i = 0
+    while i < len(formato):
+        if formato[i] == '%' and i + 1 < len(formato) and formato[i + 1] in _POSICIONES_ISO:
+            partes.append(_POSICIONES_ISO[formato[i + 1]])
+            i += 2
+        else:
+            partes.append(formato[i])
+            i += 1
+    return partes
+
+
+def etiquetas_fecha(timestamps_ms, formato='%d/%m %H:%M'):
+    """
+    Etiquetas en hora de Colombia para un arreglo de epoch ms.
+    Soporta las directivas %Y %m %d %H %M %S.
+    """
+    if len(timestamps_ms) == 0:
+        return []
+    # Colombia no tiene horario de verano: un solo desplazamiento para todo el arreglo
+    primero = datetime.fromtimestamp(int(timestamps_ms[0]) / 1000, tz=dt_timezone.utc)
+    desplazamiento_ms = int(COLOMBIA_TZ.utcoffset(primero.replace(tzinfo=None)).total_seconds() * 1000)
+    iso = np.datetime_as_string((timestamps_ms + desplazamiento_ms).astype('datetime64[ms]'), unit='s')
+
+    partes = _compilar_formato(formato)
+    return [
+        ''.join(texto[p[0]:p[1]] if isinstance(p, tuple) else p for p in partes)
+        for texto in iso.tolist()
+    ]
+
+
+def serie(timestamps_ms, etiquetas, valores):
+    """Puntos {'fecha', 'valor', 'timestamp'} omitiendo los valores NaN."""
+    validos = ~np.isnan(valores)
+    return [
+        {'fecha': etiqueta, 'valor': valor, 'timestamp': ts}
+        for etiqueta, valor, ts, valido in zip(
+            etiquetas, valores.tolist(), timestamps_ms.tolist(), validos.tolist()
+        )
+        if valido
+    ]
+
+
+def columnas_rollup(buckets, canal, convertir=None):
+    """
+    Arreglos (promedio, mínimo, máximo) de un canal de los rollups, alineados con los
+    buckets (NaN donde la ventana no tiene datos del canal). `convertir` es una
+    conversión lineal de UTIL_LIB.conversiones.
+    """
+    total = len(buckets)
+    promedio = np.full(total, np.nan)
+    minimo = np.full(total, np.nan)
+    maximo = np.full(total, np.nan)
+    for i, (_bucket, _total, estadisticas) in enumerate(buckets):
+        est = estadisticas.get(canal)
+        if not est:
+            continue
+        promedio[i], minimo[i], maximo[i] = est['avg'], est['min'], est['max']
+    if convertir is not None:
+        vectorizada = lineal(convertir)
+        promedio, minimo, maximo = vectorizada(promedio), vectorizada(minimo), vectorizada(maximo)
+    return promedio, minimo, maximo
@@ -0,0 +1,298 @@
+"""
+Buffer circular en memoria con la ventana reciente de tendencias por sistema.
+
+DatosTendenciasQueryView necesita las últimas filas (30 minutos) ya convertidas a las
+unidades del gráfico. En lugar de consultarlas y convertirlas en cada poll:
+
+- Cada sistema consultado tiene un BufferTendencias de capacidad fija
+  (TENDENCIAS_BUFFER_CAPACIDAD filas) respaldado por arreglos NumPy: epoch µs,
+  epoch ms (eje x del gráfico) y una columna por variable (NaN = sin dato).
+- ventana_tendencias() completa el buffer desde la base de datos solo con lo que le
+  falte y retorna un corte, opcionalmente solo los puntos posteriores a `despues_de_ms`
+  (respuestas incrementales).
+- Solo las lecturas de la base de datos avanzan el buffer. Varios workers confirman
+  lecturas en un orden que no es el de created_at_iot, así que cada lectura vuelve a
+  pedir las filas desde TENDENCIAS_RELECTURA_SEGUNDOS antes del último punto y las
+  mezcla sin repetir instantes: una fila confirmada tarde por otro worker no queda
+  fuera de la ventana.
+
+Los valores de cada fila se convierten con sus coeficientes del momento (o los vigentes
+si no los tiene); al cambiar los coeficientes el buffer del sistema se descarta.
+"""
+import math
+import logging
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+import numpy as np
+from django.conf import settings
+from UTIL_LIB.conversiones import celsius_a_fahrenheit, cm3_s_a_gal_min, lb_s_a_kg_min
+from _AppMonitoreoCoriolis.models import NodeRedData
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_TENDENCIAS = (
+    'created_at_iot', 'mass_rate', 'flow_rate', 'coriolis_temperature',
+    'redundant_temperature', 'pressure_out', 'density', 'mt', 'bt', 'mp', 'bp'
+)
+
+# Orden de las columnas de valores del buffer
+VARIABLES_TENDENCIAS = (
+    'flujo_masico', 'flujo_volumetrico', 'temperatura_coriolis',
+    'temperatura_salida', 'presion', 'densidad'
+)
+
+_NAN = math.nan
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def convertir_fila(fila, coeficientes):
+    """
+    Punto de tendencias de una fila (NodeRedData o values_list con CAMPOS_TENDENCIAS).
+
+    Returns:
+        (epoch µs, epoch ms, tupla de valores en el orden de VARIABLES_TENDENCIAS)
+    """
+    mt, bt, mp, bp, _, _ = coeficientes
+    fecha = fila.created_at_iot
+
+    temp_salida = _NAN
+    if fila.redundant_temperature is not None:
+        # Corrección del momento (o la vigente) antes de convertir a °F
+        mt_momento = fila.mt if fila.mt is not None else mt
+        bt_momento = fila.bt if fila.bt is not None else bt
+        temp_salida = celsius_a_fahrenheit(mt_momento * float(fila.redundant_temperature) + bt_momento)
+
+    presion = _NAN
+    if fila.pressure_out is not None:
+        mp_momento = fila.mp if fila.mp is not None else mp
+        bp_momento = fila.bp if fila.bp is not None else bp
+        presion = mp_momento * fila.pressure_out + bp_momento
+
+    valores = (
+        lb_s_a_kg_min(float(fila.mass_rate)) if fila.mass_rate is not None else _NAN,
+        cm3_s_a_gal_min(float(fila.flow_rate)) if fila.flow_rate is not None else _NAN,
+        celsius_a_fahrenheit(float(fila.coriolis_temperature)) if fila.coriolis_temperature is not None else _NAN,
+        temp_salida,
+        presion,
+        fila.density if fila.density is not None else _NAN,
+    )
+    return a_us(fecha), int(fecha.timestamp() * 1000), valores
+
+
+def a_us(fecha):
+    """Epoch en microsegundos exactos (sin redondeo de float)."""
+    return (fecha - _EPOCH) // timedelta(microseconds=1)
+
+
+def de_us(t_us):
+    return _EPOCH + timedelta(microseconds=int(t_us))
+
+
+class VentanaTendencias:
+    """Corte de puntos: columnas t_us, x_ms y valores (filas × variables)."""
+
+    def __init__(self, t_us, x_ms, valores):
+        self.t_us = t_us
+        self.x_ms = x_ms
+        self.valores = valores
+
+    def __len__(self):
+        return len(self.t_us)
+
+    @classmethod
+    def de_puntos(cls, puntos):
+        total = len(puntos)
+        t_us = np.fromiter((p[0] for p in puntos), dtype=np.int64, count=total)
+        x_ms = np.fromiter((p[1] for p in puntos), dtype=np.int64, count=total)
+        valores = np.array([p[2] for p in puntos], dtype=np.float64).reshape(total, len(VARIABLES_TENDENCIAS))
+        return cls(t_us, x_ms, valores)
+
+    def cortar(self, desde_us, hasta_us, despues_de_ms=None):
+        """Puntos con desde_us <= t <= hasta_us (y x > despues_de_ms si se indica)."""
+        i = int(np.searchsorted(self.t_us, desde_us, side='left'))
+        j = int(np.searchsorted(self.t_us, hasta_us, side='right'))
+        if despues_de_ms is not None:
+            i = max(i, int(np.searchsorted(self.x_ms, despues_de_ms, side='right')))
+            j = max(i, j)
+        return VentanaTendencias(self.t_us[i:j].copy(), self.x_ms[i:j].copy(), self.valores[i:j].copy())
+
+
+class BufferTendencias:
+    """
+    Buffer circular de capacidad fija. Se implementa sobre arreglos de 2 × capacidad:
+    se escribe al final y, al llegar al borde, las filas vigentes se copian al inicio
+    (costo amortizado O(1) por fila) de modo que la ventana siempre es contigua y se
+    corta con searchsorted sin copiar todo el buffer.
+
+    `cubre_desde_us` es el instante desde el cual el buffer tiene todas las filas del
+    sistema; sube a medida que se descartan las más antiguas. `coeficientes` son los
+    vigentes con que se convirtieron las filas que no traen los suyos.
+    """
+
+    def __init__(self, capacidad):
+        self.capacidad = capacidad
+        self.lock = threading.Lock()
+        self._t_us = np.empty(2 * capacidad, dtype=np.int64)
+        self._x_ms = np.empty(2 * capacidad, dtype=np.int64)
+        self._valores = np.empty((2 * capacidad, len(VARIABLES_TENDENCIAS)), dtype=np.float64)
+        self._inicio = 0
+        self._fin = 0
+        self.cubre_desde_us = None
+        self.coeficientes = None
+
+    def __len__(self):
+        return self._fin - self._inicio
+
+    @property
+    def ultimo_us(self):
+        return int(self._t_us[self._fin - 1]) if self._fin > self._inicio else None
+
+    def cubre(self, desde_us):
+        return self.cubre_desde_us is not None and self.cubre_desde_us <= desde_us
+
+    def reiniciar(self, puntos, cubre_desde_us, coeficientes):
+        """Reemplaza el contenido por `puntos` (ordenados), leídos completos desde cubre_desde_us."""
+        self._inicio = self._fin = 0
+        self.cubre_desde_us = None
+        self.coeficientes = tuple(coeficientes)
+        self.agregar(puntos)
+        if self.cubre_desde_us is None:
+            self.cubre_desde_us = cubre_desde_us
+
+    def agregar(self, puntos):
+        """
+        Agrega puntos ordenados por tiempo. Omite los repetidos (mismo instante que el
+        último) y retorna False si llega uno anterior: el buffer ya no es confiable.
+        """
+        for t_us, x_ms, valores in puntos:
+            ultimo = self.ultimo_us
+            if ultimo is not None and t_us <= ultimo:
+                if t_us == ultimo:
+                    continue
+                return False
+            if self._fin == len(self._t_us):
+                total = self._fin - self._inicio
+                self._t_us[:total] = self._t_us[self._inicio:self._fin]
+                self._x_ms[:total] = self._x_ms[self._inicio:self._fin]
+                self._valores[:total] = self._valores[self._inicio:self._fin]
+                self._inicio, self._fin = 0, total
+            self._t_us[self._fin] = t_us
+            self._x_ms[self._fin] = x_ms
+            self._valores[self._fin] = valores
+            self._fin += 1
+            if self._fin - self._inicio > self.capacidad:
+                # Se descarta la fila más antigua: el buffer deja de cubrir su instante
+                self.cubre_desde_us = int(self._t_us[self._inicio]) + 1
+                self._inicio += 1
+        return True
+
+    def fusionar(self, puntos):
+        """
+        Mezcla puntos ordenados con el contenido del buffer. Los instantes que ya tiene se
+        conservan; los nuevos anteriores al último punto se insertan en su lugar.
+        """
+        ultimo = self.ultimo_us
+        nuevos = [p for p in puntos if ultimo is None or p[0] > ultimo]
+        intermedios = len(puntos) - len(nuevos)
+        if intermedios:
+            actual = self.ventana()
+            anteriores = VentanaTendencias.de_puntos(puntos[:intermedios])
+            faltantes = ~np.isin(anteriores.t_us, actual.t_us)
+            if faltantes.any():
+                t_us = np.concatenate([actual.t_us, anteriores.t_us[faltantes]])
+                orden = np.argsort(t_us, kind='stable')
+                x_ms = np.concatenate([actual.x_ms, anteriores.x_ms[faltantes]])[orden]
+                valores = np.concatenate([actual.valores, anteriores.valores[faltantes]])[orden]
+                t_us = t_us[orden]
+                sobrantes = max(0, len(t_us) - self.capacidad)
+                if sobrantes:
+                    self.cubre_desde_us = int(t_us[sobrantes - 1]) + 1
+                total = len(t_us) - sobrantes
+                self._t_us[:total] = t_us[sobrantes:]
+                self._x_ms[:total] = x_ms[sobrantes:]
+                self._valores[:total] = valores[sobrantes:]
+                self._inicio, self._fin = 0, total
+        self.agregar(nuevos)
+
+    def ventana(self):
+        return VentanaTendencias(
+            self._t_us[self._inicio:self._fin],
+            self._x_ms[self._inicio:self._fin],
+            self._valores[self._inicio:self._fin]
+        )
+
+
+class RegistroBuffersTendencias:
+    """Buffers por sistema (UUID) del proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffers = {}
+
+    @property
+    def capacidad(self):
+        return getattr(settings, 'TENDENCIAS_BUFFER_CAPACIDAD', 3600)
+
+    def obtener(self, sistema_id, crear=False):
+        with self._lock:
+            buffer = self._buffers.get(str(sistema_id))
+            if buffer is None and crear:
+                buffer = self._buffers[str(sistema_id)] = BufferTendencias(self.capacidad)
+            return buffer
+
+    def descartar(self, sistema_id):
+        with self._lock:
+            self._buffers.pop(str(sistema_id), None)
+
+    def limpiar(self):
+        with self._lock:
+            self._buffers.clear()
+
+
+# Instancia compartida por proceso
+buffers_tendencias = RegistroBuffersTendencias()
+
+
+def _leer_puntos(sistema_id, coeficientes, desde=None, despues_de=None):
+    filtros = {'systemId_id': sistema_id, 'created_at_iot__isnull': False}
+    if desde is not None:
+        filtros['created_at_iot__gte'] = desde
+    if despues_de is not None:
+        filtros['created_at_iot__gt'] = despues_de
+    filas = NodeRedData.objects.filter(**filtros).order_by('created_at_iot').values_list(
+        *CAMPOS_TENDENCIAS, named=True
+    )
+    return [convertir_fila(fila, coeficientes) for fila in filas]
+
+
+def ventana_tendencias(sistema_id, fecha_inicio, fecha_fin, coeficientes, despues_de_ms=None):
+    """
+    Puntos de tendencias del sistema en [fecha_inicio, fecha_fin] como VentanaTendencias.
+
+    Usa el buffer del proceso y solo consulta la base de datos por lo que falte: toda la
+    ventana si el buffer no la cubre, o las filas desde poco antes de su último punto si
+    fecha_fin es más reciente.
+    """
+    desde_us = a_us(fecha_inicio)
+    hasta_us = a_us(fecha_fin)
+    buffer = buffers_tendencias.obtener(sistema_id, crear=True)
+
+    with buffer.lock:
+        # Los coeficientes pueden haber cambiado en otro worker (la señal solo limpia el local)
+        if not len(buffer) or not buffer.cubre(desde_us) or buffer.coeficientes != tuple(coeficientes):
+            puntos = _leer_puntos(sistema_id, coeficientes, desde=fecha_inicio)
+            buffer.reiniciar(puntos, desde_us, coeficientes)
+            if not buffer.cubre(desde_us):
+                # La ventana tiene más filas que la capacidad: se responde con la lectura completa
+                logger.warning(
+                    f"Ventana de tendencias del sistema {sistema_id} supera "
+                    f"TENDENCIAS_BUFFER_CAPACIDAD ({buffer.capacidad} filas)"
+                )
+                return VentanaTendencias.de_puntos(puntos).cortar(desde_us, hasta_us, despues_de_ms)
+        elif buffer.ultimo_us < hasta_us:
+            # Lecturas nuevas, más las confirmadas tarde justo antes del último punto
+            relectura = timedelta(seconds=getattr(settings, 'TENDENCIAS_RELECTURA_SEGUNDOS', 10))
+            puntos = _leer_puntos(sistema_id, coeficientes, despues_de=de_us(buffer.ultimo_us) - relectura)
+            buffer.fusionar(puntos)
+        return buffer.ventana().cortar(desde_us, hasta_us, despues_de_ms)
+
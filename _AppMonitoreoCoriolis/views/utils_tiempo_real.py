@@ -0,0 +1,261 @@
+"""
+Conversión de una lectura de NodeRedData a los valores de los displays en tiempo real.
+
+La usan tanto DatosTiempoRealQueryView (consulta) como la ingesta, que publica cada
+lectura nueva ya convertida en el broker de tiempo real (ver utils_broker.py), de modo
+que el stream SSE entrega a los navegadores exactamente el mismo formato.
+
+Además la ingesta mantiene en la caché de Django (alias ULTIMA_LECTURA_CACHE) una
+"última lectura" por sistema: valores crudos, mensaje convertido y coeficientes vigentes.
+Las vistas de tiempo real la leen con obtener_ultima_lectura() y solo consultan la
+base de datos con la caché fría. Con la caché por defecto (memoria local, un proceso)
+cada worker tiene su copia; ULTIMA_LECTURA_TTL_SEGUNDOS acota cuánto puede quedar
+atrás la de un worker que no recibe la ingesta. Con un backend compartido el TTL
+puede ser largo.
+"""
+import logging
+from django.conf import settings
+from django.core.cache import caches
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from _AppComplementos.models import Sistema
+from _AppMonitoreoCoriolis.models import NodeRedData
+from UTIL_LIB.conversiones import celsius_a_fahrenheit, cm3_s_a_gal_min, lb_s_a_kg_min, cm3_a_gal, lb_a_kg
+from _AppMonitoreoCoriolis.views.utils import COLOMBIA_TZ, get_coeficientes_correccion
+from _AppMonitoreoCoriolis.views.utils_broker import obtener_broker
+
+logger = logging.getLogger(__name__)
+
+
+def _valor(valor):
+    return float(valor) if valor else 0
+
+
+def datos_display(dato, coeficientes):
+    """
+    Valores de los displays para una lectura.
+
+    Args:
+        dato: NodeRedData (o cualquier objeto con sus atributos)
+        coeficientes: tupla (mt, bt, mp, bp, span, zero) de get_coeficientes_correccion
+    """
+    mt, bt, mp, bp, _, _ = coeficientes
+
+    # Aplicar corrección a Temperatura de Salida (redundant_temperature)
+    temp_salida = celsius_a_fahrenheit(dato.redundant_temperature)
+    temp_salida_corr = mt * float(temp_salida) + bt
+    temp_salida_corrCalc = int(temp_salida_corr * 1000) / 1000
+
+    # Aplicar corrección mx+b a Presión (pressure_out)
+    presion_corrCalc = None
+    if dato.pressure_out is not None:
+        presion_corr = mp * dato.pressure_out + bp
+        presion_corrCalc = int(presion_corr * 1000) / 1000
+
+    a1 = dato.dsp_rxmsg_amplitudeEstimateA1
+    a2 = dato.dsp_rxmsg_amplitudeEstimateA2
+    a1_a2 = a1 - a2 if a1 is not None and a2 is not None else None
+
+    return {
+        'flujo': {
+            'valor': cm3_s_a_gal_min(dato.flow_rate),
+            'unidad': 'gal/min'
+        },
+        'flujoMasico': {
+            'valor': lb_s_a_kg_min(dato.mass_rate),
+            'unidad': 'kg/min'
+        },
+        'temperaturaRedundante': {
+            'valor': temp_salida_corrCalc,
+            'unidad': '°F'
+        },
+        'temperaturaDiagnostico': {
+            'valor': celsius_a_fahrenheit(dato.diagnostic_temperature),
+            'unidad': '°F'
+        },
+        'temperatura': {
+            'valor': celsius_a_fahrenheit(dato.coriolis_temperature),
+            'unidad': '°F'
+        },
+        'presion': {
+            'valor': float(presion_corrCalc) if presion_corrCalc is not None else 0,
+            'unidad': 'PSI'
+        },
+        'volTotal': {
+            'valor': cm3_a_gal(dato.total_volume),
+            'unidad': 'gal'
+        },
+        'masTotal': {
+            'valor': lb_a_kg(dato.total_mass),
+            'unidad': 'kg'
+        },
+        'densidad': {
+            'valor': _valor(dato.density),
+            'unidad': 'g/cc'
+        },
+        'frecuencia': {
+            'valor': _valor(dato.coriolis_frecuency),
+            'unidad': 'Hz'
+        },
+        'NoiseEstimadedN1': {
+            'valor': _valor(dato.dsp_rxmsg_noiseEstimatedN1),
+            'unidad': '--'
+        },
+        'NoiseEstimadedN2': {
+            'valor': _valor(dato.dsp_rxmsg_noiseEstimatedN2),
+            'unidad': '--'
+        },
+        'DriverAmplitude': {
+            'valor': _valor(dato.dsp_rxmsg_driverAmplitude),
+            'unidad': '--'
+        },
+        'DriverCurr': {
+            'valor': _valor(dato.driver_curr),
+            'unidad': 'mA'
+        },
+        'A1A2': {
+            'valor': _valor(a1_a2),
+            'unidad': '--'
+        },
+        'concSolido': {
+            'valor': _valor(dato.pconc),
+            'unidad': '%'
+        },
+        'corteAgua': {
+            'valor': _valor(dato.percent_cutWater64b),
+            'unidad': '%'
+        },
+        'signalGateway': {
+            'valor': _valor(dato.signal_strength_rxCoriolis),
+            'unidad': 'dB'
+        },
+        'tempGateway': {
+            'valor': _valor(dato.temperature_gateway),
+            'unidad': '°C'  # Esta se mantiene en °C según lo solicitado
+        }
+    }
+
+
+def mensaje_tiempo_real(dato, coeficientes):
+    """Cuerpo completo de la respuesta de tiempo real (success, datos, timestamp, fecha_legible)."""
+    fecha_colombia = dato.created_at_iot.astimezone(COLOMBIA_TZ)
+    return {
+        'success': True,
+        'datos': datos_display(dato, coeficientes),
+        'timestamp': fecha_colombia.isoformat(),
+        'fecha_legible': fecha_colombia.strftime('%d/%m/%Y %H:%M:%S')
+    }
+
+
+# ----------------------------------------------------------------------
+# Última lectura por sistema
+# ----------------------------------------------------------------------
+def _cache():
+    return caches[getattr(settings, 'ULTIMA_LECTURA_CACHE', 'default')]
+
+
+def _clave(sistema_id):
+    return f'gisme:ultima_lectura:{sistema_id}'
+
+
+def _snapshot(dato, sistema, coeficientes):
+    return {
+        'sistema': {
+            'id': str(sistema.id),
+            'tag': sistema.tag,
+            'sistema_id': sistema.sistema_id
+        },
+        'created_at_iot': dato.created_at_iot,
+        'crudo': {
+            campo.attname: getattr(dato, campo.attname)
+            for campo in NodeRedData._meta.concrete_fields
+            if campo.attname not in ('id', 'systemId_id')
+        },
+        'coeficientes': tuple(coeficientes),
+        'mensaje': mensaje_tiempo_real(dato, coeficientes)
+    }
+
+
+def guardar_ultima_lectura(dato, sistema, coeficientes):
+    """
+    Guarda la lectura como la última del sistema si es más reciente que la cacheada
+    (los reenvíos atrasados no la reemplazan). Retorna el snapshot vigente.
+    """
+    cache = _cache()
+    clave = _clave(sistema.pk)
+    actual = cache.get(clave)
+    if actual is not None and actual['created_at_iot'] > dato.created_at_iot:
+        return actual
+    snapshot = _snapshot(dato, sistema, coeficientes)
+    cache.set(clave, snapshot, getattr(settings, 'ULTIMA_LECTURA_TTL_SEGUNDOS', 5))
+    return snapshot
+
+
+def obtener_ultima_lectura(sistema_id):
+    """
+    Snapshot de la última lectura del sistema:
+    {sistema, created_at_iot, crudo, coeficientes, mensaje}, o None si no tiene datos.
+
+    Con la caché caliente no hace consultas. Con la caché fría consulta la última fila
+    con created_at_iot y la cachea. Lanza Sistema.DoesNotExist si el sistema no existe.
+    """
+    snapshot = _cache().get(_clave(sistema_id))
+    if snapshot is not None:
+        return snapshot
+
+    sistema = Sistema.objects.get(id=sistema_id)
+    ultimo_dato = NodeRedData.objects.filter(
+        systemId=sistema,
+        created_at_iot__isnull=False
+    ).order_by('-created_at_iot').first()
+    if ultimo_dato is None:
+        return None
+    return guardar_ultima_lectura(ultimo_dato, sistema, get_coeficientes_correccion(sistema))
+
+
+def invalidar_ultima_lectura(sistema_id):
+    """Descarta el snapshot (p. ej. al cambiar los coeficientes con que se convirtió)."""
+    _cache().delete(_clave(sistema_id))
+
+
+def publicar_lecturas(lecturas):
+    """
+    Actualiza la última lectura cacheada y publica en el broker de tiempo real la lectura
+    más reciente de cada sistema del lote, una vez confirmada la transacción. Un error
+    aquí nunca afecta la ingesta.
+
+    Args:
+        lecturas: NodeRedData recién guardados (de uno o varios sistemas)
+    """
+    ultimas = {}
+    for dato in lecturas:
+        if dato.created_at_iot is None:
+            continue
+        actual = ultimas.get(dato.systemId_id)
+        if actual is None or dato.created_at_iot >= actual.created_at_iot:
+            ultimas[dato.systemId_id] = dato
+    if not ultimas:
+        return
+
+    def publicar():
+        broker = obtener_broker()
+        for dato in ultimas.values():
+            try:
+                sistema = dato.systemId
+                snapshot = guardar_ultima_lectura(dato, sistema, get_coeficientes_correccion(sistema))
+                if snapshot['created_at_iot'] == dato.created_at_iot:
+                    broker.publicar(dato.systemId_id, snapshot['mensaje'])
+            except Exception as e:
+                logger.error(f"Error publicando lectura en tiempo real: {str(e)}", exc_info=True)
+
+    transaction.on_commit(publicar)
+
+
+def stream_tiempo_real_disponible(request):
+    """
+    True si el request lo atiende el servidor ASGI y el stream SSE está habilitado
+    (TIEMPO_REAL_STREAM_ACTIVO). Por WSGI (incluido runserver) Django consume el stream
+    completo antes de enviar la respuesta: el navegador no recibiría eventos y la
+    conexión ocuparía un worker hasta TIEMPO_REAL_STREAM_MAX_SEGUNDOS.
+    """
+    return getattr(settings, 'TIEMPO_REAL_STREAM_ACTIVO', True) and isinstance(request, ASGIRequest)
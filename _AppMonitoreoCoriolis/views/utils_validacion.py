@@ -0,0 +1,166 @@
+"""
+Validación liviana de las lecturas Node-RED.
+
+NodeRedDataSerializer es un ModelSerializer con fields='__all__': por cada lectura se
+construyen ~60 campos DRF, se valida campo por campo y se consulta la existencia del
+systemId. En la ingesta el sistema ya viene resuelto por mac_gateway, así que los
+receptores usan ValidadorLecturas, un esquema armado una sola vez desde el modelo:
+
+- FloatField: float() como DRF (números, booleanos y cadenas numéricas); None si el
+  campo admite nulos.
+- DateTimeField: datetime o texto ISO 8601; las fechas sin zona se interpretan en la
+  zona del servidor (mismo resultado que el DateTimeField de DRF).
+- CharField: texto o número, sin espacios en los extremos, con max_length.
+- Campos fuera del esquema (NODE_RED_CAMPOS_DESCONOCIDOS): 'ignorar' (como el
+  serializer) o 'rechazar'. id, created_at y systemId se ignoran siempre.
+
+Los errores tienen la forma de serializer.errors ({campo: [mensaje]}) y los mensajes son
+los de DRF, así la respuesta a los gateways no cambia.
+
+Comparación con el serializer: python manage.py benchmark_validacion
+"""
+from datetime import date, datetime, timezone as dt_timezone
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import fields as drf_fields
+from rest_framework.utils.humanize_datetime import datetime_formats
+from _AppMonitoreoCoriolis.models import NodeRedData
+
+DESCONOCIDOS = ('ignorar', 'rechazar')
+
+# Campos que el gateway puede enviar pero no se toman del payload
+CAMPOS_IGNORADOS = frozenset({'id', 'created_at', 'systemId'})
+
+_MENSAJES_FLOAT = drf_fields.FloatField.default_error_messages
+_MENSAJES_FECHA = drf_fields.DateTimeField.default_error_messages
+_MENSAJES_TEXTO = drf_fields.CharField.default_error_messages
+_MENSAJE_NULO = drf_fields.Field.default_error_messages['null']
+_FORMATOS_FECHA = datetime_formats(drf_fields.api_settings.DATETIME_INPUT_FORMATS)
+
+
+class ErrorCampo(Exception):
+    pass
+
+
+def _a_float(valor):
+    if isinstance(valor, float):
+        return valor
+    if isinstance(valor, str) and len(valor) > drf_fields.FloatField.MAX_STRING_LENGTH:
+        raise ErrorCampo(_MENSAJES_FLOAT['max_string_length'])
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        raise ErrorCampo(_MENSAJES_FLOAT['invalid'])
+    except OverflowError:
+        raise ErrorCampo(_MENSAJES_FLOAT['overflow'])
+
+
+def _a_fecha(valor):
+    if isinstance(valor, datetime):
+        fecha = valor
+    elif isinstance(valor, date):
+        raise ErrorCampo(_MENSAJES_FECHA['date'])
+    else:
+        try:
+            fecha = parse_datetime(valor)
+        except (TypeError, ValueError):
+            fecha = None
+        if fecha is None:
+            raise ErrorCampo(_MENSAJES_FECHA['invalid'].format(format=_FORMATOS_FECHA))
+
+    if not settings.USE_TZ:
+        return timezone.make_naive(fecha, dt_timezone.utc) if timezone.is_aware(fecha) else fecha
+    zona = timezone.get_current_timezone()
+    if timezone.is_aware(fecha):
+        return fecha.astimezone(zona)
+    return timezone.make_aware(fecha, zona)
+
+
+def _texto(max_length):
+    def convertir(valor):
+        if isinstance(valor, bool) or not isinstance(valor, (str, int, float)):
+            raise ErrorCampo(_MENSAJES_TEXTO['invalid'])
+        texto = str(valor).strip()
+        if max_length is not None and len(texto) > max_length:
+            raise ErrorCampo(_MENSAJES_TEXTO['max_length'].format(max_length=max_length))
+        return texto
+    return convertir
+
+
+def _convertidor(campo):
+    if isinstance(campo, models.FloatField):
+        return _a_float
+    if isinstance(campo, models.DateTimeField):
+        return _a_fecha
+    if isinstance(campo, models.CharField):
+        return _texto(campo.max_length)
+    raise TypeError(f"Tipo de campo sin validación liviana: {campo.name} ({type(campo).__name__})")
+
+
+class ValidadorLecturas:
+    """
+    Valida y convierte un payload de lectura a los valores del modelo.
+
+        validador = ValidadorLecturas()
+        valores, errores = validador.validar(payload)
+        if not errores:
+            NodeRedData(systemId=sistema, **valores)
+
+    Args:
+        modelo: modelo cuyos campos forman el esquema (NodeRedData)
+        desconocidos: política para campos fuera del esquema; por defecto
+            NODE_RED_CAMPOS_DESCONOCIDOS
+    """
+
+    def __init__(self, modelo=NodeRedData, desconocidos=None):
+        self.desconocidos = desconocidos or getattr(settings, 'NODE_RED_CAMPOS_DESCONOCIDOS', 'ignorar')
+        if self.desconocidos not in DESCONOCIDOS:
+            raise ValueError(f"Política de campos desconocidos inválida: {self.desconocidos}")
+        # nombre -> (convertidor, admite nulos)
+        self.esquema = {
+            campo.name: (_convertidor(campo), campo.null)
+            for campo in modelo._meta.concrete_fields
+            if campo.name not in CAMPOS_IGNORADOS
+        }
+
+    def validar(self, datos):
+        """
+        Returns:
+            (valores, errores): valores convertidos de los campos presentes en `datos` y
+            errores por campo ({} si el payload es válido)
+        """
+        valores = {}
+        errores = {}
+        for nombre, valor in datos.items():
+            regla = self.esquema.get(nombre)
+            if regla is None:
+                if self.desconocidos == 'rechazar' and nombre not in CAMPOS_IGNORADOS:
+                    errores[nombre] = ['Campo desconocido.']
+                continue
+            convertir, nulo = regla
+            if valor is None:
+                if nulo:
+                    valores[nombre] = None
+                else:
+                    errores[nombre] = [_MENSAJE_NULO]
+                continue
+            try:
+                valores[nombre] = convertir(valor)
+            except ErrorCampo as e:
+                errores[nombre] = [str(e.args[0])]
+        return valores, errores
+
+
+# Un validador por política (el esquema se arma una sola vez por proceso)
+_validadores = {}
+
+
+def obtener_validador():
+    """ValidadorLecturas de NodeRedData con la política NODE_RED_CAMPOS_DESCONOCIDOS vigente."""
+    desconocidos = getattr(settings, 'NODE_RED_CAMPOS_DESCONOCIDOS', 'ignorar')
+    validador = _validadores.get(desconocidos)
+    if validador is None:
+        validador = _validadores[desconocidos] = ValidadorLecturas(desconocidos=desconocidos)
+    return validador
@@ -1,10 +1,81 @@
+import json
+import logging
+from django.conf import settings
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from .models import NodeRedData
-from .serializers import NodeRedDataSerializer
+from .serializers import NodeRedDataSerializer, NodeRedDataBulkSerializer
 from repoGenerico.views_base import BasicNodeRedAuthMixin, BaseCreateView
-from _AppComplementos.models import Sistema, ConfiguracionCoeficientes
+from _AppAuth.middleware_node_red import mac_autorizada
+from .views.utils_cache import cache_configuracion
+from .views.utils_validacion import obtener_validador
+from .views.utils_ingesta_diferida import ColaLlena, buffer_ingesta, guardar_lecturas, ingesta_diferida_activa
+from .views.utils_ingesta_binaria import (
+    CONTENT_TYPE_LECTURAS, MacNoAutorizada, MapaDesconocido, construir_lecturas, decodificar_lecturas
+)
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Tipos de contenido aceptados como NDJSON (un registro JSON por línea)
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+
+def respuesta_cola_llena(error):
+    """503 cuando la cola de la ingesta diferida está llena: el gateway debe reintentar."""
+    logger.warning(f"Ingesta Node-RED rechazada: {error}")
+    return Response(
+        {"success": False, "error": "Ingesta saturada, reintente más tarde."},
+        status=503,
+        headers={"Retry-After": str(getattr(settings, 'INGESTA_DIFERIDA_REINTENTO_SEGUNDOS', 30))}
+    )
+
+
+def valores_coeficientes(coef):
+    """
+    Coeficientes de corrección y perfil de batch vigentes que se estampan en cada registro.
+    Retorna valores por defecto si el sistema no tiene configuración.
+    """
+    if coef is None:
+        return {
+            'mt': 1.0,
+            'bt': 0.0,
+            'mp': 1.0,
+            'bp': 0.0,
+            'vol_detect_batch': 75.0,  # Valor por defecto kg
+            'time_closed_batch': 5     # Valor por defecto min
+        }
+    return {
+        'mt': coef.mt,
+        'bt': coef.bt,
+        'mp': coef.mp,
+        'bp': coef.bp,
+        'vol_detect_batch': coef.vol_masico_ini_batch,
+        'time_closed_batch': coef.time_finished_batch
+    }
+
+
+def validar_lectura(data, sistema, serializer_class):
+    """
+    Valida un registro con el esquema liviano (NODE_RED_VALIDACION_RAPIDA) o con el
+    serializer de la vista.
+
+    Returns:
+        (NodeRedData sin guardar o None, errores por campo)
+    """
+    if getattr(settings, 'NODE_RED_VALIDACION_RAPIDA', True):
+        valores, errores = obtener_validador().validar(data)
+        if errores:
+            return None, errores
+        return NodeRedData(systemId=sistema, **valores), {}
+
+    serializer = serializer_class(data=data)
+    if not serializer.is_valid():
+        return None, serializer.errors
+    return NodeRedData(**{'systemId': sistema, **serializer.validated_data}), {}
+
 
 @method_decorator(csrf_exempt, name='dispatch')
 class NodeRedReceiverView(BasicNodeRedAuthMixin, BaseCreateView):
@@ -19,7 +90,13 @@ class NodeRedReceiverView(BasicNodeRedAuthMixin, BaseCreateView):
             return auth_error
 
         mac_gateway = request.data.get("mac_gateway")
-        sistema = Sistema.objects.filter(sistema_id=mac_gateway).first()
+        if mac_gateway is not None and not isinstance(mac_gateway, str):
+            return Response({"success": False, "error": "mac_gateway debe ser un texto."}, status=400)
+        mac_error = self.check_mac_gateway(request, mac_gateway)
+        if mac_error:
+            return mac_error
+
+        sistema = cache_configuracion.obtener_sistema_por_mac(mac_gateway)
         if not mac_gateway or not sistema:
             return Response(
                 {"detail": "mac_gateway no registrado como sistema_id en sistemas."},
@@ -31,30 +108,254 @@ class NodeRedReceiverView(BasicNodeRedAuthMixin, BaseCreateView):
         data['systemId'] = str(sistema.id)  # UUID a string
 
         # Obtener coeficientes de corrección vigentes al momento del registro
-        try:
-            coef = ConfiguracionCoeficientes.objects.get(systemId=sistema)
-            data['mt'] = coef.mt
-            data['bt'] = coef.bt
-            data['mp'] = coef.mp
-            data['bp'] = coef.bp
-            data['vol_detect_batch'] = coef.vol_masico_ini_batch
-            data['time_closed_batch'] = coef.time_finished_batch
-        except ConfiguracionCoeficientes.DoesNotExist:
-            # Valores por defecto si no hay coeficientes configurados
-            data['mt'] = 1.0
-            data['bt'] = 0.0
-            data['mp'] = 1.0
-            data['bp'] = 0.0
-            data['vol_detect_batch'] = 75.0 # Valor por defecto kg
-            data['time_closed_batch'] = 5   # Valor por defecto min
-
-        serializer = self.serializer_class(data=data)
-        if serializer.is_valid():
-            obj = serializer.save()
+        coef = cache_configuracion.obtener_coeficientes(sistema.id)
+        for campo, valor in valores_coeficientes(coef).items():
+            data[campo] = valor
+
+        obj, errores = validar_lectura(data, sistema, self.serializer_class)
+        if errores:
+            return Response({"success": False, "error": errores}, status=400)
+
+        if ingesta_diferida_activa():
+            # Escritura diferida (ver utils_ingesta_diferida.py)
+            try:
+                persistido = buffer_ingesta.encolar([obj])
+            except ColaLlena as e:
+                return respuesta_cola_llena(e)
             return Response({
                 "success": True,
-                "message": "Registro exitoso",
+                "message": "Registro exitoso" if persistido else "Registro encolado",
                 "id": obj.id
-            }, status=201)
-        
-        return Response({"success": False, "error": serializer.errors}, status=400)
\ No newline at end of file
+            }, status=201 if persistido else 202)
+
+        guardar_lecturas([obj])
+        return Response({
+            "success": True,
+            "message": "Registro exitoso",
+            "id": obj.id
+        }, status=201)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class NodeRedBulkReceiverView(BasicNodeRedAuthMixin, BaseCreateView):
+    """
+    Ingesta masiva de lecturas Node-RED.
+
+    Acepta en un solo request:
+    - Un arreglo JSON de registros: [{...}, {...}]
+    - Un objeto {"mac_gateway": "...", "registros": [...]} (los registros heredan mac_gateway)
+    - NDJSON (Content-Type application/x-ndjson): un registro JSON por línea
+    - Lote binario columnar de un gateway (Content-Type application/vnd.gisme.lecturas,
+      ver views/utils_ingesta_binaria.py)
+
+    Los registros pueden provenir de uno o varios gateways. Sistemas y coeficientes se
+    resuelven con una consulta por lote y los registros válidos se guardan con
+    bulk_create dentro de una sola transacción. La respuesta incluye el estado de
+    aceptación/rechazo de cada registro (por índice).
+    """
+    model = NodeRedData
+    serializer_class = NodeRedDataBulkSerializer
+    authentication_classes = []
+    permission_classes = []
+
+    def post(self, request, *args, **kwargs):
+        auth_error = self.check_basic_auth(request)
+        if auth_error:
+            return auth_error
+
+        content_type = (request.content_type or '').split(';')[0].strip().lower()
+        if content_type == CONTENT_TYPE_LECTURAS:
+            return self._post_binario(request)
+
+        try:
+            registros = self._leer_registros(request)
+        except ValueError as e:
+            return Response({"success": False, "error": str(e)}, status=400)
+
+        max_registros = getattr(settings, 'NODE_RED_BULK_MAX_REGISTROS', 5000)
+        if len(registros) > max_registros:
+            return Response({
+                "success": False,
+                "error": f"El lote excede el máximo permitido de {max_registros} registros."
+            }, status=413)
+
+        if not registros:
+            return Response({"success": False, "error": "No se recibieron registros."}, status=400)
+
+        # Resolver todos los sistemas y coeficientes del lote (caché + a lo sumo una consulta cada uno)
+        macs = {
+            r['mac_gateway'] for r in registros
+            if isinstance(r, dict) and isinstance(r.get('mac_gateway'), str) and r['mac_gateway']
+        }
+        sistemas = cache_configuracion.obtener_sistemas_por_mac(macs)
+        coeficientes = cache_configuracion.obtener_coeficientes_de([s.id for s in sistemas.values()])
+
+        resultados = []
+        objetos = []
+
+        for indice, registro in enumerate(registros):
+            if not isinstance(registro, dict):
+                resultados.append({"index": indice, "success": False, "error": "El registro debe ser un objeto JSON."})
+                continue
+
+            if registro.get('mac_gateway') is not None and not isinstance(registro['mac_gateway'], str):
+                resultados.append({"index": indice, "success": False, "error": "mac_gateway debe ser un texto."})
+                continue
+
+            if not mac_autorizada(request, registro.get('mac_gateway')):
+                resultados.append({
+                    "index": indice,
+                    "success": False,
+                    "error": "mac_gateway no autorizado para esta credencial."
+                })
+                continue
+
+            sistema = sistemas.get(registro.get('mac_gateway'))
+            if sistema is None:
+                resultados.append({
+                    "index": indice,
+                    "success": False,
+                    "error": "mac_gateway no registrado como sistema_id en sistemas."
+                })
+                continue
+
+            data = dict(registro)
+            data.update(valores_coeficientes(coeficientes.get(sistema.id)))
+
+            obj, errores = validar_lectura(data, sistema, self.serializer_class)
+            if errores:
+                resultados.append({"index": indice, "success": False, "error": errores})
+                continue
+
+            objetos.append(obj)
+            resultados.append({"index": indice, "success": True, "id": obj.id})
+
+        try:
+            persistido = self._guardar(objetos) if objetos else True
+        except ColaLlena as e:
+            return respuesta_cola_llena(e)
+
+        aceptados = len(objetos)
+        rechazados = len(resultados) - aceptados
+        logger.info(f"Ingesta masiva Node-RED: {aceptados} aceptados, {rechazados} rechazados")
+
+        return Response({
+            "success": aceptados > 0,
+            "message": f"{aceptados} registros {'guardados' if persistido else 'encolados'}, {rechazados} rechazados",
+            "aceptados": aceptados,
+            "rechazados": rechazados,
+            "resultados": resultados
+        }, status=(201 if persistido else 202) if aceptados > 0 else 400)
+
+    def _guardar(self, objetos):
+        """
+        Guarda (o encola) las lecturas; retorna False si solo quedaron encoladas.
+        Lanza ColaLlena si la cola de la ingesta diferida no admite el lote.
+        """
+        if ingesta_diferida_activa():
+            return buffer_ingesta.encolar(objetos)
+        guardar_lecturas(objetos)
+        return True
+
+    def _post_binario(self, request):
+        """
+        Lote binario columnar de un solo gateway: las columnas se decodifican directo del
+        cuerpo y no pasan por la validación campo a campo (ya son números).
+        """
+        max_registros = getattr(settings, 'NODE_RED_BULK_MAX_REGISTROS', 5000)
+        try:
+            lote = decodificar_lecturas(
+                request.body, max_registros, autorizada=lambda mac: mac_autorizada(request, mac)
+            )
+        except MacNoAutorizada as e:
+            return self.check_mac_gateway(request, e.mac_gateway)
+        except MapaDesconocido as e:
+            return Response({
+                "success": False,
+                "error": "Mapa de campos desconocido: reenvíe el lote con 'campos'.",
+                "mapa": e.mapa
+            }, status=409)
+        except ValueError as e:
+            return Response({"success": False, "error": str(e)}, status=400)
+
+        sistema = cache_configuracion.obtener_sistema_por_mac(lote['mac_gateway'])
+        if sistema is None:
+            return Response(
+                {"success": False, "error": "mac_gateway no registrado como sistema_id en sistemas."},
+                status=400
+            )
+
+        coef = cache_configuracion.obtener_coeficientes(sistema.id)
+        try:
+            objetos = construir_lecturas(
+                lote, sistema, valores_coeficientes(coef),
+                getattr(settings, 'NODE_RED_CAMPOS_DESCONOCIDOS', 'ignorar')
+            )
+        except ValueError as e:
+            return Response({"success": False, "error": str(e)}, status=400)
+
+        if not objetos:
+            return Response({"success": False, "error": "No se recibieron registros."}, status=400)
+
+        try:
+            persistido = self._guardar(objetos)
+        except ColaLlena as e:
+            return respuesta_cola_llena(e)
+        logger.info(f"Ingesta binaria Node-RED ({sistema.tag}): {len(objetos)} lecturas")
+
+        return Response({
+            "success": True,
+            "message": f"{len(objetos)} registros {'guardados' if persistido else 'encolados'}, 0 rechazados",
+            "aceptados": len(objetos),
+            "rechazados": 0,
+            "mapa": lote['mapa']
+        }, status=201 if persistido else 202)
+
+    def _leer_registros(self, request):
+        """
+        Extrae la lista de registros del cuerpo del request (JSON o NDJSON).
+        """
+        content_type = (request.content_type or '').split(';')[0].strip().lower()
+
+        if content_type in NDJSON_CONTENT_TYPES:
+            registros = []
+            for numero, linea in enumerate(request.body.decode('utf-8').splitlines(), start=1):
+                linea = linea.strip()
+                if not linea:
+                    continue
+                try:
+                    registros.append(json.loads(linea))
+                except json.JSONDecodeError:
+                    raise ValueError(f"Línea NDJSON inválida: {numero}")
+            return registros
+
+        data = request.data
+        if isinstance(data, list):
+            return data
+
+        if isinstance(data, dict) and isinstance(data.get('registros'), list):
+            mac_comun = data.get('mac_gateway')
+            if not mac_comun:
+                return data['registros']
+            return [
+                {'mac_gateway': mac_comun, **r} if isinstance(r, dict) else r
+                for r in data['registros']
+            ]
+
+        raise ValueError("Formato inválido. Envíe un arreglo JSON, {'registros': [...]} o NDJSON.")
+
+
+class EstadoIngestaView(BasicNodeRedAuthMixin, APIView):
+    """
+    Estado de la ingesta diferida del worker que atiende la petición: profundidad de la
+    cola, antigüedad de la lectura más antigua, latencia de vaciado y errores, más los
+    segmentos de derrame pendientes de todo el nodo.
+    """
+    authentication_classes = []
+    permission_classes = []
+
+    def get(self, request, *args, **kwargs):
+        auth_error = self.check_basic_auth(request)
+        if auth_error:
+            return auth_error
+        return Response({"success": True, "estado": buffer_ingesta.estado()})
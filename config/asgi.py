@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
+
+El feed de tiempo real (api/stream-tiempo-real/<sistema>/, Server-Sent Events) mantiene
+conexiones abiertas y necesita este punto de entrada, por ejemplo:
+    gunicorn config.asgi:application -k uvicorn_worker.UvicornWorker
+Con varios procesos o nodos, configurar TIEMPO_REAL_BROKER con BrokerPostgres.
 """
 
 import os
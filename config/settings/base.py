@@ -15,6 +15,113 @@ NODE_RED_TOKEN = os.getenv("NODE_RED_TOKEN")
 
 NODE_RED_USER = os.getenv("NODE_RED_USER")
 NODE_RED_PASS = os.getenv("NODE_RED_PASS")
+# Claves propias de cada gateway (ver _AppAuth/middleware_node_red.py):
+# "AA:BB:CC:DD:EE:FF=clave1;11:22:33:44:55:66=clave2"
+NODE_RED_CLAVES_GATEWAY = {
+    mac.strip(): clave.strip()
+    for mac, _, clave in (par.partition("=") for par in os.getenv("NODE_RED_CLAVES_GATEWAY", "").split(";"))
+    if mac.strip() and clave.strip()
+}
+# Diferencia máxima (segundos) entre el timestamp de una petición firmada (GISME-HMAC) y el servidor
+NODE_RED_HMAC_TOLERANCIA_SEGUNDOS = int(os.getenv("NODE_RED_HMAC_TOLERANCIA_SEGUNDOS", "300"))
+# Alias de CACHES donde se registran las firmas ya usadas (debe ser compartido por los workers)
+NODE_RED_FIRMAS_CACHE = os.getenv("NODE_RED_FIRMAS_CACHE", "respuestas")
+
+# Máximo de registros aceptados por request en la ingesta masiva (api/node-red/bulk/)
+NODE_RED_BULK_MAX_REGISTROS = int(os.getenv("NODE_RED_BULK_MAX_REGISTROS", "5000"))
+# Validación de lecturas con el esquema liviano (ver _AppMonitoreoCoriolis/views/utils_validacion.py)
+# en lugar de NodeRedDataSerializer, y qué hacer con campos que no existen en NodeRedData
+NODE_RED_VALIDACION_RAPIDA = os.getenv("NODE_RED_VALIDACION_RAPIDA", "True").lower() == "true"
+NODE_RED_CAMPOS_DESCONOCIDOS = os.getenv("NODE_RED_CAMPOS_DESCONOCIDOS", "ignorar")  # 'ignorar' o 'rechazar'
+# Alias de CACHES donde se guardan los mapas de campos del formato binario de ingesta
+# (debe ser compartido por los workers; ver _AppMonitoreoCoriolis/views/utils_ingesta_binaria.py)
+NODE_RED_MAPAS_CACHE = os.getenv("NODE_RED_MAPAS_CACHE", "respuestas")
+
+# TTL (segundos) de la caché en proceso de Sistema/ConfiguracionCoeficientes (ingesta y consultas)
+CONFIG_CACHE_TTL_SEGUNDOS = int(os.getenv("CONFIG_CACHE_TTL_SEGUNDOS", "60"))
+
+# Rollups de NodeRedData (ver _AppMonitoreoCoriolis/views/utils_rollups.py)
+# Puntos mínimos que debe producir una resolución para ser elegida en las vistas históricas
+ROLLUP_MIN_PUNTOS = int(os.getenv("ROLLUP_MIN_PUNTOS", "500"))
+# Atraso máximo (minutos) de los rollups que se completa en vivo; si es mayor se usan los datos crudos
+ROLLUP_MAX_COLA_MINUTOS = int(os.getenv("ROLLUP_MAX_COLA_MINUTOS", "180"))
+
+# Filas leídas por lote del cursor del servidor en las exportaciones CSV en streaming
+CSV_EXPORT_CHUNK_SIZE = int(os.getenv("CSV_EXPORT_CHUNK_SIZE", "2000"))
+
+# Detector continuo de batches (ver _AppMonitoreoCoriolis/views/utils_batches.py)
+# Filas leídas por transacción al avanzar el detector
+BATCH_DETECTOR_LOTE = int(os.getenv("BATCH_DETECTOR_LOTE", "20000"))
+# Avanzar el detector en la misma petición de ingesta (además del comando detectar_batches)
+BATCH_DETECTOR_EN_INGESTA = os.getenv("BATCH_DETECTOR_EN_INGESTA", "False").lower() == "true"
+# Detección bajo demanda con el kernel NumPy (False = recorrido fila a fila original)
+BATCH_DETECTOR_VECTORIZADO = os.getenv("BATCH_DETECTOR_VECTORIZADO", "True").lower() == "true"
+
+# Feed de tiempo real por SSE (requiere servir por ASGI, ver config/asgi.py)
+# Backend del broker: ...utils_broker.BrokerMemoria (un nodo) o ...utils_broker.BrokerPostgres (multi-nodo)
+TIEMPO_REAL_BROKER = os.getenv("TIEMPO_REAL_BROKER", "_AppMonitoreoCoriolis.views.utils_broker.BrokerMemoria")
+# Segundos entre latidos del stream y duración máxima de cada conexión (el navegador reconecta)
+TIEMPO_REAL_LATIDO_SEGUNDOS = int(os.getenv("TIEMPO_REAL_LATIDO_SEGUNDOS", "15"))
+TIEMPO_REAL_STREAM_MAX_SEGUNDOS = int(os.getenv("TIEMPO_REAL_STREAM_MAX_SEGUNDOS", "300"))
+# Ofrecer el stream (solo se usa si además la petición llega por ASGI; si no, polling)
+TIEMPO_REAL_STREAM_ACTIVO = os.getenv("TIEMPO_REAL_STREAM_ACTIVO", "True").lower() == "true"
+# Última lectura por sistema que mantiene la ingesta (alias de CACHES y vigencia).
+# Con caché en memoria local cada worker tiene su copia: mantener el TTL corto.
+ULTIMA_LECTURA_CACHE = os.getenv("ULTIMA_LECTURA_CACHE", "default")
+ULTIMA_LECTURA_TTL_SEGUNDOS = int(os.getenv("ULTIMA_LECTURA_TTL_SEGUNDOS", "5"))
+# Filas por sistema del buffer en memoria de tendencias (debe cubrir la ventana de 30 minutos)
+TENDENCIAS_BUFFER_CAPACIDAD = int(os.getenv("TENDENCIAS_BUFFER_CAPACIDAD", "3600"))
+# Segundos antes del último punto del buffer que se vuelven a leer en cada poll, para
+# incluir lecturas confirmadas tarde por otros workers
+TENDENCIAS_RELECTURA_SEGUNDOS = int(os.getenv("TENDENCIAS_RELECTURA_SEGUNDOS", "10"))
+
+# Caché de respuestas de ventanas cerradas (ver _AppMonitoreoCoriolis/views/utils_respuestas.py)
+RESPUESTAS_CACHE_ACTIVA = os.getenv("RESPUESTAS_CACHE_ACTIVA", "True").lower() == "true"
+RESPUESTAS_CACHE = "respuestas"
+RESPUESTAS_CACHE_TTL_SEGUNDOS = int(os.getenv("RESPUESTAS_CACHE_TTL_SEGUNDOS", "86400"))
+# Una ventana se considera cerrada si termina antes de ahora - margen; lecturas que
+# lleguen con timestamp anterior a ese límite invalidan las respuestas del sistema
+RESPUESTAS_CACHE_MARGEN_MINUTOS = int(os.getenv("RESPUESTAS_CACHE_MARGEN_MINUTOS", "15"))
+# Detalle de batches cerrados (diagnóstico, rho15, GUM) materializado en la primera consulta
+# (ver _AppMonitoreoCoriolis/views/utils_detalle_batch.py)
+DETALLE_BATCH_MATERIALIZAR = os.getenv("DETALLE_BATCH_MATERIALIZAR", "True").lower() == "true"
+# Escaneo de diagnóstico de la flota (python manage.py escanear_flota): ventana evaluada y
+# procesos en paralelo (0 = uno por CPU)
+FLOTA_DIAGNOSTICO_HORAS = float(os.getenv("FLOTA_DIAGNOSTICO_HORAS", "24"))
+FLOTA_DIAGNOSTICO_PROCESOS = int(os.getenv("FLOTA_DIAGNOSTICO_PROCESOS", "0"))
+# Ingesta Node-RED con escritura diferida (ver _AppMonitoreoCoriolis/views/utils_ingesta_diferida.py):
+# las lecturas validadas se encolan y un hilo por worker las guarda por lotes
+INGESTA_DIFERIDA_ACTIVA = os.getenv("INGESTA_DIFERIDA_ACTIVA", "False").lower() == "true"
+# Registros y milisegundos máximos que una lectura espera en la cola antes de guardarse
+INGESTA_DIFERIDA_LOTE = int(os.getenv("INGESTA_DIFERIDA_LOTE", "500"))
+INGESTA_DIFERIDA_INTERVALO_MS = int(os.getenv("INGESTA_DIFERIDA_INTERVALO_MS", "500"))
+# Cuándo se confirma al gateway: 'encolado', 'disco' (fsync) o 'persistido' (commit, hasta ESPERA_MS)
+INGESTA_DIFERIDA_CONFIRMACION = os.getenv("INGESTA_DIFERIDA_CONFIRMACION", "encolado")
+INGESTA_DIFERIDA_ESPERA_MS = int(os.getenv("INGESTA_DIFERIDA_ESPERA_MS", "2000"))
+# Lecturas pendientes máximas por proceso (p. ej. con la base caída); por encima se responde
+# 503 con Retry-After INGESTA_DIFERIDA_REINTENTO_SEGUNDOS
+INGESTA_DIFERIDA_MAX_COLA = int(os.getenv("INGESTA_DIFERIDA_MAX_COLA", "50000"))
+INGESTA_DIFERIDA_REINTENTO_SEGUNDOS = int(os.getenv("INGESTA_DIFERIDA_REINTENTO_SEGUNDOS", "30"))
+# Segmentos de derrame en disco (compartido por los workers del nodo para recuperar los pendientes)
+INGESTA_DIFERIDA_DIRECTORIO = os.getenv("INGESTA_DIFERIDA_DIRECTORIO", str(BASE_DIR / "cache" / "ingesta"))
+# Puntos de control de la carga histórica (python manage.py backfill_nodered)
+BACKFILL_DIRECTORIO = os.getenv("BACKFILL_DIRECTORIO", str(BASE_DIR / "cache" / "backfill"))
+
+# 'default': memoria local por worker (última lectura del tiempo real).
+# 'respuestas': en archivos por defecto, compartida por los workers del nodo sin servicios
+# externos; RESPUESTAS_CACHE_BACKEND permite usar p. ej. LocMemCache o un backend compartido.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "gisme-default",
+    },
+    RESPUESTAS_CACHE: {
+        "BACKEND": os.getenv("RESPUESTAS_CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": os.getenv("RESPUESTAS_CACHE_LOCATION", str(BASE_DIR / "cache" / "respuestas")),
+        "TIMEOUT": RESPUESTAS_CACHE_TTL_SEGUNDOS,
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("RESPUESTAS_CACHE_MAX_ENTRADAS", "5000"))},
+    },
+}
 
 # Configuraciones de cookies seguras
 
@@ -90,6 +197,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    '_AppAuth.middleware_node_red.NodeRedAuthMiddleware',  # Ingesta Node-RED: antes de sesión y usuarios
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -3,25 +3,26 @@ from django.core.paginator import Paginator
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-import base64
-from django.conf import settings
+from _AppAuth.middleware_node_red import autenticar_node_red, mac_autorizada
 
-# Mixin reutilizable para autenticación básica Node-RED
+# Mixin reutilizable para autenticación Node-RED (Basic, clave por gateway o HMAC;
+# ver _AppAuth/middleware_node_red.py). Reutiliza la identidad verificada por el middleware.
 class BasicNodeRedAuthMixin:
     def check_basic_auth(self, request):
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Basic '):
-            return Response({'error': 'No autorizado'}, status=status.HTTP_401_UNAUTHORIZED)
-        try:
-            encoded_credentials = auth_header.split(' ')[1]
-            decoded_credentials = base64.b64decode(encoded_credentials).decode('utf-8')
-            username, password = decoded_credentials.split(':', 1)
-        except Exception:
-            return Response({'error': 'Credenciales mal formateadas'}, status=status.HTTP_401_UNAUTHORIZED)
-        if username != settings.NODE_RED_USER or password != settings.NODE_RED_PASS:
-            return Response({'error': 'Credenciales inválidas'}, status=status.HTTP_401_UNAUTHORIZED)
+        identidad, error = autenticar_node_red(request)
+        if identidad is None:
+            return Response({'error': error}, status=status.HTTP_401_UNAUTHORIZED)
         return None  # Autenticación exitosa
 
+    def check_mac_gateway(self, request, mac_gateway):
+        """Las claves de gateway solo pueden enviar lecturas de su propia mac_gateway."""
+        if not mac_autorizada(request, mac_gateway):
+            return Response(
+                {'success': False, 'error': 'mac_gateway no autorizado para esta credencial.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return None
+
 
 ''' XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX '''
 ''' ---------------------------------------------------------- Querys -------------------------------------------------------------------------------------- '''